@@ -0,0 +1,141 @@
+"""
+XHS-Downloader API响应缓存
+每个 /xhs/detail 的原始响应按笔记ID保存为gzip压缩的JSON，
+在有效期（TTL）内直接复用，总大小超过上限时按最近使用时间淘汰（LRU）
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from utils import get_project_path, ensure_dir
+
+API_CACHE_TTL = 7 * 24 * 3600          # 缓存有效期（秒），<=0表示永不过期
+API_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 缓存总大小上限（字节）
+EVICT_TARGET = 0.9                     # 淘汰到上限的该比例，避免每次写入都触发淘汰
+ENTRY_SUFFIX = ".json.gz"
+
+
+class ApiCache:
+    """
+    基于文件的API响应缓存
+
+    目录结构: cache/api/{笔记ID前2位}/{笔记ID}.json.gz
+    条目的修改时间即最近使用时间，命中时刷新，淘汰时删除最久未使用的条目
+    """
+
+    def __init__(self, root=None, ttl=API_CACHE_TTL, max_bytes=API_CACHE_MAX_BYTES):
+        """
+        Args:
+            root: 缓存根目录，默认 cache/api
+            ttl: 有效期（秒），<=0表示永不过期
+            max_bytes: 总大小上限（字节），<=0表示不限制
+        """
+        self.root = Path(root or get_project_path("cache", "api"))
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._size = None  # 当前总大小，首次写入时扫描目录得到
+        self._lock = threading.Lock()
+
+    def _entry_path(self, note_id):
+        return self.root / note_id[:2] / f"{note_id}{ENTRY_SUFFIX}"
+
+    def get(self, note_id):
+        """
+        查询缓存
+
+        Args:
+            note_id: 笔记ID
+
+        Returns:
+            dict: 缓存的API响应，未命中或已过期返回None
+        """
+        path = self._entry_path(note_id)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+            response = entry["response"]
+            fetched_at = float(entry["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError, EOFError):
+            return None
+
+        if self.ttl > 0 and time.time() - fetched_at > self.ttl:
+            return None
+        try:
+            os.utime(path, None)  # 刷新最近使用时间
+        except OSError:
+            pass
+        return response
+
+    def put(self, note_id, response):
+        """
+        写入缓存（先写临时文件再原子替换），超过大小上限时淘汰
+
+        Args:
+            note_id: 笔记ID
+            response: API原始响应
+        """
+        path = self._entry_path(note_id)
+        ensure_dir(path.parent)
+        entry = {"note_id": note_id, "fetched_at": time.time(), "response": response}
+        data = gzip.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            try:
+                self._size -= path.stat().st_size
+            except OSError:
+                pass
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._size += len(data)
+
+            if self.max_bytes > 0 and self._size > self.max_bytes:
+                self._evict(keep=path)
+
+    def _entries(self):
+        """列出所有条目 (最近使用时间, 路径, 大小)"""
+        entries = []
+        if not self.root.exists():
+            return entries
+        for sub in self.root.iterdir():
+            if not sub.is_dir():
+                continue
+            with os.scandir(sub) as it:
+                for e in it:
+                    if e.name.endswith(ENTRY_SUFFIX):
+                        st = e.stat()
+                        entries.append((st.st_mtime, Path(e.path), st.st_size))
+        return entries
+
+    def _evict(self, keep=None):
+        """删除最久未使用的条目，直到总大小降到上限的EVICT_TARGET以下"""
+        entries = sorted(self._entries())
+        self._size = sum(size for _, _, size in entries)
+        target = self.max_bytes * EVICT_TARGET
+        for _, path, size in entries:
+            if self._size <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+                self._size -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        """
+        缓存统计
+
+        Returns:
+            dict: 条目数和总大小（字节）
+        """
+        entries = self._entries()
+        return {"entries": len(entries), "bytes": sum(size for _, _, size in entries)}
@@ -0,0 +1,365 @@
+"""
+笔记缓存状态目录（SQLite）
+记录每个笔记各阶段的完成状态、图片数、哈希和时间戳，
+批量查询「哪些笔记还需要处理」时不必逐个访问文件系统
+
+用法：
+    python catalog.py rebuild --workers 8     # 并行扫描xhs_notes/重建目录
+    python catalog.py status                  # 查看统计
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from utils import get_project_path, ensure_dir
+from manifest import load_manifest, stage_done
+
+REBUILD_WORKERS = 8   # 重建时并行扫描的线程数
+LOOKUP_CHUNK = 500    # 批量查询时每条SQL的参数个数（低于SQLite上限999）
+
+NOTE_FIELDS = (
+    "note_id", "has_metadata", "has_record", "images", "ocr_results",
+    "content_done", "content_hash", "updated_at",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    note_id TEXT PRIMARY KEY,
+    has_metadata INTEGER NOT NULL DEFAULT 0,
+    has_record INTEGER NOT NULL DEFAULT 0,
+    images INTEGER NOT NULL DEFAULT 0,
+    ocr_results INTEGER NOT NULL DEFAULT 0,
+    content_done INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS images (
+    note_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    content_hash TEXT,
+    ocr_done INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (note_id, name)
+);
+"""
+
+
+def catalog_path():
+    """默认的目录数据库路径 cache/catalog.db"""
+    return get_project_path("cache", "catalog.db")
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def text_hash(text):
+    """文本内容的SHA-256哈希"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def scan_note_dir(note_dir):
+    """
+    扫描单个笔记目录的状态
+
+    Args:
+        note_dir: 笔记目录
+
+    Returns:
+        tuple: (笔记状态字典, [(图片名, 是否已有OCR结果)])
+    """
+    def names(sub, suffix):
+        try:
+            with os.scandir(os.path.join(note_dir, sub)) as it:
+                return {e.name for e in it if e.name.endswith(suffix)}
+        except OSError:
+            return set()
+
+    images = names("images", ".jpg")
+    ocr_stems = {name[:-3] for name in names("ocr_results", ".md")}
+
+    content_hash = None
+    content_path = os.path.join(note_dir, "content.md")
+    try:
+        with open(content_path, 'r', encoding='utf-8') as f:
+            content_hash = text_hash(f.read())
+    except OSError:
+        pass
+
+    # 有阶段清单时以清单为准（content.md可能是中断时留下的，
+    # 图片可能只下载了一部分，应有的图片数以清单中的集合为准）
+    manifest = load_manifest(note_dir)
+    content_done = content_hash is not None
+    expected = None
+    if manifest is not None:
+        content_done = content_done and stage_done(manifest, "content")
+        expected = manifest["images"]["expected"]
+    if expected is not None:
+        images = set(expected)
+
+    note = {
+        "note_id": os.path.basename(os.path.normpath(note_dir)),
+        "has_metadata": int(os.path.exists(os.path.join(note_dir, "metadata.md"))),
+        "has_record": int(os.path.exists(os.path.join(note_dir, "note.json"))),
+        "images": len(images),
+        "ocr_results": len(ocr_stems),
+        "content_done": int(content_done),
+        "content_hash": content_hash,
+        "updated_at": _now(),
+    }
+    image_rows = [(name, int(name[:-4] in ocr_stems)) for name in sorted(images)]
+    return note, image_rows
+
+
+class Catalog:
+    """
+    SQLite笔记状态目录（WAL模式，每个线程使用独立连接）
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: 数据库路径，默认 cache/catalog.db
+        """
+        self.path = path or catalog_path()
+        ensure_dir(os.path.dirname(self.path))
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def mark(self, note_id, **fields):
+        """
+        更新笔记的部分状态（不存在时插入）
+
+        Args:
+            note_id: 笔记ID
+            **fields: NOTE_FIELDS中的字段，如 has_metadata=1
+        """
+        unknown = set(fields) - set(NOTE_FIELDS)
+        if unknown:
+            raise ValueError(f"未知的目录字段: {', '.join(sorted(unknown))}")
+        fields["updated_at"] = _now()
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        updates = ", ".join(f"{k} = excluded.{k}" for k in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO notes (note_id, {columns}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT(note_id) DO UPDATE SET {updates}",
+                (note_id, *fields.values())
+            )
+
+    def record_ocr(self, note_id, images):
+        """
+        记录一批图片已完成OCR，并更新笔记的OCR结果数
+
+        Args:
+            note_id: 笔记ID
+            images: (图片名, 内容哈希或None) 列表
+        """
+        now = _now()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO images (note_id, name, content_hash, ocr_done, updated_at) "
+                "VALUES (?, ?, ?, 1, ?) ON CONFLICT(note_id, name) DO UPDATE SET "
+                "content_hash = COALESCE(excluded.content_hash, content_hash), "
+                "ocr_done = 1, updated_at = excluded.updated_at",
+                [(note_id, name, content_hash, now) for name, content_hash in images]
+            )
+            # OCR结果变化后content.md需要重新生成
+            conn.execute(
+                "INSERT INTO notes (note_id, ocr_results, updated_at) VALUES (?, "
+                "(SELECT COUNT(*) FROM images WHERE note_id = ? AND ocr_done = 1), ?) "
+                "ON CONFLICT(note_id) DO UPDATE SET ocr_results = excluded.ocr_results, "
+                "content_done = 0, content_hash = NULL, updated_at = excluded.updated_at",
+                (note_id, note_id, now)
+            )
+
+    def forget(self, note_id):
+        """
+        删除笔记的记录（文件被手动删除后记录过期时使用）
+
+        Args:
+            note_id: 笔记ID
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM notes WHERE note_id = ?", (note_id,))
+            conn.execute("DELETE FROM images WHERE note_id = ?", (note_id,))
+
+    def get(self, note_id):
+        """
+        查询单个笔记的状态
+
+        Returns:
+            dict: 状态字典，目录中没有该笔记时返回None
+        """
+        return self.get_many([note_id]).get(note_id)
+
+    def get_many(self, note_ids):
+        """
+        批量查询笔记状态
+
+        Args:
+            note_ids: 笔记ID列表
+
+        Returns:
+            dict: note_id -> 状态字典（目录中没有的笔记不出现在结果中）
+        """
+        note_ids = list(dict.fromkeys(note_ids))
+        result = {}
+        conn = self._connect()
+        for i in range(0, len(note_ids), LOOKUP_CHUNK):
+            chunk = note_ids[i:i + LOOKUP_CHUNK]
+            rows = conn.execute(
+                f"SELECT * FROM notes WHERE note_id IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            ).fetchall()
+            for row in rows:
+                result[row["note_id"]] = dict(row)
+        return result
+
+    def pending(self, note_ids):
+        """
+        筛选还需要处理的笔记（目录中没有或content.md未生成）
+
+        Args:
+            note_ids: 笔记ID列表
+
+        Returns:
+            list: 需要处理的笔记ID，保持输入顺序
+        """
+        states = self.get_many(note_ids)
+        return [i for i in note_ids if not (states.get(i) or {}).get("content_done")]
+
+    def images(self, note_id):
+        """
+        查询笔记的图片记录
+
+        Returns:
+            list: 图片状态字典列表
+        """
+        rows = self._connect().execute(
+            "SELECT * FROM images WHERE note_id = ? ORDER BY name", (note_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self):
+        """
+        目录统计
+
+        Returns:
+            dict: 笔记总数、已完成数、图片数、已OCR图片数
+        """
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS notes, COALESCE(SUM(content_done), 0) AS complete, "
+            "COALESCE(SUM(images), 0) AS images, COALESCE(SUM(ocr_results), 0) AS ocr_results "
+            "FROM notes"
+        ).fetchone()
+        return dict(row)
+
+    def rebuild(self, notes_root=None, workers=REBUILD_WORKERS):
+        """
+        并行扫描笔记目录，重建整个目录数据库
+
+        Args:
+            notes_root: 笔记根目录，默认 xhs_notes/
+            workers: 并行扫描的线程数
+
+        Returns:
+            int: 写入的笔记数
+        """
+        notes_root = notes_root or get_project_path("xhs_notes")
+        try:
+            with os.scandir(notes_root) as it:
+                note_dirs = [e.path for e in it if e.is_dir()]
+        except OSError:
+            note_dirs = []
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            scanned = list(executor.map(scan_note_dir, note_dirs))
+
+        now = _now()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM notes")
+            conn.execute("DELETE FROM images")
+            conn.executemany(
+                f"INSERT INTO notes ({', '.join(NOTE_FIELDS)}) "
+                f"VALUES ({', '.join('?' for _ in NOTE_FIELDS)})",
+                [tuple(note[k] for k in NOTE_FIELDS) for note, _ in scanned]
+            )
+            conn.executemany(
+                "INSERT INTO images (note_id, name, ocr_done, updated_at) VALUES (?, ?, ?, ?)",
+                [(note["note_id"], name, done, now) for note, rows in scanned for name, done in rows]
+            )
+        return len(scanned)
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# 按路径缓存的目录对象
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(create=False):
+    """
+    获取当前项目的笔记状态目录
+
+    Args:
+        create: 数据库不存在时是否创建
+
+    Returns:
+        Catalog: 目录对象，数据库不存在且create为False时返回None
+    """
+    path = catalog_path()
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+        if catalog is not None and os.path.exists(path):
+            return catalog
+        if not create and not os.path.exists(path):
+            return None
+        catalog = Catalog(path)
+        _catalogs[path] = catalog
+        return catalog
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='笔记缓存状态目录')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rebuild = sub.add_parser('rebuild', help='并行扫描xhs_notes/重建目录')
+    rebuild.add_argument('--workers', type=int, default=REBUILD_WORKERS, help='并行扫描的线程数')
+    sub.add_parser('status', help='查看目录统计')
+    args = parser.parse_args()
+
+    catalog = get_catalog(create=True)
+    if args.command == 'rebuild':
+        count = catalog.rebuild(workers=args.workers)
+        print(f"✓ 目录已重建: {count} 个笔记 ({catalog.path})")
+    stats = catalog.stats()
+    print(f"笔记: {stats['notes']} (已完成 {stats['complete']}), "
+          f"图片: {stats['images']} (已OCR {stats['ocr_results']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+共享HTTP客户端
+XHS-Downloader API和图片CDN复用同一组长连接池，避免每个请求重新建立TCP/TLS连接
+
+requests在第一次发送请求时才导入：所有笔记都已处理过的任务不需要网络，也不必付出导入开销
+"""
+
+import threading
+from urllib.parse import urlparse
+
+# 连接池默认配置
+API_POOL_SIZE = 8       # XHS-Downloader API 的连接池大小
+CDN_POOL_SIZE = 16      # 其它域名（图片CDN）每个域名的连接池大小
+POOL_CONNECTIONS = 16   # 缓存的域名连接池数量
+
+# 使用HTTP/2时匹配的图片CDN域名后缀
+CDN_HOST_SUFFIXES = ("xhscdn.com", "xiaohongshu.com")
+
+
+class HttpClient:
+    """
+    带连接池的HTTP客户端
+
+    - 基于requests.Session，按URL前缀挂载不同大小的连接池（第一次请求时创建）
+    - 可选通过httpx为图片CDN启用HTTP/2（未安装httpx时自动回退到HTTP/1.1）
+    """
+
+    def __init__(self, pool_sizes=None, default_pool_size=CDN_POOL_SIZE,
+                 http2=False, cdn_hosts=CDN_HOST_SUFFIXES):
+        """
+        Args:
+            pool_sizes: URL前缀到连接池大小的映射，如 {"http://127.0.0.1:5556": 8}
+            default_pool_size: 其它域名的连接池大小
+            http2: 是否为图片CDN启用HTTP/2
+            cdn_hosts: 启用HTTP/2的域名后缀
+        """
+        self.pool_sizes = dict(pool_sizes or {})
+        self.default_pool_size = default_pool_size
+        self.cdn_hosts = tuple(cdn_hosts)
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._http2_client = None
+        if http2:
+            self._http2_client = self._create_http2_client(default_pool_size)
+
+    @property
+    def session(self):
+        """requests.Session（第一次使用时导入requests并创建连接池）"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        default_adapter = HTTPAdapter(
+            pool_connections=POOL_CONNECTIONS,
+            pool_maxsize=self.default_pool_size
+        )
+        session.mount("http://", default_adapter)
+        session.mount("https://", default_adapter)
+        for prefix, size in self.pool_sizes.items():
+            session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=size))
+        return session
+
+    @staticmethod
+    def _create_http2_client(pool_size):
+        """创建HTTP/2客户端，依赖未安装时返回None"""
+        try:
+            import httpx
+            return httpx.Client(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size
+                )
+            )
+        except ImportError:
+            print("警告：httpx[http2]未安装，图片CDN将使用HTTP/1.1")
+            print("请运行: pip install 'httpx[http2]'")
+            return None
+
+    def _use_http2(self, url):
+        if self._http2_client is None:
+            return False
+        host = urlparse(url).hostname or ""
+        return host.endswith(self.cdn_hosts)
+
+    def get(self, url, **kwargs):
+        """
+        发送GET请求（图片CDN在启用HTTP/2时走httpx）
+
+        stream=True时响应体不预先读入内存，通过 iter_content() 分块读取，读完后需调用 close()
+        """
+        if self._use_http2(url):
+            if kwargs.pop("stream", False):
+                request = self._http2_client.build_request("GET", url, **kwargs)
+                return _StreamedHttp2Response(self._http2_client.send(request, stream=True))
+            return self._http2_client.get(url, **kwargs)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """发送POST请求"""
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        """关闭所有连接"""
+        if self._session is not None:
+            self._session.close()
+        if self._http2_client is not None:
+            self._http2_client.close()
+
+
+class _StreamedHttp2Response:
+    """把httpx的流式响应包装成requests风格的 iter_content() 接口"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    def iter_content(self, chunk_size=None):
+        return self._response.iter_bytes(chunk_size)
+
+    def close(self):
+        self._response.close()
+
+
+# 进程内共享的客户端
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """获取进程内共享的HTTP客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def set_client(client):
+    """
+    替换共享的HTTP客户端（用于注入测试替身）
+
+    Args:
+        client: 提供get/post方法的对象，None表示恢复为默认客户端
+
+    Returns:
+        原来的客户端
+    """
+    global _client
+    with _client_lock:
+        previous = _client
+        _client = client
+        return previous
+
+
+def configure_client(pool_sizes=None, default_pool_size=CDN_POOL_SIZE, http2=False):
+    """
+    按配置重新创建共享的HTTP客户端
+
+    Args:
+        pool_sizes: URL前缀到连接池大小的映射
+        default_pool_size: 其它域名的连接池大小
+        http2: 是否为图片CDN启用HTTP/2
+
+    Returns:
+        HttpClient: 新的客户端
+    """
+    client = HttpClient(pool_sizes=pool_sizes, default_pool_size=default_pool_size, http2=http2)
+    previous = set_client(client)
+    if isinstance(previous, HttpClient):
+        previous.close()
+    return client
@@ -0,0 +1,335 @@
+"""
+异步图片下载引擎
+基于asyncio调度，按域名限制并发数，并用令牌桶控制请求速率
+
+图片先分块流式写入 {idx}.jpg.part，校验完整后再原子重命名为 {idx}.jpg；
+中断留下的 .part 文件在下次下载时通过HTTP Range续传
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from http_client import get_client
+
+# 默认配置
+PER_HOST_CONCURRENCY = 4   # 每个域名同时进行的下载数
+RATE_PER_HOST = 4.0        # 每个域名每秒允许发起的请求数
+BURST_PER_HOST = 4         # 令牌桶容量（允许的突发请求数）
+IMAGE_TIMEOUT = 30         # 单张图片下载超时（秒）
+CHUNK_SIZE = 64 * 1024     # 流式写入的分块大小（字节）
+PART_SUFFIX = ".part"      # 未完成下载的临时文件后缀
+TAIL_BYTES = 32            # 完整性检查读取的文件末尾字节数
+
+
+class TokenBucket:
+    """
+    令牌桶限速器
+    以固定速率补充令牌，每次请求消耗一个令牌，令牌不足时异步等待
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 令牌桶容量
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """获取一个令牌，必要时等待"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+def is_image_complete(img_path):
+    """
+    快速检查图片文件是否完整（只读取文件头和末尾若干字节）
+
+    JPEG检查结束标记FFD9，PNG检查IEND块，WebP检查RIFF声明的长度，
+    无法识别的格式（如服务器返回的HTML错误页）一律视为不完整
+
+    Args:
+        img_path: 图片路径
+
+    Returns:
+        bool: True表示文件完整
+    """
+    try:
+        size = os.path.getsize(img_path)
+        if size == 0:
+            return False
+        with open(img_path, 'rb') as f:
+            head = f.read(12)
+            f.seek(max(0, size - TAIL_BYTES))
+            tail = f.read()
+    except OSError:
+        return False
+
+    if head.startswith(b'\xff\xd8'):
+        return b'\xff\xd9' in tail
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return b'IEND' in tail
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return int.from_bytes(head[4:8], 'little') + 8 <= size
+    if head.startswith(b'GIF8'):
+        return tail.rstrip(b'\x00').endswith(b';')
+    return False
+
+
+def _expected_size(response, offset):
+    """根据响应头推算完整文件大小，无法确定时返回None"""
+    content_range = response.headers.get('Content-Range', '')
+    match = re.match(r'bytes \d+-\d+/(\d+)', content_range)
+    if match:
+        return int(match.group(1))
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit():
+        return offset + int(length)
+    return None
+
+
+def _is_image_response(response):
+    """响应的Content-Type是否可能是图片（未声明时不做判断）"""
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    return not content_type or content_type.startswith('image/') or content_type == 'application/octet-stream'
+
+
+def fetch_image(url, img_path, timeout=IMAGE_TIMEOUT):
+    """
+    流式下载单张图片（同步，在线程池中执行）
+
+    数据分块写入 .part 临时文件，已有 .part 时用Range请求续传；
+    大小与图片结束标记校验通过后才原子重命名为目标文件
+
+    Args:
+        url: 图片地址
+        img_path: 保存路径
+        timeout: 超时时间（秒）
+
+    Returns:
+        str: 失败原因，成功返回None
+    """
+    part_path = f"{img_path}{PART_SUFFIX}"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    response = get_client().get(url, timeout=timeout, stream=True, headers=headers)
+    try:
+        if response.status_code == 416 and offset:
+            # 临时文件已经是完整大小
+            expected = None
+        elif response.status_code == 206 and offset:
+            expected = _expected_size(response, offset)
+            mode = 'ab'
+        elif response.status_code == 200:
+            # 服务器不支持Range时从头下载
+            offset = 0
+            expected = _expected_size(response, 0)
+            mode = 'wb'
+        else:
+            return f"HTTP {response.status_code}"
+
+        if response.status_code != 416 and not _is_image_response(response):
+            return f"非图片响应: {response.headers.get('Content-Type')}"
+
+        if response.status_code != 416:
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+    finally:
+        response.close()
+
+    size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if expected is not None and size != expected:
+        # 保留临时文件，下次续传
+        return f"下载不完整: {size}/{expected} 字节"
+    if not is_image_complete(part_path):
+        os.remove(part_path)
+        if offset:
+            # 续传得到的文件损坏，丢弃后重新下载一次
+            return fetch_image(url, img_path, timeout)
+        return "图片数据不完整"
+
+    os.replace(part_path, img_path)
+    return None
+
+
+class ImageDownloader:
+    """
+    异步图片下载器
+
+    下载任务在独立线程的事件循环中调度，多个调用方（如流水线的多个下载线程）
+    共享同一组域名并发限制和令牌桶。
+    """
+
+    def __init__(self, fetch=fetch_image, per_host=PER_HOST_CONCURRENCY,
+                 rate=RATE_PER_HOST, burst=BURST_PER_HOST):
+        """
+        Args:
+            fetch: 单张图片下载函数 fetch(url, img_path) -> 失败原因或None
+            per_host: 每个域名的并发上限
+            rate: 每个域名每秒请求数，<=0表示不限速
+            burst: 令牌桶容量
+        """
+        self.fetch = fetch
+        self.per_host = max(1, per_host)
+        self.rate = rate
+        self.burst = burst
+
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._start_lock = threading.Lock()
+        self._host_limits = {}
+
+    def _ensure_loop(self):
+        """启动后台事件循环线程"""
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(8, self.per_host * 4),
+                    thread_name_prefix="image-fetch"
+                )
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="image-downloader",
+                    daemon=True
+                )
+                self._thread.start()
+        return self._loop
+
+    def _limits_for(self, url):
+        """获取域名对应的并发信号量和令牌桶（在事件循环线程中调用）"""
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = (
+                asyncio.Semaphore(self.per_host),
+                TokenBucket(self.rate, self.burst)
+            )
+        return self._host_limits[host]
+
+    def download(self, jobs, on_complete=None):
+        """
+        下载一批图片，阻塞直到全部完成
+
+        Args:
+            jobs: (idx, url, img_path) 列表
+            on_complete: 可选回调，每张图片成功下载后以 (idx, img_path) 调用
+
+        Returns:
+            dict: idx -> 失败原因（成功为None）
+        """
+        if not jobs:
+            return {}
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._download_all(jobs, on_complete), loop)
+        return future.result()
+
+    async def _download_all(self, jobs, on_complete):
+        results = await asyncio.gather(
+            *(self._download_one(idx, url, img_path, on_complete) for idx, url, img_path in jobs)
+        )
+        return {idx: error for idx, error in results}
+
+    async def _download_one(self, idx, url, img_path, on_complete):
+        semaphore, bucket = self._limits_for(url)
+        async with semaphore:
+            await bucket.acquire()
+            loop = asyncio.get_running_loop()
+            error = await loop.run_in_executor(
+                self._executor, self._fetch_and_notify, idx, url, img_path, on_complete
+            )
+        return idx, error
+
+    def _fetch_and_notify(self, idx, url, img_path, on_complete):
+        """在线程池中下载图片，成功后立即回调（不阻塞事件循环）"""
+        try:
+            error = self.fetch(url, img_path)
+        except Exception as e:
+            error = str(e)
+
+        if error:
+            print(f"    ✗ 图片 {idx}.jpg 下载失败: {error}")
+            return error
+
+        print(f"    ✓ 下载图片 {idx}.jpg")
+        if on_complete:
+            on_complete(idx, img_path)
+        return None
+
+    def close(self):
+        """停止事件循环并释放线程池"""
+        with self._start_lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._executor.shutdown(wait=True)
+            self._loop = None
+            self._thread = None
+            self._executor = None
+            self._host_limits = {}
+
+
+# 进程内共享的下载器
+_downloader = None
+_downloader_lock = threading.Lock()
+
+
+def get_downloader():
+    """获取进程内共享的图片下载器"""
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = ImageDownloader()
+        return _downloader
+
+
+def configure_downloader(per_host=PER_HOST_CONCURRENCY, rate=RATE_PER_HOST,
+                         burst=BURST_PER_HOST, fetch=None):
+    """
+    重新配置共享的图片下载器
+
+    Args:
+        per_host: 每个域名的并发上限
+        rate: 每个域名每秒请求数
+        burst: 令牌桶容量
+        fetch: 自定义下载函数，默认使用fetch_image
+
+    Returns:
+        ImageDownloader: 新的下载器
+    """
+    global _downloader
+    with _downloader_lock:
+        if _downloader is not None:
+            _downloader.close()
+        _downloader = ImageDownloader(
+            fetch=fetch or fetch_image,
+            per_host=per_host,
+            rate=rate,
+            burst=burst
+        )
+        return _downloader
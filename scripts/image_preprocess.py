@@ -0,0 +1,161 @@
+"""
+OCR前的图片预处理
+小红书图片常见1440×1920甚至更大，远超检测模型需要的分辨率；
+识别前用JPEG draft模式快速解码并缩小到最长边不超过上限，直接把解码后的数组交给PaddleOCR，
+同时返回缩放比例，需要时可把检测框坐标换算回原图
+"""
+
+# 送入OCR的图片最长边上限（像素），<=0表示不缩放；
+# 960下最常见的1440×1920原图在JPEG解码阶段直接按1/2缩小，不需要全尺寸解码再插值，
+# 正文文字高度仍大于识别模型的输入高度
+DEFAULT_MAX_SIDE = 960
+
+# draft缩小后的最长边不低于上限的该比例时直接使用，不再全尺寸解码后插值到上限
+# （如1080×1440在上限960下按1/2解码为540×720）
+DRAFT_MIN_RATIO = 0.75
+DRAFT_FACTORS = (2, 4, 8)
+
+# NumPy/Pillow为可选依赖，未安装时直接把图片路径交给OCR引擎
+_deps_checked = False
+_deps_available = False
+
+
+def preprocess_available():
+    """检查NumPy和Pillow是否可用"""
+    global _deps_checked, _deps_available
+    if not _deps_checked:
+        try:
+            import numpy  # noqa: F401
+            from PIL import Image  # noqa: F401
+            _deps_available = True
+        except ImportError:
+            print("警告：NumPy或Pillow未安装，OCR前将不缩放图片")
+            print("请运行: pip install numpy pillow")
+            _deps_available = False
+        _deps_checked = True
+    return _deps_available
+
+
+def target_size(size, max_side):
+    """
+    计算缩放后的尺寸
+
+    Args:
+        size: 原图尺寸 (宽, 高)
+        max_side: 最长边上限，<=0表示不缩放
+
+    Returns:
+        tuple: (缩放后尺寸, 缩放比例)，无需缩放时比例为1.0
+    """
+    width, height = size
+    longest = max(width, height)
+    if max_side <= 0 or longest <= max_side:
+        return size, 1.0
+    scale = max_side / longest
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return target, target[0] / width
+
+
+def draft_size(size, max_side):
+    """
+    JPEG解码阶段能直接缩小到的尺寸
+
+    Args:
+        size: 原图尺寸 (宽, 高)
+        max_side: 最长边上限
+
+    Returns:
+        tuple: 传给Image.draft的尺寸（按该尺寸解码后最长边不超过上限且不低于
+               上限的DRAFT_MIN_RATIO倍），不存在这样的缩小比例时返回None
+    """
+    width, height = size
+    longest = max(width, height)
+    for factor in DRAFT_FACTORS:
+        # libjpeg按1/factor缩小时尺寸向上取整
+        reduced = -(-longest // factor)
+        if reduced <= max_side:
+            if reduced >= max_side * DRAFT_MIN_RATIO:
+                return width // factor, height // factor
+            return None
+    return None
+
+
+def prepare_image(img_path, max_side=DEFAULT_MAX_SIDE):
+    """
+    为OCR准备一张图片
+
+    超过上限的图片解码并缩小为BGR数组（与PaddleOCR读取图片文件得到的通道顺序一致）；
+    未超过上限、依赖缺失或无法解码的图片返回原路径，由OCR引擎自行读取（错误也由引擎报告）
+
+    Args:
+        img_path: 图片路径
+        max_side: 最长边上限（像素）
+
+    Returns:
+        tuple: (predict的输入：路径字符串或数组, 缩放比例)
+    """
+    img_path = str(img_path)
+    if max_side <= 0 or not preprocess_available():
+        return img_path, 1.0
+
+    import numpy as np
+    from PIL import Image
+
+    try:
+        with Image.open(img_path) as img:
+            target, scale = target_size(img.size, max_side)
+            if scale == 1.0:
+                return img_path, 1.0
+            # draft只对JPEG生效：解码阶段直接按1/2、1/4、1/8缩小，省去全尺寸解码的时间和内存；
+            # 能缩小到接近上限时直接使用解码结果，否则（或不是JPEG）再双线性插值到上限
+            width = img.width
+            img.draft('RGB', draft_size(img.size, max_side) or target)
+            img = img.convert('RGB')
+            if max(img.size) > max_side:
+                img = img.resize(target, Image.BILINEAR)
+            scale = img.width / width
+            pixels = np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
+    except Exception:
+        return img_path, 1.0
+    return pixels, scale
+
+
+def to_original_coords(points, scale):
+    """
+    把缩放后图片上的坐标换算回原图
+
+    Args:
+        points: 坐标序列，如 [[x, y], ...] 或 [x1, y1, x2, y2]
+        scale: prepare_image返回的缩放比例
+
+    Returns:
+        与输入结构相同的坐标（浮点数）
+    """
+    if isinstance(points, (list, tuple)):
+        return [to_original_coords(p, scale) for p in points]
+    if hasattr(points, "tolist"):
+        return to_original_coords(points.tolist(), scale)
+    return points / scale
+
+
+def original_boxes(boxes, scale):
+    """
+    把检测框换算回原图坐标（保留1位小数，便于写入JSON）
+
+    Args:
+        boxes: 缩放后图片上的检测框，如 [[x1, y1, x2, y2], ...]
+        scale: prepare_image返回的缩放比例
+
+    Returns:
+        list: 原图上的检测框
+    """
+    return [[round(v, 1) for v in box] for box in to_original_coords(boxes, scale)]
+
+
+class OcrLines(list):
+    """识别结果：文本行列表，附带识别前的缩放比例和原图坐标的检测框（与文本行一一对应）"""
+
+    def __init__(self, lines=(), scale=1.0, boxes=None):
+        super().__init__(lines)
+        self.scale = scale
+        self.boxes = boxes
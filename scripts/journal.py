@@ -0,0 +1,114 @@
+"""
+任务日志（只追加）
+ronggao_output/{task_id}/journal.jsonl 按行记录任务的输入和每个笔记的处理结果，
+每行写入后立即刷盘；进程中断后可据此只继续未完成的笔记（--resume TASK_ID）
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from utils import get_project_path, ensure_dir
+
+JOURNAL_FILENAME = "journal.jsonl"
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def journal_path(task_id):
+    """任务日志路径 ronggao_output/{task_id}/journal.jsonl"""
+    return Path(get_project_path("ronggao_output", task_id, JOURNAL_FILENAME))
+
+
+class TaskJournal:
+    """
+    只追加的任务日志（线程安全）
+
+    事件:
+        start: 任务输入 {"items": [...]}
+        note: 单个笔记结果 {"index": 位置, "item": 输入, "note_id": ID, "status": "done"|"failed"}
+        interrupted: 任务被中断
+        finish: 任务完成 {"success": 数量, "failed": 数量}
+    """
+
+    def __init__(self, task_id):
+        """
+        Args:
+            task_id: 任务ID
+        """
+        self.task_id = task_id
+        self.path = journal_path(task_id)
+        self._lock = threading.Lock()
+
+    def append(self, event, **fields):
+        """
+        追加一条事件并刷盘
+
+        Args:
+            event: 事件类型
+            **fields: 事件字段
+        """
+        line = json.dumps({"event": event, "at": _now(), **fields}, ensure_ascii=False)
+        with self._lock:
+            ensure_dir(self.path.parent)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start(self, items):
+        """记录任务输入"""
+        self.append("start", items=list(items))
+
+    def record_note(self, index, item, note_id, success):
+        """记录单个笔记的处理结果"""
+        self.append("note", index=index, item=item, note_id=note_id,
+                    status="done" if success else "failed")
+
+    def interrupted(self):
+        """记录任务被中断"""
+        self.append("interrupted")
+
+    def finish(self, success, failed):
+        """记录任务完成"""
+        self.append("finish", success=success, failed=failed)
+
+
+def load_journal(task_id):
+    """
+    读取任务日志（忽略中断时写了一半的最后一行）
+
+    Args:
+        task_id: 任务ID
+
+    Returns:
+        dict: {"items": 输入列表, "status": {位置: "done"|"failed"}, "finished": 是否已完成}，
+              日志不存在或没有start事件时返回None
+    """
+    items = None
+    status = {}
+    finished = False
+    try:
+        with open(journal_path(task_id), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                event = entry.get("event")
+                if event == "start":
+                    items = entry["items"]
+                elif event == "note":
+                    status[entry["index"]] = entry["status"]
+                elif event == "finish":
+                    finished = True
+    except OSError:
+        return None
+    if items is None:
+        return None
+    return {"items": items, "status": status, "finished": finished}
+
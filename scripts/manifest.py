@@ -0,0 +1,309 @@
+"""
+笔记阶段清单
+每个笔记目录下的 manifest.json 记录各阶段（获取、下载、OCR、生成内容）的完成情况、
+应有的图片集合与已完成的图片集合，以及各阶段的输入哈希。
+中断后再次运行时只补做缺失的图片和阶段，而不是整篇笔记全部重来或全部跳过
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from utils import get_project_path
+from note_record import load_record, CONTENT_TEMPLATE_VERSION
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+STAGES = ("fetch", "download", "ocr", "content")
+
+# 同一笔记的清单可能被多个下载/OCR线程同时更新
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(str(path), threading.Lock())
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def manifest_dir(note_id):
+    """笔记ID对应的目录"""
+    return Path(get_project_path("xhs_notes", note_id))
+
+
+def load_manifest(note_dir):
+    """
+    读取阶段清单
+
+    Args:
+        note_dir: 笔记目录
+
+    Returns:
+        dict: 清单内容，不存在或损坏时返回None
+    """
+    try:
+        with open(Path(note_dir) / MANIFEST_FILENAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def _new_manifest(note_id):
+    return {
+        "version": MANIFEST_VERSION,
+        "note_id": note_id,
+        "stages": {stage: {"done": False, "at": None} for stage in STAGES},
+        "images": {"expected": None, "downloaded": {}, "ocr": {}},
+        "inputs": {},
+    }
+
+
+def _refresh(manifest):
+    """根据图片集合重新计算下载和OCR阶段是否完成"""
+    images = manifest["images"]
+    expected = images["expected"]
+    for stage, done_key in (("download", "downloaded"), ("ocr", "ocr")):
+        done = expected is not None and set(expected) <= set(images[done_key])
+        entry = manifest["stages"][stage]
+        if done and not entry["done"]:
+            entry["at"] = _now()
+        entry["done"] = done
+
+
+def update_manifest(note_dir, change):
+    """
+    在锁内读取、修改并原子写回清单
+
+    Args:
+        note_dir: 笔记目录
+        change: 修改函数 change(manifest)
+
+    Returns:
+        dict: 更新后的清单
+    """
+    note_dir = Path(note_dir)
+    with _lock_for(note_dir):
+        manifest = load_manifest(note_dir) or _new_manifest(note_dir.name)
+        change(manifest)
+        _refresh(manifest)
+        note_dir.mkdir(parents=True, exist_ok=True)
+        path = note_dir / MANIFEST_FILENAME
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    return manifest
+
+
+def _invalidate(manifest, *stages):
+    for stage in stages:
+        manifest["stages"][stage] = {"done": False, "at": None}
+
+
+def mark_fetched(note_id, api_hash):
+    """
+    记录获取阶段完成
+
+    Args:
+        note_id: 笔记ID
+        api_hash: API数据的哈希（数据变化时后续阶段需要重做）
+    """
+    def change(manifest):
+        if manifest["inputs"].get("api") != api_hash:
+            _invalidate(manifest, "content")
+        manifest["inputs"]["api"] = api_hash
+        manifest["stages"]["fetch"] = {"done": True, "at": _now()}
+
+    update_manifest(manifest_dir(note_id), change)
+
+
+def set_expected_images(note_id, names):
+    """
+    记录笔记应有的图片集合
+
+    Args:
+        note_id: 笔记ID
+        names: 图片文件名列表，如 ["0.jpg", "1.jpg"]
+    """
+    def change(manifest):
+        manifest["images"]["expected"] = list(names)
+
+    update_manifest(manifest_dir(note_id), change)
+
+
+def mark_downloaded(note_dir, name):
+    """记录一张图片已下载完成"""
+    def change(manifest):
+        manifest["images"]["downloaded"][name] = _now()
+
+    update_manifest(note_dir, change)
+
+
+def mark_ocr_done(note_dir, image_hashes, file_hashes=None):
+    """
+    记录一批图片已完成OCR，生成内容阶段随之失效
+
+    Args:
+        note_dir: 笔记目录
+        image_hashes: 图片文件名 -> 图片内容哈希（OCR的输入哈希，可为None）
+        file_hashes: OCR结果文件名 -> 写入的文件内容哈希（用于区分手动修正与重新识别）
+    """
+    def change(manifest):
+        manifest["images"]["ocr"].update(image_hashes)
+        if file_hashes:
+            manifest["images"].setdefault("ocr_files", {}).update(file_hashes)
+        _invalidate(manifest, "content")
+
+    update_manifest(note_dir, change)
+
+
+def mark_ocr_synced(note_dir, file_hashes):
+    """
+    记录手动修正过的OCR结果文件已同步到note.json（之后不再视为修正）
+
+    Args:
+        note_dir: 笔记目录
+        file_hashes: OCR结果文件名 -> 文件内容哈希
+    """
+    def change(manifest):
+        manifest["images"].setdefault("ocr_files", {}).update(file_hashes)
+
+    update_manifest(note_dir, change)
+
+
+def file_digest(path):
+    """文件内容的哈希（与content_inputs中OCR结果文件的指纹一致）"""
+    with open(path, 'rb') as f:
+        return _sha256(f.read())
+
+
+def mark_content_done(note_id, content_hash, inputs=None):
+    """
+    记录content.md已生成
+
+    Args:
+        note_id: 笔记ID
+        content_hash: content.md内容的哈希
+        inputs: 生成时的输入指纹（content_inputs的返回值）
+    """
+    def change(manifest):
+        manifest["stages"]["content"] = {
+            "done": True, "at": _now(), "hash": content_hash, "inputs": inputs,
+        }
+
+    update_manifest(manifest_dir(note_id), change)
+
+
+def stage_done(manifest, stage):
+    """清单中某个阶段是否已完成"""
+    return bool(manifest["stages"].get(stage, {}).get("done"))
+
+
+def missing_images(manifest, stage):
+    """
+    某个阶段尚未完成的图片
+
+    Args:
+        manifest: 清单
+        stage: "download" 或 "ocr"
+
+    Returns:
+        list: 图片文件名，应有图片集合未知时返回None
+    """
+    images = manifest["images"]
+    if images["expected"] is None:
+        return None
+    done = images["downloaded" if stage == "download" else "ocr"]
+    return [name for name in images["expected"] if name not in done]
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_inputs(note_dir):
+    """
+    计算content.md各输入的指纹：模板版本、笔记字段、每个OCR结果文件
+
+    Args:
+        note_dir: 笔记目录
+
+    Returns:
+        dict: {"template": 版本, "metadata": 哈希, "ocr": {文件名: 哈希}}，
+              元数据不存在时"metadata"为None
+    """
+    note_dir = Path(note_dir)
+    record = load_record(note_dir)
+    if record is not None and record.get("api") is not None:
+        # 有记录时content.md由记录渲染，记录中的OCR文本行也是输入
+        payload = {"api": record["api"],
+                   "ocr": {k: v.get("lines") for k, v in (record.get("ocr") or {}).items()}}
+        metadata = _sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    else:
+        try:
+            metadata = _sha256((note_dir / "metadata.md").read_bytes())
+        except OSError:
+            metadata = None
+
+    ocr = {}
+    try:
+        with os.scandir(note_dir / "ocr_results") as it:
+            for entry in it:
+                if entry.name.endswith(".md"):
+                    with open(entry.path, 'rb') as f:
+                        ocr[entry.name] = _sha256(f.read())
+    except OSError:
+        pass
+
+    return {"template": CONTENT_TEMPLATE_VERSION, "metadata": metadata,
+            "ocr": dict(sorted(ocr.items()))}
+
+
+def content_stale(note_dir, inputs=None):
+    """
+    content.md是否需要重新生成（未生成、没有输入指纹或任一输入已变化）
+
+    Args:
+        note_dir: 笔记目录
+        inputs: 已计算的输入指纹，默认重新计算
+
+    Returns:
+        bool: True表示需要重新生成
+    """
+    manifest = load_manifest(note_dir)
+    if manifest is None or not stage_done(manifest, "content"):
+        return True
+    if not (Path(note_dir) / "content.md").exists():
+        return True
+    stored = manifest["stages"]["content"].get("inputs")
+    return stored != (inputs or content_inputs(note_dir))
+
+
+def changed_ocr_files(note_dir, inputs):
+    """
+    被手动修正过的OCR结果文件：内容与OCR写入（或上次同步）时记录的哈希不同；
+    重新识别写入的文件记录了新的哈希，不算修正。
+    没有写入哈希的旧清单，与上次生成content.md时的输入指纹比较
+
+    Args:
+        note_dir: 笔记目录
+        inputs: 当前的输入指纹
+
+    Returns:
+        list: OCR结果文件名，没有记录过指纹时返回空列表
+    """
+    manifest = load_manifest(note_dir)
+    if manifest is None:
+        return []
+    written = manifest["images"].get("ocr_files") or {}
+    stored = (manifest["stages"].get("content", {}).get("inputs") or {}).get("ocr") or {}
+    return [name for name, digest in inputs["ocr"].items()
+            if written.get(name, stored.get(name)) not in (None, digest)]
@@ -0,0 +1,166 @@
+"""
+流式写入合并文档
+先写入文件头，每个笔记完成后立即按输入顺序追加它的内容，
+成功/失败计数在全部完成后写入文末和旁路文件 merged.json，
+下游步骤无需等待最慢的笔记即可开始读取 merged.md
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from utils import get_project_path, ensure_dir, format_note_ids_display
+
+MERGED_FILENAME = "merged.md"
+STATUS_FILENAME = "merged.json"
+SECTION_SEPARATOR = "\n\n---\n\n"
+
+
+class MergedWriter:
+    """
+    按输入顺序流式写入merged.md
+
+    乱序完成的笔记暂存在内存中，等前面的笔记都完成后再写入，
+    因此同时只保留尚未轮到的笔记内容
+    """
+
+    def __init__(self, task_id, note_ids, output_dir=None):
+        """
+        Args:
+            task_id: 任务ID
+            note_ids: 笔记ID或URL列表（决定写入顺序）
+            output_dir: 输出目录，默认 ronggao_output/{task_id}
+        """
+        self.task_id = task_id
+        self.note_ids = list(note_ids)
+        self.output_dir = Path(output_dir or get_project_path("ronggao_output", task_id))
+        self.path = self.output_dir / MERGED_FILENAME
+        self.status_path = self.output_dir / STATUS_FILENAME
+        self.success_count = 0
+        self.failed = []
+        self._pending = {}
+        self._next = 0
+        self._written = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """写入文件头（计数在close时写入文末）"""
+        ensure_dir(self.output_dir)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write(f"""# 融稿素材合并文档
+
+## 任务信息
+
+- **生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+- **任务ID**: {self.task_id}
+- **处理笔记数**: {len(self.note_ids)}
+- **处理统计**: 见文末
+
+## 笔记ID列表
+
+{format_note_ids_display(self.note_ids)}
+
+---
+
+""")
+        self._file.flush()
+        self._write_status(complete=False)
+        return self
+
+    def add(self, index, content):
+        """
+        提交一个笔记的结果（任意线程、任意顺序调用）
+
+        Args:
+            index: 笔记在输入列表中的位置
+            content: 笔记内容，失败时为None
+        """
+        with self._lock:
+            self._pending[index] = content
+            progressed = False
+            while self._next in self._pending:
+                content = self._pending.pop(self._next)
+                if content is None:
+                    self.failed.append(self.note_ids[self._next])
+                else:
+                    if self._written:
+                        self._file.write(SECTION_SEPARATOR)
+                    self._file.write(content)
+                    self._written += 1
+                    self.success_count += 1
+                self._next += 1
+                progressed = True
+            if progressed:
+                self._file.flush()
+                self._write_status(complete=False)
+
+    def close(self):
+        """写入文末统计并标记完成（未提交的笔记按失败计）"""
+        with self._lock:
+            for index in range(self._next, len(self.note_ids)):
+                content = self._pending.pop(index, None)
+                if content is None:
+                    self.failed.append(self.note_ids[index])
+                    continue
+                if self._written:
+                    self._file.write(SECTION_SEPARATOR)
+                self._file.write(content)
+                self._written += 1
+                self.success_count += 1
+            self._next = len(self.note_ids)
+
+            if not self._written:
+                self._file.write("\n⚠ 没有成功处理的笔记内容\n")
+            self._file.write(f"""
+
+---
+
+## 处理统计
+
+- **完成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+- **成功处理**: {self.success_count}
+- **失败处理**: {len(self.failed)}
+""")
+            self._file.close()
+            self._file = None
+            self._write_status(complete=True)
+
+    def abort(self):
+        """
+        中断时关闭文件：只保留已按顺序写入的笔记，不写文末统计，
+        merged.json保持未完成状态，续跑时重新生成
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            self._write_status(complete=False)
+
+    def _write_status(self, complete):
+        """原子写入旁路状态文件，下游据此判断merged.md是否写完"""
+        status = {
+            "task_id": self.task_id,
+            "total": len(self.note_ids),
+            "written": self._next,
+            "success": self.success_count,
+            "failed": len(self.failed),
+            "failed_notes": self.failed,
+            "complete": complete,
+        }
+        tmp_path = self.status_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.status_path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        elif self._file is not None:
+            self.close()
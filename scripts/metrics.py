@@ -0,0 +1,253 @@
+"""
+任务级的分阶段耗时与吞吐指标
+各阶段（API、图片下载、OCR、生成内容、合并文档）每次调用记录一条事件，
+写入 ronggao_output/{task_id}/metrics.jsonl，任务结束时汇总为 metrics.md 表格；
+未启用时计时上下文只返回一个空字典，处理流程不受影响
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils import get_project_path, ensure_dir
+
+METRICS_FILENAME = "metrics.jsonl"
+SUMMARY_FILENAME = "metrics.md"
+FLUSH_EVERY = 200  # 缓冲多少条事件后写入文件
+
+# 汇总表中各阶段的显示顺序和名称
+STAGE_LABELS = {
+    "api": "API获取",
+    "download": "图片下载",
+    "ocr": "OCR识别",
+    "content": "生成内容",
+    "merged": "合并文档",
+}
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class TaskMetrics:
+    """
+    单个任务的指标记录器（线程安全）
+
+    事件: {"stage": 阶段, "t": 相对任务开始的秒数, "seconds": 耗时, "note_id": 笔记ID, 计数器...}
+    """
+
+    def __init__(self, task_id, path=None):
+        """
+        Args:
+            task_id: 任务ID
+            path: 事件文件路径，默认 ronggao_output/{task_id}/metrics.jsonl
+        """
+        self.task_id = task_id
+        self.path = Path(path or get_project_path("ronggao_output", task_id, METRICS_FILENAME))
+        self.started = time.perf_counter()
+        self._buffer = []
+        self._durations = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, note_id=None, **counters):
+        """
+        记录一次阶段调用
+
+        Args:
+            stage: 阶段名
+            seconds: 耗时（秒）
+            note_id: 笔记ID（跨笔记的调用为None）
+            **counters: 计数器，如 bytes=1024, images=3
+        """
+        event = {"stage": stage, "t": round(time.perf_counter() - self.started, 4),
+                 "seconds": round(seconds, 6)}
+        if note_id:
+            event["note_id"] = note_id
+        event.update(counters)
+        with self._lock:
+            self._durations.setdefault(stage, []).append(seconds)
+            totals = self._counters.setdefault(stage, {})
+            for key, value in counters.items():
+                totals[key] = totals.get(key, 0) + value
+            self._buffer.append(event)
+            if len(self._buffer) >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        ensure_dir(self.path.parent)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in self._buffer))
+        self._buffer.clear()
+
+    def flush(self):
+        """把缓冲的事件写入文件"""
+        with self._lock:
+            self._flush_locked()
+
+    def summary(self):
+        """
+        按阶段汇总
+
+        Returns:
+            dict: 阶段 -> {"calls", "seconds", "mean", "p50", "p95", "max", 计数器合计...}
+        """
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+            counters = {stage: dict(values) for stage, values in self._counters.items()}
+        result = {}
+        for stage, values in durations.items():
+            total = sum(values)
+            result[stage] = {
+                "calls": len(values),
+                "seconds": total,
+                "mean": total / len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "max": values[-1],
+                **counters.get(stage, {}),
+            }
+        return result
+
+    def render_summary(self):
+        """
+        渲染汇总表（Markdown）
+
+        Returns:
+            str: 汇总表文本
+        """
+        summary = self.summary()
+        elapsed = time.perf_counter() - self.started
+        lines = [
+            f"# 任务指标 {self.task_id}",
+            "",
+            f"- **总耗时**: {elapsed:.2f}秒",
+            "",
+            "| 阶段 | 调用 | 总耗时(s) | 平均(ms) | p50(ms) | p95(ms) | 最大(ms) | 计数 |",
+            "|------|------|-----------|----------|---------|---------|----------|------|",
+        ]
+        stages = [s for s in STAGE_LABELS if s in summary] + sorted(set(summary) - set(STAGE_LABELS))
+        for stage in stages:
+            s = summary[stage]
+            counts = ", ".join(
+                f"{key} {_format_count(key, value)}" for key, value in s.items()
+                if key not in ("calls", "seconds", "mean", "p50", "p95", "max")
+            )
+            lines.append(
+                f"| {STAGE_LABELS.get(stage, stage)} | {s['calls']} | {s['seconds']:.2f} | "
+                f"{s['mean'] * 1000:.1f} | {s['p50'] * 1000:.1f} | {s['p95'] * 1000:.1f} | "
+                f"{s['max'] * 1000:.1f} | {counts} |"
+            )
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """
+        写入剩余事件和汇总表 metrics.md
+
+        Returns:
+            str: 汇总表文本
+        """
+        self.flush()
+        table = self.render_summary()
+        ensure_dir(self.path.parent)
+        (self.path.parent / SUMMARY_FILENAME).write_text(table, encoding='utf-8')
+        return table
+
+
+def _format_count(key, value):
+    if key == "bytes":
+        return f"{value / 1024 / 1024:.1f}MB" if value >= 1024 * 1024 else f"{value / 1024:.1f}KB"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+# 进程内当前任务的记录器，None表示不记录
+_active = None
+
+# 每次阶段计时后调用的观察者 observer(stage, seconds, counters)，如Prometheus导出
+_observers = []
+_observers_lock = threading.Lock()
+
+
+def set_metrics(metrics):
+    """
+    设置当前任务的指标记录器
+
+    Args:
+        metrics: TaskMetrics，None表示停止记录
+
+    Returns:
+        原来的记录器
+    """
+    global _active
+    previous = _active
+    _active = metrics
+    return previous
+
+
+def get_metrics():
+    """当前任务的指标记录器，未启用时返回None"""
+    return _active
+
+
+def add_observer(observer):
+    """
+    添加阶段计时的观察者（跨任务持续接收，不受set_metrics影响）
+
+    Args:
+        observer: observer(stage, seconds, counters)
+    """
+    global _observers
+    with _observers_lock:
+        _observers = _observers + [observer]
+
+
+def remove_observer(observer):
+    """移除阶段计时的观察者"""
+    global _observers
+    with _observers_lock:
+        _observers = [o for o in _observers if o != observer]
+
+
+@contextmanager
+def timed(stage, note_id=None):
+    """
+    计时一次阶段调用，调用方可向返回的字典写入计数器
+
+    用法:
+        with timed("download", note_id) as m:
+            m["bytes"] = 1024
+
+    Args:
+        stage: 阶段名
+        note_id: 笔记ID
+
+    Yields:
+        dict: 计数器
+    """
+    metrics = _active
+    observers = _observers
+    counters = {}
+    if metrics is None and not observers:
+        yield counters
+        return
+    start = time.perf_counter()
+    try:
+        yield counters
+    except BaseException:
+        counters["errors"] = counters.get("errors", 0) + 1
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if metrics is not None:
+            metrics.record(stage, seconds, note_id, **counters)
+        for observer in observers:
+            observer(stage, seconds, counters)
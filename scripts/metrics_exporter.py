@@ -0,0 +1,279 @@
+"""
+Prometheus文本格式的指标导出
+在本机端口上提供 /metrics（text exposition format 0.0.4），
+汇总各阶段的调用数、耗时直方图和计数器，以及由回调实时读取的状态（队列深度、进行中的笔记等）
+
+启用方式：
+    python xhs_processor.py --metrics-port 9108 "..."
+    curl http://127.0.0.1:9108/metrics
+"""
+
+import math
+import threading
+
+from metrics import add_observer, remove_observer
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PREFIX = "xhs_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 阶段耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只增的计数器（按标签区分）"""
+
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """累积桶直方图（按标签区分）"""
+
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    result.append((f"{self.name}_bucket", key + (("le", _number(float(bound))),), cumulative))
+                result.append((f"{self.name}_sum", key, series["sum"]))
+                result.append((f"{self.name}_count", key, series["count"]))
+        return result
+
+
+class CallbackGauge:
+    """抓取时由回调计算当前值的仪表（回调返回 {标签元组: 值} 或单个数值）"""
+
+    type = "gauge"
+
+    def __init__(self, name, help, callback):
+        self.name = name
+        self.help = help
+        self.callback = callback
+
+    def samples(self):
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, tuple(key), value) for key, value in values.items() if value is not None]
+
+
+class CallbackCounter(CallbackGauge):
+    """抓取时由回调读取的累计计数（只增不减的值，如进程内的调用统计），按计数器类型导出"""
+
+    type = "counter"
+
+
+class MetricsExporter:
+    """
+    指标注册表与 /metrics HTTP服务
+
+    注册为metrics模块的观察者后，每次阶段计时（timed）都会更新：
+        xhs_stage_duration_seconds{stage}   阶段耗时直方图
+        xhs_stage_calls_total{stage}        调用数
+        xhs_stage_errors_total{stage}       抛出异常的调用数
+        xhs_stage_units_total{stage,unit}   阶段计数器合计（bytes、images、lines、cache_hits等）
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: 阶段耗时直方图的桶上限（秒）
+        """
+        self._metrics = []
+        self._lock = threading.Lock()
+        self.stage_seconds = self.histogram("stage_duration_seconds", "各阶段单次调用耗时（秒）", buckets)
+        self.stage_calls = self.counter("stage_calls_total", "各阶段调用次数")
+        self.stage_errors = self.counter("stage_errors_total", "各阶段抛出异常的调用次数")
+        self.stage_units = self.counter("stage_units_total", "各阶段计数器合计（字节、图片、文本行、缓存命中等）")
+        self.gauge("cache_hit_ratio", "缓存命中率（api: API响应缓存；ocr: OCR缓存与近似图片复用）",
+                   self._cache_hit_ratios)
+        self.server = None
+        self._thread = None
+
+    def counter(self, name, help):
+        """注册计数器"""
+        return self._register(Counter(METRICS_PREFIX + name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        """注册直方图"""
+        return self._register(Histogram(METRICS_PREFIX + name, help, buckets))
+
+    def gauge(self, name, help, callback):
+        """注册由回调计算的仪表"""
+        return self._register(CallbackGauge(METRICS_PREFIX + name, help, callback))
+
+    def callback_counter(self, name, help, callback):
+        """注册由回调读取的计数器（名称应以_total结尾）"""
+        return self._register(CallbackCounter(METRICS_PREFIX + name, help, callback))
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def observe(self, stage, seconds, counters):
+        """
+        记录一次阶段调用（metrics.timed的观察者回调）
+
+        Args:
+            stage: 阶段名
+            seconds: 耗时（秒）
+            counters: 计数器
+        """
+        self.stage_seconds.observe(seconds, stage=stage)
+        self.stage_calls.inc(stage=stage)
+        for unit, value in counters.items():
+            if unit == "errors":
+                self.stage_errors.inc(value, stage=stage)
+            elif isinstance(value, (int, float)) and value:
+                self.stage_units.inc(value, stage=stage, unit=unit)
+
+    def _cache_hit_ratios(self):
+        ratios = {}
+        api_calls = self.stage_calls.value(stage="api")
+        if api_calls:
+            ratios[(("cache", "api"),)] = self.stage_units.value(stage="api", unit="cache_hits") / api_calls
+        reused = (self.stage_units.value(stage="ocr", unit="cache_hits")
+                  + self.stage_units.value(stage="ocr", unit="phash_reuses"))
+        looked_up = reused + self.stage_units.value(stage="ocr", unit="recognized")
+        if looked_up:
+            ratios[(("cache", "ocr"),)] = reused / looked_up
+        return ratios
+
+    def render(self):
+        """
+        渲染所有指标
+
+        Returns:
+            str: Prometheus文本格式
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def start(self, port, host=METRICS_HOST):
+        """
+        注册为阶段计时的观察者并在后台线程中启动 /metrics 服务
+
+        Args:
+            port: 端口，0表示自动分配
+            host: 监听地址（默认只监听本机）
+
+        Returns:
+            MetricsExporter: self
+        """
+        # 只在启用导出时导入HTTP服务模块
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-exporter",
+                                        daemon=True)
+        self._thread.start()
+        add_observer(self.observe)
+        return self
+
+    @property
+    def url(self):
+        """/metrics 地址"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def stop(self):
+        """停止服务并取消观察"""
+        remove_observer(self.observe)
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
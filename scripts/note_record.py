@@ -0,0 +1,226 @@
+"""
+笔记结构化记录
+每个笔记目录下保存一份 note.json（API原始字段、每张图片的OCR文本行、时间戳），
+metadata.md 和 content.md 都由该记录直接渲染，不再用正则解析Markdown
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from utils import get_project_path
+
+RECORD_FILENAME = "note.json"
+RECORD_VERSION = 1
+# content.md模板版本，修改render_content_md的输出格式时递增，已有笔记会被判定为需要重新生成
+CONTENT_TEMPLATE_VERSION = 1
+OCR_TEXT_HEADING = "## 识别文本"
+EMPTY_OCR_TEXT = "（未识别到文字）"
+
+# 同一笔记的记录可能被多个OCR线程同时更新
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(str(path), threading.Lock())
+
+
+def now_str():
+    """当前时间（记录与Markdown中统一使用的格式）"""
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def record_path(note_dir):
+    """
+    获取笔记记录文件路径
+
+    Args:
+        note_dir: 笔记目录
+
+    Returns:
+        Path: note.json路径
+    """
+    return Path(note_dir) / RECORD_FILENAME
+
+
+def note_dir_for(note_id):
+    """笔记ID对应的目录"""
+    return Path(get_project_path("xhs_notes", note_id))
+
+
+def load_record(note_dir):
+    """
+    读取笔记记录
+
+    Args:
+        note_dir: 笔记目录
+
+    Returns:
+        dict: 记录内容，不存在或损坏时返回None
+    """
+    try:
+        with open(record_path(note_dir), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def save_record(note_dir, record):
+    """
+    写入笔记记录（先写临时文件再原子替换）
+
+    Args:
+        note_dir: 笔记目录
+        record: 记录内容
+    """
+    path = record_path(note_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _empty_record(note_id):
+    return {"version": RECORD_VERSION, "note_id": note_id, "fetched_at": None, "api": None, "ocr": {}}
+
+
+def save_api_data(note_id, data):
+    """
+    保存API返回的笔记字段（保留已有的OCR结果）
+
+    Args:
+        note_id: 笔记ID
+        data: API响应中的data字段
+
+    Returns:
+        dict: 更新后的记录
+    """
+    note_dir = note_dir_for(note_id)
+    with _lock_for(note_dir):
+        record = load_record(note_dir) or _empty_record(note_id)
+        record["api"] = dict(data)
+        record["fetched_at"] = now_str()
+        save_record(note_dir, record)
+    return record
+
+
+def update_ocr_results(note_dir, entries):
+    """
+    合并一批图片的OCR结果
+
+    Args:
+        note_dir: 笔记目录
+        entries: 图片文件名 -> {"lines": [...], "source": 来源或None, "recognized_at": 时间}
+    """
+    if not entries:
+        return
+    note_dir = Path(note_dir)
+    with _lock_for(note_dir):
+        record = load_record(note_dir) or _empty_record(note_dir.name)
+        record.setdefault("ocr", {}).update(entries)
+        save_record(note_dir, record)
+
+
+def parse_ocr_md(text):
+    """
+    从OCR结果文件中解析识别文本行（用于同步手动修正过的结果）
+
+    Args:
+        text: ocr_results/*.md 的内容
+
+    Returns:
+        list: 文本行，格式不符时返回None
+    """
+    _, sep, body = text.partition(f"{OCR_TEXT_HEADING}\n")
+    if not sep:
+        return None
+    body = body.strip()
+    if not body or body == EMPTY_OCR_TEXT:
+        return []
+    return body.split('\n')
+
+
+def render_metadata_md(record):
+    """
+    由记录渲染metadata.md
+
+    Args:
+        record: 笔记记录
+
+    Returns:
+        str: Markdown内容
+    """
+    note_id = record["note_id"]
+    data = record.get("api") or {}
+    return f"""# 笔记元数据
+
+- **ID**: {note_id}
+- **标题**: {data.get('作品标题', '无标题')}
+- **作者**: {data.get('作者昵称', '未知')}
+- **作者ID**: {data.get('作者ID', '未知')}
+- **发布时间**: {data.get('发布时间', '未知')}
+- **更新时间**: {data.get('更新时间', '未知')}
+- **作品类型**: {data.get('作品类型', '未知')}
+- **点赞数量**: {data.get('点赞数量', 0)}
+- **收藏数量**: {data.get('收藏数量', 0)}
+- **评论数量**: {data.get('评论数量', 0)}
+- **分享数量**: {data.get('分享数量', 0)}
+- **作品链接**: https://www.xiaohongshu.com/explore/{note_id}
+
+## 原始内容
+
+{data.get('作品描述', '（无描述）')}
+"""
+
+
+def render_content_md(record):
+    """
+    由记录渲染content.md（纯内存操作）
+
+    Args:
+        record: 笔记记录
+
+    Returns:
+        str: Markdown内容
+    """
+    data = record.get("api") or {}
+    content = str(data.get('作品描述') or '').strip()
+
+    md_lines = [
+        f"# {data.get('作品标题', '无标题')}",
+        "",
+        "## 元信息",
+        f"- **作者**: {data.get('作者昵称', '未知')}",
+        f"- **发布时间**: {data.get('发布时间', '未知')}",
+        "",
+        "## 正文内容",
+        "",
+        content if content else "（无正文内容）",
+        "",
+        "## 图片文本"
+    ]
+
+    ocr_results = record.get("ocr") or {}
+    if ocr_results:
+        # 与按文件名排序的ocr_results/*.md保持相同顺序
+        for image_name in sorted(ocr_results, key=lambda name: f"{Path(name).stem}.md"):
+            idx = Path(image_name).stem
+            lines = ocr_results[image_name].get("lines") or []
+            text = '\n'.join(lines).strip() if lines else '（未识别到文字）'
+
+            if idx == "0":
+                md_lines.append(f"\n### 封面图片文本")
+            else:
+                md_lines.append(f"\n### 图片{idx}文本")
+            md_lines.append("")
+            md_lines.append(text)
+    else:
+        md_lines.append("\n（无OCR识别结果）")
+
+    return '\n'.join(md_lines)
@@ -0,0 +1,431 @@
+"""
+OCR配置自动调优
+在本机CPU上用xhs_notes/中的图片样本比较检测/识别模型（mobile / server）、推理线程数、
+每批图片数和识别前的最长边上限，测量每秒识别图片数和与参考文本的字符一致率，
+把满足一致率要求的最快配置写入 ocr_profile.json，xhs_processor初始化OCR引擎时读取
+
+逐项调优：先比较模型组合，再在选出的模型上依次比较线程数、批大小和最长边上限，
+每项保留满足一致率要求且最快的取值（全组合需要的引擎初始化次数太多）
+
+用法：
+    python ocr_autotune.py                          # 抽样20张图片，参考文本为note.json中已有的识别结果
+    python ocr_autotune.py --images 40 --min-agreement 0.95
+    python ocr_autotune.py --reference server       # 用server模型+原图识别结果作为参考文本
+"""
+
+import argparse
+import difflib
+import json
+import os
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+
+from utils import get_project_path, write_text_atomic
+from note_record import load_record
+from image_preprocess import prepare_image, DEFAULT_MAX_SIDE
+
+PROFILE_FILENAME = "ocr_profile.json"
+PROFILE_VERSION = 1
+# 配置文件中的调优项
+PROFILE_KEYS = ("det_model", "rec_model", "cpu_threads", "batch_size", "max_side")
+
+DET_MODELS = ("PP-OCRv5_mobile_det", "PP-OCRv5_server_det")
+REC_MODELS = ("PP-OCRv5_mobile_rec", "PP-OCRv5_server_rec")
+BATCH_SIZES = (1, 2, 4, 8)
+MAX_SIDES = (960, 1280, 1600, 0)
+
+# 未调优时的配置（PP-OCRv5默认使用server模型）
+BASELINE = {
+    "det_model": "PP-OCRv5_server_det",
+    "rec_model": "PP-OCRv5_server_rec",
+    "cpu_threads": None,
+    "batch_size": 4,
+    "max_side": DEFAULT_MAX_SIDE,
+}
+
+SAMPLE_SIZE = 20       # 默认抽样图片数
+MIN_AGREEMENT = 0.97   # 与参考文本的平均字符一致率下限
+REFERENCE_MODES = ("stored", "server")
+
+
+def profile_path():
+    """调优配置文件路径"""
+    return get_project_path(PROFILE_FILENAME)
+
+
+def load_profile(path=None):
+    """
+    读取调优配置
+
+    Args:
+        path: 配置文件路径，默认为项目根目录下的 ocr_profile.json
+
+    Returns:
+        dict: PROFILE_KEYS中的各项，文件不存在或格式不符时返回None
+    """
+    try:
+        with open(path or profile_path(), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        profile = data["profile"]
+        result = {
+            "det_model": str(profile["det_model"]),
+            "rec_model": str(profile["rec_model"]),
+            "cpu_threads": int(profile["cpu_threads"]) if profile.get("cpu_threads") else None,
+            "batch_size": max(1, int(profile["batch_size"])),
+            "max_side": int(profile["max_side"]),
+        }
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    return result
+
+
+def save_profile(report, path=None):
+    """
+    写入调优结果
+
+    Args:
+        report: autotune返回的结果
+        path: 配置文件路径，默认为项目根目录下的 ocr_profile.json
+
+    Returns:
+        Path: 写入的路径
+    """
+    path = Path(path or profile_path())
+    write_text_atomic(path, json.dumps(report, ensure_ascii=False, indent=2) + "\n")
+    return path
+
+
+def thread_choices(cpu_count=None):
+    """
+    候选的推理线程数：1、2、4…直到CPU核心数
+
+    Args:
+        cpu_count: CPU核心数，默认使用os.cpu_count()
+
+    Returns:
+        tuple: 从小到大的线程数
+    """
+    cpu_count = max(1, cpu_count or os.cpu_count() or 1)
+    choices = []
+    n = 1
+    while n < cpu_count:
+        choices.append(n)
+        n *= 2
+    choices.append(cpu_count)
+    return tuple(choices)
+
+
+def normalize_text(lines):
+    """把文本行拼接为去掉空白的字符串（检测框切分不同的结果按字符比较）"""
+    return "".join("".join(lines).split())
+
+
+def char_agreement(reference, lines):
+    """
+    字符一致率
+
+    Args:
+        reference: 参考文本行
+        lines: 待比较的文本行
+
+    Returns:
+        float: 0~1，两者都为空时为1
+    """
+    expected, actual = normalize_text(reference), normalize_text(lines)
+    if not expected and not actual:
+        return 1.0
+    return difflib.SequenceMatcher(None, expected, actual, autojunk=False).ratio()
+
+
+def sample_images(count=SAMPLE_SIZE, seed=0, notes_root=None, require_text=True):
+    """
+    从已处理的笔记中抽样图片
+
+    Args:
+        count: 抽样数量
+        seed: 随机种子（相同种子抽到相同的图片，便于对比多次调优）
+        notes_root: 笔记根目录，默认 xhs_notes/
+        require_text: 只抽取note.json中已有非空识别结果的图片（作为参考文本）
+
+    Returns:
+        list: [{"path": 图片路径, "lines": 已有的识别结果或None}, ...]
+    """
+    notes_root = Path(notes_root or get_project_path("xhs_notes"))
+    candidates = []
+    try:
+        note_dirs = sorted(p for p in notes_root.iterdir() if p.is_dir())
+    except OSError:
+        return []
+    for note_dir in note_dirs:
+        images_dir = note_dir / "images"
+        if not images_dir.is_dir():
+            continue
+        record = load_record(note_dir) or {}
+        ocr_results = record.get("ocr") or {}
+        for img_path in sorted(images_dir.glob("*.jpg")):
+            lines = (ocr_results.get(img_path.name) or {}).get("lines")
+            if require_text and not lines:
+                continue
+            candidates.append({"path": str(img_path), "lines": lines or None})
+    if len(candidates) > count:
+        candidates = random.Random(seed).sample(candidates, count)
+    return candidates
+
+
+def create_engine(det_model, rec_model, cpu_threads=None, device="cpu"):
+    """
+    按候选配置创建PaddleOCR引擎
+
+    Args:
+        det_model: 检测模型名
+        rec_model: 识别模型名
+        cpu_threads: CPU推理线程数，None使用PaddleOCR默认值
+        device: 推理设备
+
+    Returns:
+        PaddleOCR对象
+    """
+    from paddleocr import PaddleOCR
+    from xhs_processor import OCR_CONFIG
+
+    extra = {"cpu_threads": cpu_threads} if cpu_threads and device == "cpu" else {}
+    return PaddleOCR(
+        **OCR_CONFIG,
+        text_detection_model_name=det_model,
+        text_recognition_model_name=rec_model,
+        device=device,
+        **extra
+    )
+
+
+def result_lines(result):
+    """从predict的单个结果中读取文本行，格式不支持时返回空列表"""
+    json_data = getattr(result, 'json', None)
+    if isinstance(json_data, dict):
+        return list(json_data.get('res', {}).get('rec_texts') or [])
+    return []
+
+
+class Autotuner:
+    """
+    OCR配置调优器
+
+    引擎按 (检测模型, 识别模型, 线程数) 复用，批大小和最长边上限不需要重新初始化引擎
+    """
+
+    def __init__(self, samples, device="cpu", engine_factory=create_engine,
+                 min_agreement=MIN_AGREEMENT, clock=time.perf_counter):
+        """
+        Args:
+            samples: sample_images返回的图片样本（lines为参考文本）
+            device: 推理设备
+            engine_factory: factory(det_model, rec_model, cpu_threads, device) -> 引擎
+            min_agreement: 平均字符一致率下限
+            clock: 计时函数
+        """
+        self.samples = samples
+        self.device = device
+        self.engine_factory = engine_factory
+        self.min_agreement = min_agreement
+        self.clock = clock
+        self.trials = []
+        self._engines = {}
+
+    def engine(self, candidate):
+        """候选配置对应的引擎（首次使用时创建并预热）"""
+        key = (candidate["det_model"], candidate["rec_model"], candidate["cpu_threads"])
+        if key not in self._engines:
+            print(f"  → 加载引擎: {key[0]} + {key[1]}, 线程 {key[2] or '默认'}")
+            engine = self.engine_factory(*key, device=self.device)
+            # 首次推理包含模型预热，不计入测量
+            if self.samples:
+                list(engine.predict(input=self.samples[0]["path"]))
+            self._engines[key] = engine
+        return self._engines[key]
+
+    def recognize(self, candidate):
+        """
+        按候选配置识别所有样本
+
+        Returns:
+            tuple: (与样本顺序一致的文本行列表, 耗时秒数)
+        """
+        engine = self.engine(candidate)
+        batch_size = candidate["batch_size"]
+        lines = []
+        start = self.clock()
+        for i in range(0, len(self.samples), batch_size):
+            batch = self.samples[i:i + batch_size]
+            inputs = [prepare_image(s["path"], candidate["max_side"])[0] for s in batch]
+            results = list(engine.predict(input=inputs if len(inputs) > 1 else inputs[0]))
+            if len(results) != len(inputs):
+                raise RuntimeError(f"OCR返回 {len(results)} 个结果（期望 {len(inputs)}）")
+            lines.extend(result_lines(r) for r in results)
+        return lines, self.clock() - start
+
+    def build_reference(self, candidate=None):
+        """
+        用最准确的配置（server模型、原图、逐张识别）生成参考文本，覆盖样本中已有的识别结果
+
+        Args:
+            candidate: 参考配置，默认为BASELINE的模型、不缩放、批大小1
+        """
+        candidate = candidate or {**BASELINE, "batch_size": 1, "max_side": 0}
+        print("\n生成参考文本...")
+        lines, _ = self.recognize(candidate)
+        for sample, reference in zip(self.samples, lines):
+            sample["lines"] = reference
+
+    def measure(self, candidate):
+        """
+        测量一个候选配置
+
+        Returns:
+            dict: 候选配置各项 + images_per_sec + agreement
+        """
+        lines, seconds = self.recognize(candidate)
+        agreement = sum(char_agreement(s["lines"] or [], got)
+                        for s, got in zip(self.samples, lines)) / max(1, len(self.samples))
+        trial = {**candidate,
+                 "images_per_sec": round(len(self.samples) / seconds, 3) if seconds > 0 else 0.0,
+                 "agreement": round(agreement, 4)}
+        self.trials.append(trial)
+        mark = "✓" if agreement >= self.min_agreement else "✗"
+        print(f"    {mark} {candidate['det_model']} + {candidate['rec_model']}, "
+              f"线程 {candidate['cpu_threads'] or '默认'}, 批大小 {candidate['batch_size']}, "
+              f"最长边 {candidate['max_side'] or '原图'}: "
+              f"{trial['images_per_sec']:.2f} 张/秒, 一致率 {agreement:.2%}")
+        return trial
+
+    def best(self, trials):
+        """满足一致率要求的最快配置；都不满足时取一致率最高的"""
+        eligible = [t for t in trials if t["agreement"] >= self.min_agreement]
+        if eligible:
+            return max(eligible, key=lambda t: t["images_per_sec"])
+        return max(trials, key=lambda t: (t["agreement"], t["images_per_sec"]))
+
+    def run(self, det_models=DET_MODELS, rec_models=REC_MODELS, threads=None,
+            batch_sizes=BATCH_SIZES, max_sides=MAX_SIDES, baseline=None):
+        """
+        逐项调优
+
+        Args:
+            det_models/rec_models: 候选的检测/识别模型
+            threads: 候选线程数，默认thread_choices()
+            batch_sizes: 候选的每批图片数
+            max_sides: 候选的最长边上限（0表示不缩放）
+            baseline: 起始配置，默认BASELINE（线程数取最大候选值）
+
+        Returns:
+            dict: {"profile": 最佳配置, "baseline": 起始配置的测量结果, "trials": 所有测量结果, ...}
+        """
+        threads = tuple(threads or thread_choices())
+        current = dict(baseline or BASELINE)
+        current["cpu_threads"] = current["cpu_threads"] or max(threads)
+        base_trial = self.measure(current)
+
+        def stage(title, candidates):
+            nonlocal current
+            print(f"\n[{title}]")
+            # 当前配置排在最前：速度相同时保留当前取值
+            measured = [self._trial_for(current)] + [self._trial_for(c) for c in candidates]
+            chosen = self.best(measured)
+            current = {k: chosen[k] for k in PROFILE_KEYS}
+
+        stage("模型", [{**current, "det_model": d, "rec_model": r}
+                       for d in det_models for r in rec_models])
+        stage("线程数", [{**current, "cpu_threads": n} for n in threads])
+        stage("批大小", [{**current, "batch_size": n} for n in batch_sizes])
+        stage("最长边", [{**current, "max_side": n} for n in max_sides])
+
+        chosen = self._trial_for(current)
+        return {
+            "version": PROFILE_VERSION,
+            "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "device": self.device,
+            "cpu_count": os.cpu_count(),
+            "images": len(self.samples),
+            "min_agreement": self.min_agreement,
+            "profile": current,
+            "images_per_sec": chosen["images_per_sec"],
+            "agreement": chosen["agreement"],
+            "baseline": base_trial,
+            "trials": self.trials,
+        }
+
+    def _trial_for(self, candidate):
+        """候选配置最近一次的测量结果，尚未测量时测量"""
+        for trial in reversed(self.trials):
+            if all(trial[k] == candidate[k] for k in PROFILE_KEYS):
+                return trial
+        return self.measure(candidate)
+
+
+def _int_list(value):
+    return tuple(int(v) for v in value.split(",") if v.strip())
+
+
+def _str_list(value):
+    return tuple(v.strip() for v in value.split(",") if v.strip())
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='在本机上自动调优OCR配置')
+    parser.add_argument('--images', type=int, default=SAMPLE_SIZE, help='抽样图片数')
+    parser.add_argument('--seed', type=int, default=0, help='抽样的随机种子')
+    parser.add_argument('--reference', choices=REFERENCE_MODES, default="stored",
+                        help='参考文本：stored为note.json中已有的识别结果，server为server模型识别原图的结果')
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT,
+                        help='与参考文本的平均字符一致率下限')
+    parser.add_argument('--device', default="cpu", help='推理设备')
+    parser.add_argument('--det-models', type=_str_list, default=DET_MODELS, help='候选检测模型（逗号分隔）')
+    parser.add_argument('--rec-models', type=_str_list, default=REC_MODELS, help='候选识别模型（逗号分隔）')
+    parser.add_argument('--threads', type=_int_list, default=None,
+                        help='候选推理线程数（逗号分隔，默认1、2、4…直到CPU核心数）')
+    parser.add_argument('--batch-sizes', type=_int_list, default=BATCH_SIZES, help='候选批大小（逗号分隔）')
+    parser.add_argument('--max-sides', type=_int_list, default=MAX_SIDES,
+                        help='候选最长边上限（逗号分隔，0表示不缩放）')
+    parser.add_argument('--output', default=None,
+                        help=f'配置文件路径（默认项目根目录下的{PROFILE_FILENAME}；其它路径需用'
+                             'xhs_processor.py --ocr-profile 或环境变量XHS_OCR_PROFILE_PATH指定）')
+    args = parser.parse_args()
+
+    try:
+        import paddleocr  # noqa: F401
+    except ImportError:
+        print("✗ PaddleOCR未安装，无法调优")
+        print("请运行: pip install paddlepaddle paddleocr")
+        raise SystemExit(1)
+
+    samples = sample_images(args.images, seed=args.seed, require_text=args.reference == "stored")
+    if not samples:
+        print("✗ 没有可用的样本图片（xhs_notes/下需要有已识别过的笔记）")
+        raise SystemExit(1)
+    print(f"✓ 抽样 {len(samples)} 张图片，设备 {args.device}")
+
+    tuner = Autotuner(samples, device=args.device, min_agreement=args.min_agreement)
+    if args.reference == "server":
+        tuner.build_reference()
+    report = tuner.run(det_models=args.det_models, rec_models=args.rec_models, threads=args.threads,
+                       batch_sizes=args.batch_sizes, max_sides=args.max_sides)
+
+    path = save_profile(report, args.output)
+    profile, baseline = report["profile"], report["baseline"]
+    print(f"\n✓ 最佳配置: {profile['det_model']} + {profile['rec_model']}, "
+          f"线程 {profile['cpu_threads']}, 批大小 {profile['batch_size']}, "
+          f"最长边 {profile['max_side'] or '原图'}")
+    print(f"  {report['images_per_sec']:.2f} 张/秒（默认配置 {baseline['images_per_sec']:.2f} 张/秒），"
+          f"一致率 {report['agreement']:.2%}")
+    if report["agreement"] < args.min_agreement:
+        print(f"⚠ 没有配置达到一致率下限 {args.min_agreement:.0%}，已选择一致率最高的配置")
+    if args.output:
+        print(f"✓ 已写入 {path}（使用: python xhs_processor.py --ocr-profile {path} ...）")
+    else:
+        print(f"✓ 已写入 {path}（xhs_processor启动时自动加载，--no-ocr-profile可忽略）")
+
+
+if __name__ == "__main__":
+    main()
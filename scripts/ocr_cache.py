@@ -0,0 +1,121 @@
+"""
+OCR结果缓存
+按「图片内容哈希 + OCR引擎配置指纹」缓存识别结果，跨笔记复用相同图片的识别文本
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from utils import get_project_path, ensure_dir
+
+
+def image_hash(img_path):
+    """
+    计算图片文件内容的SHA-256哈希
+
+    Args:
+        img_path: 图片路径
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    digest = hashlib.sha256()
+    with open(img_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def engine_fingerprint(config, version="unknown"):
+    """
+    计算OCR引擎配置指纹，模型、版本或参数变化都会得到不同的指纹
+
+    Args:
+        config: OCR引擎参数字典
+        version: OCR库版本
+
+    Returns:
+        str: 16位十六进制指纹
+    """
+    payload = json.dumps({"config": config, "version": version}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class OcrCache:
+    """
+    基于文件的OCR结果缓存
+
+    目录结构: cache/ocr/{引擎指纹}/{哈希前2位}/{哈希}.json
+    引擎配置变化后指纹改变，旧配置下的结果自然失效。
+    """
+
+    def __init__(self, engine_key, root=None):
+        """
+        Args:
+            engine_key: OCR引擎配置指纹
+            root: 缓存根目录，默认 cache/ocr
+        """
+        self.engine_key = engine_key
+        self.root = Path(root or get_project_path("cache", "ocr"))
+        self.engine_dir = self.root / engine_key
+
+    def _entry_path(self, content_hash):
+        return self.engine_dir / content_hash[:2] / f"{content_hash}.json"
+
+    def get(self, content_hash):
+        """
+        查询缓存
+
+        Args:
+            content_hash: 图片内容哈希
+
+        Returns:
+            list: 缓存的文本行，未命中返回None
+        """
+        path = self._entry_path(content_hash)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)["lines"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, content_hash, lines, image=None):
+        """
+        写入缓存（先写临时文件再原子替换）
+
+        Args:
+            content_hash: 图片内容哈希
+            lines: 识别到的文本行
+            image: 来源图片路径（仅用于排查）
+        """
+        path = self._entry_path(content_hash)
+        ensure_dir(path.parent)
+        entry = {
+            "lines": list(lines),
+            "image": str(image) if image else None,
+            "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def purge_other_engines(self):
+        """
+        删除其它引擎配置下的缓存
+
+        Returns:
+            int: 删除的引擎目录数
+        """
+        if not self.root.exists():
+            return 0
+        removed = 0
+        for child in self.root.iterdir():
+            if child.is_dir() and child.name != self.engine_key:
+                shutil.rmtree(child, ignore_errors=True)
+                removed += 1
+        return removed
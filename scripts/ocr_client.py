@@ -0,0 +1,129 @@
+"""
+本地OCR服务的客户端与结果序列化协议
+与服务端（ocr_server.py）分开，处理器只需导入本模块，不加载http.server等服务端依赖
+"""
+
+import re
+import threading
+import time
+
+from http_client import get_client
+from text_gate import NoText
+from image_preprocess import OcrLines
+
+# 默认配置
+OCR_SERVER_HOST = "127.0.0.1"
+OCR_SERVER_PORT = 5557
+OCR_SERVER_URL = f"http://{OCR_SERVER_HOST}:{OCR_SERVER_PORT}"
+REQUEST_TIMEOUT = 300    # 客户端等待识别结果的超时（秒）
+HEALTH_TIMEOUT = 0.5     # 健康检查超时（秒）
+HEALTH_CACHE_SECONDS = 30  # 健康检查结果缓存时间（秒）
+ENGINE_KEY_PATTERN = re.compile(r'^[0-9a-f]{16}$')  # 引擎指纹格式（用作缓存目录名）
+
+
+def serialize_result(result):
+    """单张图片的识别结果转换为JSON（保留跳过原因、缩放比例和检测框）"""
+    if isinstance(result, Exception):
+        return {"error": str(result)}
+    if isinstance(result, NoText):
+        return {"lines": [], "no_text": result.reason}
+    item = {"lines": list(result)}
+    if isinstance(result, OcrLines):
+        item.update(scale=result.scale, boxes=result.boxes)
+    return item
+
+
+def deserialize_result(item):
+    """serialize_result的逆过程"""
+    if "error" in item:
+        return RuntimeError(item["error"])
+    if "no_text" in item:
+        return NoText(item["no_text"])
+    if "scale" in item:
+        return OcrLines(item["lines"], item["scale"], item.get("boxes"))
+    return item["lines"]
+
+
+class OcrServerClient:
+    """OCR服务客户端"""
+
+    def __init__(self, url=OCR_SERVER_URL, timeout=REQUEST_TIMEOUT):
+        """
+        Args:
+            url: 服务地址
+            timeout: 识别请求超时（秒）
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        # 服务端引擎指纹（健康检查或识别结果中获得，未知时为None）
+        self.engine_key = None
+        self._available = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        """检查服务是否可用（结果缓存一段时间）"""
+        with self._lock:
+            now = time.monotonic()
+            if self._available is not None and now - self._checked_at < HEALTH_CACHE_SECONDS:
+                return self._available
+            try:
+                response = get_client().get(f"{self.url}/health", timeout=HEALTH_TIMEOUT)
+                self._available = response.status_code == 200
+            except Exception:
+                self._available = False
+            if self._available:
+                try:
+                    self.engine_key = _valid_engine_key(response.json().get("engine_key"))
+                except Exception:
+                    self.engine_key = None
+            self._checked_at = now
+            return self._available
+
+    def mark_unavailable(self):
+        """请求失败后标记服务不可用，直到下次健康检查"""
+        with self._lock:
+            self._available = False
+            self._checked_at = time.monotonic()
+
+    def recognize(self, paths):
+        """
+        请求识别一批图片
+
+        Args:
+            paths: 图片路径列表（服务与客户端在同一台机器上，直接传递绝对路径）
+
+        Returns:
+            list: 与输入顺序一致的结果，每项为文本行列表或异常对象
+        """
+        return self.recognize_with_key(paths)[0]
+
+    def recognize_with_key(self, paths):
+        """
+        请求识别一批图片，同时返回产生这些结果的服务端引擎指纹
+
+        Args:
+            paths: 图片路径列表
+
+        Returns:
+            tuple: (结果列表, 引擎指纹)，服务未报告指纹时指纹为None
+        """
+        response = get_client().post(
+            f"{self.url}/ocr",
+            json={"images": [str(p) for p in paths]},
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"OCR服务返回错误状态码: {response.status_code}")
+        payload = response.json()
+        engine_key = _valid_engine_key(payload.get("engine_key"))
+        if engine_key:
+            self.engine_key = engine_key
+        return [deserialize_result(item) for item in payload["results"]], engine_key
+
+
+def _valid_engine_key(value):
+    """服务返回的引擎指纹用作缓存目录名，格式不符时视为未知"""
+    if isinstance(value, str) and ENGINE_KEY_PATTERN.match(value):
+        return value
+    return None
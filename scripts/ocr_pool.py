@@ -0,0 +1,129 @@
+"""
+多进程OCR识别池
+CPU模式下单个进程内的OCR引擎无法用满所有核心，识别池在每个工作进程中加载一个引擎，
+把每批图片分散到各进程并行识别
+
+每个进程的推理线程数 × 进程数 不应超过CPU核心数，避免线程争抢
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 推理库读取的线程数环境变量，需在工作进程加载引擎之前设置
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# 工作进程内的识别函数（每个进程一个）
+_worker_engine = None
+
+
+def default_cpu_threads(workers):
+    """
+    按CPU核心数平均分配每个工作进程的推理线程数
+
+    Args:
+        workers: 工作进程数
+
+    Returns:
+        int: 每个进程的推理线程数
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def create_worker_engine(cpu_threads):
+    """
+    默认的引擎工厂：在工作进程中加载PaddleOCR
+
+    Args:
+        cpu_threads: 推理线程数
+
+    Returns:
+        callable: engine(paths) -> 文本行列表或异常对象的列表，PaddleOCR不可用时返回None
+    """
+    from ocr_server import create_paddle_engine
+    return create_paddle_engine(cpu_threads=cpu_threads)
+
+
+def _init_worker(engine_factory, cpu_threads):
+    """工作进程初始化：限制推理线程数并加载引擎"""
+    global _worker_engine
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(cpu_threads)
+    _worker_engine = engine_factory(cpu_threads)
+
+
+def _worker_recognize(paths):
+    """在工作进程中识别一组图片"""
+    if _worker_engine is None:
+        return [RuntimeError("OCR引擎不可用")] * len(paths)
+    return _worker_engine(paths)
+
+
+class OcrProcessPool:
+    """
+    多进程OCR识别池
+
+    recognize() 与 OcrServerClient.recognize() 接口一致，
+    识别结果在主进程中按原有方式写入，输出与单进程识别完全相同
+    """
+
+    def __init__(self, workers, cpu_threads=None, engine_factory=create_worker_engine):
+        """
+        Args:
+            workers: 工作进程数
+            cpu_threads: 每个进程的推理线程数，默认按CPU核心数平均分配
+            engine_factory: 可序列化的模块级函数 factory(cpu_threads) -> engine(paths)
+        """
+        self.workers = max(1, workers)
+        self.cpu_threads = cpu_threads or default_cpu_threads(self.workers)
+        # 使用spawn启动，避免fork时复制下载线程等运行状态
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(engine_factory, self.cpu_threads)
+        )
+
+    def recognize(self, paths):
+        """
+        把一批图片分给各工作进程识别
+
+        Args:
+            paths: 图片路径列表
+
+        Returns:
+            list: 与输入顺序一致的结果，每项为文本行列表或异常对象
+        """
+        paths = [str(p) for p in paths]
+        if not paths:
+            return []
+
+        # 按进程数切成连续的若干段，每个进程批量识别一段
+        chunks = min(self.workers, len(paths))
+        size, extra = divmod(len(paths), chunks)
+        futures = []
+        start = 0
+        for i in range(chunks):
+            end = start + size + (1 if i < extra else 0)
+            futures.append((start, end, self._executor.submit(_worker_recognize, paths[start:end])))
+            start = end
+
+        results = [None] * len(paths)
+        for start, end, future in futures:
+            try:
+                chunk_results = future.result()
+                if len(chunk_results) != end - start:
+                    raise RuntimeError(f"识别结果数量不匹配: {len(chunk_results)} != {end - start}")
+            except Exception as e:
+                chunk_results = [e] * (end - start)
+            results[start:end] = chunk_results
+        return results
+
+    def close(self, wait=True):
+        """
+        关闭工作进程
+
+        Args:
+            wait: 为False时不等待进行中的识别，并取消排队的任务
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,311 @@
+"""
+本地OCR推理服务
+常驻进程保持PaddleOCR模型预热，对多个处理进程的请求做动态凑批
+
+启动方式：
+    python ocr_server.py --port 5557 --max-batch 8 --max-wait-ms 20
+"""
+
+import argparse
+import ipaddress
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 客户端与序列化协议在ocr_client中（处理器只导入客户端，不加载http.server）
+from ocr_client import (
+    OcrServerClient,
+    serialize_result,
+    OCR_SERVER_HOST,
+    OCR_SERVER_PORT,
+    OCR_SERVER_URL,
+    REQUEST_TIMEOUT
+)
+
+# 默认配置
+MAX_BATCH = 8            # 每批最多图片数
+MAX_WAIT = 0.02          # 凑批等待时间（秒）
+
+
+class _OcrRequest:
+    """一次识别请求（可包含多张图片）"""
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.results = [None] * len(paths)
+        self.remaining = len(paths)
+        self.done = threading.Event()
+
+
+class DynamicBatcher:
+    """
+    动态凑批器
+    把来自多个并发请求的图片合并成批，在单个线程中调用识别引擎
+    """
+
+    def __init__(self, engine, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        """
+        Args:
+            engine: 批量识别函数 engine(paths) -> 与输入等长的列表，
+                    每项为文本行列表或异常对象
+            max_batch: 每批最多图片数
+            max_wait: 收到第一张图片后等待凑批的最长时间（秒）
+        """
+        self.engine = engine
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.batches = 0
+        self.images = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+        self._stopped = threading.Event()
+        self._thread.start()
+
+    def submit(self, paths, timeout=REQUEST_TIMEOUT):
+        """
+        提交图片并等待识别结果
+
+        Args:
+            paths: 图片路径列表
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            list: 与输入顺序一致的结果，每项为文本行列表或异常对象
+        """
+        request = _OcrRequest(list(paths))
+        if not request.paths:
+            return []
+        for i, path in enumerate(request.paths):
+            self._queue.put((request, i, path))
+        if not request.done.wait(timeout):
+            raise TimeoutError("OCR识别超时")
+        return request.results
+
+    @property
+    def pending(self):
+        """等待识别的图片数"""
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._process(batch)
+
+    def _process(self, batch):
+        paths = [path for _, _, path in batch]
+        try:
+            results = self.engine(paths)
+            if len(results) != len(paths):
+                raise RuntimeError(f"识别结果数量不匹配: {len(results)} != {len(paths)}")
+        except Exception as e:
+            results = [e] * len(paths)
+
+        self.batches += 1
+        self.images += len(paths)
+        for (request, i, _), result in zip(batch, results):
+            request.results[i] = result
+            request.remaining -= 1
+            if request.remaining == 0:
+                request.done.set()
+
+    def stop(self):
+        """停止凑批线程"""
+        self._stopped.set()
+        self._thread.join()
+
+
+class _OcrHandler(BaseHTTPRequestHandler):
+    """OCR服务的HTTP请求处理"""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+        batcher = self.server.batcher
+        self._send_json(200, {
+            "status": "ok",
+            "engine": self.server.engine_name,
+            "engine_key": self.server.engine_key,
+            "pending": batcher.pending,
+            "batches": batcher.batches,
+            "images": batcher.images,
+        })
+
+    def do_POST(self):
+        if self.path != "/ocr":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+            paths = payload["images"]
+        except Exception as e:
+            self._send_json(400, {"error": f"请求格式错误: {e}"})
+            return
+
+        try:
+            results = self.server.batcher.submit(paths)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+
+        self._send_json(200, {
+            "results": [serialize_result(r) for r in results],
+            "engine_key": self.server.engine_key,
+        })
+
+    def log_message(self, format, *args):
+        # 不逐条打印访问日志
+        pass
+
+
+class OcrServer:
+    """本地OCR推理服务（按请求中的路径读取本机文件，只应监听回环地址，见is_loopback_host）"""
+
+    def __init__(self, engine, host=OCR_SERVER_HOST, port=OCR_SERVER_PORT,
+                 max_batch=MAX_BATCH, max_wait=MAX_WAIT, engine_name="PaddleOCR",
+                 engine_key=None):
+        """
+        Args:
+            engine: 批量识别函数，见DynamicBatcher
+            host: 监听地址
+            port: 监听端口，0表示随机端口
+            max_batch: 每批最多图片数
+            max_wait: 凑批等待时间（秒）
+            engine_name: 健康检查中显示的引擎名称
+            engine_key: 服务端OCR引擎配置指纹，随健康检查和识别结果返回，
+                        客户端据此缓存服务识别的结果
+        """
+        self.batcher = DynamicBatcher(engine, max_batch=max_batch, max_wait=max_wait)
+        self.httpd = ThreadingHTTPServer((host, port), _OcrHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.batcher = self.batcher
+        self.httpd.engine_name = engine_name
+        self.httpd.engine_key = engine_key
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """在当前线程中运行服务"""
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """停止服务"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.batcher.stop()
+        if self._thread:
+            self._thread.join()
+
+
+def is_loopback_host(host):
+    """
+    监听地址是否只能从本机访问
+    
+    /ocr按客户端提交的路径直接读取本机文件，因此服务不能对网络开放
+    
+    Args:
+        host: 监听地址
+    
+    Returns:
+        bool: localhost或回环地址返回True
+    """
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def create_paddle_engine(cpu_threads=None):
+    """
+    加载PaddleOCR并返回批量识别函数
+    
+    Args:
+        cpu_threads: CPU模式下的推理线程数，None使用PaddleOCR默认值
+
+    Returns:
+        callable: engine(paths) -> 文本行列表或异常对象的列表，PaddleOCR不可用时返回None
+    """
+    import xhs_processor
+
+    if cpu_threads:
+        xhs_processor.OCR_CPU_THREADS = cpu_threads
+    if not xhs_processor.init_ocr():
+        return None
+    return xhs_processor.recognize_images
+
+
+def main():
+    """启动OCR服务"""
+    parser = argparse.ArgumentParser(description='本地OCR推理服务')
+    parser.add_argument('--host', default=OCR_SERVER_HOST, help='监听地址（仅限本机回环地址）')
+    parser.add_argument('--port', type=int, default=OCR_SERVER_PORT, help='监听端口')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='每批最多图片数')
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT * 1000,
+                        help='凑批等待时间（毫秒）')
+    args = parser.parse_args()
+    if not is_loopback_host(args.host):
+        parser.error(f"--host 只能是本机回环地址（如 {OCR_SERVER_HOST}），不能是 {args.host}")
+
+    engine = create_paddle_engine()
+    if engine is None:
+        raise SystemExit(1)
+
+    import xhs_processor
+
+    server = OcrServer(
+        engine,
+        host=args.host,
+        port=args.port,
+        max_batch=args.max_batch,
+        max_wait=args.max_wait_ms / 1000,
+        engine_key=xhs_processor.ocr_engine_key()
+    )
+    print(f"✓ OCR服务已启动: {server.url} (批大小 {args.max_batch}, 凑批等待 {args.max_wait_ms:.0f}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止OCR服务...")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
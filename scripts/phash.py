@@ -0,0 +1,260 @@
+"""
+感知哈希近似图片检测
+用NumPy向量化计算pHash/dHash，并用多索引哈希（multi-index hashing）做汉明距离近邻查询，
+同一张图重新压缩或缩放后仍能找到已识别过的版本
+"""
+
+import math
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from utils import get_project_path, ensure_dir
+
+HASH_BITS = 64            # 哈希位数（8x8）
+PHASH_MAX_DISTANCE = 4    # 视为同一张图的最大汉明距离
+
+# NumPy/Pillow为可选依赖，未安装时禁用近似图片检测
+_deps_checked = False
+_deps_available = False
+_dct_cache = {}
+
+
+def phash_available():
+    """检查NumPy和Pillow是否可用"""
+    global _deps_checked, _deps_available
+    if not _deps_checked:
+        try:
+            import numpy  # noqa: F401
+            from PIL import Image  # noqa: F401
+            _deps_available = True
+        except ImportError:
+            print("警告：NumPy或Pillow未安装，近似图片检测将不可用")
+            print("请运行: pip install numpy pillow")
+            _deps_available = False
+        _deps_checked = True
+    return _deps_available
+
+
+def _load_gray(img_path, size):
+    """以灰度读取图片并缩放到指定尺寸（JPEG使用draft模式快速解码）"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(img_path) as img:
+        img.draft('L', (size[0] * 2, size[1] * 2))
+        img = img.convert('L').resize(size, Image.BILINEAR)
+        return np.asarray(img, dtype=np.float32)
+
+
+def _dct_matrix(n):
+    """n阶DCT-II正交变换矩阵"""
+    if n not in _dct_cache:
+        import numpy as np
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * math.sqrt(2.0 / n)
+        matrix[0, :] /= math.sqrt(2.0)
+        _dct_cache[n] = matrix.astype(np.float32)
+    return _dct_cache[n]
+
+
+def _bits_to_int(bits):
+    """布尔数组转换为整数哈希"""
+    import numpy as np
+    return int.from_bytes(np.packbits(bits.astype(np.uint8)).tobytes(), 'big')
+
+
+def phash_pixels(pixels, hash_size=8):
+    """
+    对一批灰度图计算pHash（向量化）
+
+    Args:
+        pixels: 形状为 (N, S, S) 的灰度数组，S = hash_size * 4
+        hash_size: 哈希边长
+
+    Returns:
+        list: N个整数哈希
+    """
+    import numpy as np
+
+    pixels = np.asarray(pixels, dtype=np.float32)
+    dct = _dct_matrix(pixels.shape[-1])
+    # 对每张图做二维DCT：D @ X @ D^T
+    coeffs = np.einsum('ij,njk,lk->nil', dct, pixels, dct)
+    low = coeffs[:, :hash_size, :hash_size].reshape(len(pixels), -1)
+    medians = np.median(low, axis=1, keepdims=True)
+    bits = low > medians
+    return [_bits_to_int(row) for row in bits]
+
+
+def phash(img_path, hash_size=8):
+    """
+    计算图片的pHash（对JPEG重新压缩、缩放较稳定）
+
+    Args:
+        img_path: 图片路径
+        hash_size: 哈希边长，哈希位数为 hash_size^2
+
+    Returns:
+        int: 哈希值
+    """
+    size = hash_size * 4
+    return phash_pixels(_load_gray(img_path, (size, size))[None], hash_size)[0]
+
+
+def dhash(img_path, hash_size=8):
+    """
+    计算图片的dHash（相邻像素梯度）
+
+    Args:
+        img_path: 图片路径
+        hash_size: 哈希边长
+
+    Returns:
+        int: 哈希值
+    """
+    pixels = _load_gray(img_path, (hash_size + 1, hash_size))
+    return _bits_to_int((pixels[:, 1:] > pixels[:, :-1]).ravel())
+
+
+def hamming(a, b):
+    """两个哈希之间的汉明距离"""
+    return bin(a ^ b).count('1')
+
+
+class PhashIndex:
+    """
+    感知哈希近邻索引（多索引哈希）
+
+    把64位哈希切成 max_distance + 1 段，由抽屉原理，汉明距离不超过max_distance的
+    两个哈希至少有一段完全相同。查询时只需比较各段桶内的候选，
+    索引增长到几十万张图片时查询仍然只涉及少量候选。
+
+    索引持久化为追加写入的文本文件，每行: pHash<TAB>内容哈希<TAB>图片路径
+    """
+
+    def __init__(self, path=None, max_distance=PHASH_MAX_DISTANCE, bits=HASH_BITS):
+        """
+        Args:
+            path: 索引文件路径，默认 cache/phash/index.tsv；传入False表示只在内存中索引
+            max_distance: 支持查询的最大汉明距离
+            bits: 哈希位数
+        """
+        self.path = Path(path) if path else Path(get_project_path("cache", "phash", "index.tsv"))
+        self.persist = path is not False
+        self.max_distance = max(0, max_distance)
+        self.bits = bits
+
+        # 把哈希切成 max_distance + 1 段
+        chunks = min(self.max_distance + 1, bits)
+        bounds = [round(i * bits / chunks) for i in range(chunks + 1)]
+        self._segments = [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(chunks)]
+        self._tables = [defaultdict(list) for _ in self._segments]
+        self._by_content = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def __len__(self):
+        self.load()
+        return len(self._by_content)
+
+    def _keys(self, value):
+        return [(value >> shift) & ((1 << width) - 1) for shift, width in self._segments]
+
+    def _insert(self, value, content_hash):
+        if content_hash in self._by_content:
+            return False
+        self._by_content[content_hash] = value
+        for table, key in zip(self._tables, self._keys(value)):
+            table[key].append(content_hash)
+        return True
+
+    def load(self):
+        """从索引文件加载（只加载一次）"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.persist or not self.path.exists():
+                return
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) >= 2:
+                        try:
+                            self._insert(int(parts[0], 16), parts[1])
+                        except ValueError:
+                            continue
+
+    def add(self, value, content_hash, image=None):
+        """
+        加入一张图片
+
+        Args:
+            value: 感知哈希
+            content_hash: 图片内容哈希
+            image: 图片路径（仅用于排查）
+        """
+        self.load()
+        with self._lock:
+            if not self._insert(value, content_hash) or not self.persist:
+                return
+            ensure_dir(self.path.parent)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"{value:016x}\t{content_hash}\t{image or ''}\n")
+
+    def get(self, content_hash):
+        """查询已索引图片的感知哈希，不存在返回None"""
+        self.load()
+        with self._lock:
+            return self._by_content.get(content_hash)
+
+    def query(self, value, max_distance=None):
+        """
+        查询汉明距离不超过max_distance的图片
+
+        Args:
+            value: 感知哈希
+            max_distance: 最大距离，不能超过索引的max_distance
+
+        Returns:
+            list: (距离, 内容哈希) 列表，按距离升序
+        """
+        self.load()
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        with self._lock:
+            candidates = set()
+            for table, key in zip(self._tables, self._keys(value)):
+                candidates.update(table.get(key, ()))
+            matches = []
+            for content_hash in candidates:
+                distance = hamming(value, self._by_content[content_hash])
+                if distance <= max_distance:
+                    matches.append((distance, content_hash))
+        return sorted(matches)
+
+
+# 进程内共享的索引
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_phash_index(max_distance=PHASH_MAX_DISTANCE):
+    """
+    获取进程内共享的感知哈希索引
+
+    Args:
+        max_distance: 最大汉明距离（变化时重新创建索引）
+
+    Returns:
+        PhashIndex: 索引对象，NumPy/Pillow不可用时返回None
+    """
+    global _index
+    if not phash_available():
+        return None
+    with _index_lock:
+        expected = Path(get_project_path("cache", "phash", "index.tsv"))
+        if _index is None or _index.max_distance != max_distance or _index.path != expected:
+            _index = PhashIndex(max_distance=max_distance)
+        return _index
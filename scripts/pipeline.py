@@ -0,0 +1,347 @@
+"""
+分阶段并发处理流水线
+API获取 → 图片下载 → OCR识别 → 内容生成，每个阶段使用独立的线程池和有界队列
+"""
+
+import queue
+import threading
+import time
+import weakref
+
+# 各阶段默认并发数（OCR引擎不是线程安全的，默认单线程）
+DEFAULT_WORKERS = {
+    "fetch": 4,
+    "download": 4,
+    "ocr": 1,
+    "build": 2,
+}
+
+# 阶段之间队列的默认容量
+DEFAULT_QUEUE_SIZE = 32
+
+# OCR阶段凑批：每批最多图片数，以及凑批时等待后续图片的最长时间（秒）
+DEFAULT_OCR_BATCH_SIZE = 4
+DEFAULT_OCR_LINGER = 0.05
+
+# 主线程等待时处理信号（如Ctrl+C）的间隔（秒）
+SIGNAL_POLL = 0.1
+
+# 通知工作线程退出的哨兵
+_STOP = object()
+
+# 正在运行的流水线（供指标导出读取队列深度和进行中的笔记数）
+_running = weakref.WeakSet()
+_running_lock = threading.Lock()
+
+
+def running_snapshot():
+    """
+    汇总所有正在运行的流水线的状态
+
+    Returns:
+        dict: {"pipelines": 数量, "in_flight": 进行中的笔记数, "pending": 未开始的笔记数,
+               "queues": {阶段: 队列中的任务数}}
+    """
+    with _running_lock:
+        pipelines = list(_running)
+    snapshot = {"pipelines": len(pipelines), "in_flight": 0, "pending": 0,
+                "queues": {name: 0 for name in DEFAULT_WORKERS}}
+    for pipeline in pipelines:
+        stats = pipeline.snapshot()
+        snapshot["in_flight"] += stats["in_flight"]
+        snapshot["pending"] += stats["pending"]
+        for name, depth in stats["queues"].items():
+            snapshot["queues"][name] = snapshot["queues"].get(name, 0) + depth
+    return snapshot
+
+
+class NoteJob:
+    """流水线中单个笔记的处理状态"""
+
+    def __init__(self, index, item):
+        self.index = index
+        self.item = item
+        self.note_id = None
+        self.api_data = None
+        self.content = None
+        self.failed = False
+        self.finished = False
+        # 收到停止信号时尚未开始处理的笔记
+        self.cancelled = False
+        # 已提交但尚未完成OCR的图片数
+        self.pending_images = 0
+        # 下载阶段是否仍在产出图片
+        self.emitting = True
+        self.lock = threading.Lock()
+
+
+class NotePipeline:
+    """
+    分阶段笔记处理流水线
+
+    各阶段通过回调函数注入：
+        fetch(job): 获取笔记数据，设置job.note_id / job.api_data，
+                    若笔记已完成可直接设置job.content；返回False表示失败
+        download(job, emit): 下载图片，每张图片就绪后立即调用emit(img_path)
+        ocr(items): 批量识别图片，items为 (job, img_path) 列表，可能来自多个笔记
+        build(job): 生成并返回笔记内容，失败返回None
+    """
+
+    def __init__(self, fetch, download, ocr, build, workers=None,
+                 queue_size=DEFAULT_QUEUE_SIZE, ocr_batch_size=DEFAULT_OCR_BATCH_SIZE,
+                 ocr_linger=DEFAULT_OCR_LINGER, on_error=None, on_result=None,
+                 keep_results=True, stop=None):
+        """
+        Args:
+            fetch/download/ocr/build: 各阶段回调
+            workers: 各阶段并发数，如 {"fetch": 4, "ocr": 1}，未指定的使用默认值
+            queue_size: 阶段之间队列的容量
+            ocr_batch_size: OCR阶段每批最多图片数
+            ocr_linger: OCR阶段凑批时等待后续图片的最长时间（秒）
+            on_error: 阶段异常回调 on_error(job, stage, exc)
+            on_result: 笔记完成回调 on_result(job)
+            keep_results: 为False时在完成回调后释放笔记内容（内容已由回调写出），
+                          run返回的列表中成功的笔记为True
+            stop: 可选的threading.Event，设置后不再开始新的笔记，已开始的笔记处理完后run返回
+        """
+        self.stages = {
+            "fetch": fetch,
+            "download": download,
+            "ocr": ocr,
+            "build": build,
+        }
+        self.workers = dict(DEFAULT_WORKERS)
+        if workers:
+            self.workers.update({k: v for k, v in workers.items() if v})
+        self.queues = {name: queue.Queue(maxsize=queue_size) for name in self.stages}
+        self.ocr_batch_size = max(1, ocr_batch_size)
+        self.ocr_linger = ocr_linger
+        self.on_error = on_error
+        self.on_result = on_result
+        self.keep_results = keep_results
+        self.stop = stop
+
+        self._threads = []
+        self._done_count = 0
+        self._started_count = 0
+        self._total = 0
+        self._done_cond = threading.Condition()
+
+    def run(self, items):
+        """
+        运行流水线处理所有笔记
+
+        Args:
+            items: 笔记ID或URL列表
+
+        Returns:
+            list: 与输入顺序一致的内容列表，失败或被停止的笔记为None（keep_results为False时成功的笔记为True）
+        """
+        jobs = [NoteJob(i, item) for i, item in enumerate(items)]
+        self._total = len(jobs)
+        self._done_count = 0
+        self._started_count = 0
+        if not jobs:
+            return []
+
+        self._start_workers()
+        with _running_lock:
+            _running.add(self)
+        aborted = False
+        try:
+            for job in jobs:
+                self.queues["fetch"].put(job)
+
+            with self._done_cond:
+                while self._done_count < self._total:
+                    # 带超时等待：信号可能被工作线程接收，主线程需要定期醒来执行信号处理函数
+                    self._done_cond.wait(SIGNAL_POLL)
+        except KeyboardInterrupt:
+            aborted = True
+            raise
+        finally:
+            with _running_lock:
+                _running.discard(self)
+            # 强制退出时工作线程可能阻塞在网络或OCR调用中，不再等待（均为守护线程）
+            self._stop_workers(wait=not aborted)
+
+        if not self.keep_results:
+            return [None if job.failed or job.cancelled else True for job in jobs]
+        return [None if job.failed or job.cancelled else job.content for job in jobs]
+
+    def snapshot(self):
+        """
+        当前状态
+
+        Returns:
+            dict: {"in_flight": 已开始未完成的笔记数, "pending": 未开始的笔记数,
+                   "queues": {阶段: 队列中的任务数}}
+        """
+        with self._done_cond:
+            started, done = self._started_count, self._done_count
+        return {
+            "in_flight": max(0, started - done),
+            "pending": self._total - started,
+            "queues": {name: q.qsize() for name, q in self.queues.items()},
+        }
+
+    def _start_workers(self):
+        """启动各阶段的工作线程"""
+        loops = {
+            "fetch": (self._worker_loop, (self.queues["fetch"], self._handle_fetch, "fetch")),
+            "download": (self._worker_loop, (self.queues["download"], self._handle_download, "download")),
+            "ocr": (self._ocr_worker_loop, ()),
+            "build": (self._worker_loop, (self.queues["build"], self._handle_build, "build")),
+        }
+        self._threads = []
+        for name, (target, args) in loops.items():
+            for i in range(self.workers[name]):
+                thread = threading.Thread(
+                    target=target,
+                    args=args,
+                    name=f"pipeline-{name}-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append((name, thread))
+
+    def _stop_workers(self, wait=True):
+        """
+        向每个工作线程发送退出信号并等待结束
+
+        Args:
+            wait: 为False时直接放弃工作线程（队列可能已满，也不发送退出信号）
+        """
+        if wait:
+            for name, _ in self._threads:
+                self.queues[name].put(_STOP)
+            for _, thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def _worker_loop(self, in_queue, handler, stage):
+        """工作线程主循环"""
+        while True:
+            task = in_queue.get()
+            if task is _STOP:
+                break
+            try:
+                handler(task)
+            except Exception as e:
+                self._fail(task, stage, e)
+
+    def _handle_fetch(self, job):
+        with self._done_cond:
+            self._started_count += 1
+        if self.stop is not None and self.stop.is_set():
+            job.cancelled = True
+            self._finish(job)
+            return
+        if self.stages["fetch"](job) is False:
+            job.failed = True
+            self._finish(job)
+        elif job.content is not None:
+            self._finish(job)
+        else:
+            self.queues["download"].put(job)
+
+    def _handle_download(self, job):
+        def emit(img_path):
+            with job.lock:
+                job.pending_images += 1
+            self.queues["ocr"].put((job, img_path))
+
+        try:
+            self.stages["download"](job, emit)
+        except Exception as e:
+            if self.on_error:
+                self.on_error(job, "download", e)
+            job.failed = True
+
+        with job.lock:
+            job.emitting = False
+            ready = job.pending_images == 0
+        if ready:
+            self._images_done(job)
+
+    def _ocr_worker_loop(self):
+        """OCR工作线程主循环：从队列中凑批后批量识别"""
+        in_queue = self.queues["ocr"]
+        stopping = False
+        while not stopping:
+            task = in_queue.get()
+            if task is _STOP:
+                break
+
+            batch = [task]
+            deadline = time.monotonic() + self.ocr_linger
+            while len(batch) < self.ocr_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        task = in_queue.get(timeout=remaining)
+                    else:
+                        task = in_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if task is _STOP:
+                    stopping = True
+                    break
+                batch.append(task)
+
+            self._handle_ocr(batch)
+
+    def _handle_ocr(self, batch):
+        try:
+            self.stages["ocr"](batch)
+        except Exception as e:
+            # 识别失败不影响笔记生成，只报告一次每个笔记
+            if self.on_error:
+                for job in {id(job): job for job, _ in batch}.values():
+                    self.on_error(job, "ocr", e)
+        finally:
+            for job, _ in batch:
+                with job.lock:
+                    job.pending_images -= 1
+                    ready = job.pending_images == 0 and not job.emitting
+                if ready:
+                    self._images_done(job)
+
+    def _images_done(self, job):
+        """笔记的全部图片已识别完成，进入内容生成阶段"""
+        if job.failed:
+            self._finish(job)
+        else:
+            self.queues["build"].put(job)
+
+    def _handle_build(self, job):
+        job.content = self.stages["build"](job)
+        if job.content is None:
+            job.failed = True
+        self._finish(job)
+
+    def _fail(self, job, stage, exc):
+        """记录阶段异常并结束该笔记"""
+        if self.on_error:
+            self.on_error(job, stage, exc)
+        job.failed = True
+        self._finish(job)
+
+    def _finish(self, job):
+        """标记笔记处理结束（每个笔记只生效一次）"""
+        with job.lock:
+            if job.finished:
+                return
+            job.finished = True
+
+        if self.on_result and not job.cancelled:
+            try:
+                self.on_result(job)
+            except Exception as e:
+                print(f"  ✗ 结果回调失败: {e}")
+        if not self.keep_results:
+            job.content = None
+
+        with self._done_cond:
+            self._done_count += 1
+            self._done_cond.notify_all()
@@ -0,0 +1,113 @@
+"""
+按输入指纹增量重建content.md
+content.md的输入（笔记字段、每个OCR结果文件、模板版本）的指纹记录在manifest.json中，
+只有输入变化过的笔记才重新生成；手动修正过的OCR结果文件会先同步回note.json
+
+用法：
+    python rebuild.py --workers 8            # 并行重建xhs_notes/下所有过期的笔记
+    python rebuild.py 笔记ID1 笔记ID2         # 只检查指定笔记
+    python rebuild.py --force                 # 忽略指纹全部重新生成
+"""
+
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import get_project_path
+from manifest import content_inputs, content_stale
+from note_record import note_dir_for
+import xhs_processor
+
+REBUILD_WORKERS = 8  # 并行重建的线程数
+
+
+def list_notes(notes_root=None):
+    """
+    列出有元数据的笔记
+
+    Args:
+        notes_root: 笔记根目录，默认 xhs_notes/
+
+    Returns:
+        list: 笔记ID（按名称排序）
+    """
+    notes_root = notes_root or get_project_path("xhs_notes")
+    try:
+        with os.scandir(notes_root) as it:
+            return sorted(
+                e.name for e in it
+                if e.is_dir() and (os.path.exists(os.path.join(e.path, "note.json"))
+                                   or os.path.exists(os.path.join(e.path, "metadata.md")))
+            )
+    except OSError:
+        return []
+
+
+def rebuild_note(note_id, force=False):
+    """
+    输入变化时重新生成单个笔记的content.md
+
+    Args:
+        note_id: 笔记ID
+        force: 是否忽略指纹强制重新生成
+
+    Returns:
+        str: "rebuilt"、"skipped" 或 "failed"
+    """
+    note_dir = note_dir_for(note_id)
+    inputs = content_inputs(note_dir)
+    if inputs["metadata"] is None:
+        return "failed"
+    if not force and not content_stale(note_dir, inputs):
+        return "skipped"
+    xhs_processor.generate_content_md(note_id)
+    return "rebuilt" if not content_stale(note_dir) else "failed"
+
+
+def rebuild_notes(note_ids=None, workers=REBUILD_WORKERS, force=False):
+    """
+    并行重建过期的content.md
+
+    Args:
+        note_ids: 笔记ID列表，默认为xhs_notes/下所有笔记
+        workers: 并行线程数
+        force: 是否忽略指纹强制重新生成
+
+    Returns:
+        dict: {"rebuilt": 数量, "skipped": 数量, "failed": [笔记ID]}
+    """
+    note_ids = list_notes() if note_ids is None else list(note_ids)
+
+    def run(note_id):
+        try:
+            return rebuild_note(note_id, force=force)
+        except Exception as e:
+            print(f"  ✗ 笔记 {note_id} 重建失败: {e}")
+            return "failed"
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(run, note_ids))
+
+    return {
+        "rebuilt": results.count("rebuilt"),
+        "skipped": results.count("skipped"),
+        "failed": [n for n, r in zip(note_ids, results) if r == "failed"],
+    }
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='按输入指纹增量重建content.md')
+    parser.add_argument('notes', nargs='*', help='笔记ID（默认为xhs_notes/下所有笔记）')
+    parser.add_argument('--workers', type=int, default=REBUILD_WORKERS, help='并行重建的线程数')
+    parser.add_argument('--force', action='store_true', help='忽略指纹全部重新生成')
+    args = parser.parse_args()
+
+    result = rebuild_notes(args.notes or None, workers=args.workers, force=args.force)
+    print(f"\n✓ 重新生成 {result['rebuilt']} 个笔记，跳过 {result['skipped']} 个（输入未变化）")
+    if result["failed"]:
+        print(f"✗ 失败 {len(result['failed'])} 个: {', '.join(result['failed'])}")
+
+
+if __name__ == "__main__":
+    main()
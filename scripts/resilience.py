@@ -0,0 +1,202 @@
+"""
+重试与熔断
+可重试的失败（超时、连接错误、5xx）按带随机抖动的指数退避重试；
+连续失败达到阈值后熔断器打开，暂停调用，冷却后放行单个探测请求，成功即恢复
+"""
+
+import random
+import threading
+import time
+
+# 重试默认配置
+RETRY_ATTEMPTS = 3        # 最多尝试次数（含首次）
+RETRY_BASE_DELAY = 1.0    # 首次重试前的退避上限（秒），之后每次翻倍
+RETRY_MAX_DELAY = 30.0    # 单次退避上限（秒）
+
+# 熔断默认配置
+BREAKER_THRESHOLD = 5     # 连续失败多少次后熔断
+BREAKER_COOLDOWN = 30.0   # 熔断后多久放行探测请求（秒）
+BREAKER_MAX_WAIT = 300.0  # 熔断期间单个调用最多等待多久（秒），超过后放弃
+PROBE_POLL = 0.5          # 探测请求进行中时其它调用的轮询间隔（秒）
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RetryableError(Exception):
+    """可重试的失败（超时、连接错误、5xx）"""
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开期间等待超时，调用被拒绝"""
+
+
+class RetryPolicy:
+    """
+    指数退避重试策略（full jitter：每次在 [0, 上限] 内随机等待，避免大量调用同时重试）
+    """
+
+    def __init__(self, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, rng=None):
+        """
+        Args:
+            attempts: 最多尝试次数（含首次），1表示不重试
+            base_delay: 首次重试前的退避上限（秒）
+            max_delay: 单次退避上限（秒）
+            rng: 随机数生成器（测试时可注入）
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+
+    def delay(self, retry):
+        """
+        第retry次重试前的等待时间
+
+        Args:
+            retry: 重试序号，从0开始
+
+        Returns:
+            float: 等待秒数
+        """
+        cap = min(self.max_delay, self.base_delay * (2 ** retry))
+        return self.rng.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    熔断器（线程安全）
+
+    closed: 正常放行；连续失败达到阈值后进入open
+    open: 拒绝调用，冷却时间过后进入half_open
+    half_open: 只放行一个探测请求，成功恢复closed，失败重新open
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN,
+                 clock=time.monotonic):
+        """
+        Args:
+            threshold: 连续失败多少次后熔断
+            cooldown: 熔断后多久放行探测请求（秒）
+            clock: 时钟函数（测试时可注入）
+        """
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+        self.rejections = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        申请发起一次调用
+
+        Returns:
+            float: 0表示可以调用，否则为建议等待的秒数
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return 0
+            if self.state == OPEN:
+                remaining = self.opened_at + self.cooldown - self.clock()
+                if remaining > 0:
+                    self.rejections += 1
+                    return remaining
+                self.state = HALF_OPEN
+            if self._probing:
+                self.rejections += 1
+                return PROBE_POLL
+            self._probing = True
+            return 0
+
+    def record_success(self):
+        """调用成功（服务有正常响应）"""
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """调用失败（可重试的失败）"""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self.opens += 1
+            self._probing = False
+
+    def stats(self):
+        """
+        熔断器统计
+
+        Returns:
+            dict: 当前状态、连续失败数、熔断次数、被拒绝的调用申请数
+        """
+        with self._lock:
+            return {"state": self.state, "failures": self.failures,
+                    "opens": self.opens, "rejections": self.rejections}
+
+
+def call_with_retry(func, policy=None, breaker=None, max_wait=BREAKER_MAX_WAIT,
+                    on_retry=None, sleep=time.sleep):
+    """
+    调用func，遇到RetryableError时按退避策略重试，并经过熔断器
+
+    func抛出的其它异常视为服务已正常响应（如4xx），直接向上抛出且不重试
+
+    Args:
+        func: 无参调用，成功时返回结果
+        policy: 重试策略，默认RetryPolicy()
+        breaker: 熔断器，None表示不熔断
+        max_wait: 熔断期间最多等待的总秒数
+        on_retry: 重试回调 on_retry(重试序号, 异常, 等待秒数)
+        sleep: 等待函数（测试时可注入）
+
+    Returns:
+        func的返回值
+
+    Raises:
+        RetryableError: 重试次数用尽
+        CircuitOpenError: 熔断期间等待超时
+    """
+    policy = policy or RetryPolicy()
+    waited = 0.0
+    retry = 0
+    while True:
+        if breaker is not None:
+            wait = breaker.acquire()
+            while wait > 0:
+                if waited + wait > max_wait:
+                    raise CircuitOpenError(f"熔断中，已等待 {waited:.0f} 秒")
+                sleep(wait)
+                waited += wait
+                wait = breaker.acquire()
+
+        try:
+            result = func()
+        except RetryableError as e:
+            if breaker is not None:
+                breaker.record_failure()
+            if retry + 1 >= policy.attempts:
+                raise
+            delay = policy.delay(retry)
+            if on_retry:
+                on_retry(retry + 1, e, delay)
+            sleep(delay)
+            retry += 1
+            continue
+        except Exception:
+            if breaker is not None:
+                breaker.record_success()
+            raise
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,192 @@
+"""
+识别前的文字存在性判断
+笔记中很多图片是商品图、风景照，没有任何文字，却要付出完整的检测+识别开销。
+识别前先用NumPy向量化统计高对比度边缘的密度，明显没有文字的图片直接跳过；
+可选再用轻量的检测模型（PP-OCRv5_mobile_det）只做检测，检测不到文本框时跳过识别。
+检测结果不会交给后续识别复用，有文字的图片会被检测两次，所以默认只用边缘密度判断，
+只有大部分图片都没有文字时才值得启用detect
+"""
+
+GATE_MODES = ("off", "heuristic", "detect")
+DEFAULT_GATE_MODE = "heuristic"
+
+GATE_SAMPLE_SIDE = 256        # 启发式判断时把图片缩小到的最长边（像素）
+# 文字笔画与背景之间是高对比度的突变；只按局部对比度判断，
+# 纯色背景上的文字只占很少像素，全图的灰度分布看不出来
+EDGE_STRENGTH = 48            # 视为强边缘的相邻像素灰度差（0~255）
+MIN_EDGE_DENSITY = 0.004      # 强边缘像素占比低于该值视为没有文字
+
+GATE_DET_MODEL = "PP-OCRv5_mobile_det"
+GATE_DET_MAX_SIDE = 960       # 检测模型输入的最长边上限
+
+# 跳过识别的原因
+REASON_HEURISTIC = "高对比度边缘过少"
+REASON_DETECTION = "未检测到文本框"
+
+
+class NoText(list):
+    """跳过识别的图片的结果：空的文本行列表，附带跳过原因"""
+
+    def __init__(self, reason):
+        super().__init__()
+        self.reason = reason
+
+
+def _gray_sample(item):
+    """把图片路径或BGR数组转换为缩小后的灰度数组"""
+    import numpy as np
+
+    if isinstance(item, np.ndarray):
+        pixels = item
+        step = max(1, max(pixels.shape[:2]) // GATE_SAMPLE_SIDE)
+        pixels = pixels[::step, ::step].astype(np.float32)
+        if pixels.ndim == 3:
+            # BGR转灰度
+            pixels = pixels[..., 0] * 0.114 + pixels[..., 1] * 0.587 + pixels[..., 2] * 0.299
+        return pixels
+
+    from PIL import Image
+    with Image.open(item) as img:
+        img.draft('L', (GATE_SAMPLE_SIDE, GATE_SAMPLE_SIDE))
+        img = img.convert('L')
+        img.thumbnail((GATE_SAMPLE_SIDE, GATE_SAMPLE_SIDE), Image.BILINEAR)
+        return np.asarray(img, dtype=np.float32)
+
+
+def text_features(item):
+    """
+    计算判断文字存在性的特征
+
+    Args:
+        item: 图片路径或BGR数组
+
+    Returns:
+        dict: {"edge_density": 强边缘像素占比, "max_gradient": 最大相邻像素灰度差}
+    """
+    import numpy as np
+
+    gray = _gray_sample(item)
+    if gray.shape[0] < 2 or gray.shape[1] < 2:
+        return {"edge_density": 0.0, "max_gradient": 0.0}
+    gx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    gy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    gradient = np.maximum(gx, gy)
+    return {"edge_density": float((gradient >= EDGE_STRENGTH).mean()),
+            "max_gradient": float(gradient.max())}
+
+
+def heuristic_no_text(item):
+    """
+    启发式判断图片是否明显没有文字（宁可放过，不可错杀）
+
+    Args:
+        item: 图片路径或BGR数组
+
+    Returns:
+        bool: True表示没有文字；无法读取的图片返回False，交给OCR引擎处理
+    """
+    try:
+        features = text_features(item)
+    except Exception:
+        return False
+    return features["edge_density"] < MIN_EDGE_DENSITY
+
+
+def create_detector(device="cpu"):
+    """
+    加载只做检测的模型
+
+    Args:
+        device: 推理设备
+
+    Returns:
+        TextDetection对象，PaddleOCR不可用或加载失败时返回None
+    """
+    try:
+        from paddleocr import TextDetection
+        return TextDetection(model_name=GATE_DET_MODEL, device=device,
+                             limit_side_len=GATE_DET_MAX_SIDE, limit_type="max")
+    except Exception as e:
+        print(f"    ⚠ 文本检测模型加载失败，只使用边缘密度判断: {e}")
+        return None
+
+
+def count_boxes(det_result):
+    """从TextDetection单张结果中读取文本框数量，格式不支持时返回None"""
+    json_data = getattr(det_result, 'json', None)
+    if isinstance(json_data, dict) and 'dt_polys' in json_data.get('res', {}):
+        return len(json_data['res']['dt_polys'])
+    return None
+
+
+class TextGate:
+    """
+    识别前的文字存在性判断
+
+    mode:
+        off        不判断，所有图片都识别
+        heuristic  只用边缘密度判断（默认，不增加检测开销）
+        detect     边缘密度判断后，再用检测模型确认（有文字的图片会多一次检测）
+    """
+
+    def __init__(self, mode=DEFAULT_GATE_MODE, detector_factory=create_detector, device="cpu"):
+        """
+        Args:
+            mode: 判断方式（GATE_MODES之一）
+            detector_factory: factory(device) -> 检测模型（需要时才加载）
+            device: 检测模型的推理设备
+        """
+        if mode not in GATE_MODES:
+            raise ValueError(f"未知的文字判断方式: {mode}")
+        self.mode = mode
+        self.detector_factory = detector_factory
+        self.device = device
+        self._detector = None
+        self._detector_loaded = False
+
+    def detector(self):
+        """检测模型（首次调用时加载），不可用时返回None"""
+        if not self._detector_loaded:
+            self._detector = self.detector_factory(self.device)
+            self._detector_loaded = True
+        return self._detector
+
+    def check(self, items):
+        """
+        判断一批图片是否需要识别
+
+        Args:
+            items: predict的输入列表（图片路径或BGR数组）
+
+        Returns:
+            list: 与输入顺序一致，需要识别的为None，跳过的为原因
+        """
+        reasons = [None] * len(items)
+        if self.mode == "off":
+            return reasons
+
+        candidates = []
+        for i, item in enumerate(items):
+            if heuristic_no_text(item):
+                reasons[i] = REASON_HEURISTIC
+            else:
+                candidates.append(i)
+
+        if self.mode != "detect" or not candidates:
+            return reasons
+        detector = self.detector()
+        if detector is None:
+            return reasons
+
+        try:
+            results = list(detector.predict(input=[items[i] for i in candidates],
+                                            batch_size=len(candidates)))
+        except Exception as e:
+            print(f"    ⚠ 文本检测失败，全部识别: {e}")
+            return reasons
+        if len(results) != len(candidates):
+            return reasons
+        for i, result in zip(candidates, results):
+            if count_boxes(result) == 0:
+                reasons[i] = REASON_DETECTION
+        return reasons
@@ -75,6 +75,23 @@ def parse_note_ids(input_str):
     return list(set(results))
 
 
+def extract_note_id(note_id_or_url):
+    """
+    从笔记ID或URL中提取24位笔记ID
+
+    Args:
+        note_id_or_url: 笔记ID或完整URL
+
+    Returns:
+        str: 笔记ID，URL中找不到ID时返回None
+    """
+    if not note_id_or_url.startswith('http'):
+        return note_id_or_url
+
+    match = re.search(r'[0-9a-f]{24}', note_id_or_url.lower())
+    return match.group() if match else None
+
+
 def ensure_dir(path):
     """
     确保目录存在，如果不存在则创建
@@ -85,10 +102,65 @@ def ensure_dir(path):
     Path(path).mkdir(parents=True, exist_ok=True)
 
 
+def write_text_atomic(path, text):
+    """
+    原子写入文本文件：先写临时文件再替换，中断时不会留下写了一半的文件
+    
+    Args:
+        path: 目标路径
+        text: 文本内容
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _manifest(note_id):
+    """
+    读取笔记的阶段清单（xhs_notes/{note_id}/manifest.json）
+    
+    Args:
+        note_id: 笔记ID
+    
+    Returns:
+        dict: 清单内容，不存在时返回None
+    """
+    # 延迟导入，避免与manifest模块循环导入
+    from manifest import load_manifest
+    return load_manifest(get_project_path("xhs_notes", note_id))
+
+
+def _catalog_state(note_id):
+    """
+    从笔记状态目录（cache/catalog.db）查询笔记状态
+    
+    Args:
+        note_id: 笔记ID
+    
+    Returns:
+        dict: 状态字典，目录不存在或没有该笔记时返回None
+    """
+    # 没有目录数据库时不导入sqlite3（全部笔记已处理的任务启动时逐个检查笔记状态）
+    if not os.path.exists(get_project_path("cache", "catalog.db")):
+        return None
+    
+    # 延迟导入，避免与catalog模块循环导入
+    import sqlite3
+    from catalog import get_catalog
+    
+    try:
+        catalog = get_catalog()
+        return catalog.get(note_id) if catalog is not None else None
+    except sqlite3.Error:
+        return None
+
+
 def is_note_complete(note_id):
     """
     检查笔记是否已完整处理
-    通过检查content.md文件是否存在来判断
+    优先按阶段清单判断（输入变化后清单中的生成内容阶段会失效），
+    没有清单时查询状态目录，都没有时检查content.md文件是否存在
     
     Args:
         note_id: 笔记ID
@@ -96,6 +168,13 @@ def is_note_complete(note_id):
     Returns:
         bool: True表示已处理，False表示未处理
     """
+    manifest = _manifest(note_id)
+    if manifest is not None:
+        from manifest import stage_done
+        return stage_done(manifest, "content")
+    state = _catalog_state(note_id)
+    if state and state["content_done"]:
+        return True
     content_path = Path(get_project_path("xhs_notes", note_id, "content.md"))
     return content_path.exists()
 
@@ -110,27 +189,40 @@ def has_metadata(note_id):
     Returns:
         bool: True表示存在元数据
     """
+    state = _catalog_state(note_id)
+    if state and state["has_metadata"]:
+        return True
     metadata_path = Path(get_project_path("xhs_notes", note_id, "metadata.md"))
     return metadata_path.exists()
 
 
 def has_ocr_results(note_id):
     """
-    检查是否已有OCR识别结果
+    检查OCR识别是否已完成
+    有阶段清单时要求所有图片都已识别，否则只要存在OCR结果文件即可
     
     Args:
         note_id: 笔记ID
     
     Returns:
-        bool: True表示存在OCR结果
+        bool: True表示OCR已完成
     """
+    state = _catalog_state(note_id)
+    manifest = _manifest(note_id)
+    expected = manifest["images"]["expected"] if manifest is not None else None
+    # 状态目录中的图片数必须等于应有的图片数（只下载了一部分时磁盘上的图片数偏少）
+    if (state and state["ocr_results"] > 0 and state["ocr_results"] >= state["images"]
+            and (expected is None or state["images"] == len(expected))):
+        return True
+    if expected is not None:
+        from manifest import stage_done
+        return stage_done(manifest, "ocr")
     ocr_dir = Path(get_project_path("xhs_notes", note_id, "ocr_results"))
     if not ocr_dir.exists():
         return False
     
-    # 检查是否有.md文件
-    md_files = list(ocr_dir.glob("*.md"))
-    return len(md_files) > 0
+    # 检查是否有.md文件（找到第一个即返回，不列出整个目录）
+    return any(ocr_dir.glob("*.md"))
 
 
 def read_content_md(note_id):
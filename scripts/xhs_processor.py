@@ -5,9 +5,12 @@
 
 import sys
 import json
-import requests
+import argparse
+import threading
 import time
 import os
+import signal
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 
@@ -15,6 +18,7 @@ from datetime import datetime
 from utils import (
     generate_task_id,
     parse_note_ids,
+    extract_note_id,
     ensure_dir,
     is_note_complete,
     has_metadata,
@@ -22,15 +26,189 @@ from utils import (
     read_content_md,
     format_note_ids_display,
     create_error_log,
-    get_project_path
+    get_project_path,
+    write_text_atomic
 )
+from pipeline import NotePipeline, DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE, running_snapshot
+from merged_writer import MergedWriter
+from journal import TaskJournal, load_journal
+from http_client import (
+    get_client,
+    configure_client,
+    API_POOL_SIZE,
+    CDN_POOL_SIZE
+)
+from ocr_client import OcrServerClient, OCR_SERVER_URL
+from ocr_cache import OcrCache, image_hash, engine_fingerprint
+from api_cache import ApiCache, API_CACHE_TTL, API_CACHE_MAX_BYTES
+from resilience import (
+    RetryPolicy,
+    CircuitBreaker,
+    RetryableError,
+    CircuitOpenError,
+    call_with_retry,
+    RETRY_ATTEMPTS,
+    BREAKER_THRESHOLD,
+    BREAKER_COOLDOWN,
+    BREAKER_MAX_WAIT
+)
+from metrics import TaskMetrics, timed, set_metrics, METRICS_FILENAME, SUMMARY_FILENAME
+from manifest import (
+    load_manifest,
+    stage_done,
+    mark_fetched,
+    set_expected_images,
+    mark_downloaded,
+    mark_ocr_done,
+    mark_ocr_synced,
+    file_digest,
+    mark_content_done,
+    content_inputs,
+    content_stale,
+    changed_ocr_files
+)
+from note_record import (
+    load_record,
+    note_dir_for,
+    save_api_data,
+    update_ocr_results,
+    render_metadata_md,
+    render_content_md,
+    parse_ocr_md,
+    now_str
+)
+from phash import get_phash_index, phash, PHASH_MAX_DISTANCE
+from image_preprocess import prepare_image, original_boxes, OcrLines, DEFAULT_MAX_SIDE
+from text_gate import TextGate, NoText, GATE_MODES, DEFAULT_GATE_MODE
+from ocr_autotune import load_profile, profile_path, PROFILE_FILENAME
+# 状态目录（sqlite3）、图片下载器（asyncio）、指标导出（http.server）和多进程识别池
+# 在用到时才导入：全部笔记都已处理的任务不需要它们
 
-# 配置
-XHS_API_URL = "http://127.0.0.1:5556/xhs/detail"
+# 配置（API地址可用环境变量XHS_API_BASE或--api-base指定，如指向本地模拟服务）
+DEFAULT_XHS_API_BASE = "http://127.0.0.1:5556"
+XHS_API_BASE = os.environ.get("XHS_API_BASE", DEFAULT_XHS_API_BASE).rstrip("/")
+XHS_API_URL = f"{XHS_API_BASE}/xhs/detail"
+XHS_API_DOCS_URL = f"{XHS_API_BASE}/docs"
 XHS_API_TIMEOUT = 60  # API超时时间（秒）
 
+# API服务状态检查：只在有笔记需要调用API时检查，结果在有效期内复用
+API_STATUS_TTL = 30  # 检查结果有效期（秒）
+_api_probe = {"base": None, "ok": None, "checked_at": 0.0}
+_api_probe_lock = threading.Lock()
+
+# API原始响应缓存（cache/api）：有效期内直接复用，不再调用API
+API_CACHE_ENABLED = True
+API_CACHE_TTL_SECONDS = API_CACHE_TTL
+API_CACHE_SIZE_BYTES = API_CACHE_MAX_BYTES
+_api_cache = None
+_api_cache_lock = threading.Lock()
+
+# API重试与熔断：超时、连接错误、5xx按指数退避重试，连续失败后暂停调用并探测恢复
+API_RETRY_POLICY = RetryPolicy()
+api_breaker = CircuitBreaker()
+API_BREAKER_MAX_WAIT = BREAKER_MAX_WAIT  # 熔断期间单个笔记最多等待多久（秒）
+API_STATS = {"calls": 0, "retries": 0, "failures": 0}
+_api_stats_lock = threading.Lock()
+
 # OCR配置 - 延迟导入，避免未安装时报错
 ocr = None
+OCR_BATCH_SIZE = 4  # 每次批量识别的图片数
+
+# PaddleOCR引擎参数（修改后OCR缓存指纹随之变化，旧的缓存结果不再命中）
+OCR_CONFIG = {
+    "ocr_version": "PP-OCRv5",  # 使用v5版本
+    "use_doc_orientation_classify": False,
+    "use_doc_unwarping": False,
+    "use_textline_orientation": False,
+    "lang": "ch",
+}
+
+# 识别前把图片缩小到最长边不超过该值（像素），<=0表示不缩放；
+# 可用环境变量XHS_OCR_MAX_SIDE或--ocr-max-side指定（环境变量同时传给多进程识别池的工作进程）
+OCR_MAX_SIDE = int(os.environ.get("XHS_OCR_MAX_SIDE", DEFAULT_MAX_SIDE))
+
+# 识别前判断图片是否有文字（off / heuristic / detect），没有文字的图片跳过识别；
+# 可用环境变量XHS_OCR_TEXT_GATE或--text-gate指定
+OCR_TEXT_GATE = os.environ.get("XHS_OCR_TEXT_GATE", DEFAULT_GATE_MODE)
+text_gate = None
+
+# 是否使用ocr_autotune.py生成的调优配置（模型、线程数、批大小、最长边上限）；
+# 可用环境变量XHS_OCR_PROFILE=off或--no-ocr-profile关闭
+OCR_PROFILE_ENABLED = os.environ.get("XHS_OCR_PROFILE", "on") != "off"
+# 调优配置文件路径，None为项目根目录下的ocr_profile.json；
+# 可用环境变量XHS_OCR_PROFILE_PATH或--ocr-profile指定（环境变量同时传给多进程识别池的工作进程）
+OCR_PROFILE_PATH = os.environ.get("XHS_OCR_PROFILE_PATH") or None
+_ocr_profile = None  # 已读取的调优配置 (文件路径, 配置)
+
+# 按图片内容哈希跨笔记复用OCR结果
+OCR_CACHE_ENABLED = True
+
+# 感知哈希近似图片复用：与已识别图片的汉明距离不超过该值时直接复用识别文本
+PHASH_ENABLED = True
+PHASH_DISTANCE = PHASH_MAX_DISTANCE
+
+# 常驻OCR服务客户端，服务不可用时回退到进程内识别；None表示不使用服务
+ocr_server_client = OcrServerClient(OCR_SERVER_URL)
+
+# 多进程OCR识别池（CPU模式下并行识别）；None表示在本进程内识别
+ocr_pool = None
+OCR_CPU_THREADS = None  # CPU模式下每个引擎的推理线程数，None使用PaddleOCR默认值
+
+# OCR吞吐统计
+OCR_STATS = {"images": 0, "seconds": 0.0, "batches": 0, "cache_hits": 0, "phash_reuses": 0,
+             "downscaled": 0, "no_text": 0}
+# 进程内OCR引擎状态（uninitialized / ready / unavailable），供指标导出
+OCR_ENGINE_STATE = {"state": "uninitialized", "device": None, "init_seconds": None}
+
+# Prometheus指标导出（--metrics-port），None表示未启用
+metrics_exporter = None
+_ocr_stats_lock = threading.Lock()
+
+
+def load_ocr_profile(path=None):
+    """
+    读取调优配置文件并缓存，之后get_ocr_profile直接返回缓存的配置
+    
+    Args:
+        path: 配置文件路径，默认为OCR_PROFILE_PATH（未指定时为项目根目录下的ocr_profile.json）
+    
+    Returns:
+        dict: 调优配置，文件不存在或格式不符时返回None
+    """
+    global _ocr_profile
+    path = os.path.abspath(path or OCR_PROFILE_PATH or profile_path())
+    _ocr_profile = (path, load_profile(path))
+    return _ocr_profile[1]
+
+
+def get_ocr_profile():
+    """
+    获取调优配置（每个配置文件只读取一次，计算引擎指纹时不再重复读取）
+    
+    Returns:
+        dict: 调优配置，未生成或未启用时返回None
+    """
+    if not OCR_PROFILE_ENABLED:
+        return None
+    path = os.path.abspath(OCR_PROFILE_PATH or profile_path())
+    if _ocr_profile is None or _ocr_profile[0] != path:
+        return load_ocr_profile(path)
+    return _ocr_profile[1]
+
+
+def ocr_engine_config():
+    """
+    PaddleOCR引擎参数：OCR_CONFIG，有调优配置时指定其中的检测/识别模型
+    
+    Returns:
+        dict: 引擎参数
+    """
+    config = dict(OCR_CONFIG)
+    profile = get_ocr_profile()
+    if profile:
+        config["text_detection_model_name"] = profile["det_model"]
+        config["text_recognition_model_name"] = profile["rec_model"]
+    return config
 
 
 def init_ocr():
@@ -47,23 +225,214 @@ def init_ocr():
             
             print(f"正在初始化OCR引擎 (PP-OCRv5, 设备: {device})...")
             
-            # 使用PP-OCRv4 Mobile轻量级模型，速度更快
+            # CPU模式下限制推理线程数，多进程识别时避免线程争抢；未指定时使用调优配置中的线程数
+            profile = get_ocr_profile()
+            cpu_threads = OCR_CPU_THREADS or (profile and profile["cpu_threads"])
+            extra = {"cpu_threads": cpu_threads} if cpu_threads and not use_gpu else {}
+            config = ocr_engine_config()
+            if profile:
+                print(f"✓ 使用调优配置 {OCR_PROFILE_PATH or PROFILE_FILENAME}: "
+                      f"{profile['det_model']} + {profile['rec_model']}")
+            start = time.perf_counter()
             ocr = PaddleOCR(
-                ocr_version='PP-OCRv5',  # 使用v5版本
-                use_doc_orientation_classify=False,
-                use_doc_unwarping=False,
-                use_textline_orientation=False,
-                lang='ch',
-                device=device  # 指定设备
+                **config,
+                device=device,  # 指定设备
+                **extra
             )
+            OCR_ENGINE_STATE.update(state="ready", device=device,
+                                    init_seconds=time.perf_counter() - start)
             print(f"OCR引擎初始化完成 (PP-OCRv5, {'GPU加速' if use_gpu else 'CPU模式'})")
         except ImportError:
+            OCR_ENGINE_STATE["state"] = "unavailable"
             print("警告：PaddleOCR未安装，OCR功能将不可用")
             print("请运行: pip install paddlepaddle paddleocr")
             return False
     return True
 
 
+@lru_cache(maxsize=1)
+def _paddleocr_version():
+    """读取已安装的PaddleOCR版本（不导入模块）"""
+    import importlib.metadata
+    
+    try:
+        return importlib.metadata.version("paddleocr")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def ocr_engine_key():
+    """
+    当前OCR引擎配置的指纹（模型、版本、参数）
+    
+    Returns:
+        str: 引擎指纹
+    """
+    return engine_fingerprint({**ocr_engine_config(), "max_side": OCR_MAX_SIDE, "text_gate": OCR_TEXT_GATE},
+                              _paddleocr_version())
+
+
+def ocr_backend_key():
+    """
+    将要执行识别的OCR后端的引擎指纹
+    
+    常驻OCR服务可用且报告了指纹时使用服务端指纹（服务可能使用不同的模型或参数），
+    否则使用本进程的配置（多进程识别池与本进程配置相同）
+    
+    Returns:
+        str: 引擎指纹
+    """
+    client = ocr_server_client
+    if client is not None and client.is_available() and client.engine_key:
+        return client.engine_key
+    return ocr_engine_key()
+
+
+def get_ocr_cache(engine_key=None):
+    """
+    获取引擎配置对应的OCR结果缓存
+    
+    Args:
+        engine_key: 引擎指纹，默认为当前OCR后端的指纹
+    
+    Returns:
+        OcrCache: 缓存对象，未启用缓存时返回None
+    """
+    if not OCR_CACHE_ENABLED:
+        return None
+    return OcrCache(engine_key or ocr_backend_key())
+
+
+def get_api_cache():
+    """
+    获取进程内共享的API响应缓存
+    
+    Returns:
+        ApiCache: 缓存对象，未启用缓存时返回None
+    """
+    global _api_cache
+    if not API_CACHE_ENABLED:
+        return None
+    with _api_cache_lock:
+        root = Path(get_project_path("cache", "api"))
+        if (_api_cache is None or _api_cache.root != root
+                or _api_cache.ttl != API_CACHE_TTL_SECONDS
+                or _api_cache.max_bytes != API_CACHE_SIZE_BYTES):
+            _api_cache = ApiCache(root, ttl=API_CACHE_TTL_SECONDS, max_bytes=API_CACHE_SIZE_BYTES)
+        return _api_cache
+
+
+def get_image_phash_index():
+    """
+    获取近似图片索引
+    
+    Returns:
+        PhashIndex: 索引对象，未启用或缺少NumPy/Pillow时返回None
+    """
+    if not PHASH_ENABLED or not OCR_CACHE_ENABLED:
+        return None
+    return get_phash_index(PHASH_DISTANCE)
+
+
+def index_image_phash(img_file, content_hash=None):
+    """
+    计算图片的感知哈希并加入近似图片索引（已索引的图片直接返回）
+    
+    Args:
+        img_file: 图片路径
+        content_hash: 图片内容哈希，None时现场计算
+    
+    Returns:
+        int: 感知哈希，未启用或无法解码图片时返回None
+    """
+    index = get_image_phash_index()
+    if index is None:
+        return None
+    try:
+        content_hash = content_hash or image_hash(img_file)
+        value = index.get(content_hash)
+        if value is None:
+            value = phash(img_file)
+            index.add(value, content_hash, image=img_file)
+        return value
+    except Exception as e:
+        print(f"    ⚠ {Path(img_file).name} 无法计算感知哈希: {e}")
+        return None
+
+
+def find_near_duplicate(img_file, content_hash, cache):
+    """
+    在近似图片索引中查找已识别过的相似图片
+    
+    Args:
+        img_file: 图片路径
+        content_hash: 图片内容哈希
+        cache: OCR结果缓存
+    
+    Returns:
+        tuple: (文本行, 汉明距离, 相似图片内容哈希)，未找到返回None
+    """
+    value = index_image_phash(img_file, content_hash)
+    if value is None:
+        return None
+    for distance, other_hash in get_image_phash_index().query(value):
+        if other_hash == content_hash:
+            continue
+        lines = cache.get(other_hash)
+        if lines is not None:
+            return lines, distance, other_hash
+    return None
+
+
+def update_catalog(note_id, **fields):
+    """
+    更新笔记状态目录（cache/catalog.db），失败不影响处理流程
+    
+    Args:
+        note_id: 笔记ID
+        **fields: 状态字段，如 has_metadata=1
+    """
+    import sqlite3
+    from catalog import get_catalog
+    
+    try:
+        get_catalog(create=True).mark(note_id, **fields)
+    except sqlite3.Error as e:
+        print(f"  ⚠ 状态目录更新失败: {e}")
+
+
+def forget_catalog_note(note_id):
+    """
+    删除状态目录中已过期的笔记记录（如笔记文件被手动删除），之后按磁盘文件判断状态
+    
+    Args:
+        note_id: 笔记ID
+    """
+    import sqlite3
+    from catalog import get_catalog
+    
+    catalog = get_catalog()
+    if catalog is None:
+        return
+    try:
+        catalog.forget(note_id)
+    except sqlite3.Error as e:
+        print(f"  ⚠ 状态目录更新失败: {e}")
+
+
+def set_api_base(base):
+    """
+    设置XHS-Downloader API地址
+    
+    Args:
+        base: 服务地址，如 http://127.0.0.1:5556
+    """
+    global XHS_API_BASE, XHS_API_URL, XHS_API_DOCS_URL
+    XHS_API_BASE = base.rstrip("/")
+    XHS_API_URL = f"{XHS_API_BASE}/xhs/detail"
+    XHS_API_DOCS_URL = f"{XHS_API_BASE}/docs"
+
+
 def check_xhs_api_status():
     """
     检查XHS-Downloader API服务是否运行
@@ -73,7 +442,7 @@ def check_xhs_api_status():
     """
     try:
         # 尝试访问API文档页面
-        response = requests.get("http://127.0.0.1:5556/docs", timeout=5)
+        response = get_client().get(XHS_API_DOCS_URL, timeout=5)
         if response.status_code == 200:
             print("✓ XHS-Downloader API服务正常")
             return True
@@ -88,6 +457,65 @@ def check_xhs_api_status():
     return False
 
 
+def api_reachable():
+    """
+    检查API服务是否运行（结果在API_STATUS_TTL内复用，并发调用只检查一次）
+    
+    Returns:
+        bool: True表示服务正常
+    """
+    with _api_probe_lock:
+        now = time.monotonic()
+        if (_api_probe["base"] == XHS_API_BASE and _api_probe["ok"] is not None
+                and now - _api_probe["checked_at"] < API_STATUS_TTL):
+            return _api_probe["ok"]
+        ok = check_xhs_api_status()
+        _api_probe.update(base=XHS_API_BASE, ok=ok, checked_at=now)
+        return ok
+
+
+def notes_needing_api(note_items):
+    """
+    找出需要调用API的笔记（未处理完成、没有元数据，API响应缓存中也没有）
+    
+    Args:
+        note_items: 笔记ID或URL列表
+    
+    Returns:
+        list: 需要调用API的笔记
+    """
+    cache = get_api_cache()
+    needed = []
+    for item in note_items:
+        note_id = extract_note_id(item)
+        if note_id and (is_note_complete(note_id) or has_metadata(note_id)):
+            continue
+        if note_id and cache is not None and cache.get(note_id) is not None:
+            continue
+        needed.append(item)
+    return needed
+
+
+def notes_needing_work(note_items):
+    """
+    找出还需要处理的笔记（未处理完成，或状态显示已完成但content.md已不存在）
+    
+    Args:
+        note_items: 笔记ID或URL列表
+    
+    Returns:
+        list: 需要处理的笔记
+    """
+    needed = []
+    for item in note_items:
+        note_id = extract_note_id(item)
+        if (note_id and is_note_complete(note_id)
+                and Path(get_project_path("xhs_notes", note_id, "content.md")).exists()):
+            continue
+        needed.append(item)
+    return needed
+
+
 def download_note_via_api(note_id_or_url):
     """
     通过XHS-Downloader API获取笔记数据
@@ -98,6 +526,34 @@ def download_note_via_api(note_id_or_url):
     Returns:
         dict: API返回的数据，失败返回None
     """
+    cache_key = extract_note_id(note_id_or_url)
+    with timed("api", cache_key) as m:
+        result = _request_note_data(note_id_or_url, cache_key, m)
+        m["ok"] = int(result is not None)
+        return result
+
+
+def _request_note_data(note_id_or_url, cache_key, m):
+    """
+    download_note_via_api的实现：先查API响应缓存，未命中时带重试调用API
+    
+    Args:
+        note_id_or_url: 笔记ID或完整URL
+        cache_key: 笔记ID（缓存键）
+        m: 指标计数器（cache_hits / retries / bytes）
+    
+    Returns:
+        dict: API返回的数据，失败返回None
+    """
+    # 有效期内的缓存响应直接复用
+    cache = get_api_cache()
+    if cache is not None and cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            m["cache_hits"] = 1
+            print(f"  ✓ 使用缓存的API数据")
+            return cached
+    
     print(f"  → 调用API获取笔记数据...")
     
     # 判断是ID还是URL
@@ -120,18 +576,48 @@ def download_note_via_api(note_id_or_url):
         "skip": False
     }
     
+    def request_detail():
+        import requests
+        
+        record_api_stat("calls")
+        try:
+            response = get_client().post(
+                XHS_API_URL,
+                json=data,
+                timeout=XHS_API_TIMEOUT
+            )
+        except requests.exceptions.Timeout as e:
+            raise RetryableError("API请求超时") from e
+        except requests.exceptions.ConnectionError as e:
+            raise RetryableError("无法连接到API服务") from e
+        # 服务端错误和限流可重试，其它状态码说明服务正常响应
+        if response.status_code >= 500 or response.status_code == 429:
+            raise RetryableError(f"API返回错误状态码: {response.status_code}")
+        return response
+    
+    def on_retry(attempt, exc, delay):
+        record_api_stat("retries")
+        m["retries"] = attempt
+        print(f"  ⚠ {exc}，{delay:.1f}秒后第 {attempt} 次重试")
+    
     try:
-        response = requests.post(
-            XHS_API_URL,
-            json=data,
-            timeout=XHS_API_TIMEOUT
-        )
+        response = call_with_retry(request_detail, policy=API_RETRY_POLICY,
+                                   breaker=api_breaker, max_wait=API_BREAKER_MAX_WAIT,
+                                   on_retry=on_retry)
         
+        content = getattr(response, "content", None)
+        if isinstance(content, bytes):
+            m["bytes"] = len(content)
         if response.status_code == 200:
             result = response.json()
             # 检查是否有数据
             if result.get('data'):
                 print(f"  ✓ 成功获取笔记数据")
+                if cache is not None and cache_key:
+                    try:
+                        cache.put(cache_key, result)
+                    except OSError as e:
+                        print(f"  ⚠ API响应缓存写入失败: {e}")
                 return result
             else:
                 print(f"  ✗ API返回失败: {result.get('message', '未知错误')}")
@@ -140,20 +626,48 @@ def download_note_via_api(note_id_or_url):
             print(f"  ✗ API返回错误状态码: {response.status_code}")
             return None
             
-    except requests.exceptions.Timeout:
-        print(f"  ✗ API请求超时")
+    except RetryableError as e:
+        record_api_stat("failures")
+        print(f"  ✗ {e}")
         return None
-    except requests.exceptions.ConnectionError:
-        print(f"  ✗ 无法连接到API服务")
+    except CircuitOpenError as e:
+        record_api_stat("failures")
+        print(f"  ✗ API服务熔断，跳过本次调用（{e}）")
         return None
     except Exception as e:
         print(f"  ✗ API调用失败: {e}")
         return None
 
 
+def record_api_stat(key):
+    """API调用统计加一（calls / retries / failures）"""
+    with _api_stats_lock:
+        API_STATS[key] += 1
+
+
+def report_api_resilience():
+    """
+    输出本次运行的API重试与熔断统计
+    
+    Returns:
+        dict: API调用统计与熔断器状态
+    """
+    with _api_stats_lock:
+        stats = dict(API_STATS)
+    breaker = api_breaker.stats()
+    stats.update({f"breaker_{k}": v for k, v in breaker.items()})
+    if not stats["calls"]:
+        return stats
+    print(f"✓ API调用: {stats['calls']} 次, 重试 {stats['retries']} 次, 最终失败 {stats['failures']} 个笔记")
+    if breaker["opens"] or breaker["state"] != "closed":
+        print(f"⚠ API熔断: {breaker['opens']} 次, 拒绝调用 {breaker['rejections']} 次, "
+              f"当前状态 {breaker['state']}")
+    return stats
+
+
 def save_metadata_md(note_id, api_data):
     """
-    保存笔记元数据为MD格式
+    保存笔记元数据：结构化记录note.json和由其渲染的metadata.md
     
     Args:
         note_id: 笔记ID
@@ -163,45 +677,30 @@ def save_metadata_md(note_id, api_data):
     path = get_project_path("xhs_notes", note_id)
     ensure_dir(path)
     
-    # 从API响应中提取数据
-    data = api_data.get('data', {})
-    
-    # 构建元数据内容
-    md_content = f"""# 笔记元数据
-
-- **ID**: {note_id}
-- **标题**: {data.get('作品标题', '无标题')}
-- **作者**: {data.get('作者昵称', '未知')}
-- **作者ID**: {data.get('作者ID', '未知')}
-- **发布时间**: {data.get('发布时间', '未知')}
-- **更新时间**: {data.get('更新时间', '未知')}
-- **作品类型**: {data.get('作品类型', '未知')}
-- **点赞数量**: {data.get('点赞数量', 0)}
-- **收藏数量**: {data.get('收藏数量', 0)}
-- **评论数量**: {data.get('评论数量', 0)}
-- **分享数量**: {data.get('分享数量', 0)}
-- **作品链接**: https://www.xiaohongshu.com/explore/{note_id}
-
-## 原始内容
-
-{data.get('作品描述', '（无描述）')}
-"""
+    # 先保存结构化记录（note.json），再由记录渲染metadata.md
+    record = save_api_data(note_id, api_data.get('data', {}))
     
     # 保存文件
-    with open(f"{path}/metadata.md", 'w', encoding='utf-8') as f:
-        f.write(md_content)
+    write_text_atomic(f"{path}/metadata.md", render_metadata_md(record))
+    # 重新获取后content.md需要重新生成
+    update_catalog(note_id, has_metadata=1, has_record=1, content_done=0, content_hash=None)
+    from catalog import text_hash
+    mark_fetched(note_id, text_hash(json.dumps(record["api"], sort_keys=True, ensure_ascii=False)))
     
     print(f"  ✓ 元数据已保存")
 
 
-def download_images(note_id, api_data):
+def download_images(note_id, api_data, on_image=None):
     """
     下载笔记的所有图片
     
     Args:
         note_id: 笔记ID
         api_data: API返回的数据
+        on_image: 可选回调，每张图片就绪（下载完成或已存在）后以图片路径调用
     """
+    from image_downloader import get_downloader, is_image_complete, PART_SUFFIX
+    
     images_dir = get_project_path("xhs_notes", note_id, "images")
     ensure_dir(images_dir)
     
@@ -210,45 +709,64 @@ def download_images(note_id, api_data):
     # API返回的字段是"下载地址"
     image_urls = data.get('下载地址', [])
     
+    # 记录应有的图片集合，中断后可以只补齐缺失的图片
+    note_dir = Path(images_dir).parent
+    set_expected_images(note_id, [f"{idx}.jpg" for idx in range(len(image_urls))])
+    
     if not image_urls:
         print(f"  ⚠ 未找到图片链接")
         return
     
-    print(f"  → 下载 {len(image_urls)} 张图片...")
-    
-    # 下载每张图片
-    for idx, url in enumerate(image_urls):
-        img_path = f"{images_dir}/{idx}.jpg"
+    with timed("download", note_id) as m:
+        m.update(images=len(image_urls), existing=0, downloaded=0, bytes=0)
+        counters_lock = threading.Lock()
+        print(f"  → 下载 {len(image_urls)} 张图片...")
+        update_catalog(note_id, images=len(image_urls))
         
-        # 如果文件已存在，跳过
-        if Path(img_path).exists():
-            print(f"    ✓ 图片 {idx}.jpg 已存在")
-            continue
+        # 已存在的图片直接跳过，其余交给异步下载器并发下载
+        jobs = []
+        for idx, url in enumerate(image_urls):
+            img_path = f"{images_dir}/{idx}.jpg"
+            
+            # 如果文件已存在且完整，跳过
+            if Path(img_path).exists():
+                if is_image_complete(img_path):
+                    print(f"    ✓ 图片 {idx}.jpg 已存在")
+                    m["existing"] += 1
+                    mark_downloaded(note_dir, f"{idx}.jpg")
+                    if on_image:
+                        on_image(Path(img_path))
+                    continue
+                # 中断留下的不完整图片转为临时文件，从断点续传
+                print(f"    ⚠ 图片 {idx}.jpg 不完整，重新下载")
+                os.replace(img_path, f"{img_path}{PART_SUFFIX}")
+            
+            jobs.append((idx, url, img_path))
         
-        try:
-            # 下载图片
-            response = requests.get(url, timeout=30)
-            if response.status_code == 200:
-                with open(img_path, 'wb') as f:
-                    f.write(response.content)
-                print(f"    ✓ 下载图片 {idx}.jpg")
-            else:
-                print(f"    ✗ 图片 {idx}.jpg 下载失败: HTTP {response.status_code}")
-        except Exception as e:
-            print(f"    ✗ 图片 {idx}.jpg 下载失败: {e}")
+        # 下载完成后立即计算感知哈希，OCR阶段可直接查询近似图片
+        def on_complete(idx, img_path):
+            mark_downloaded(note_dir, f"{idx}.jpg")
+            with counters_lock:
+                m["downloaded"] += 1
+                m["bytes"] += os.path.getsize(img_path)
+            index_image_phash(img_path)
+            if on_image:
+                on_image(Path(img_path))
         
-        # 添加短暂延迟，避免请求过快
-        time.sleep(0.5)
+        # 按域名限制并发并用令牌桶限速，替代固定的串行延迟
+        errors = get_downloader().download(jobs, on_complete=on_complete) or {}
+        m["failed"] = len([e for e in errors.values() if e])
 
 
-def perform_ocr_on_note(note_id):
+def perform_ocr_on_note(note_id, batch_size=None):
     """
     对笔记的所有图片执行OCR识别
     
     Args:
         note_id: 笔记ID
+        batch_size: 每批识别的图片数，默认使用OCR_BATCH_SIZE
     """
-    if not init_ocr():
+    if not ocr_backend_ready():
         return
     
     images_dir = get_project_path("xhs_notes", note_id, "images")
@@ -264,74 +782,523 @@ def perform_ocr_on_note(note_id):
     
     print(f"  → OCR识别 {len(image_files)} 张图片...")
     
-    for img_file in image_files:
-        ocr_md_path = f"{ocr_dir}/{img_file.stem}.md"
-        
-        # 如果OCR结果已存在，跳过
-        if Path(ocr_md_path).exists():
-            print(f"    ✓ {img_file.name} OCR结果已存在")
-            continue
-        
-        print(f"    → 识别 {img_file.name}...")
-        
-        try:
-            # 执行OCR (使用predict方法)
-            result = ocr.predict(input=str(img_file))
-            
-            # 提取识别的文本
-            text_lines = []
-            
-            # 处理PaddleOCR返回的结果
-            if result and len(result) > 0:
-                ocr_result = result[0]
-                
-                # 新版PaddleOCR 3.2.0：通过json属性访问识别结果
-                if hasattr(ocr_result, 'json'):
-                    json_data = ocr_result.json
-                    if 'res' in json_data and 'rec_texts' in json_data['res']:
-                        text_lines = json_data['res']['rec_texts']
-                        print(f"    ✓ {img_file.name} OCR完成，识别到 {len(text_lines)} 行文本")
-                    else:
-                        print(f"    ✗ {img_file.name} OCR结果格式异常")
-                else:
-                    print(f"    ✗ {img_file.name} OCR返回格式不支持")
-            
-            # 保存OCR结果为MD格式
-            md_content = f"""# 图片OCR识别结果
+    ocr_images_batch(
+        [(img_file, f"{ocr_dir}/{img_file.stem}.md") for img_file in image_files],
+        batch_size=batch_size
+    )
+
+
+def ocr_image(img_file, ocr_dir):
+    """
+    对单张图片执行OCR识别并保存结果
+    
+    Args:
+        img_file: 图片路径（Path）
+        ocr_dir: OCR结果目录
+    """
+    ocr_images_batch([(img_file, f"{ocr_dir}/{img_file.stem}.md")], batch_size=1)
+
+
+def extract_ocr_lines(ocr_result, img_name, scale=1.0):
+    """
+    从PaddleOCR单张图片的识别结果中提取文本行
+    
+    Args:
+        ocr_result: predict返回的单个结果对象
+        img_name: 图片文件名（用于输出提示）
+        scale: 识别前的缩放比例（检测框坐标除以该值即为原图坐标）
+    
+    Returns:
+        OcrLines: 识别到的文本行，附带缩放比例和原图坐标的检测框
+    """
+    # 新版PaddleOCR 3.2.0：通过json属性访问识别结果
+    if hasattr(ocr_result, 'json'):
+        json_data = ocr_result.json
+        if 'res' in json_data and 'rec_texts' in json_data['res']:
+            text_lines = json_data['res']['rec_texts']
+            boxes = json_data['res'].get('rec_boxes')
+            if boxes is not None and len(boxes) == len(text_lines):
+                boxes = original_boxes(boxes, scale)
+            else:
+                boxes = None
+            scaled = f"（缩放 ×{scale:.2f}）" if scale != 1.0 else ""
+            print(f"    ✓ {img_name} OCR完成，识别到 {len(text_lines)} 行文本{scaled}")
+            return OcrLines(text_lines, scale, boxes)
+        print(f"    ✗ {img_name} OCR结果格式异常")
+    else:
+        print(f"    ✗ {img_name} OCR返回格式不支持")
+    return []
+
+
+def save_ocr_md(img_file, ocr_md_path, text_lines, source=None):
+    """
+    保存单张图片的OCR结果为MD格式
+    
+    Args:
+        img_file: 图片路径（Path）
+        ocr_md_path: OCR结果文件路径
+        text_lines: 识别到的文本行
+        source: 结果来源说明（如命中缓存），None表示本次识别
+    
+    Returns:
+        str: 写入的识别时间
+    """
+    recognized_at = now_str()
+    source_line = f"\n- **结果来源**: {source}" if source else ""
+    md_content = f"""# 图片OCR识别结果
 
 - **图片文件**: images/{img_file.name}
-- **识别时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-- **识别引擎**: PaddleOCR
+- **识别时间**: {recognized_at}
+- **识别引擎**: PaddleOCR{source_line}
 
 ## 识别文本
 
 {chr(10).join(text_lines) if text_lines else '（未识别到文字）'}
 """
+    
+    write_text_atomic(ocr_md_path, md_content)
+    return recognized_at
+
+
+def _predict_batch(inputs):
+    """
+    批量执行OCR推理
+    
+    Args:
+        inputs: predict的输入列表（图片路径或预处理后的数组）
+    
+    Returns:
+        list: 与输入顺序一致的识别结果，单张失败时对应位置为异常对象
+    """
+    if len(inputs) > 1:
+        try:
+            results = list(ocr.predict(input=list(inputs)))
+            if len(results) == len(inputs):
+                return results
+            print(f"    ⚠ 批量OCR返回 {len(results)} 个结果（期望 {len(inputs)}），改为逐张识别")
+        except Exception as e:
+            print(f"    ⚠ 批量OCR失败，改为逐张识别: {e}")
+    
+    # 单张识别，或批量失败时逐张识别，避免一张坏图拖垮整批
+    results = []
+    for item in inputs:
+        try:
+            result = ocr.predict(input=item)
+            results.append(result[0] if result else None)
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _recognize_batch(image_files):
+    """
+    识别一批图片：优先使用常驻OCR服务，其次多进程识别池，最后回退到进程内识别
+    
+    Args:
+        image_files: 图片路径列表
+    
+    Returns:
+        tuple: (结果列表, 引擎指纹)，结果与输入顺序一致，每项为文本行列表或异常对象；
+               引擎指纹标识实际产生结果的引擎配置，未知时为None（结果不写入缓存）
+    """
+    client = ocr_server_client
+    if client is not None and client.is_available():
+        try:
+            return client.recognize_with_key([Path(f).resolve() for f in image_files])
+        except Exception as e:
+            print(f"    ⚠ OCR服务请求失败，改用本地识别: {e}")
+            client.mark_unavailable()
+    
+    if ocr_pool is not None:
+        return ocr_pool.recognize([Path(f).resolve() for f in image_files]), ocr_engine_key()
+    
+    if not init_ocr():
+        return [RuntimeError("OCR引擎不可用")] * len(image_files), None
+    
+    return recognize_images(image_files), ocr_engine_key()
+
+
+def get_text_gate():
+    """
+    获取识别前的文字存在性判断（检测模型在首次需要时加载）
+    
+    Returns:
+        TextGate: 判断对象
+    """
+    global text_gate
+    if text_gate is None or text_gate.mode != OCR_TEXT_GATE:
+        text_gate = TextGate(OCR_TEXT_GATE, device=OCR_ENGINE_STATE["device"] or "cpu")
+    return text_gate
+
+
+def recognize_images(image_files):
+    """
+    使用进程内OCR引擎识别一批图片（需先调用init_ocr）
+    
+    Args:
+        image_files: 图片路径列表
+    
+    Returns:
+        list: 与输入顺序一致的结果，每项为文本行列表、异常对象或NoText（没有文字，跳过识别）
+    """
+    # 每张图片只解码一次：大图缩小后以数组形式交给引擎
+    prepared = [prepare_image(f, OCR_MAX_SIDE) for f in image_files]
+    downscaled = len([scale for _, scale in prepared if scale != 1.0])
+    if downscaled:
+        with _ocr_stats_lock:
+            OCR_STATS["downscaled"] += downscaled
+    
+    # 没有文字的图片不做识别
+    reasons = get_text_gate().check([item for item, _ in prepared])
+    pending = [i for i, reason in enumerate(reasons) if reason is None]
+    predicted = _predict_batch([prepared[i][0] for i in pending]) if pending else []
+    results = [NoText(reason) if reason else None for reason in reasons]
+    for i, r in zip(pending, predicted):
+        name = Path(image_files[i]).name
+        results[i] = r if isinstance(r, Exception) else (
+            extract_ocr_lines(r, name, prepared[i][1]) if r is not None else [])
+    return results
+
+
+def ocr_backend_ready():
+    """
+    检查是否有可用的OCR后端（常驻OCR服务、多进程识别池或进程内引擎）
+    
+    Returns:
+        bool: True表示可以执行OCR
+    """
+    if ocr_server_client is not None and ocr_server_client.is_available():
+        return True
+    if ocr_pool is not None:
+        return True
+    return init_ocr()
+
+
+def ocr_images_batch(jobs, batch_size=None):
+    """
+    分批执行OCR识别，每张图片的结果写入各自的OCR结果文件
+    
+    内容相同的图片（包括不同笔记中的同一张图）只识别一次，
+    并优先从OCR缓存中读取已识别过的结果；重新压缩或缩放过的同一张图
+    通过感知哈希找到已识别的版本后直接复用其文本。
+    
+    Args:
+        jobs: (图片路径, OCR结果文件路径) 列表，可以来自多个笔记
+        batch_size: 每批识别的图片数，默认使用OCR_BATCH_SIZE
+    """
+    note_dirs = {Path(ocr_md_path).parent.parent for _, ocr_md_path in jobs}
+    note_id = next(iter(note_dirs)).name if len(note_dirs) == 1 else None
+    with timed("ocr", note_id) as m:
+        m.update(images=len(jobs), notes=len(note_dirs), existing=0, cache_hits=0,
+                 phash_reuses=0, recognized=0, no_text=0, failed=0, lines=0, ocr_seconds=0.0)
+        _ocr_images_batch(jobs, batch_size, m)
+
+
+def _ocr_images_batch(jobs, batch_size, m):
+    """ocr_images_batch的实现，m为指标计数器"""
+    import sqlite3
+    from catalog import get_catalog
+    from image_downloader import is_image_complete
+    
+    batch_size = max(1, batch_size or OCR_BATCH_SIZE)
+    cache = get_ocr_cache()
+    
+    # 识别结果同时汇总到各笔记的note.json（按笔记目录分组，每批写一次）
+    updates = {}
+    # 写入的OCR结果文件的哈希记入阶段清单，之后内容不同的文件才视为手动修正
+    written = {}
+    
+    def save_result(img_file, ocr_md_path, text_lines, content_hash, source=None):
+        recognized_at = save_ocr_md(img_file, ocr_md_path, text_lines, source=source)
+        try:
+            written.setdefault(Path(ocr_md_path).parent.parent, {})[Path(ocr_md_path).name] = \
+                file_digest(ocr_md_path)
+        except OSError:
+            pass
+        updates.setdefault(Path(ocr_md_path).parent.parent, {})[img_file.name] = {
+            "lines": list(text_lines),
+            "source": source,
+            "recognized_at": recognized_at,
+            "content_hash": content_hash,
+        }
+        # 本次识别的结果记录缩放比例和原图坐标的检测框
+        if isinstance(text_lines, OcrLines):
+            entry = updates[Path(ocr_md_path).parent.parent][img_file.name]
+            entry["scale"] = round(text_lines.scale, 4)
+            if text_lines.boxes is not None:
+                entry["boxes"] = text_lines.boxes
+    
+    def flush_records():
+        for note_dir, entries in updates.items():
+            try:
+                update_ocr_results(note_dir, entries)
+                # 阶段清单最后写入，作为这些图片OCR完成的标记
+                mark_ocr_done(note_dir, {name: e["content_hash"] for name, e in entries.items()},
+                              written.get(note_dir))
+                get_catalog(create=True).record_ocr(
+                    note_dir.name, [(name, e["content_hash"]) for name, e in entries.items()]
+                )
+            except (OSError, sqlite3.Error) as e:
+                print(f"    ⚠ 笔记记录写入失败: {e}")
+        updates.clear()
+        written.clear()
+    
+    # 有阶段清单的笔记，只有清单中记录过的OCR结果才算完成（结果文件可能来自中断的运行）
+    manifests = {}
+    
+    def ocr_recorded(img_file, ocr_md_path):
+        note_dir = Path(ocr_md_path).parent.parent
+        if note_dir not in manifests:
+            manifests[note_dir] = load_manifest(note_dir)
+        manifest = manifests[note_dir]
+        return manifest is None or img_file.name in manifest["images"]["ocr"]
+    
+    # 已有结果的图片直接跳过，命中缓存的图片直接写入结果
+    groups = {}
+    for img_file, ocr_md_path in jobs:
+        img_file = Path(img_file)
+        if Path(ocr_md_path).exists() and ocr_recorded(img_file, ocr_md_path):
+            print(f"    ✓ {img_file.name} OCR结果已存在")
+            m["existing"] += 1
+            continue
+        
+        # 不完整的图片不识别，避免错误结果写入缓存
+        if not is_image_complete(img_file):
+            print(f"    ✗ {img_file.name} 图片不完整，跳过OCR")
+            m["failed"] += 1
+            continue
+        
+        content_hash = None
+        if cache is not None:
+            try:
+                content_hash = image_hash(img_file)
+            except OSError as e:
+                print(f"    ⚠ {img_file.name} 无法计算哈希: {e}")
+        
+        if content_hash:
+            cached_lines = cache.get(content_hash)
+            if cached_lines is not None:
+                save_result(img_file, ocr_md_path, cached_lines, content_hash,
+                            source=f"OCR缓存 ({content_hash[:12]})")
+                record_ocr_cache_hit()
+                m["cache_hits"] += 1
+                m["lines"] += len(cached_lines)
+                print(f"    ✓ {img_file.name} 命中OCR缓存")
+                continue
             
-            with open(ocr_md_path, 'w', encoding='utf-8') as f:
-                f.write(md_content)
+            near = find_near_duplicate(img_file, content_hash, cache)
+            if near is not None:
+                near_lines, distance, source_hash = near
+                save_result(img_file, ocr_md_path, near_lines, content_hash,
+                            source=f"近似图片复用 ({source_hash[:12]}, 汉明距离 {distance})")
+                record_ocr_phash_reuse()
+                m["phash_reuses"] += 1
+                m["lines"] += len(near_lines)
+                print(f"    ✓ {img_file.name} 复用近似图片的OCR结果 (汉明距离 {distance})")
+                continue
+        
+        # 相同内容的图片归为一组，只识别一次
+        key = content_hash or str(img_file)
+        group = groups.setdefault(key, (content_hash, []))
+        group[1].append((img_file, ocr_md_path))
+    flush_records()
+    
+    unique = list(groups.values())
+    for i in range(0, len(unique), batch_size):
+        batch = unique[i:i + batch_size]
+        names = ", ".join(members[0][0].name for _, members in batch)
+        print(f"    → 识别 {names}...")
+        
+        start = time.perf_counter()
+        results, engine_key = _recognize_batch([members[0][0] for _, members in batch])
+        elapsed = time.perf_counter() - start
+        
+        # 识别结果按实际产生它的引擎配置缓存（OCR服务的配置可能与本进程不同）
+        result_cache = cache
+        if cache is not None and engine_key != cache.engine_key:
+            result_cache = get_ocr_cache(engine_key) if engine_key else None
+        record_ocr_throughput(len(batch), elapsed)
+        m["ocr_seconds"] += elapsed
+        
+        for (content_hash, members), text_lines in zip(batch, results):
+            if isinstance(text_lines, Exception):
+                for img_file, _ in members:
+                    print(f"    ✗ {img_file.name} OCR失败: {text_lines}")
+                m["failed"] += len(members)
+                continue
+            
+            source = None
+            if isinstance(text_lines, NoText):
+                source = f"无文字，跳过识别（{text_lines.reason}）"
+                record_ocr_no_text(len(members))
+                m["no_text"] += len(members)
+            else:
+                m["recognized"] += len(members)
+                m["lines"] += len(text_lines) * len(members)
             
-            print(f"    ✓ {img_file.name} OCR完成")
+            for img_file, ocr_md_path in members:
+                try:
+                    save_result(img_file, ocr_md_path, text_lines, content_hash, source=source)
+                    print(f"    ✓ {img_file.name} {'无文字' if source else 'OCR完成'}")
+                except Exception as e:
+                    print(f"    ✗ {img_file.name} OCR失败: {e}")
             
-        except Exception as e:
-            print(f"    ✗ {img_file.name} OCR失败: {e}")
+            if result_cache is not None and content_hash:
+                try:
+                    result_cache.put(content_hash, text_lines, image=members[0][0])
+                except OSError as e:
+                    print(f"    ⚠ OCR缓存写入失败: {e}")
+        flush_records()
+        
+        if elapsed > 0:
+            print(f"    ✓ 本批 {len(batch)} 张图片耗时 {elapsed:.2f}秒 ({len(batch) / elapsed:.2f} 张/秒)")
+
+
+def record_ocr_throughput(images, seconds):
+    """累计OCR识别的图片数和耗时"""
+    with _ocr_stats_lock:
+        OCR_STATS["images"] += images
+        OCR_STATS["seconds"] += seconds
+        OCR_STATS["batches"] += 1
+
+
+def record_ocr_cache_hit():
+    """累计OCR缓存命中数"""
+    with _ocr_stats_lock:
+        OCR_STATS["cache_hits"] += 1
+
+
+def record_ocr_no_text(images):
+    """累计判断为没有文字而跳过识别的图片数"""
+    with _ocr_stats_lock:
+        OCR_STATS["no_text"] += images
+
+
+def record_ocr_phash_reuse():
+    """累计近似图片复用数"""
+    with _ocr_stats_lock:
+        OCR_STATS["phash_reuses"] += 1
+
+
+def report_ocr_throughput(batch_size=None):
+    """
+    输出本次运行的OCR吞吐量
+    
+    Args:
+        batch_size: 本次使用的批大小（仅用于显示）
+    
+    Returns:
+        float: 每秒识别的图片数，未执行OCR时返回None
+    """
+    with _ocr_stats_lock:
+        images = OCR_STATS["images"]
+        seconds = OCR_STATS["seconds"]
+        batches = OCR_STATS["batches"]
+        cache_hits = OCR_STATS["cache_hits"]
+        phash_reuses = OCR_STATS["phash_reuses"]
+        downscaled = OCR_STATS["downscaled"]
+        no_text = OCR_STATS["no_text"]
+    if cache_hits:
+        print(f"✓ OCR缓存命中: {cache_hits} 张图片")
+    if phash_reuses:
+        print(f"✓ 近似图片复用: {phash_reuses} 张图片")
+    if downscaled:
+        print(f"✓ 识别前缩小: {downscaled} 张图片（最长边 {OCR_MAX_SIDE}px）")
+    if no_text:
+        print(f"✓ 无文字跳过识别: {no_text} 张图片")
+    if not images or seconds <= 0:
+        return None
+    throughput = images / seconds
+    print(f"✓ OCR吞吐: {images} 张图片 / {batches} 批, "
+          f"{seconds:.2f}秒, {throughput:.2f} 张/秒 (批大小 {batch_size or OCR_BATCH_SIZE})")
+    return throughput
 
 
 def generate_content_md(note_id):
     """
     生成整合的content.md文件
     
+    优先由结构化记录note.json渲染；没有记录的旧笔记回退为解析metadata.md和OCR结果文件
+    
     Args:
         note_id: 笔记ID
     """
     print(f"  → 生成content.md...")
     
+    with timed("content", note_id) as m:
+        note_dir = note_dir_for(note_id)
+        record = load_record(note_dir)
+        if record is None or record.get("api") is None:
+            m["legacy"] = 1
+            _generate_content_md_legacy(note_id)
+            return
+        
+        # 手动修正过的OCR结果文件先同步回记录，再由记录渲染
+        inputs = content_inputs(note_dir)
+        if _sync_ocr_edits(note_dir, record, inputs):
+            record = load_record(note_dir)
+            inputs = content_inputs(note_dir)
+        
+        content = render_content_md(record)
+        content_path = get_project_path("xhs_notes", note_id, "content.md")
+        write_text_atomic(content_path, content)
+        from catalog import text_hash
+        mark_content_done(note_id, text_hash(content), inputs)
+        update_catalog(note_id, content_done=1, content_hash=text_hash(content))
+        m["bytes"] = len(content.encode('utf-8'))
+    
+    print(f"  ✓ content.md已生成")
+
+
+def _sync_ocr_edits(note_dir, record, inputs):
+    """
+    把被手动修正过的OCR结果文件（内容与OCR写入时不同）同步到note.json
+    
+    Args:
+        note_dir: 笔记目录
+        record: 笔记记录
+        inputs: 当前的输入指纹
+    
+    Returns:
+        bool: 是否有结果被同步
+    """
+    image_names = {Path(name).stem: name for name in record.get("ocr") or {}}
+    entries = {}
+    synced = []
+    for md_name in changed_ocr_files(note_dir, inputs):
+        with open(Path(note_dir) / "ocr_results" / md_name, 'r', encoding='utf-8') as f:
+            lines = parse_ocr_md(f.read())
+        if lines is None:
+            print(f"    ⚠ {md_name} 格式无法识别，忽略修改")
+            continue
+        stem = Path(md_name).stem
+        entries[image_names.get(stem, f"{stem}.jpg")] = {
+            "lines": lines, "source": "手动修正", "recognized_at": now_str()
+        }
+        synced.append(md_name)
+    
+    if not entries:
+        return False
+    update_ocr_results(note_dir, entries)
+    mark_ocr_synced(note_dir, {name: inputs["ocr"][name] for name in synced})
+    print(f"    → 已同步 {len(entries)} 个修改过的OCR结果")
+    return True
+
+
+def _generate_content_md_legacy(note_id):
+    """
+    从metadata.md和ocr_results/*.md解析生成content.md（没有note.json的旧笔记）
+    
+    Args:
+        note_id: 笔记ID
+    """
     # 读取metadata
     metadata_path = get_project_path("xhs_notes", note_id, "metadata.md")
     if not Path(metadata_path).exists():
         print(f"  ✗ 元数据文件不存在")
         return
     
+    inputs = content_inputs(note_dir_for(note_id))
     with open(metadata_path, 'r', encoding='utf-8') as f:
         metadata = f.read()
     
@@ -394,13 +1361,54 @@ def generate_content_md(note_id):
         md_lines.append("\n（无OCR识别结果）")
     
     # 保存content.md
+    content = '\n'.join(md_lines)
     content_path = get_project_path("xhs_notes", note_id, "content.md")
-    with open(content_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(md_lines))
+    write_text_atomic(content_path, content)
+    from catalog import text_hash
+    mark_content_done(note_id, text_hash(content), inputs)
+    update_catalog(note_id, content_done=1, content_hash=text_hash(content))
     
     print(f"  ✓ content.md已生成")
 
 
+def resume_api_data(note_id):
+    """
+    下载阶段未完成时，从note.json取回API数据，用于补齐缺失的图片
+    
+    Args:
+        note_id: 笔记ID
+    
+    Returns:
+        dict: 与API响应格式相同的数据，无需补齐或无法补齐时返回None
+    """
+    note_dir = note_dir_for(note_id)
+    manifest = load_manifest(note_dir)
+    if manifest is None or stage_done(manifest, "download"):
+        return None
+    record = load_record(note_dir)
+    if not record or record.get("api") is None:
+        return None
+    return {"data": record["api"]}
+
+
+def read_processed_content(note_id):
+    """
+    读取已处理笔记的content.md
+    OCR结果、元数据或模板版本在上次生成后有变化时，先重新生成再读取
+    
+    Args:
+        note_id: 笔记ID
+    
+    Returns:
+        str: content.md内容，文件不存在时返回None
+    """
+    note_dir = note_dir_for(note_id)
+    if content_stale(note_dir):
+        print(f"  → 笔记 {note_id} 的内容输入已变化")
+        generate_content_md(note_id)
+    return read_content_md(note_id)
+
+
 def process_note(note_id_or_url, task_id):
     """
     处理单个笔记的完整流程
@@ -413,24 +1421,21 @@ def process_note(note_id_or_url, task_id):
         str: 处理后的content内容，失败返回None
     """
     # 提取笔记ID用于文件存储
-    if note_id_or_url.startswith('http'):
-        # 从URL中提取笔记ID
-        import re
-        match = re.search(r'[0-9a-f]{24}', note_id_or_url.lower())
-        if match:
-            note_id = match.group()
-        else:
-            print(f"\n✗ 无法从URL提取笔记ID: {note_id_or_url}")
-            return None
-    else:
-        note_id = note_id_or_url
+    note_id = extract_note_id(note_id_or_url)
+    if not note_id:
+        print(f"\n✗ 无法从URL提取笔记ID: {note_id_or_url}")
+        return None
     
     print(f"\n处理笔记: {note_id}")
     
     # 检查是否已完整处理
     if is_note_complete(note_id):
-        print(f"  ✓ 笔记已处理，读取现有数据")
-        return read_content_md(note_id)
+        content = read_processed_content(note_id)
+        if content is not None:
+            print(f"  ✓ 笔记已处理，读取现有数据")
+            return content
+        # 状态目录中的记录已过期，重新处理
+        forget_catalog_note(note_id)
     
     try:
         # 1. 获取笔记数据
@@ -448,6 +1453,10 @@ def process_note(note_id_or_url, task_id):
             download_images(note_id, api_result)
         else:
             print(f"  ✓ 元数据已存在")
+            # 上次运行中断时补齐缺失的图片
+            resume_data = resume_api_data(note_id)
+            if resume_data is not None:
+                download_images(note_id, resume_data)
         
         # 2. OCR处理
         if not has_ocr_results(note_id):
@@ -468,6 +1477,120 @@ def process_note(note_id_or_url, task_id):
         return None
 
 
+def _pipeline_fetch(job, task_id):
+    """流水线获取阶段：检查缓存状态，必要时调用API并保存元数据"""
+    note_id = extract_note_id(job.item)
+    if not note_id:
+        print(f"\n✗ 无法从URL提取笔记ID: {job.item}")
+        return False
+    job.note_id = note_id
+    
+    if is_note_complete(note_id):
+        content = read_processed_content(note_id)
+        if content is not None:
+            print(f"  ✓ 笔记 {note_id} 已处理，读取现有数据")
+            job.content = content
+            return True
+        # 状态目录中的记录已过期（文件被删除），重新处理
+        forget_catalog_note(note_id)
+    
+    if not has_metadata(note_id):
+        api_result = download_note_via_api(job.item)
+        if not api_result:
+            create_error_log(task_id, f"笔记 {note_id} 获取数据失败")
+            return False
+        save_metadata_md(note_id, api_result)
+        job.api_data = api_result
+    else:
+        print(f"  ✓ 笔记 {note_id} 元数据已存在")
+        # 上次运行中断时补齐缺失的图片
+        job.api_data = resume_api_data(note_id)
+    return True
+
+
+def _pipeline_download(job, emit):
+    """流水线下载阶段：每张图片就绪后立即交给OCR阶段"""
+    if job.api_data is not None:
+        download_images(job.note_id, job.api_data, on_image=emit)
+    elif not has_ocr_results(job.note_id):
+        images_dir = get_project_path("xhs_notes", job.note_id, "images")
+        for img_file in sorted(Path(images_dir).glob("*.jpg")):
+            emit(img_file)
+
+
+def _pipeline_ocr(items, batch_size=None):
+    """流水线OCR阶段：批量识别来自一个或多个笔记的图片"""
+    if not ocr_backend_ready():
+        return
+    jobs = []
+    for job, img_path in items:
+        ocr_dir = get_project_path("xhs_notes", job.note_id, "ocr_results")
+        ensure_dir(ocr_dir)
+        img_file = Path(img_path)
+        jobs.append((img_file, f"{ocr_dir}/{img_file.stem}.md"))
+    ocr_images_batch(jobs, batch_size=batch_size)
+
+
+def _pipeline_build(job):
+    """流水线内容生成阶段：生成content.md并返回内容"""
+    generate_content_md(job.note_id)
+    content = read_content_md(job.note_id)
+    if content is not None:
+        print(f"  ✓ 笔记 {job.note_id} 处理完成")
+    return content
+
+
+def run_pipeline(note_items, task_id, workers=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 ocr_batch_size=None, merged_writer=None, journal=None, indices=None,
+                 stop=None):
+    """
+    使用分阶段流水线并发处理多个笔记
+    
+    Args:
+        note_items: 笔记ID或URL列表
+        task_id: 任务ID
+        workers: 各阶段并发数，如 {"fetch": 4, "download": 4, "ocr": 1, "build": 2}
+        queue_size: 阶段之间队列的容量
+        ocr_batch_size: OCR每批图片数（跨笔记凑批），默认使用OCR_BATCH_SIZE
+        merged_writer: 可选的MergedWriter，每个笔记完成后立即写入合并文档，不再保留内容
+        journal: 可选的TaskJournal，每个笔记完成后记录结果
+        indices: 笔记在任务输入中的位置（续跑部分笔记时使用），默认为0..n-1
+        stop: 可选的threading.Event，设置后不再开始新的笔记
+    
+    Returns:
+        list: 与输入顺序一致的内容列表，失败的笔记为None（流式写入时成功的笔记为True）
+    """
+    def on_error(job, stage, exc):
+        note = job.note_id or job.item
+        print(f"  ✗ 笔记 {note} {stage}阶段失败: {exc}")
+        create_error_log(task_id, f"笔记 {note} 处理失败({stage}): {exc}")
+    
+    def on_result(job):
+        index = indices[job.index] if indices is not None else job.index
+        content = None if job.failed else job.content
+        if metrics_exporter is not None:
+            metrics_exporter.notes.inc(result="success" if content is not None else "failed")
+        if journal is not None:
+            journal.record_note(index, job.item, job.note_id, content is not None)
+        if merged_writer is not None:
+            merged_writer.add(index, content)
+    
+    pipeline = NotePipeline(
+        fetch=lambda job: _pipeline_fetch(job, task_id),
+        download=_pipeline_download,
+        ocr=lambda items: _pipeline_ocr(items, batch_size=ocr_batch_size),
+        build=_pipeline_build,
+        workers=workers,
+        queue_size=queue_size,
+        ocr_batch_size=ocr_batch_size or OCR_BATCH_SIZE,
+        on_error=on_error,
+        on_result=on_result,
+        keep_results=merged_writer is None,
+        stop=stop
+    )
+    return pipeline.run(note_items)
+
+
 def generate_merged_md(task_id, contents, note_ids):
     """
     生成合并的MD文件
@@ -477,6 +1600,20 @@ def generate_merged_md(task_id, contents, note_ids):
         contents: 内容列表
         note_ids: 笔记ID列表
     """
+    with timed("merged") as m:
+        m["notes"] = len(note_ids)
+        m["bytes"] = _write_merged_md(task_id, contents, note_ids)
+    
+    print(f"\n✓ 合并文档已生成: ronggao_output/{task_id}/merged.md")
+
+
+def _write_merged_md(task_id, contents, note_ids):
+    """
+    构建并写入merged.md
+    
+    Returns:
+        int: 写入的字节数
+    """
     output_dir = get_project_path("ronggao_output", task_id)
     ensure_dir(output_dir)
     
@@ -513,29 +1650,241 @@ def generate_merged_md(task_id, contents, note_ids):
     merged_path = Path(output_dir) / "merged.md"
     with open(merged_path, 'w', encoding='utf-8') as f:
         f.write(merged_content)
+    return len(merged_content.encode('utf-8'))
+
+
+def start_metrics_exporter(port, host=None):
+    """
+    启动Prometheus指标导出，除各阶段的耗时与计数外还导出：
+    笔记完成数、流水线队列深度与进行中的笔记、API调用/重试/失败和熔断状态、OCR引擎状态
     
-    print(f"\n✓ 合并文档已生成: ronggao_output/{task_id}/merged.md")
+    Args:
+        port: 端口，0表示自动分配
+        host: 监听地址，默认只监听本机
+    
+    Returns:
+        MetricsExporter: 已启动的导出器
+    """
+    global metrics_exporter
+    from metrics_exporter import MetricsExporter, METRICS_HOST
+    
+    exporter = MetricsExporter()
+    exporter.notes = exporter.counter("notes_total", "处理完成的笔记数（result: success / failed）")
+    
+    exporter.gauge("pipeline_in_flight_notes", "已开始处理但尚未完成的笔记数",
+                   lambda: running_snapshot()["in_flight"])
+    exporter.gauge("pipeline_pending_notes", "尚未开始处理的笔记数",
+                   lambda: running_snapshot()["pending"])
+    exporter.gauge("pipeline_queue_depth", "各阶段队列中等待的任务数",
+                   lambda: {(("stage", name),): depth
+                            for name, depth in running_snapshot()["queues"].items()})
+    
+    def api_stats():
+        with _api_stats_lock:
+            return {(("result", key),): value for key, value in API_STATS.items()}
+    
+    exporter.callback_counter("api_requests_total",
+                              "API累计调用、重试和失败次数（result: calls / retries / failures）", api_stats)
+    exporter.gauge("api_breaker_open", "API熔断器是否打开（state标签为当前状态）",
+                   lambda: {(("state", api_breaker.state),): int(api_breaker.state != "closed")})
+    
+    def ocr_engine():
+        states = {(("backend", "local"), ("state", OCR_ENGINE_STATE["state"])): 1}
+        if ocr_server_client is not None:
+            states[(("backend", "server"), ("state", "configured"))] = 1
+        if ocr_pool is not None:
+            states[(("backend", "pool"), ("state", "configured"))] = ocr_pool.workers
+        return states
+    
+    exporter.gauge("ocr_engine_state", "OCR后端状态（local为init_ocr初始化的进程内引擎，pool为进程数）",
+                   ocr_engine)
+    exporter.gauge("ocr_engine_init_seconds", "进程内OCR引擎初始化耗时（秒）",
+                   lambda: OCR_ENGINE_STATE["init_seconds"])
+    
+    metrics_exporter = exporter.start(port, host or METRICS_HOST)
+    print(f"✓ 指标导出: {exporter.url}")
+    return exporter
+
+
+def stop_metrics_exporter():
+    """停止Prometheus指标导出"""
+    global metrics_exporter
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+        metrics_exporter = None
+
+
+def finish_metrics(metrics):
+    """
+    停止记录指标，写入metrics.md汇总表并输出
+    
+    Args:
+        metrics: TaskMetrics，None表示未启用
+    """
+    set_metrics(None)
+    if metrics is None:
+        return
+    try:
+        table = metrics.close()
+    except OSError as e:
+        print(f"⚠ 指标写入失败: {e}")
+        return
+    print(f"\n{table}")
+    print(f"✓ 阶段指标: ronggao_output/{metrics.task_id}/{METRICS_FILENAME}, {SUMMARY_FILENAME}")
+
+
+def plan_resume(state):
+    """
+    根据任务日志确定续跑时需要处理的笔记
+    
+    Args:
+        state: load_journal返回的任务状态
+    
+    Returns:
+        tuple: (需要处理的笔记位置列表, {位置: 已完成笔记的内容})
+    """
+    done_contents = {}
+    for index, item in enumerate(state["items"]):
+        if state["status"].get(index) != "done":
+            continue
+        note_id = extract_note_id(item)
+        content = read_content_md(note_id) if note_id else None
+        # 日志记录为完成但content.md已不存在的笔记重新处理
+        if content is not None:
+            done_contents[index] = content
+    pending = [i for i in range(len(state["items"])) if i not in done_contents]
+    return pending, done_contents
+
+
+def parse_args(argv=None):
+    """
+    解析命令行参数
+    
+    Args:
+        argv: 参数列表，默认使用sys.argv[1:]
+    
+    Returns:
+        argparse.Namespace: 解析结果
+    """
+    parser = argparse.ArgumentParser(description='小红书融稿工具 - 数据处理模块')
+    parser.add_argument('notes', nargs='?', default=None, help='笔记URL列表')
+    parser.add_argument('--resume', metavar='TASK_ID', default=None,
+                        help='继续被中断的任务，只处理任务日志中未完成的笔记')
+    parser.add_argument('--fetch-workers', type=int, default=DEFAULT_WORKERS['fetch'],
+                        help='API获取阶段并发数')
+    parser.add_argument('--download-workers', type=int, default=DEFAULT_WORKERS['download'],
+                        help='图片下载阶段并发数')
+    parser.add_argument('--ocr-workers', type=int, default=DEFAULT_WORKERS['ocr'],
+                        help='OCR识别阶段并发数')
+    parser.add_argument('--build-workers', type=int, default=DEFAULT_WORKERS['build'],
+                        help='内容生成阶段并发数')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='阶段之间队列的容量')
+    parser.add_argument('--ocr-batch-size', type=int, default=None,
+                        help='OCR每批识别的图片数（可跨笔记凑批，默认使用调优配置或%d）' % OCR_BATCH_SIZE)
+    parser.add_argument('--ocr-server', default=OCR_SERVER_URL,
+                        help='常驻OCR服务地址（不可用时自动回退到本地识别）')
+    parser.add_argument('--no-ocr-server', action='store_true',
+                        help='不使用常驻OCR服务，始终在本进程内识别')
+    parser.add_argument('--ocr-processes', type=int, default=0,
+                        help='多进程OCR识别的进程数（CPU模式，<=1表示单进程）')
+    parser.add_argument('--ocr-threads', type=int, default=None,
+                        help='每个OCR引擎的推理线程数（默认按CPU核心数平均分配）')
+    parser.add_argument('--ocr-max-side', type=int, default=None,
+                        help='识别前把图片缩小到最长边不超过该值（像素，<=0表示不缩放，默认使用调优配置）')
+    parser.add_argument('--no-ocr-profile', action='store_true',
+                        help=f'不使用ocr_autotune.py生成的调优配置（{PROFILE_FILENAME}）')
+    parser.add_argument('--ocr-profile', default=None,
+                        help=f'调优配置文件路径（默认项目根目录下的{PROFILE_FILENAME}，也可用环境变量XHS_OCR_PROFILE_PATH指定）')
+    parser.add_argument('--text-gate', choices=GATE_MODES, default=OCR_TEXT_GATE,
+                        help='识别前判断图片是否有文字：off不判断，heuristic只用边缘密度（默认），'
+                             'detect再用检测模型确认（有文字的图片会多一次检测，'
+                             '只适合大部分图片没有文字时；没有文字的图片跳过识别）')
+    parser.add_argument('--no-ocr-cache', action='store_true',
+                        help='不使用跨笔记的OCR结果缓存')
+    parser.add_argument('--phash-distance', type=int, default=PHASH_DISTANCE,
+                        help='近似图片复用OCR结果的最大汉明距离（64位pHash）')
+    parser.add_argument('--no-phash', action='store_true',
+                        help='不复用近似图片（重新压缩/缩放的同一张图）的OCR结果')
+    parser.add_argument('--api-retries', type=int, default=RETRY_ATTEMPTS,
+                        help='API超时、连接错误、5xx时的最多尝试次数（含首次）')
+    parser.add_argument('--breaker-threshold', type=int, default=BREAKER_THRESHOLD,
+                        help='API连续失败多少次后熔断')
+    parser.add_argument('--breaker-cooldown', type=float, default=BREAKER_COOLDOWN,
+                        help='API熔断后多久放行探测请求（秒）')
+    parser.add_argument('--no-api-cache', action='store_true',
+                        help='不使用API响应缓存，每个笔记都调用API')
+    parser.add_argument('--api-cache-ttl', type=float, default=API_CACHE_TTL / 3600,
+                        help='API响应缓存有效期（小时，<=0永不过期）')
+    parser.add_argument('--api-cache-size', type=int, default=API_CACHE_MAX_BYTES // (1024 * 1024),
+                        help='API响应缓存总大小上限（MB），超出时淘汰最久未使用的条目')
+    parser.add_argument('--api-base', default=XHS_API_BASE,
+                        help='XHS-Downloader API地址（也可用环境变量XHS_API_BASE指定）')
+    parser.add_argument('--api-pool-size', type=int, default=API_POOL_SIZE,
+                        help='XHS-Downloader API连接池大小')
+    parser.add_argument('--cdn-pool-size', type=int, default=CDN_POOL_SIZE,
+                        help='图片CDN每个域名的连接池大小')
+    parser.add_argument('--http2', action='store_true',
+                        help='图片CDN使用HTTP/2（需要安装httpx[http2]）')
+    # 下载与指标导出的默认值在各自模块中（用到时才导入），未指定时为None
+    parser.add_argument('--per-host-downloads', type=int, default=None,
+                        help='每个图片域名的并发下载数')
+    parser.add_argument('--download-rate', type=float, default=None,
+                        help='每个图片域名每秒请求数（<=0不限速）')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='在本机该端口提供Prometheus格式的 /metrics（默认不启用）')
+    parser.add_argument('--metrics-host', default=None,
+                        help='指标导出的监听地址（默认只监听本机）')
+    parser.add_argument('--no-metrics', action='store_true',
+                        help='不记录分阶段指标（metrics.jsonl / metrics.md）')
+    parser.add_argument('--stream-merged', action='store_true',
+                        help='流式写入合并文档：每个笔记完成后立即按顺序追加，统计写入文末和merged.json')
+    args = parser.parse_args(argv)
+    
+    # 未在命令行指定的批大小和最长边上限使用调优配置（启动时读取一次）
+    profile = None if args.no_ocr_profile or not OCR_PROFILE_ENABLED else load_ocr_profile(args.ocr_profile)
+    if args.ocr_batch_size is None:
+        args.ocr_batch_size = profile["batch_size"] if profile else OCR_BATCH_SIZE
+    if args.ocr_max_side is None:
+        args.ocr_max_side = profile["max_side"] if profile else OCR_MAX_SIDE
+    return args
 
 
 def main():
     """主函数"""
+    global ocr_server_client, ocr_pool, OCR_CPU_THREADS, OCR_MAX_SIDE, OCR_TEXT_GATE, OCR_PROFILE_ENABLED
+    global OCR_PROFILE_PATH
+    global OCR_CACHE_ENABLED, PHASH_ENABLED, PHASH_DISTANCE
+    global API_CACHE_ENABLED, API_CACHE_TTL_SECONDS, API_CACHE_SIZE_BYTES
+    global API_RETRY_POLICY, api_breaker
+    
     print("=" * 50)
     print("小红书融稿工具 - 数据处理模块")
     print("=" * 50)
     
+    args = parse_args()
+    
+    # 续跑中断的任务：笔记列表取自任务日志
+    resume_state = None
+    if args.resume:
+        resume_state = load_journal(args.resume)
+        if resume_state is None:
+            print(f"\n错误：找不到任务 {args.resume} 的日志 (ronggao_output/{args.resume}/journal.jsonl)")
+            sys.exit(1)
+    
     # 检查命令行参数
-    if len(sys.argv) < 2:
+    if args.notes is None and resume_state is None:
         print("\n错误：请提供笔记ID列表")
         print("用法：python xhs_processor.py \"笔记ID列表\"")
         print("\n示例：")
         print('  python xhs_processor.py "1. 68a9a370000000001b037dc0"')
         sys.exit(1)
     
-    # 获取输入
-    note_ids_input = sys.argv[1]
-    
     # 解析笔记ID或URL
-    note_items = parse_note_ids(note_ids_input)
+    if resume_state is not None:
+        note_items = resume_state["items"]
+    else:
+        note_items = parse_note_ids(args.notes)
     
     if not note_items:
         print("\n错误：未找到有效的笔记ID或URL")
@@ -546,47 +1895,193 @@ def main():
     for i, item in enumerate(note_items, 1):
         if item.startswith('http'):
             # 从URL提取ID显示
-            import re
-            match = re.search(r'[0-9a-f]{24}', item.lower())
-            if match:
-                print(f"  {i}. {match.group()} (带token)")
+            note_id = extract_note_id(item)
+            if note_id:
+                print(f"  {i}. {note_id} (带token)")
         else:
             print(f"  {i}. {item}")
     
-    # 检查API服务状态
-    if not check_xhs_api_status():
-        sys.exit(1)
+    # 以下只设置参数，不创建连接、进程或数据库
+    set_api_base(args.api_base)
+    # 配置OCR后端：优先使用常驻OCR服务
+    ocr_server_client = None if args.no_ocr_server else OcrServerClient(args.ocr_server)
+    OCR_CACHE_ENABLED = not args.no_ocr_cache
+    API_CACHE_ENABLED = not args.no_api_cache
+    API_CACHE_TTL_SECONDS = args.api_cache_ttl * 3600
+    API_CACHE_SIZE_BYTES = args.api_cache_size * 1024 * 1024
+    API_RETRY_POLICY = RetryPolicy(attempts=args.api_retries)
+    api_breaker = CircuitBreaker(threshold=args.breaker_threshold, cooldown=args.breaker_cooldown)
+    PHASH_ENABLED = not args.no_phash
+    PHASH_DISTANCE = args.phash_distance
+    # 写入环境变量，多进程识别池的工作进程（spawn启动）使用同样的缩放上限和文字判断方式
+    OCR_MAX_SIDE = args.ocr_max_side
+    os.environ["XHS_OCR_MAX_SIDE"] = str(OCR_MAX_SIDE)
+    OCR_TEXT_GATE = args.text_gate
+    os.environ["XHS_OCR_TEXT_GATE"] = OCR_TEXT_GATE
+    OCR_PROFILE_ENABLED = OCR_PROFILE_ENABLED and not args.no_ocr_profile
+    os.environ["XHS_OCR_PROFILE"] = "on" if OCR_PROFILE_ENABLED else "off"
+    if args.ocr_profile:
+        OCR_PROFILE_PATH = os.path.abspath(args.ocr_profile)
+        os.environ["XHS_OCR_PROFILE_PATH"] = OCR_PROFILE_PATH
+        if OCR_PROFILE_ENABLED and get_ocr_profile() is None:
+            print(f"⚠ 无法读取调优配置 {OCR_PROFILE_PATH}，使用默认参数")
     
-    # 生成任务ID
-    task_id = generate_task_id()
+    if args.metrics_port is not None:
+        start_metrics_exporter(args.metrics_port, args.metrics_host)
+    
+    if resume_state is not None:
+        indices, done_contents = plan_resume(resume_state)
+    else:
+        indices, done_contents = list(range(len(note_items))), {}
+    
+    # 全部笔记都已处理过时直接读取现有内容：按阶段清单和content.md判断是否完成
+    # （只有没有清单的旧笔记才查询状态目录），不创建HTTP连接池、OCR识别池和图片下载器，
+    # 也不检查API服务
+    ocr_batch_size = args.ocr_batch_size
+    work_items = notes_needing_work([note_items[i] for i in indices])
+    if work_items:
+        import sqlite3
+        from catalog import get_catalog
+        from image_downloader import configure_downloader
+        
+        # 批量查询状态目录，统计已完成的笔记
+        catalog = get_catalog()
+        if catalog is not None:
+            ids = [i for i in (extract_note_id(item) for item in note_items) if i]
+            try:
+                pending = catalog.pending(ids)
+                print(f"\n状态目录: {len(ids) - len(pending)} 个笔记已完成, {len(pending)} 个待处理")
+            except sqlite3.Error as e:
+                print(f"\n⚠ 状态目录查询失败: {e}")
+        
+        # 创建共享的长连接HTTP客户端
+        configure_client(
+            pool_sizes={XHS_API_BASE: args.api_pool_size},
+            default_pool_size=args.cdn_pool_size,
+            http2=args.http2
+        )
+        
+        # 只有需要调用API的笔记才检查API服务状态
+        fetch_items = notes_needing_api(work_items)
+        if fetch_items:
+            print(f"\n需要调用API: {len(fetch_items)} 个笔记")
+            if not api_reachable():
+                sys.exit(1)
+        else:
+            print("\n✓ 所有笔记均已有数据，跳过API服务检查")
+        
+        # 多进程OCR：每个进程一个引擎，进程数 × 线程数不超过CPU核心数
+        if args.ocr_processes > 1:
+            from ocr_pool import OcrProcessPool
+            ocr_pool = OcrProcessPool(args.ocr_processes, cpu_threads=args.ocr_threads)
+            # 每批至少给每个进程分到一张图片
+            ocr_batch_size = max(ocr_batch_size, ocr_pool.workers)
+            print(f"✓ 多进程OCR: {ocr_pool.workers} 个进程 × {ocr_pool.cpu_threads} 线程")
+        elif args.ocr_threads:
+            OCR_CPU_THREADS = args.ocr_threads
+        
+        # 配置图片下载的并发与限速（未指定的参数使用下载器的默认值）
+        limits = {"per_host": args.per_host_downloads, "rate": args.download_rate}
+        configure_downloader(**{k: v for k, v in limits.items() if v is not None})
+    else:
+        print("\n✓ 所有笔记均已处理，跳过API服务检查和OCR初始化")
+    
+    # 生成任务ID（续跑时沿用原任务ID和输出目录）
+    task_id = args.resume or generate_task_id()
     print(f"\n任务ID: {task_id}")
+    journal = TaskJournal(task_id)
+    metrics = None if args.no_metrics else TaskMetrics(task_id)
+    set_metrics(metrics)
+    if args.resume:
+        print(f"继续任务: {len(done_contents)} 个笔记已完成, {len(indices)} 个待处理")
+    else:
+        journal.start(note_items)
     
-    # 处理每个笔记
+    # 处理笔记：获取、下载、OCR、生成内容分阶段并发执行
     print("\n" + "=" * 50)
     print("开始处理笔记")
     print("=" * 50)
     
-    all_contents = []
-    for note_item in note_items:
-        content = process_note(note_item, task_id)
-        all_contents.append(content)
+    workers = {
+        "fetch": args.fetch_workers,
+        "download": args.download_workers,
+        "ocr": args.ocr_workers,
+        "build": args.build_workers,
+    }
+    merged_writer = MergedWriter(task_id, note_items).open() if args.stream_merged else None
+    if merged_writer is not None:
+        for index, content in done_contents.items():
+            merged_writer.add(index, content)
+    
+    # 第一次Ctrl+C：不再开始新的笔记，等进行中的笔记完成并写入日志；第二次强制退出
+    stop = threading.Event()
+    
+    def on_sigint(signum, frame):
+        if stop.is_set():
+            # 第二次：立即中断主线程，流水线和OCR池不再等待阻塞中的工作线程/进程
+            print("\n✗ 强制退出")
+            raise KeyboardInterrupt
+        stop.set()
+        print("\n⚠ 收到中断信号，等待进行中的笔记完成后退出（再次按 Ctrl+C 强制退出）...")
+    
+    previous_handler = signal.signal(signal.SIGINT, on_sigint)
+    aborted = False
+    try:
+        results = run_pipeline([note_items[i] for i in indices], task_id, workers=workers,
+                               queue_size=args.queue_size,
+                               ocr_batch_size=ocr_batch_size,
+                               merged_writer=merged_writer,
+                               journal=journal, indices=indices, stop=stop)
+    except KeyboardInterrupt:
+        aborted = True
+        raise
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if ocr_pool is not None:
+            ocr_pool.close(wait=not aborted)
+        # 中断的任务只保留已写入的笔记，merged.json保持未完成，续跑时重写
+        if merged_writer is not None and (aborted or stop.is_set()):
+            merged_writer.abort()
+        elif merged_writer is not None:
+            merged_writer.close()
+    
+    all_contents = [done_contents.get(i) for i in range(len(note_items))]
+    for index, content in zip(indices, results):
+        all_contents[index] = content
+    
+    if stop.is_set():
+        journal.interrupted()
+        done = len([c for c in all_contents if c is not None])
+        print(f"\n⚠ 任务已中断: {done}/{len(note_items)} 个笔记已完成，结果已写入任务日志")
+        print(f"  继续处理: python xhs_processor.py --resume {task_id}")
+        finish_metrics(metrics)
+        stop_metrics_exporter()
+        return task_id
     
     # 生成合并文件
     print("\n" + "=" * 50)
     print("生成合并文档")
     print("=" * 50)
     
-    generate_merged_md(task_id, all_contents, note_items)
+    if merged_writer is not None:
+        print(f"\n✓ 合并文档已流式写入: ronggao_output/{task_id}/merged.md")
+    else:
+        generate_merged_md(task_id, all_contents, note_items)
     
     # 输出统计
     success_count = len([c for c in all_contents if c is not None])
     fail_count = len(note_items) - success_count
+    journal.finish(success_count, fail_count)
     
     print("\n" + "=" * 50)
     print("处理完成")
     print("=" * 50)
     print(f"✓ 任务ID: {task_id}")
     print(f"✓ 成功处理: {success_count} 个笔记")
+    report_ocr_throughput(ocr_batch_size)
+    report_api_resilience()
+    finish_metrics(metrics)
+    stop_metrics_exporter()
     if fail_count > 0:
         print(f"✗ 失败处理: {fail_count} 个笔记")
         print(f"  查看错误日志: ronggao_output/{task_id}/error.log")
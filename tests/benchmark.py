@@ -0,0 +1,393 @@
+"""
+端到端处理流程基准测试
+在临时项目目录中生成合成语料，计时输入解析、content.md/merged.md生成、
+状态检查，以及对桩服务（API、图片CDN、OCR引擎）的完整process_note流程；
+结果写入JSON，可与保存的基线比较并标记性能回退
+
+用法：
+    python tests/benchmark.py --notes 1000 --output bench.json
+    python tests/benchmark.py --notes 1000 --baseline bench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+from catalog import catalog_path, get_catalog
+from image_downloader import configure_downloader
+from image_preprocess import prepare_image
+from synthetic_corpus import generate_corpus, make_api_data, image_lines, render_image, find_font, note_id_for
+from utils import parse_note_ids, is_note_complete, has_metadata, has_ocr_results
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2      # 比基线慢超过20%视为回退
+PROCESS_NOTES_LIMIT = 100    # 完整流程默认最多处理的笔记数
+FRESH_PREFIX = "6f"          # 完整流程使用的新笔记ID前缀（与语料不重叠）
+LARGE_IMAGE_SIZE = (1440, 1920)  # OCR预处理基准使用的大图尺寸（常见的小红书原图）
+
+
+class _StubResult:
+    """与PaddleOCR 3.x单张结果相同的json结构"""
+
+    def __init__(self, lines):
+        self.json = {"res": {"rec_texts": lines}}
+
+
+class StubOcr:
+    """按图片路径返回预先确定的文字的OCR引擎桩"""
+
+    def __init__(self, texts):
+        """
+        Args:
+            texts: 图片路径 -> 文本行
+        """
+        self.texts = texts
+
+    def predict(self, input):
+        paths = input if isinstance(input, list) else [input]
+        return [_StubResult(self.texts.get(str(Path(p).resolve()), [])) for p in paths]
+
+
+def _timed(func, repeat):
+    """
+    重复执行func并返回每次的耗时
+
+    Args:
+        func: 被测函数
+        repeat: 重复次数
+
+    Returns:
+        list: 每次耗时（秒）
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def _result(runs, items):
+    median = statistics.median(runs)
+    return {
+        "seconds": round(median, 6),
+        "runs": [round(r, 6) for r in runs],
+        "items": items,
+        "per_item_ms": round(median * 1000 / max(items, 1), 4),
+    }
+
+
+def _status_checks(note_ids):
+    for note_id in note_ids:
+        is_note_complete(note_id)
+        has_metadata(note_id)
+        has_ocr_results(note_id)
+
+
+def bench_corpus(root, note_ids, repeat):
+    """
+    计时对已有语料的操作
+
+    Args:
+        root: 项目根目录
+        note_ids: 语料笔记ID列表
+        repeat: 重复次数
+
+    Returns:
+        dict: 基准项名称 -> 结果
+    """
+    results = {}
+    count = len(note_ids)
+
+    # 混合ID、URL和带序号列表的用户输入
+    text = "\n".join(
+        f"{i + 1}. https://www.xiaohongshu.com/explore/{nid}?xsec_token=abc" if i % 2 else nid
+        for i, nid in enumerate(note_ids)
+    )
+    results["parse_note_ids"] = _result(_timed(lambda: parse_note_ids(text), repeat), count)
+    results["parse_note_ids_plain"] = _result(
+        _timed(lambda: parse_note_ids("\n".join(note_ids)), repeat), count)
+
+    results["generate_content_md"] = _result(
+        _timed(lambda: [xhs_processor.generate_content_md(nid) for nid in note_ids], repeat), count)
+
+    contents = [utils.read_content_md(nid) for nid in note_ids]
+    results["generate_merged_md"] = _result(
+        _timed(lambda: xhs_processor.generate_merged_md("bench_merged", contents, note_ids), repeat),
+        count)
+
+    # 状态检查：有状态目录时查询SQLite，没有时按阶段清单和文件判断
+    results["status_checks_catalog"] = _result(_timed(lambda: _status_checks(note_ids), repeat), count)
+    results["catalog_pending"] = _result(
+        _timed(lambda: get_catalog().pending(note_ids), repeat), count)
+
+    db = catalog_path()
+    moved = f"{db}.bench"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db + suffix):
+            os.replace(db + suffix, moved + suffix)
+    try:
+        results["status_checks_files"] = _result(_timed(lambda: _status_checks(note_ids), repeat), count)
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(moved + suffix):
+                os.replace(moved + suffix, db + suffix)
+    return results
+
+
+def bench_preprocess(root, repeat, font_path=None):
+    """
+    计时大图送入OCR前的解码：全尺寸解码 vs draft模式解码并缩小
+
+    Args:
+        root: 项目根目录
+        repeat: 重复次数
+
+    Returns:
+        dict: 基准项名称 -> 结果
+    """
+    import numpy as np
+    from PIL import Image
+
+    images = []
+    for i in range(4):
+        path = Path(root) / f"large_{i}.jpg"
+        render_image(path, image_lines("large", i, random.Random(i)), find_font(font_path), i)
+        with Image.open(path) as img:
+            img.resize(LARGE_IMAGE_SIZE, Image.BICUBIC).save(path, quality=90)
+        images.append(path)
+
+    def full_decode():
+        for path in images:
+            with Image.open(path) as img:
+                np.asarray(img.convert('RGB'))
+
+    def prepared():
+        for path in images:
+            prepare_image(path, xhs_processor.OCR_MAX_SIDE)
+
+    return {
+        "ocr_decode_full": _result(_timed(full_decode, repeat), len(images)),
+        "ocr_prepare_image": _result(_timed(prepared, repeat), len(images)),
+    }
+
+
+def bench_process_note(root, notes, images, repeat, seed, font_path=None):
+    """
+    计时完整的process_note流程（API、图片下载和OCR均为桩，不访问网络也不需要PaddleOCR）
+
+    每次重复都使用一批新的笔记，并关闭OCR缓存和pHash复用，保证每张图片都经过识别
+
+    Args:
+        root: 项目根目录
+        notes: 每次处理的笔记数
+        images: 每个笔记的图片数
+        repeat: 重复次数
+        seed: 随机种子
+        font_path: 中文字体路径
+
+    Returns:
+        dict: 结果
+    """
+    rng = random.Random(seed)
+    font = find_font(font_path)
+    responses = {}
+    jpegs = {}
+    texts = {}
+    batches = []
+    scratch = Path(root) / "bench_images"
+    scratch.mkdir(exist_ok=True)
+    for r in range(repeat):
+        batch = []
+        for n in range(notes):
+            note_id = note_id_for(r * notes + n, prefix=FRESH_PREFIX)
+            api = make_api_data(note_id, rng, images)
+            responses[note_id] = api
+            for idx, url in enumerate(api["data"]["下载地址"]):
+                lines = image_lines(note_id, idx, rng)
+                tmp = scratch / f"{note_id}_{idx}.jpg"
+                render_image(tmp, lines, font, seed=r * 100000 + n * 100 + idx)
+                jpegs[url] = tmp.read_bytes()
+                img_path = Path(utils.get_project_path("xhs_notes", note_id, "images", f"{idx}.jpg"))
+                texts[str(img_path.resolve())] = lines
+            batch.append(note_id)
+        batches.append(batch)
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    def fetch(url, img_path):
+        Path(img_path).write_bytes(jpegs[url])
+        return None
+
+    def api(note_id_or_url):
+        return responses.get(utils.extract_note_id(note_id_or_url))
+
+    saved = {name: getattr(xhs_processor, name) for name in
+             ("ocr", "ocr_server_client", "ocr_pool", "OCR_CACHE_ENABLED", "PHASH_ENABLED")}
+    xhs_processor.ocr = StubOcr(texts)
+    xhs_processor.ocr_server_client = None
+    xhs_processor.ocr_pool = None
+    xhs_processor.OCR_CACHE_ENABLED = False
+    xhs_processor.PHASH_ENABLED = False
+    configure_downloader(fetch=fetch, rate=1e6, burst=1000)
+    pending = iter(batches)
+    runs = []
+    try:
+        with mock.patch.object(xhs_processor, "download_note_via_api", side_effect=api):
+            for _ in range(repeat):
+                batch = next(pending)
+                start = time.perf_counter()
+                contents = [xhs_processor.process_note(nid, "bench_process") for nid in batch]
+                runs.append(time.perf_counter() - start)
+                failed = sum(1 for c in contents if c is None)
+                if failed:
+                    raise RuntimeError(f"{failed} 个笔记处理失败")
+    finally:
+        for name, value in saved.items():
+            setattr(xhs_processor, name, value)
+        configure_downloader()
+    return _result(runs, notes)
+
+
+def run_benchmarks(notes, images=3, repeat=DEFAULT_REPEAT, process_notes=None, seed=0,
+                   render=True, font_path=None):
+    """
+    在临时项目目录中生成语料并执行全部基准项
+
+    Args:
+        notes: 语料笔记数
+        images: 每个笔记的图片数
+        repeat: 每项重复次数（取中位数）
+        process_notes: 完整流程处理的笔记数，None为min(notes, 100)，0跳过
+        seed: 随机种子
+        render: 语料是否渲染JPEG图片
+        font_path: 中文字体路径
+
+    Returns:
+        dict: {"meta": 运行环境与参数, "results": 基准项名称 -> 结果}
+    """
+    if process_notes is None:
+        process_notes = min(notes, PROCESS_NOTES_LIMIT)
+
+    root = tempfile.mkdtemp(prefix="xhs_bench_")
+    original_root = utils.PROJECT_ROOT
+    results = {}
+    try:
+        # 处理器的逐条输出会淹没计时结果，丢弃
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            start = time.perf_counter()
+            note_ids = generate_corpus(root, notes, images, seed, render=render, font_path=font_path)
+            results["generate_corpus"] = _result([time.perf_counter() - start], notes)
+
+            utils.PROJECT_ROOT = root
+            results.update(bench_corpus(root, note_ids, repeat))
+            if render:
+                results.update(bench_preprocess(root, repeat, font_path))
+            if process_notes:
+                results["process_note"] = bench_process_note(
+                    root, process_notes, images, repeat, seed + 1, font_path)
+    finally:
+        utils.PROJECT_ROOT = original_root
+        shutil.rmtree(root, ignore_errors=True)
+
+    meta = {
+        "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "notes": notes,
+        "images_per_note": images,
+        "repeat": repeat,
+        "process_notes": process_notes,
+        "rendered": render,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    与基线比较每条目的耗时
+
+    Args:
+        current: 本次结果
+        baseline: 基线结果
+        threshold: 允许的相对变慢比例
+
+    Returns:
+        list: (名称, 基线ms/条, 本次ms/条, 相对变化, 是否回退)，基线中没有的项跳过
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("per_item_ms"):
+            continue
+        change = result["per_item_ms"] / base["per_item_ms"] - 1
+        rows.append((name, base["per_item_ms"], result["per_item_ms"], change, change > threshold))
+    return rows
+
+
+def print_results(report):
+    """打印结果表"""
+    meta = report["meta"]
+    print(f"\n基准测试: {meta['notes']} 个笔记 × {meta['images_per_note']} 张图片，"
+          f"重复 {meta['repeat']} 次（取中位数）")
+    print(f"{'项目':<24}{'总耗时(s)':>12}{'条目':>8}{'ms/条':>12}")
+    for name, result in report["results"].items():
+        print(f"{name:<24}{result['seconds']:>12.4f}{result['items']:>8}{result['per_item_ms']:>12.4f}")
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='端到端处理流程基准测试')
+    parser.add_argument('--notes', type=int, default=100, help='合成笔记数（10 ~ 10000）')
+    parser.add_argument('--images', type=int, default=3, help='每个笔记的图片数')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='每项重复次数')
+    parser.add_argument('--process-notes', type=int, default=None,
+                        help=f'完整流程处理的笔记数（默认min(笔记数, {PROCESS_NOTES_LIMIT})，0跳过）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--no-render', action='store_true', help='语料不渲染JPEG图片（只测文本处理）')
+    parser.add_argument('--font', default=None, help='中文字体路径')
+    parser.add_argument('--output', default=None, help='结果JSON输出路径')
+    parser.add_argument('--baseline', default=None, help='基线结果JSON，与之比较')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'比基线慢多少视为回退（比例，默认{DEFAULT_THRESHOLD}）')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.notes, args.images, max(1, args.repeat), args.process_notes,
+                            args.seed, render=not args.no_render, font_path=args.font)
+    print_results(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n✓ 结果已保存: {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        rows = compare(report, baseline, args.threshold)
+        print(f"\n与基线比较（阈值 +{args.threshold:.0%}）:")
+        for name, base, now, change, regressed in rows:
+            mark = "✗" if regressed else "✓"
+            print(f"  {mark} {name:<24}{base:>10.4f} → {now:<10.4f} ms/条 ({change:+.1%})")
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print(f"\n✗ 性能回退: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✓ 没有性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+本地模拟 XHS-Downloader API 与图片CDN（用于压测和故障注入）
+实现 /docs、/xhs/detail（与真实服务相同的中文字段名）和 /cdn/{note_id}/{序号}.jpg，
+API和CDN可分别配置延迟分布、错误率、超时率和限流
+
+启动方式：
+    python tests/fake_xhs_server.py --port 5556 --api-latency lognormal:80,0.5 --api-error-rate 0.05
+    python scripts/xhs_processor.py --api-base http://127.0.0.1:5556 "..."
+"""
+
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from synthetic_corpus import make_api_data, image_lines, render_image, find_font
+
+NOTE_ID_PATTERN = re.compile(r'[0-9a-f]{24}')
+CDN_PATH_PATTERN = re.compile(r'^/cdn/([0-9a-f]{24})/(\d+)\.jpg$')
+HANG_SECONDS = 120.0   # 注入超时时响应挂起的时间（秒），应大于客户端超时
+
+
+class Latency:
+    """
+    延迟分布（毫秒），由字符串描述：
+        const:50             固定50ms
+        uniform:20,200       20~200ms均匀分布
+        exp:50               均值50ms的指数分布
+        lognormal:80,0.5     中位数80ms、对数标准差0.5的对数正态分布
+    """
+
+    KINDS = ("const", "uniform", "exp", "lognormal")
+
+    def __init__(self, spec="const:0"):
+        """
+        Args:
+            spec: 分布描述
+
+        Raises:
+            ValueError: 描述格式错误
+        """
+        kind, _, params = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的延迟分布: {kind}（可选 {', '.join(self.KINDS)}）")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p] or [0.0]
+        self.spec = spec
+
+    def sample(self, rng):
+        """
+        抽取一次延迟
+
+        Args:
+            rng: 随机数生成器
+
+        Returns:
+            float: 延迟（秒）
+        """
+        p = self.params
+        if self.kind == "uniform":
+            ms = rng.uniform(p[0], p[1] if len(p) > 1 else p[0])
+        elif self.kind == "exp":
+            ms = rng.expovariate(1 / p[0]) if p[0] > 0 else 0
+        elif self.kind == "lognormal":
+            ms = p[0] * rng.lognormvariate(0, p[1] if len(p) > 1 else 0.5)
+        else:
+            ms = p[0]
+        return max(ms, 0) / 1000
+
+
+class Faults:
+    """
+    单个端点（API或CDN）的故障配置与统计（线程安全）
+    """
+
+    def __init__(self, latency="const:0", error_rate=0.0, timeout_rate=0.0, rate=0.0,
+                 hang=HANG_SECONDS):
+        """
+        Args:
+            latency: 延迟分布描述（见Latency）
+            error_rate: 返回500的比例
+            timeout_rate: 挂起hang秒后才响应的比例（模拟超时）
+            rate: 每秒允许的请求数，超出返回429（<=0不限流）
+            hang: 注入超时时挂起的秒数
+        """
+        self.latency = Latency(latency) if isinstance(latency, str) else latency
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.rate = rate
+        self.hang = hang
+        self.counts = {"requests": 0, "ok": 0, "errors": 0, "timeouts": 0, "rate_limited": 0}
+        self._tokens = max(rate, 1.0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_token(self):
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def decide(self, rng):
+        """
+        决定本次请求的处理方式
+
+        Args:
+            rng: 随机数生成器
+
+        Returns:
+            tuple: (动作, 延迟秒数)，动作为 "ok" / "error" / "timeout" / "rate_limited"
+        """
+        with self._lock:
+            self.counts["requests"] += 1
+            if not self._take_token():
+                action = "rate_limited"
+            else:
+                roll = rng.random()
+                if roll < self.timeout_rate:
+                    action = "timeout"
+                elif roll < self.timeout_rate + self.error_rate:
+                    action = "error"
+                else:
+                    action = "ok"
+            key = {"ok": "ok", "error": "errors", "timeout": "timeouts",
+                   "rate_limited": "rate_limited"}[action]
+            self.counts[key] += 1
+            delay = self.latency.sample(rng)
+        return action, delay
+
+    def stats(self):
+        """各类响应的计数"""
+        with self._lock:
+            return dict(self.counts)
+
+
+class FakeXhsHandler(BaseHTTPRequestHandler):
+    """模拟XHS-Downloader和图片CDN的请求处理"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    def _apply_faults(self, faults):
+        """按故障配置延迟或返回错误，返回True表示已响应"""
+        server = self.server
+        action, delay = faults.decide(server.rng_for_thread())
+        if action == "timeout":
+            server.stopped.wait(faults.hang)
+        elif delay:
+            time.sleep(delay)
+        if action == "error":
+            self._send_json(500, {"message": "模拟服务端错误"})
+            return True
+        if action == "rate_limited":
+            self._send_json(429, {"message": "请求过于频繁"})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path == "/docs":
+            self._send(200, b"<html><title>XHS-Downloader (fake)</title></html>", "text/html")
+            return
+        match = CDN_PATH_PATTERN.match(self.path)
+        if not match:
+            self._send_json(404, {"message": "Not Found"})
+            return
+        if self._apply_faults(self.server.cdn):
+            return
+        body = self.server.image_bytes(match.group(1), int(match.group(2)))
+        if body is None:
+            self._send_json(404, {"message": "图片不存在"})
+            return
+        # 支持断点续传的Range请求
+        range_match = re.match(r'bytes=(\d+)-$', self.headers.get("Range", ""))
+        if range_match:
+            start = int(range_match.group(1))
+            if start >= len(body):
+                self._send(416, b"", "image/jpeg", {"Content-Range": f"bytes */{len(body)}"})
+                return
+            self._send(206, body[start:], "image/jpeg",
+                       {"Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"})
+            return
+        self._send(200, body, "image/jpeg")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length) if length else b""
+        if self.path != "/xhs/detail":
+            self._send_json(404, {"message": "Not Found"})
+            return
+        if self._apply_faults(self.server.api):
+            return
+        try:
+            url = json.loads(raw or b"{}").get("url", "")
+        except ValueError:
+            url = ""
+        match = NOTE_ID_PATTERN.search(url.lower())
+        if not match:
+            self._send_json(200, {"message": "获取小红书作品数据失败", "data": {}})
+            return
+        self._send_json(200, self.server.note_response(match.group(0)))
+
+
+class FakeXhsServer(ThreadingHTTPServer):
+    """
+    模拟XHS-Downloader API与图片CDN
+
+    笔记数据和图片由笔记ID确定性生成（同一ID每次返回相同内容），图片渲染后缓存在内存中
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, api=None, cdn=None, images=3, seed=0,
+                 font_path=None):
+        """
+        Args:
+            host: 监听地址
+            port: 端口，0表示自动分配
+            api: /xhs/detail 的故障配置（Faults）
+            cdn: 图片的故障配置（Faults）
+            images: 每个笔记的图片数
+            seed: 随机种子
+            font_path: 中文字体路径
+        """
+        super().__init__((host, port), FakeXhsHandler)
+        self.api = api or Faults()
+        self.cdn = cdn or Faults()
+        self.images = images
+        self.seed = seed
+        self.font = find_font(font_path)
+        self.stopped = threading.Event()
+        self._images = {}
+        self._images_lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = None
+
+    @property
+    def url(self):
+        """服务地址，如 http://127.0.0.1:5556"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def rng_for_thread(self):
+        """每个处理线程独立的随机数生成器"""
+        rng = getattr(self._local, "rng", None)
+        if rng is None:
+            rng = self._local.rng = random.Random(f"{self.seed}-{threading.get_ident()}")
+        return rng
+
+    def note_response(self, note_id):
+        """
+        生成笔记的API响应（下载地址指向本服务的/cdn路径）
+
+        Args:
+            note_id: 笔记ID
+
+        Returns:
+            dict: API响应
+        """
+        result = make_api_data(note_id, random.Random(f"{self.seed}-{note_id}"), self.images)
+        result["data"]["作品链接"] = f"https://www.xiaohongshu.com/explore/{note_id}"
+        result["data"]["下载地址"] = [f"{self.url}/cdn/{note_id}/{i}.jpg" for i in range(self.images)]
+        return result
+
+    def image_bytes(self, note_id, idx):
+        """
+        笔记第idx张图片的JPEG数据
+
+        Returns:
+            bytes: 图片数据，序号超出图片数时返回None
+        """
+        if idx >= self.images:
+            return None
+        key = (note_id, idx)
+        with self._images_lock:
+            cached = self._images.get(key)
+        if cached is not None:
+            return cached
+        lines = image_lines(note_id, idx, random.Random(f"{self.seed}-{note_id}-{idx}"))
+        buffer = io.BytesIO()
+        render_image(buffer, lines, self.font, seed=int(note_id[-6:], 16) * 100 + idx)
+        data = buffer.getvalue()
+        with self._images_lock:
+            self._images[key] = data
+        return data
+
+    def handle_error(self, request, client_address):
+        # 客户端超时后断开连接属于预期情况，不打印异常
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-xhs", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务（挂起中的请求立即返回）"""
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+    def stats(self):
+        """API和CDN各类响应的计数"""
+        return {"api": self.api.stats(), "cdn": self.cdn.stats()}
+
+
+def add_fault_args(parser):
+    """添加API和CDN的故障注入参数（服务和压测共用）"""
+    for name, label in (("api", "API"), ("cdn", "图片CDN")):
+        parser.add_argument(f'--{name}-latency', default="const:0",
+                            help=f'{label}延迟分布（毫秒）：const:50 / uniform:20,200 / exp:50 / lognormal:80,0.5')
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0.0,
+                            help=f'{label}返回500的比例')
+        parser.add_argument(f'--{name}-timeout-rate', type=float, default=0.0,
+                            help=f'{label}挂起不响应（模拟超时）的比例')
+        parser.add_argument(f'--{name}-rate', type=float, default=0.0,
+                            help=f'{label}每秒允许的请求数，超出返回429（<=0不限流）')
+    parser.add_argument('--hang', type=float, default=HANG_SECONDS,
+                        help='模拟超时时挂起的秒数')
+    parser.add_argument('--images', type=int, default=3, help='每个笔记的图片数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--font', default=None, help='中文字体路径')
+
+
+def server_from_args(args, host="127.0.0.1", port=0):
+    """按命令行参数创建模拟服务"""
+    def faults(name):
+        return Faults(
+            latency=getattr(args, f"{name}_latency"),
+            error_rate=getattr(args, f"{name}_error_rate"),
+            timeout_rate=getattr(args, f"{name}_timeout_rate"),
+            rate=getattr(args, f"{name}_rate"),
+            hang=args.hang
+        )
+    return FakeXhsServer(host, port, api=faults("api"), cdn=faults("cdn"),
+                         images=args.images, seed=args.seed, font_path=args.font)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='模拟XHS-Downloader API与图片CDN')
+    parser.add_argument('--host', default="127.0.0.1", help='监听地址')
+    parser.add_argument('--port', type=int, default=5556, help='监听端口')
+    add_fault_args(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.host, args.port)
+    print(f"✓ 模拟XHS-Downloader已启动: {server.url}")
+    print(f"  API: 延迟 {server.api.latency.spec}, 错误率 {args.api_error_rate:.0%}, "
+          f"超时率 {args.api_timeout_rate:.0%}, 限流 {args.api_rate or '无'}")
+    print(f"  CDN: 延迟 {server.cdn.latency.spec}, 错误率 {args.cdn_error_rate:.0%}, "
+          f"超时率 {args.cdn_timeout_rate:.0%}, 限流 {args.cdn_rate or '无'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stopped.set()
+        server.server_close()
+        print(f"\n请求统计: {json.dumps(server.stats(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+压测：用处理流水线对本地模拟XHS-Downloader/CDN处理一批新笔记
+报告吞吐（笔记/秒）和单个笔记延迟（从调用API到内容生成完成）的p50/p95
+
+用法：
+    python tests/load_harness.py --notes 200 --api-latency lognormal:80,0.5 --api-error-rate 0.05
+    python tests/load_harness.py --notes 500 --cdn-latency uniform:20,300 --cdn-rate 50 --output load.json
+"""
+
+import argparse
+import json
+import math
+import shutil
+import sys
+import tempfile
+import time
+import os
+from contextlib import redirect_stdout
+from functools import partial
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+import http_client
+from http_client import HttpClient, API_POOL_SIZE, CDN_POOL_SIZE
+from image_downloader import configure_downloader, fetch_image, PER_HOST_CONCURRENCY
+from pipeline import DEFAULT_WORKERS
+from resilience import RetryPolicy, CircuitBreaker, RETRY_ATTEMPTS, RETRY_BASE_DELAY
+from benchmark import StubOcr
+from fake_xhs_server import add_fault_args, server_from_args
+from synthetic_corpus import note_id_for
+
+LOAD_PREFIX = "7a"        # 压测笔记ID前缀
+API_TIMEOUT = 5.0         # 压测时API请求超时（秒）
+CDN_TIMEOUT = 5.0         # 压测时图片下载超时（秒）
+
+# 压测期间修改的处理器配置，结束后恢复
+PROCESSOR_GLOBALS = (
+    "XHS_API_BASE", "XHS_API_URL", "XHS_API_DOCS_URL", "XHS_API_TIMEOUT",
+    "API_RETRY_POLICY", "api_breaker", "ocr", "ocr_server_client", "ocr_pool",
+)
+
+
+class SlowStubOcr(StubOcr):
+    """每张图片耗时固定时间的OCR引擎桩（模拟识别耗时）"""
+
+    def __init__(self, seconds):
+        super().__init__({})
+        self.seconds = seconds
+
+    def predict(self, input):
+        paths = input if isinstance(input, list) else [input]
+        time.sleep(self.seconds * len(paths))
+        return super().predict(input)
+
+
+class LatencyRecorder:
+    """记录每个笔记首次调用API和处理完成的时间（作为run_pipeline的journal）"""
+
+    def __init__(self):
+        self.started = {}
+        self.finished = {}
+
+    def wrap_api(self, func):
+        def wrapper(note_id_or_url):
+            self.started.setdefault(utils.extract_note_id(note_id_or_url), time.perf_counter())
+            return func(note_id_or_url)
+        return wrapper
+
+    def record_note(self, index, item, note_id, success):
+        self.finished[note_id] = (time.perf_counter(), success)
+
+    def latencies(self):
+        """成功笔记的延迟（秒）"""
+        return sorted(
+            end - self.started[note_id]
+            for note_id, (end, success) in self.finished.items()
+            if success and note_id in self.started
+        )
+
+
+def percentile(values, pct):
+    """
+    最近秩百分位数
+
+    Args:
+        values: 已排序的数值列表
+        pct: 百分位（0~100）
+
+    Returns:
+        float: 百分位数，空列表返回None
+    """
+    if not values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def run_load(server, notes, workers=None, api_timeout=API_TIMEOUT, cdn_timeout=CDN_TIMEOUT,
+             api_retries=RETRY_ATTEMPTS, retry_delay=RETRY_BASE_DELAY, pool_size=CDN_POOL_SIZE,
+             per_host=PER_HOST_CONCURRENCY, download_rate=0, ocr_seconds=0.0, verbose=False):
+    """
+    在临时项目目录中对模拟服务处理一批新笔记
+
+    Args:
+        server: 已启动的FakeXhsServer
+        notes: 笔记数
+        workers: 各阶段并发数，默认DEFAULT_WORKERS
+        api_timeout: API请求超时（秒）
+        cdn_timeout: 图片下载超时（秒）
+        api_retries: API最多尝试次数
+        retry_delay: 首次重试前的退避上限（秒）
+        pool_size: 连接池大小
+        per_host: 每个图片域名的并发下载数
+        download_rate: 每个图片域名每秒请求数（<=0不限速）
+        ocr_seconds: 模拟每张图片的OCR耗时（秒）
+        verbose: 是否显示处理器输出
+
+    Returns:
+        dict: 吞吐、延迟、API统计和服务端统计
+    """
+    root = tempfile.mkdtemp(prefix="xhs_load_")
+    original_root = utils.PROJECT_ROOT
+    saved = {name: getattr(xhs_processor, name) for name in PROCESSOR_GLOBALS}
+    api_before = dict(xhs_processor.API_STATS)
+    original_api = xhs_processor.download_note_via_api
+    client = HttpClient(pool_sizes={server.url: max(pool_size, API_POOL_SIZE)},
+                        default_pool_size=pool_size)
+    original_client = http_client.set_client(client)
+    recorder = LatencyRecorder()
+    items = [note_id_for(n, prefix=LOAD_PREFIX) for n in range(notes)]
+
+    utils.PROJECT_ROOT = root
+    xhs_processor.set_api_base(server.url)
+    xhs_processor.XHS_API_TIMEOUT = api_timeout
+    xhs_processor.API_RETRY_POLICY = RetryPolicy(attempts=api_retries, base_delay=retry_delay)
+    xhs_processor.api_breaker = CircuitBreaker()
+    xhs_processor.ocr = SlowStubOcr(ocr_seconds)
+    xhs_processor.ocr_server_client = None
+    xhs_processor.ocr_pool = None
+    xhs_processor.download_note_via_api = recorder.wrap_api(original_api)
+    configure_downloader(per_host=per_host, rate=download_rate,
+                         fetch=partial(fetch_image, timeout=cdn_timeout))
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(sys.stdout if verbose else devnull):
+            start = time.perf_counter()
+            results = xhs_processor.run_pipeline(items, "load_test", workers=workers or DEFAULT_WORKERS,
+                                                 journal=recorder)
+            elapsed = time.perf_counter() - start
+    finally:
+        xhs_processor.download_note_via_api = original_api
+        for name, value in saved.items():
+            setattr(xhs_processor, name, value)
+        configure_downloader()
+        http_client.set_client(original_client)
+        client.close()
+        utils.PROJECT_ROOT = original_root
+        shutil.rmtree(root, ignore_errors=True)
+
+    success = len([r for r in results if r is not None])
+    latencies = recorder.latencies()
+    return {
+        "notes": notes,
+        "success": success,
+        "failed": notes - success,
+        "seconds": round(elapsed, 3),
+        "notes_per_sec": round(success / elapsed, 2) if elapsed > 0 else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_max": latencies[-1] if latencies else None,
+        "api": {key: xhs_processor.API_STATS[key] - api_before.get(key, 0)
+                for key in xhs_processor.API_STATS},
+        "server": server.stats(),
+    }
+
+
+def print_report(report):
+    """打印压测结果"""
+    def ms(value):
+        return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+    print(f"\n笔记: {report['success']}/{report['notes']} 成功，耗时 {report['seconds']:.2f} 秒")
+    print(f"吞吐: {report['notes_per_sec']} 笔记/秒")
+    print(f"单笔记延迟: p50 {ms(report['latency_p50'])}, p95 {ms(report['latency_p95'])}, "
+          f"最大 {ms(report['latency_max'])}")
+    api = report["api"]
+    print(f"API调用: {api['calls']} 次, 重试 {api['retries']} 次, 失败 {api['failures']} 次")
+    for name, counts in report["server"].items():
+        print(f"服务端{name.upper()}: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='对本地模拟XHS-Downloader/CDN压测处理流水线')
+    parser.add_argument('--notes', type=int, default=100, help='笔记数')
+    parser.add_argument('--fetch-workers', type=int, default=DEFAULT_WORKERS['fetch'], help='API获取阶段并发数')
+    parser.add_argument('--download-workers', type=int, default=DEFAULT_WORKERS['download'],
+                        help='图片下载阶段并发数')
+    parser.add_argument('--ocr-workers', type=int, default=DEFAULT_WORKERS['ocr'], help='OCR识别阶段并发数')
+    parser.add_argument('--build-workers', type=int, default=DEFAULT_WORKERS['build'], help='内容生成阶段并发数')
+    parser.add_argument('--api-timeout', type=float, default=API_TIMEOUT, help='API请求超时（秒）')
+    parser.add_argument('--cdn-timeout', type=float, default=CDN_TIMEOUT, help='图片下载超时（秒）')
+    parser.add_argument('--api-retries', type=int, default=RETRY_ATTEMPTS, help='API最多尝试次数（含首次）')
+    parser.add_argument('--retry-delay', type=float, default=RETRY_BASE_DELAY,
+                        help='API首次重试前的退避上限（秒）')
+    parser.add_argument('--pool-size', type=int, default=CDN_POOL_SIZE, help='连接池大小')
+    parser.add_argument('--per-host-downloads', type=int, default=PER_HOST_CONCURRENCY,
+                        help='每个图片域名的并发下载数')
+    parser.add_argument('--download-rate', type=float, default=0, help='每个图片域名每秒请求数（<=0不限速）')
+    parser.add_argument('--ocr-ms', type=float, default=0, help='模拟每张图片的OCR耗时（毫秒）')
+    parser.add_argument('--verbose', action='store_true', help='显示处理器输出')
+    parser.add_argument('--output', default=None, help='结果JSON输出路径')
+    add_fault_args(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    print(f"✓ 模拟服务: {server.url}（API延迟 {args.api_latency}，CDN延迟 {args.cdn_latency}）")
+    workers = {"fetch": args.fetch_workers, "download": args.download_workers,
+               "ocr": args.ocr_workers, "build": args.build_workers}
+    try:
+        report = run_load(server, args.notes, workers, args.api_timeout, args.cdn_timeout,
+                          args.api_retries, args.retry_delay, args.pool_size, args.per_host_downloads,
+                          args.download_rate, args.ocr_ms / 1000, args.verbose)
+    finally:
+        server.stop()
+    print_report(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n✓ 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
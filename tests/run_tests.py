@@ -27,7 +27,30 @@ def run_all_tests():
     # 添加测试模块
     test_modules = [
         'test_utils',
-        'test_xhs_processor'
+        'test_xhs_processor',
+        'test_pipeline',
+        'test_image_downloader',
+        'test_http_client',
+        'test_ocr_server',
+        'test_ocr_cache',
+        'test_phash',
+        'test_ocr_pool',
+        'test_note_record',
+        'test_catalog',
+        'test_manifest',
+        'test_rebuild',
+        'test_merged_writer',
+        'test_api_cache',
+        'test_resilience',
+        'test_journal',
+        'test_benchmark',
+        'test_fake_xhs_server',
+        'test_metrics',
+        'test_metrics_exporter',
+        'test_image_preprocess',
+        'test_text_gate',
+        'test_fast_path',
+        'test_ocr_autotune'
     ]
     
     for module in test_modules:
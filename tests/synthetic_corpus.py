@@ -0,0 +1,200 @@
+"""
+合成笔记语料生成器（供 benchmark.py 使用）
+按指定规模生成 xhs_notes/{note_id}/ 下的 note.json、metadata.md、
+带中文文字的JPEG图片和OCR结果，以及与之对应的模拟API响应
+
+用法：
+    python tests/synthetic_corpus.py /tmp/corpus --notes 1000 --images 3
+"""
+
+import argparse
+import random
+import sys
+import os
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+
+# 常见的中文字体位置，找不到时使用Pillow默认字体（中文会显示为方框，图片结构不变）
+CJK_FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+]
+
+WORDS = [
+    "护肤", "早餐", "通勤", "穿搭", "收纳", "旅行", "攻略", "平价", "好物", "测评",
+    "教程", "日常", "记录", "分享", "清单", "避坑", "干货", "合集", "新手", "必看",
+]
+
+IMAGE_SIZE = (480, 640)
+
+
+def note_id_for(index, prefix="5e"):
+    """第index个合成笔记的24位十六进制ID"""
+    return f"{prefix}{index:022x}"
+
+
+def _sentence(rng, words=8):
+    return "".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_api_data(note_id, rng, images):
+    """
+    生成与XHS-Downloader响应格式相同的笔记数据
+
+    Args:
+        note_id: 笔记ID
+        rng: 随机数生成器
+        images: 图片数
+
+    Returns:
+        dict: API响应（含data字段）
+    """
+    return {
+        "message": "获取小红书作品数据成功",
+        "data": {
+            "作品标题": _sentence(rng, 4),
+            "作者昵称": f"作者{rng.randint(1, 999)}",
+            "作者ID": f"author_{rng.randint(1, 99999)}",
+            "发布时间": f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)} 12:00:00",
+            "作品类型": "图文",
+            "点赞数量": rng.randint(0, 10000),
+            "作品描述": "\n\n".join(_sentence(rng, 12) for _ in range(3)) + "\n#" + rng.choice(WORDS),
+            "下载地址": [f"http://cdn.synthetic/{note_id}/{i}.jpg" for i in range(images)],
+        },
+    }
+
+
+def find_font(font_path=None, size=28):
+    """
+    加载用于渲染中文的字体
+
+    Args:
+        font_path: 指定的字体路径
+        size: 字号
+
+    Returns:
+        ImageFont: 字体对象
+    """
+    from PIL import ImageFont
+    for path in ([font_path] if font_path else []) + CJK_FONT_CANDIDATES:
+        if path and os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size=size)
+
+
+def render_image(path, lines, font, seed):
+    """
+    渲染一张带文字的JPEG图片
+
+    Args:
+        path: 输出路径
+        lines: 文字行
+        font: 字体
+        seed: 背景色随机种子
+    """
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    background = tuple(rng.randint(200, 255) for _ in range(3))
+    image = Image.new("RGB", IMAGE_SIZE, background)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((24, 40 + i * 48), line, fill=(20, 20, 20), font=font)
+    image.save(path, "JPEG", quality=85)
+
+
+def image_lines(note_id, idx, rng):
+    """合成图片上的文字（也是模拟OCR的识别结果）"""
+    return [f"{note_id[-6:]}-{idx}"] + [_sentence(rng, 6) for _ in range(3)]
+
+
+def generate_corpus(root, notes, images=3, seed=0, render=True, font_path=None):
+    """
+    在root下生成合成语料（已完整处理的笔记，各阶段状态与处理器写入的一致）
+
+    Args:
+        root: 项目根目录（笔记写入 root/xhs_notes/）
+        notes: 笔记数
+        images: 每个笔记的图片数
+        seed: 随机种子
+        render: 是否渲染JPEG图片（大规模只测文本处理时可关闭）
+        font_path: 中文字体路径
+
+    Returns:
+        list: 笔记ID列表
+    """
+    # 延迟导入：需要先设置PROJECT_ROOT
+    from note_record import update_ocr_results
+    from manifest import set_expected_images, mark_downloaded, mark_ocr_done
+    from catalog import get_catalog
+    from xhs_processor import save_metadata_md, save_ocr_md, generate_content_md, update_catalog
+
+    original_root = utils.PROJECT_ROOT
+    utils.PROJECT_ROOT = str(root)
+    rng = random.Random(seed)
+    font = find_font(font_path) if render else None
+    note_ids = []
+    try:
+        for n in range(notes):
+            note_id = note_id_for(n)
+            save_metadata_md(note_id, make_api_data(note_id, rng, images))
+
+            note_dir = Path(root) / "xhs_notes" / note_id
+            images_dir = note_dir / "images"
+            ocr_dir = note_dir / "ocr_results"
+            images_dir.mkdir(exist_ok=True)
+            ocr_dir.mkdir(exist_ok=True)
+            names = [f"{idx}.jpg" for idx in range(images)]
+            set_expected_images(note_id, names)
+            update_catalog(note_id, images=images)
+
+            entries = {}
+            for idx, name in enumerate(names):
+                lines = image_lines(note_id, idx, rng)
+                img_path = images_dir / name
+                if render:
+                    render_image(img_path, lines, font, seed=n * 1000 + idx)
+                mark_downloaded(note_dir, name)
+                recognized_at = save_ocr_md(img_path, ocr_dir / f"{idx}.md", lines)
+                entries[name] = {"lines": lines, "source": None, "recognized_at": recognized_at}
+            update_ocr_results(note_dir, entries)
+            mark_ocr_done(note_dir, {name: None for name in names})
+            get_catalog(create=True).record_ocr(note_id, [(name, None) for name in names])
+
+            generate_content_md(note_id)
+            note_ids.append(note_id)
+    finally:
+        utils.PROJECT_ROOT = original_root
+    return note_ids
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='生成合成笔记语料')
+    parser.add_argument('root', help='输出的项目根目录')
+    parser.add_argument('--notes', type=int, default=100, help='笔记数（10 ~ 10000）')
+    parser.add_argument('--images', type=int, default=3, help='每个笔记的图片数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--no-render', action='store_true', help='不渲染JPEG图片')
+    parser.add_argument('--font', default=None, help='中文字体路径')
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            ids = generate_corpus(args.root, args.notes, args.images, args.seed,
+                                  render=not args.no_render, font_path=args.font)
+        finally:
+            sys.stdout = stdout
+    print(f"✓ 已生成 {len(ids)} 个笔记: {Path(args.root) / 'xhs_notes'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+api_cache.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from unittest.mock import Mock
+import sys
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+import http_client
+from api_cache import ApiCache
+
+
+RESPONSE = {'message': 'ok', 'data': {'作品标题': '缓存标题', '未渲染的字段': [1, 2, 3]}}
+
+
+class TestApiCache(unittest.TestCase):
+    """测试API响应缓存"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_roundtrip_compressed(self):
+        """测试响应以gzip压缩的JSON保存并完整读回"""
+        cache = ApiCache(self.test_dir)
+        cache.put("68237be30000000022006481", RESPONSE)
+
+        path = self.test_dir / "68" / "68237be30000000022006481.json.gz"
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["response"], RESPONSE)
+        self.assertEqual(cache.get("68237be30000000022006481"), RESPONSE)
+        self.assertIsNone(cache.get("missing"))
+
+    def test_ttl_expiry(self):
+        """测试超过有效期的条目不再命中"""
+        ApiCache(self.test_dir).put("note_a", RESPONSE)
+        time.sleep(0.1)
+
+        self.assertIsNone(ApiCache(self.test_dir, ttl=0.05).get("note_a"))
+        self.assertEqual(ApiCache(self.test_dir, ttl=3600).get("note_a"), RESPONSE)
+        self.assertEqual(ApiCache(self.test_dir, ttl=0).get("note_a"), RESPONSE)
+
+    def test_lru_eviction(self):
+        """测试超过大小上限时淘汰最久未使用的条目"""
+        probe = ApiCache(self.test_dir / "probe")
+        probe.put("x", RESPONSE)
+        entry_size = probe.stats()["bytes"]
+
+        cache = ApiCache(self.test_dir / "lru", max_bytes=entry_size * 3 + 10)
+        now = time.time()
+        for i, note_id in enumerate(["n1", "n2", "n3"]):
+            cache.put(note_id, RESPONSE)
+            os.utime(cache._entry_path(note_id), (now - 100 + i, now - 100 + i))
+        # 最早写入的n1最近被读取过，应保留
+        cache.get("n1")
+        cache.put("n4", RESPONSE)
+
+        self.assertIsNone(cache.get("n2"))
+        self.assertEqual(cache.get("n1"), RESPONSE)
+        self.assertEqual(cache.get("n4"), RESPONSE)
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+
+    def test_corrupt_entry_ignored(self):
+        """测试损坏的条目视为未命中"""
+        cache = ApiCache(self.test_dir)
+        path = cache._entry_path("note_b")
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"not gzip")
+
+        self.assertIsNone(cache.get("note_b"))
+
+
+class TestProcessorApiCache(unittest.TestCase):
+    """测试处理器调用API前先查询缓存"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+        self.original_enabled = xhs_processor.API_CACHE_ENABLED
+        xhs_processor.API_CACHE_ENABLED = True
+        self.mock_client = Mock()
+        self.original_client = http_client.set_client(self.mock_client)
+
+    def tearDown(self):
+        http_client.set_client(self.original_client)
+        xhs_processor.API_CACHE_ENABLED = self.original_enabled
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_second_call_served_from_cache(self):
+        """测试同一笔记第二次获取不再调用API"""
+        response = Mock(status_code=200)
+        response.json.return_value = RESPONSE
+        self.mock_client.post.return_value = response
+        url = "https://www.xiaohongshu.com/explore/68237be30000000022006481?xsec_token=abc"
+
+        first = xhs_processor.download_note_via_api(url)
+        second = xhs_processor.download_note_via_api(url)
+
+        self.assertEqual(first, RESPONSE)
+        self.assertEqual(second, RESPONSE)
+        self.assertEqual(self.mock_client.post.call_count, 1)
+
+    def test_failures_not_cached(self):
+        """测试失败的响应不写入缓存"""
+        self.mock_client.post.return_value = Mock(status_code=500)
+
+        self.assertIsNone(xhs_processor.download_note_via_api("note_c"))
+        self.assertEqual(xhs_processor.get_api_cache().stats()["entries"], 0)
+
+    def test_disabled(self):
+        """测试关闭缓存后每次都调用API"""
+        xhs_processor.API_CACHE_ENABLED = False
+        response = Mock(status_code=200)
+        response.json.return_value = RESPONSE
+        self.mock_client.post.return_value = response
+
+        xhs_processor.download_note_via_api("note_d")
+        xhs_processor.download_note_via_api("note_d")
+
+        self.assertEqual(self.mock_client.post.call_count, 2)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,68 @@
+"""
+benchmark.py 与 synthetic_corpus.py 的冒烟测试（小规模）
+"""
+
+import unittest
+import tempfile
+import shutil
+import io
+import sys
+import os
+from contextlib import redirect_stdout
+from pathlib import Path
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import utils
+from benchmark import run_benchmarks, compare
+from synthetic_corpus import generate_corpus
+
+
+class TestSyntheticCorpus(unittest.TestCase):
+    """测试合成语料与处理器写入的状态一致"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_root = utils.PROJECT_ROOT
+
+    def tearDown(self):
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_generated_notes_complete(self):
+        """测试生成的笔记被视为已完整处理"""
+        with redirect_stdout(io.StringIO()):
+            note_ids = generate_corpus(self.test_dir, 3, images=2)
+
+        utils.PROJECT_ROOT = self.test_dir
+        for note_id in note_ids:
+            self.assertTrue(utils.is_note_complete(note_id))
+            self.assertTrue(utils.has_ocr_results(note_id))
+            self.assertTrue((Path(self.test_dir) / "xhs_notes" / note_id / "images" / "1.jpg").exists())
+            self.assertIn(note_id[-6:], utils.read_content_md(note_id))
+
+
+class TestBenchmark(unittest.TestCase):
+    """测试基准测试运行与基线比较"""
+
+    def test_run_and_compare(self):
+        """测试全部基准项都有结果，变慢超过阈值的项被标记"""
+        report = run_benchmarks(4, images=1, repeat=1, process_notes=2)
+
+        for name in ("parse_note_ids", "generate_content_md", "generate_merged_md",
+                     "status_checks_catalog", "status_checks_files", "process_note"):
+            self.assertIn(name, report["results"])
+        self.assertEqual(report["results"]["process_note"]["items"], 2)
+
+        baseline = {"results": {name: dict(r, per_item_ms=r["per_item_ms"] / 2)
+                                for name, r in report["results"].items()}}
+        rows = compare(report, baseline, threshold=0.2)
+        self.assertTrue(rows and all(row[4] for row in rows))
+        self.assertFalse(any(row[4] for row in compare(report, report)))
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,219 @@
+"""
+catalog.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+import threading
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+from catalog import Catalog, LOOKUP_CHUNK, get_catalog
+from manifest import set_expected_images
+
+
+class TestCatalog(unittest.TestCase):
+    """测试SQLite笔记状态目录"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.catalog = Catalog(str(self.test_dir / "catalog.db"))
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_wal_mode(self):
+        """测试使用WAL日志模式"""
+        mode = self.catalog._connect().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode.lower(), "wal")
+
+    def test_mark_and_get(self):
+        """测试部分字段更新"""
+        self.assertIsNone(self.catalog.get("n1"))
+
+        self.catalog.mark("n1", has_metadata=1)
+        self.catalog.mark("n1", images=3)
+
+        state = self.catalog.get("n1")
+        self.assertEqual((state["has_metadata"], state["images"], state["content_done"]), (1, 3, 0))
+        with self.assertRaises(ValueError):
+            self.catalog.mark("n1", unknown=1)
+
+    def test_batch_lookup_and_pending(self):
+        """测试超过单条SQL参数上限的批量查询"""
+        ids = [f"note{i:05d}" for i in range(LOOKUP_CHUNK * 2 + 7)]
+        for note_id in ids[::2]:
+            self.catalog.mark(note_id, content_done=1)
+
+        states = self.catalog.get_many(ids)
+        pending = self.catalog.pending(ids)
+
+        self.assertEqual(len(states), len(ids[::2]))
+        self.assertEqual(pending, ids[1::2])
+
+    def test_record_ocr_counts_images(self):
+        """测试记录OCR结果后更新笔记的OCR数"""
+        self.catalog.record_ocr("n2", [("0.jpg", "aa"), ("1.jpg", None)])
+        self.catalog.record_ocr("n2", [("1.jpg", "bb")])
+
+        self.assertEqual(self.catalog.get("n2")["ocr_results"], 2)
+        images = self.catalog.images("n2")
+        self.assertEqual([(i["name"], i["content_hash"]) for i in images],
+                         [("0.jpg", "aa"), ("1.jpg", "bb")])
+
+    def test_record_ocr_resets_content(self):
+        """测试记录OCR结果后笔记的content.md状态失效"""
+        self.catalog.mark("n3", content_done=1, content_hash="cc")
+        self.catalog.record_ocr("n3", [("0.jpg", "aa")])
+
+        state = self.catalog.get("n3")
+        self.assertEqual((state["content_done"], state["content_hash"]), (0, None))
+
+    def test_concurrent_writers(self):
+        """测试多线程同时写入"""
+        def worker(n):
+            for i in range(20):
+                self.catalog.mark(f"t{n}-{i}", has_metadata=1)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.catalog.stats()["notes"], 80)
+
+    def test_rebuild_from_disk(self):
+        """测试并行扫描笔记目录重建"""
+        notes_root = self.test_dir / "xhs_notes"
+        done = notes_root / "done_note"
+        (done / "images").mkdir(parents=True)
+        (done / "ocr_results").mkdir()
+        (done / "metadata.md").write_text("meta", encoding='utf-8')
+        (done / "content.md").write_text("content", encoding='utf-8')
+        for i in range(3):
+            (done / "images" / f"{i}.jpg").write_bytes(b"img")
+        (done / "ocr_results" / "0.md").write_text("ocr", encoding='utf-8')
+        (notes_root / "empty_note").mkdir()
+        self.catalog.mark("stale_note", content_done=1)
+
+        count = self.catalog.rebuild(notes_root=str(notes_root), workers=4)
+
+        self.assertEqual(count, 2)
+        self.assertIsNone(self.catalog.get("stale_note"))
+        state = self.catalog.get("done_note")
+        self.assertEqual((state["has_metadata"], state["images"], state["ocr_results"],
+                          state["content_done"]), (1, 3, 1, 1))
+        self.assertIsNotNone(state["content_hash"])
+        self.assertEqual([i["ocr_done"] for i in self.catalog.images("done_note")], [1, 0, 0])
+        self.assertEqual(self.catalog.pending(["done_note", "empty_note"]), ["empty_note"])
+
+    def test_rebuild_uses_expected_images(self):
+        """测试重建时应有的图片数取自阶段清单（只下载了一部分的笔记）"""
+        original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        try:
+            set_expected_images("partial", ["0.jpg", "1.jpg", "2.jpg"])
+            note_dir = self.test_dir / "xhs_notes" / "partial"
+            (note_dir / "images").mkdir()
+            (note_dir / "ocr_results").mkdir()
+            for i in range(2):
+                (note_dir / "images" / f"{i}.jpg").write_bytes(b"img")
+                (note_dir / "ocr_results" / f"{i}.md").write_text("ocr", encoding='utf-8')
+
+            self.catalog.rebuild(notes_root=str(self.test_dir / "xhs_notes"), workers=1)
+        finally:
+            utils.PROJECT_ROOT = original_root
+
+        state = self.catalog.get("partial")
+        self.assertEqual((state["images"], state["ocr_results"]), (3, 2))
+        self.assertEqual([(i["name"], i["ocr_done"]) for i in self.catalog.images("partial")],
+                         [("0.jpg", 1), ("1.jpg", 1), ("2.jpg", 0)])
+
+
+class TestCatalogIntegration(unittest.TestCase):
+    """测试工具函数和处理器使用状态目录"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+
+    def tearDown(self):
+        catalog = get_catalog()
+        if catalog is not None:
+            catalog.close()
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_helpers_read_catalog(self):
+        """测试工具函数优先读取状态目录，目录中没有时检查文件"""
+        self.assertFalse(utils.is_note_complete("note_a"))
+
+        get_catalog(create=True).mark("note_a", has_metadata=1, ocr_results=2, content_done=1)
+
+        self.assertTrue(utils.is_note_complete("note_a"))
+        self.assertTrue(utils.has_metadata("note_a"))
+        self.assertTrue(utils.has_ocr_results("note_a"))
+
+        # 目录中未完成的阶段仍以磁盘文件为准
+        note_dir = self.test_dir / "xhs_notes" / "note_b"
+        note_dir.mkdir(parents=True)
+        (note_dir / "metadata.md").write_text("meta", encoding='utf-8')
+        get_catalog().mark("note_b", images=1)
+        self.assertTrue(utils.has_metadata("note_b"))
+        self.assertFalse(utils.is_note_complete("note_b"))
+
+    def test_partial_note_not_ocr_complete(self):
+        """测试状态目录中的图片数少于清单中应有的图片数时不算OCR完成"""
+        set_expected_images("note_e", ["0.jpg", "1.jpg", "2.jpg"])
+        get_catalog(create=True).mark("note_e", images=2, ocr_results=2)
+
+        self.assertFalse(utils.has_ocr_results("note_e"))
+
+        get_catalog().mark("note_e", images=3, ocr_results=3)
+        self.assertTrue(utils.has_ocr_results("note_e"))
+
+    def test_processor_updates_catalog(self):
+        """测试处理器在各阶段更新状态目录"""
+        api_data = {'data': {'作品标题': '标题', '作品描述': '正文'}}
+        xhs_processor.save_metadata_md("note_c", api_data)
+        xhs_processor.generate_content_md("note_c")
+
+        state = get_catalog().get("note_c")
+        self.assertEqual((state["has_metadata"], state["has_record"], state["content_done"]), (1, 1, 1))
+        self.assertIsNotNone(state["content_hash"])
+
+    def test_refetch_resets_content(self):
+        """测试重新获取笔记数据后状态目录不再报告content.md已完成"""
+        xhs_processor.save_metadata_md("note_f", {'data': {'作品标题': '标题', '作品描述': '正文'}})
+        xhs_processor.generate_content_md("note_f")
+        self.assertEqual(get_catalog().get("note_f")["content_done"], 1)
+
+        xhs_processor.save_metadata_md("note_f", {'data': {'作品标题': '新标题', '作品描述': '新正文'}})
+
+        state = get_catalog().get("note_f")
+        self.assertEqual((state["content_done"], state["content_hash"]), (0, None))
+        self.assertFalse(utils.is_note_complete("note_f"))
+
+    def test_stale_entry_reprocessed(self):
+        """测试状态目录记录已完成但文件被删除时重新处理"""
+        get_catalog(create=True).mark("note_d", has_metadata=1, content_done=1)
+
+        self.assertIsNone(xhs_processor.process_note("note_d", "task_stale"))
+
+        self.assertIsNone(get_catalog().get("note_d"))
+        self.assertFalse(utils.has_metadata("note_d"))
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
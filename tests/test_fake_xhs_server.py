@@ -0,0 +1,95 @@
+"""
+fake_xhs_server.py 与 load_harness.py 的单元测试
+"""
+
+import unittest
+import random
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import xhs_processor
+import http_client
+from http_client import HttpClient
+from fake_xhs_server import FakeXhsServer, Faults, Latency
+from load_harness import run_load, percentile
+
+
+class TestFaults(unittest.TestCase):
+    """测试延迟分布与故障注入配置"""
+
+    def test_latency_distributions(self):
+        """测试各延迟分布的取值范围"""
+        rng = random.Random(0)
+        self.assertEqual(Latency("const:50").sample(rng), 0.05)
+        samples = [Latency("uniform:20,40").sample(rng) for _ in range(100)]
+        self.assertTrue(all(0.02 <= s <= 0.04 for s in samples))
+        samples = sorted(Latency("lognormal:80,0.5").sample(rng) for _ in range(1001))
+        self.assertAlmostEqual(samples[500], 0.08, delta=0.01)
+        with self.assertRaises(ValueError):
+            Latency("pareto:1")
+
+    def test_rate_limit(self):
+        """测试超过每秒请求数的请求被限流"""
+        faults = Faults(rate=2)
+        actions = [faults.decide(random.Random(0))[0] for _ in range(5)]
+        self.assertEqual(actions.count("ok"), 2)
+        self.assertEqual(faults.stats()["rate_limited"], 3)
+
+    def test_percentile(self):
+        """测试最近秩百分位数"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertIsNone(percentile([], 95))
+
+
+class TestFakeServer(unittest.TestCase):
+    """测试处理器对模拟服务的真实网络请求"""
+
+    def setUp(self):
+        self.server = FakeXhsServer(images=2).start()
+        self.saved = (xhs_processor.XHS_API_BASE, xhs_processor.API_CACHE_ENABLED)
+        self.original_client = http_client.set_client(HttpClient())
+
+    def tearDown(self):
+        http_client.set_client(self.original_client)
+        xhs_processor.set_api_base(self.saved[0])
+        xhs_processor.API_CACHE_ENABLED = self.saved[1]
+        self.server.stop()
+
+    def test_api_fields_and_images(self):
+        """测试接口返回与真实服务相同的字段，图片地址可下载"""
+        xhs_processor.set_api_base(self.server.url)
+        xhs_processor.API_CACHE_ENABLED = False
+
+        self.assertTrue(xhs_processor.check_xhs_api_status())
+        result = xhs_processor.download_note_via_api("7a0000000000000000000001")
+
+        data = result["data"]
+        for field in ("作品标题", "作品描述", "作者昵称", "下载地址"):
+            self.assertIn(field, data)
+        self.assertEqual(len(data["下载地址"]), 2)
+        response = http_client.get_client().get(data["下载地址"][1], timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b"\xff\xd8"))
+
+    def test_load_with_errors(self):
+        """测试压测在注入错误后通过重试完成所有笔记"""
+        self.server.api = Faults(latency="uniform:1,5", error_rate=0.3)
+
+        report = run_load(self.server, 6, api_retries=10, retry_delay=0.01)
+
+        self.assertEqual(report["success"], 6)
+        self.assertGreater(report["notes_per_sec"], 0)
+        self.assertIsNotNone(report["latency_p95"])
+        self.assertEqual(report["server"]["cdn"]["ok"], 12)
+        self.assertEqual(report["api"]["calls"], report["server"]["api"]["requests"])
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,181 @@
+"""
+已处理过的任务的快速路径：不探测API服务、不创建网络连接
+"""
+
+import unittest
+import tempfile
+import shutil
+import subprocess
+import json
+from unittest import mock
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import http_client
+import utils
+import xhs_processor
+from synthetic_corpus import generate_corpus, note_id_for
+
+# main()会修改的模块级配置，测试后恢复
+PROCESSOR_GLOBALS = (
+    "ocr_server_client", "ocr_pool", "OCR_CPU_THREADS", "OCR_CACHE_ENABLED",
+    "PHASH_ENABLED", "PHASH_DISTANCE", "API_CACHE_ENABLED", "API_CACHE_TTL_SECONDS",
+    "API_CACHE_SIZE_BYTES", "API_RETRY_POLICY", "api_breaker", "OCR_MAX_SIDE", "OCR_TEXT_GATE",
+    "OCR_PROFILE_ENABLED", "OCR_PROFILE_PATH", "XHS_API_BASE", "XHS_API_URL", "XHS_API_DOCS_URL",
+)
+
+# 没有服务监听的地址
+UNREACHABLE_API = "http://127.0.0.1:9"
+
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+# 全部笔记已处理的任务不应导入的模块（网络、下载、OCR服务/识别池、指标导出）
+DEFERRED_MODULES = (
+    "requests", "asyncio", "http.server", "image_downloader", "metrics_exporter",
+    "ocr_server", "ocr_pool",
+)
+
+# 在独立进程中运行一个全部已处理的任务，输出加载过的模块
+IMPORT_PROBE = '''
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import utils
+utils.PROJECT_ROOT = sys.argv[2]
+import xhs_processor
+notes = json.loads(sys.argv[3])
+sys.argv = ["xhs_processor.py", "\\n".join(notes), "--api-base", sys.argv[4], "--no-ocr-server", "--no-metrics"]
+xhs_processor.main()
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+class TestFastPath(unittest.TestCase):
+    """测试全部笔记已处理时的启动流程"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+            self.note_ids = generate_corpus(self.test_dir, 5, images=1, render=False)
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+        self.saved = {name: getattr(xhs_processor, name) for name in PROCESSOR_GLOBALS}
+        self.saved_env = {name: os.environ.get(name) for name in ("XHS_OCR_MAX_SIDE", "XHS_OCR_TEXT_GATE",
+                                                               "XHS_OCR_PROFILE", "XHS_OCR_PROFILE_PATH")}
+        self.original_client = http_client.set_client(None)
+
+    def tearDown(self):
+        client = http_client.set_client(self.original_client)
+        if isinstance(client, http_client.HttpClient):
+            client.close()
+        for name, value in self.saved.items():
+            setattr(xhs_processor, name, value)
+        for name, value in self.saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _main(self, notes):
+        args = ["xhs_processor.py", "\n".join(notes), "--api-base", UNREACHABLE_API,
+                "--no-ocr-server", "--no-metrics"]
+        with mock.patch.object(sys, "argv", args):
+            return xhs_processor.main()
+
+    def test_cached_task_skips_api_check(self):
+        """测试全部已处理时不检查API服务、不创建HTTP连接，直接生成合并文档"""
+        with mock.patch.object(xhs_processor, "check_xhs_api_status") as check:
+            task_id = self._main(self.note_ids)
+
+        check.assert_not_called()
+        self.assertIsNone(http_client.get_client()._session)
+        merged = Path(self.test_dir) / "ronggao_output" / task_id / "merged.md"
+        self.assertIn(self.note_ids[0], merged.read_text(encoding='utf-8'))
+
+    def _loaded_modules(self):
+        """在独立进程中运行全部已处理的任务，返回加载过的模块"""
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE, SCRIPTS_DIR, self.test_dir,
+             json.dumps(self.note_ids), UNREACHABLE_API],
+            capture_output=True, text=True, encoding='utf-8', timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return set(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    def test_cached_task_defers_imports(self):
+        """
+        测试全部已处理时不导入网络、下载器、OCR服务和指标导出模块；
+        笔记都有阶段清单时，无论是否存在状态目录都不导入sqlite3
+        """
+        catalog_db = os.path.join(self.test_dir, "cache", "catalog.db")
+        for has_catalog in (True, False):
+            with self.subTest(has_catalog=has_catalog):
+                self.assertEqual(os.path.exists(catalog_db), has_catalog)
+                loaded = self._loaded_modules()
+
+                deferred = DEFERRED_MODULES + ("sqlite3", "catalog")
+                self.assertEqual([m for m in deferred if m in loaded], [])
+                if has_catalog:
+                    os.remove(catalog_db)
+
+    def test_legacy_notes_query_catalog(self):
+        """测试没有阶段清单的旧笔记按状态目录判断完成，其余模块仍不导入"""
+        for note_id in self.note_ids:
+            os.remove(os.path.join(self.test_dir, "xhs_notes", note_id, "manifest.json"))
+
+        loaded = self._loaded_modules()
+
+        self.assertIn("catalog", loaded)
+        self.assertEqual([m for m in DEFERRED_MODULES if m in loaded], [])
+
+    def test_uncached_note_requires_api(self):
+        """测试有笔记需要调用API而服务不可用时退出"""
+        with self.assertRaises(SystemExit):
+            self._main(self.note_ids + [note_id_for(99, prefix="6f")])
+
+    def test_notes_needing_api(self):
+        """测试已处理、已有元数据或API缓存命中的笔记不需要调用API"""
+        fresh = [note_id_for(n, prefix="6f") for n in range(3)]
+        xhs_processor.get_api_cache().put(fresh[1], {"data": {"作品标题": "缓存"}})
+
+        self.assertEqual(xhs_processor.notes_needing_api(self.note_ids + fresh), [fresh[0], fresh[2]])
+
+
+class TestApiReachable(unittest.TestCase):
+    """测试API服务状态检查的缓存"""
+
+    def setUp(self):
+        self.saved = {name: getattr(xhs_processor, name)
+                      for name in ("XHS_API_BASE", "XHS_API_URL", "XHS_API_DOCS_URL")}
+        xhs_processor._api_probe.update(base=None, ok=None, checked_at=0.0)
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(xhs_processor, name, value)
+        xhs_processor._api_probe.update(base=None, ok=None, checked_at=0.0)
+
+    def test_result_cached_per_base(self):
+        """测试有效期内复用检查结果，地址变化后重新检查"""
+        with mock.patch.object(xhs_processor, "check_xhs_api_status", return_value=True) as check:
+            self.assertTrue(xhs_processor.api_reachable())
+            self.assertTrue(xhs_processor.api_reachable())
+            self.assertEqual(check.call_count, 1)
+
+            xhs_processor.set_api_base("http://127.0.0.1:5557")
+            xhs_processor.api_reachable()
+            self.assertEqual(check.call_count, 2)
+
+            with mock.patch.object(xhs_processor, "API_STATUS_TTL", 0):
+                xhs_processor.api_reachable()
+            self.assertEqual(check.call_count, 3)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+"""
+http_client.py 模块的单元测试
+"""
+
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import http_client
+from http_client import HttpClient, get_client, set_client, configure_client
+
+
+class TestHttpClient(unittest.TestCase):
+    """测试共享HTTP客户端"""
+
+    def setUp(self):
+        self.original_client = set_client(None)
+
+    def tearDown(self):
+        client = set_client(self.original_client)
+        if isinstance(client, HttpClient):
+            client.close()
+
+    def test_shared_client_reused(self):
+        """测试共享客户端在多次调用间复用"""
+        self.assertIs(get_client(), get_client())
+
+    def test_pool_sizes_per_prefix(self):
+        """测试按URL前缀配置连接池大小"""
+        client = HttpClient(
+            pool_sizes={"http://127.0.0.1:5556": 3},
+            default_pool_size=7
+        )
+        try:
+            api_adapter = client.session.get_adapter("http://127.0.0.1:5556/xhs/detail")
+            cdn_adapter = client.session.get_adapter("https://sns-img-qc.xhscdn.com/a.jpg")
+            self.assertEqual(api_adapter._pool_maxsize, 3)
+            self.assertEqual(cdn_adapter._pool_maxsize, 7)
+        finally:
+            client.close()
+
+    def test_session_created_on_first_request(self):
+        """测试连接池在第一次使用时才创建"""
+        client = HttpClient()
+        try:
+            self.assertIsNone(client._session)
+            session = client.session
+            self.assertIs(client.session, session)
+        finally:
+            client.close()
+
+    def test_configure_replaces_shared_client(self):
+        """测试重新配置会替换共享客户端"""
+        first = get_client()
+        second = configure_client(default_pool_size=2)
+        self.assertIsNot(first, second)
+        self.assertIs(get_client(), second)
+
+    def test_inject_test_double(self):
+        """测试可注入测试替身"""
+        fake = Mock()
+        set_client(fake)
+        get_client().get("http://example.com", timeout=1)
+        fake.get.assert_called_once_with("http://example.com", timeout=1)
+
+    def test_http2_only_for_cdn_hosts(self):
+        """测试HTTP/2只用于图片CDN域名"""
+        client = HttpClient()
+        client._http2_client = Mock()
+        client.session = Mock()
+        try:
+            client.get("https://sns-img-qc.xhscdn.com/a.jpg", timeout=5)
+            client.get("http://127.0.0.1:5556/docs", timeout=5)
+        finally:
+            client._http2_client = None
+
+        client.session.get.assert_called_once_with("http://127.0.0.1:5556/docs", timeout=5)
+
+    def test_http2_fallback_without_httpx(self):
+        """测试未安装httpx时回退到HTTP/1.1"""
+        original = sys.modules.get('httpx')
+        sys.modules['httpx'] = None
+        try:
+            client = HttpClient(http2=True)
+        finally:
+            if original is None:
+                del sys.modules['httpx']
+            else:
+                sys.modules['httpx'] = original
+        try:
+            self.assertIsNone(client._http2_client)
+            self.assertFalse(client._use_http2("https://sns-img-qc.xhscdn.com/a.jpg"))
+        finally:
+            client.close()
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,320 @@
+"""
+image_downloader.py 模块的单元测试
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+import threading
+import time
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import http_client
+import image_downloader
+from image_downloader import (
+    TokenBucket, ImageDownloader, configure_downloader, fetch_image, is_image_complete
+)
+
+# 最小的“完整JPEG”：SOI + 数据 + EOI
+JPEG_BYTES = b"\xff\xd8" + bytes(range(256)) * 4 + b"\xff\xd9"
+
+
+class TestTokenBucket(unittest.TestCase):
+    """测试令牌桶限速器"""
+
+    def test_burst_then_rate_limited(self):
+        """测试突发容量用完后按速率放行"""
+        async def acquire_all(bucket, n):
+            start = time.monotonic()
+            for _ in range(n):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        # 容量2，速率20/秒：前2个立即放行，后4个约需0.2秒
+        elapsed = asyncio.run(acquire_all(TokenBucket(rate=20, capacity=2), 6))
+        self.assertGreaterEqual(elapsed, 0.18)
+        self.assertLess(elapsed, 0.6)
+
+    def test_unlimited(self):
+        """测试速率<=0时不限速"""
+        async def acquire_all(bucket, n):
+            start = time.monotonic()
+            for _ in range(n):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(acquire_all(TokenBucket(rate=0, capacity=1), 100))
+        self.assertLess(elapsed, 0.1)
+
+
+class TestImageDownloader(unittest.TestCase):
+    """测试异步图片下载器"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.active = {}
+        self.max_active = {}
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _fetch(self, url, img_path):
+        """模拟下载：记录每个域名的并发数"""
+        host = url.split('/')[2]
+        with self.lock:
+            self.active[host] = self.active.get(host, 0) + 1
+            self.max_active[host] = max(self.max_active.get(host, 0), self.active[host])
+        time.sleep(0.03)
+        with self.lock:
+            self.active[host] -= 1
+        if 'bad' in url:
+            return "HTTP 404"
+        Path(img_path).write_bytes(b"image")
+        return None
+
+    def _jobs(self, host, n):
+        return [
+            (i, f"http://{host}/{i}.jpg", os.path.join(self.test_dir, f"{host}-{i}.jpg"))
+            for i in range(n)
+        ]
+
+    def test_per_host_concurrency_cap(self):
+        """测试每个域名的并发上限"""
+        downloader = ImageDownloader(fetch=self._fetch, per_host=2, rate=0)
+        try:
+            jobs = self._jobs("a.example", 6) + self._jobs("b.example", 6)
+            results = downloader.download(jobs)
+        finally:
+            downloader.close()
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(self.max_active["a.example"], 2)
+        self.assertEqual(self.max_active["b.example"], 2)
+
+    def test_on_complete_and_failures(self):
+        """测试成功回调与失败原因"""
+        completed = []
+        downloader = ImageDownloader(fetch=self._fetch, per_host=4, rate=0)
+        jobs = [
+            (0, "http://cdn.example/0.jpg", os.path.join(self.test_dir, "0.jpg")),
+            (1, "http://cdn.example/bad.jpg", os.path.join(self.test_dir, "1.jpg")),
+        ]
+        try:
+            results = downloader.download(jobs, on_complete=lambda idx, path: completed.append(idx))
+        finally:
+            downloader.close()
+
+        self.assertEqual(completed, [0])
+        self.assertIsNone(results[0])
+        self.assertEqual(results[1], "HTTP 404")
+
+    def test_shared_across_threads(self):
+        """测试多个线程共享同一下载器时仍遵守域名并发上限"""
+        downloader = ImageDownloader(fetch=self._fetch, per_host=2, rate=0)
+        threads = [
+            threading.Thread(target=downloader.download, args=(self._jobs("a.example", 4),))
+            for _ in range(3)
+        ]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            downloader.close()
+
+        self.assertEqual(self.max_active["a.example"], 2)
+
+
+class TestDownloadImagesLayout(unittest.TestCase):
+    """测试download_images保持images/{idx}.jpg布局"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+        self.fetched = []
+
+        def fetch(url, img_path):
+            self.fetched.append(url)
+            Path(img_path).write_bytes(b"image")
+            return None
+
+        configure_downloader(per_host=2, rate=0, fetch=fetch)
+
+    def tearDown(self):
+        configure_downloader()
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_layout_and_skip_existing(self):
+        """测试图片按序号保存，已存在的图片跳过下载"""
+        from xhs_processor import download_images
+
+        note_id = "test_note_dl"
+        images_dir = Path(self.test_dir) / "xhs_notes" / note_id / "images"
+        images_dir.mkdir(parents=True)
+        (images_dir / "1.jpg").write_bytes(b"\xff\xd8existing\xff\xd9")
+
+        api_data = {'data': {'下载地址': [
+            "http://cdn.example/a.jpg",
+            "http://cdn.example/b.jpg",
+            "http://cdn.example/c.jpg",
+        ]}}
+        ready = []
+        download_images(note_id, api_data, on_image=lambda p: ready.append(p.name))
+
+        self.assertEqual(sorted(p.name for p in images_dir.iterdir()), ["0.jpg", "1.jpg", "2.jpg"])
+        self.assertEqual((images_dir / "1.jpg").read_bytes(), b"\xff\xd8existing\xff\xd9")
+        self.assertEqual(sorted(self.fetched), ["http://cdn.example/a.jpg", "http://cdn.example/c.jpg"])
+        self.assertEqual(sorted(ready), ["0.jpg", "1.jpg", "2.jpg"])
+
+    def test_truncated_existing_image_redownloaded(self):
+        """测试不完整的已有图片会重新下载"""
+        from xhs_processor import download_images
+
+        note_id = "test_note_truncated"
+        images_dir = Path(self.test_dir) / "xhs_notes" / note_id / "images"
+        images_dir.mkdir(parents=True)
+        (images_dir / "0.jpg").write_bytes(b"\xff\xd8trunc")
+
+        download_images(note_id, {'data': {'下载地址': ["http://cdn.example/a.jpg"]}})
+
+        self.assertEqual(self.fetched, ["http://cdn.example/a.jpg"])
+        self.assertEqual((images_dir / "0.jpg").read_bytes(), b"image")
+
+
+class FakeStreamResponse:
+    """支持流式读取的模拟响应，可在指定字节数后模拟连接中断"""
+
+    def __init__(self, status_code, body=b"", headers=None, fail_after=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+        self._fail_after = fail_after
+        self.closed = False
+
+    def iter_content(self, chunk_size=None):
+        sent = 0
+        for i in range(0, len(self._body), 100):
+            if self._fail_after is not None and sent >= self._fail_after:
+                raise ConnectionError("连接中断")
+            chunk = self._body[i:i + 100]
+            sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCdnClient:
+    """支持Range请求的模拟图片CDN"""
+
+    def __init__(self, body, support_range=True):
+        self.body = body
+        self.support_range = support_range
+        self.requests = []
+        self.fail_after = None
+
+    def get(self, url, timeout=None, stream=False, headers=None):
+        headers = headers or {}
+        self.requests.append(headers.get("Range"))
+        fail_after, self.fail_after = self.fail_after, None
+        total = len(self.body)
+        if "Range" in headers and self.support_range:
+            start = int(headers["Range"][len("bytes="):-1])
+            return FakeStreamResponse(206, self.body[start:], {
+                "Content-Length": str(total - start),
+                "Content-Range": f"bytes {start}-{total - 1}/{total}",
+            }, fail_after)
+        return FakeStreamResponse(200, self.body, {"Content-Length": str(total)}, fail_after)
+
+
+class TestFetchImage(unittest.TestCase):
+    """测试流式、可续传、带完整性校验的图片下载"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.img_path = str(self.test_dir / "0.jpg")
+        self.original_client = http_client.get_client()
+
+    def tearDown(self):
+        http_client.set_client(self.original_client)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_streams_to_part_then_renames(self):
+        """测试完整下载后原子重命名，不留临时文件"""
+        client = FakeCdnClient(JPEG_BYTES)
+        http_client.set_client(client)
+
+        self.assertIsNone(fetch_image("http://cdn.example/a.jpg", self.img_path))
+
+        self.assertEqual(Path(self.img_path).read_bytes(), JPEG_BYTES)
+        self.assertFalse(Path(self.img_path + ".part").exists())
+        self.assertEqual(client.requests, [None])
+
+    def test_resume_after_interruption(self):
+        """测试中断后保留临时文件并通过Range续传"""
+        client = FakeCdnClient(JPEG_BYTES)
+        client.fail_after = 300
+        http_client.set_client(client)
+
+        with self.assertRaises(ConnectionError):
+            fetch_image("http://cdn.example/a.jpg", self.img_path)
+        self.assertFalse(Path(self.img_path).exists())
+        partial = Path(self.img_path + ".part").stat().st_size
+        self.assertEqual(partial, 300)
+
+        self.assertIsNone(fetch_image("http://cdn.example/a.jpg", self.img_path))
+
+        self.assertEqual(client.requests[-1], "bytes=300-")
+        self.assertEqual(Path(self.img_path).read_bytes(), JPEG_BYTES)
+
+    def test_server_without_range_restarts(self):
+        """测试服务器不支持Range时从头下载"""
+        Path(self.img_path + ".part").write_bytes(JPEG_BYTES[:100])
+        http_client.set_client(FakeCdnClient(JPEG_BYTES, support_range=False))
+
+        self.assertIsNone(fetch_image("http://cdn.example/a.jpg", self.img_path))
+        self.assertEqual(Path(self.img_path).read_bytes(), JPEG_BYTES)
+
+    def test_truncated_body_rejected(self):
+        """测试缺少结束标记的图片不会成为正式文件"""
+        http_client.set_client(FakeCdnClient(JPEG_BYTES[:-2]))
+
+        error = fetch_image("http://cdn.example/a.jpg", self.img_path)
+
+        self.assertIsNotNone(error)
+        self.assertFalse(Path(self.img_path).exists())
+        self.assertFalse(Path(self.img_path + ".part").exists())
+
+    def test_is_image_complete(self):
+        """测试图片完整性快速检查"""
+        cases = {
+            "ok.jpg": (JPEG_BYTES, True),
+            "trunc.jpg": (JPEG_BYTES[:500], False),
+            "ok.png": (b"\x89PNG\r\n\x1a\n" + b"\x00" * 20 + b"IEND\xaeB`\x82", True),
+            "trunc.png": (b"\x89PNG\r\n\x1a\n" + b"\x00" * 20, False),
+            "ok.webp": (b"RIFF" + (12).to_bytes(4, "little") + b"WEBP" + b"\x00" * 8, True),
+            "trunc.webp": (b"RIFF" + (100).to_bytes(4, "little") + b"WEBP" + b"\x00" * 8, False),
+            "empty.jpg": (b"", False),
+            "error.jpg": (b"<html><body>403 Forbidden</body></html>", False),
+        }
+        for name, (data, expected) in cases.items():
+            path = self.test_dir / name
+            path.write_bytes(data)
+            self.assertEqual(is_image_complete(path), expected, name)
+        self.assertFalse(is_image_complete(self.test_dir / "missing.jpg"))
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
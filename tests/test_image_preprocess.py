@@ -0,0 +1,198 @@
+"""
+image_preprocess.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+from unittest import mock
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import numpy as np
+from PIL import Image
+
+import utils
+import xhs_processor
+from image_preprocess import (
+    prepare_image, target_size, to_original_coords, draft_size, original_boxes, OcrLines,
+    DEFAULT_MAX_SIDE
+)
+from note_record import load_record
+from ocr_client import serialize_result, deserialize_result
+
+
+def make_image(path, size, color=(220, 30, 10)):
+    """生成一张纯色JPEG图片"""
+    Image.new("RGB", size, color).save(path, quality=90)
+    return path
+
+
+class TestPrepareImage(unittest.TestCase):
+    """测试OCR前的缩放"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_target_size(self):
+        """测试按最长边计算缩放尺寸"""
+        self.assertEqual(target_size((1440, 1920), 960), ((720, 960), 0.5))
+        self.assertEqual(target_size((800, 600), 960), ((800, 600), 1.0))
+        self.assertEqual(target_size((4000, 3000), 0), ((4000, 3000), 1.0))
+
+    def test_large_image_downscaled_to_bgr_array(self):
+        """测试大图缩小为BGR数组并返回缩放比例"""
+        path = make_image(self.test_dir / "big.jpg", (1200, 1600))
+
+        pixels, scale = prepare_image(path, max_side=1280)
+
+        self.assertIsInstance(pixels, np.ndarray)
+        self.assertEqual(pixels.shape, (1280, 960, 3))
+        self.assertAlmostEqual(scale, 960 / 1200)
+        # 通道顺序为BGR：红色在最后一个通道
+        self.assertGreater(int(pixels[0, 0, 2]), 200)
+        self.assertLess(int(pixels[0, 0, 0]), 50)
+
+    def test_default_max_side_reached_by_draft(self):
+        """测试默认上限下常见的1440×1920原图在解码阶段直接缩小一半"""
+        self.assertEqual(draft_size((1440, 1920), DEFAULT_MAX_SIDE), (720, 960))
+        path = make_image(self.test_dir / "big.jpg", (1440, 1920))
+
+        with mock.patch.object(Image.Image, "resize", side_effect=AssertionError("不应插值缩放")):
+            pixels, scale = prepare_image(path)
+
+        self.assertEqual(pixels.shape, (960, 720, 3))
+        self.assertEqual(scale, 0.5)
+
+    def test_draft_result_close_to_limit_used_directly(self):
+        """测试draft能缩小到接近上限时不再插值，否则插值到上限"""
+        self.assertEqual(draft_size((1080, 1440), 960), (540, 720))
+        self.assertEqual(draft_size((1440, 1920), 1280), (720, 960))
+        self.assertIsNone(draft_size((1200, 1600), 1280))
+        self.assertIsNone(draft_size((1000, 1000), 960))
+        path = make_image(self.test_dir / "mid.jpg", (1080, 1440))
+
+        with mock.patch.object(Image.Image, "resize", side_effect=AssertionError("不应插值缩放")):
+            pixels, scale = prepare_image(path, 960)
+
+        self.assertEqual(pixels.shape, (720, 540, 3))
+        self.assertEqual(scale, 0.5)
+
+    def test_non_jpeg_resized(self):
+        """测试draft不生效的格式仍缩小到上限"""
+        path = self.test_dir / "big.png"
+        Image.new("RGB", (1440, 1920), (220, 30, 10)).save(path)
+
+        pixels, scale = prepare_image(path, 960)
+
+        self.assertEqual(pixels.shape, (960, 720, 3))
+        self.assertEqual(scale, 0.5)
+
+    def test_small_or_undecodable_image_keeps_path(self):
+        """测试未超过上限或无法解码的图片交给引擎自行读取"""
+        small = make_image(self.test_dir / "small.jpg", (480, 640))
+        broken = self.test_dir / "broken.jpg"
+        broken.write_bytes(b"not an image")
+
+        self.assertEqual(prepare_image(small, 1280), (str(small), 1.0))
+        self.assertEqual(prepare_image(broken, 1280), (str(broken), 1.0))
+        self.assertEqual(prepare_image(small, 0), (str(small), 1.0))
+
+    def test_to_original_coords(self):
+        """测试检测框坐标换算回原图"""
+        box = np.array([[10, 20], [30, 40]])
+        self.assertEqual(to_original_coords(box, 0.5), [[20.0, 40.0], [60.0, 80.0]])
+        self.assertEqual(to_original_coords([5, 10], 0.25), [20.0, 40.0])
+        self.assertEqual(original_boxes(np.array([[10, 20, 30, 41]]), 0.3), [[33.3, 66.7, 100.0, 136.7]])
+
+    def test_result_through_server(self):
+        """测试缩放比例和检测框经过OCR服务后保留"""
+        restored = deserialize_result(serialize_result(OcrLines(["文字"], 0.5, [[2.0, 4.0, 6.0, 8.0]])))
+        self.assertIsInstance(restored, OcrLines)
+        self.assertEqual(restored, ["文字"])
+        self.assertEqual((restored.scale, restored.boxes), (0.5, [[2.0, 4.0, 6.0, 8.0]]))
+
+
+class RecordingEngine:
+    """记录predict输入的模拟OCR引擎"""
+
+    class Result:
+        def __init__(self, lines):
+            self.json = {'res': {'rec_texts': lines, 'rec_boxes': [[10, 20, 30, 40]] * len(lines)}}
+
+    def __init__(self):
+        self.inputs = []
+
+    def predict(self, input):
+        items = input if isinstance(input, list) else [input]
+        self.inputs.extend(items)
+        return [self.Result(["文字"]) for _ in items]
+
+
+class TestProcessorPreprocess(unittest.TestCase):
+    """测试处理器识别前缩放图片"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        self.saved = {name: getattr(xhs_processor, name)
+                      for name in ("ocr", "ocr_server_client", "OCR_MAX_SIDE", "OCR_CACHE_ENABLED",
+                                   "OCR_TEXT_GATE")}
+        self.engine = RecordingEngine()
+        xhs_processor.ocr = self.engine
+        xhs_processor.ocr_server_client = None
+        xhs_processor.OCR_MAX_SIDE = 960
+        xhs_processor.OCR_CACHE_ENABLED = False
+        # 纯色测试图片没有文字，不做文字判断
+        xhs_processor.OCR_TEXT_GATE = "off"
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(xhs_processor, name, value)
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_large_images_passed_as_arrays(self):
+        """测试大图以数组传给引擎，小图仍传路径"""
+        images_dir = self.test_dir / "xhs_notes" / "note_a" / "images"
+        ocr_dir = images_dir.parent / "ocr_results"
+        images_dir.mkdir(parents=True)
+        ocr_dir.mkdir()
+        big = make_image(images_dir / "0.jpg", (1440, 1920))
+        small = make_image(images_dir / "1.jpg", (480, 640), color=(10, 200, 30))
+        before = xhs_processor.OCR_STATS["downscaled"]
+
+        xhs_processor.ocr_images_batch([(big, str(ocr_dir / "0.md")), (small, str(ocr_dir / "1.md"))],
+                                       batch_size=2)
+
+        array, path = self.engine.inputs
+        self.assertEqual(array.shape, (960, 720, 3))
+        self.assertEqual(path, str(small))
+        self.assertEqual(xhs_processor.OCR_STATS["downscaled"] - before, 1)
+        self.assertIn("文字", (ocr_dir / "0.md").read_text(encoding='utf-8'))
+
+        # 缩放比例和换算回原图坐标的检测框写入note.json
+        entries = load_record(images_dir.parent)["ocr"]
+        self.assertEqual(entries["0.jpg"]["scale"], 0.5)
+        self.assertEqual(entries["0.jpg"]["boxes"], [[20.0, 40.0, 60.0, 80.0]])
+        self.assertEqual(entries["1.jpg"]["scale"], 1.0)
+        self.assertEqual(entries["1.jpg"]["boxes"], [[10.0, 20.0, 30.0, 40.0]])
+
+    def test_max_side_in_cache_fingerprint(self):
+        """测试缩放上限变化后OCR缓存不再命中"""
+        key = xhs_processor.ocr_engine_key()
+        xhs_processor.OCR_MAX_SIDE = 1280
+        self.assertNotEqual(xhs_processor.ocr_engine_key(), key)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,243 @@
+"""
+journal.py 模块与 --resume 的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import signal
+import time
+import threading
+from unittest import mock
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+from journal import TaskJournal, load_journal, journal_path
+from pipeline import NotePipeline
+
+
+NOTE_IDS = [f"68a9a370000000001b037d{i:02x}" for i in range(4)]
+
+# main()会修改的模块级配置，测试后恢复
+PROCESSOR_GLOBALS = (
+    "ocr_server_client", "ocr_pool", "OCR_CPU_THREADS", "OCR_CACHE_ENABLED",
+    "PHASH_ENABLED", "PHASH_DISTANCE", "API_CACHE_ENABLED", "API_CACHE_TTL_SECONDS",
+    "API_CACHE_SIZE_BYTES", "API_RETRY_POLICY", "api_breaker",
+)
+
+
+class TestTaskJournal(unittest.TestCase):
+    """测试只追加的任务日志"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+
+    def tearDown(self):
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_records_outcomes(self):
+        """测试记录输入和每个笔记的结果，后写入的结果覆盖之前的"""
+        journal = TaskJournal("task_a")
+        journal.start(["a", "b", "c"])
+        journal.record_note(0, "a", "a", True)
+        journal.record_note(1, "b", "b", False)
+        journal.record_note(1, "b", "b", True)
+
+        state = load_journal("task_a")
+        self.assertEqual(state["items"], ["a", "b", "c"])
+        self.assertEqual(state["status"], {0: "done", 1: "done"})
+        self.assertFalse(state["finished"])
+
+        journal.finish(2, 1)
+        self.assertTrue(load_journal("task_a")["finished"])
+
+    def test_truncated_last_line_ignored(self):
+        """测试中断时写了一半的最后一行被忽略"""
+        journal = TaskJournal("task_b")
+        journal.start(["a"])
+        with open(journal_path("task_b"), 'a', encoding='utf-8') as f:
+            f.write('{"event": "note", "index": 0, "sta')
+
+        self.assertEqual(load_journal("task_b")["status"], {})
+
+    def test_missing_journal(self):
+        """测试不存在的任务返回None"""
+        self.assertIsNone(load_journal("no_such_task"))
+
+    def test_pipeline_stop_drains_in_flight(self):
+        """测试停止信号后进行中的笔记完成，未开始的笔记不处理也不回调"""
+        stop = threading.Event()
+        started = []
+
+        def fetch(job):
+            job.note_id = job.item
+            started.append(job.item)
+            if job.item == "b":
+                stop.set()
+                time.sleep(0.05)
+
+        finished = []
+        pipeline = NotePipeline(
+            fetch=fetch,
+            download=lambda job, emit: None,
+            ocr=lambda items: None,
+            build=lambda job: f"content-{job.item}",
+            workers={"fetch": 1},
+            on_result=lambda job: finished.append(job.item),
+            stop=stop
+        )
+        results = pipeline.run(["a", "b", "c", "d"])
+
+        self.assertEqual(results, ["content-a", "content-b", None, None])
+        self.assertEqual(started, ["a", "b"])
+        self.assertEqual(sorted(finished), ["a", "b"])
+
+
+class TestResume(unittest.TestCase):
+    """测试中断后 --resume 只处理未完成的笔记并生成相同的合并文档"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+        self.saved = {name: getattr(xhs_processor, name) for name in PROCESSOR_GLOBALS}
+        self.api_calls = []
+        self.interrupt = False
+        self.force_quit = False
+        self.release = threading.Event()
+
+        def fake_api(item):
+            note_id = utils.extract_note_id(item)
+            self.api_calls.append(note_id)
+            # 连按两次Ctrl+C时，获取线程仍阻塞在网络调用中
+            if self.force_quit:
+                os.kill(os.getpid(), signal.SIGINT)
+                time.sleep(0.2)
+                os.kill(os.getpid(), signal.SIGINT)
+                self.release.wait(10)
+            # 第二个笔记获取数据时按下Ctrl+C
+            if self.interrupt and len(self.api_calls) == 2:
+                os.kill(os.getpid(), signal.SIGINT)
+                time.sleep(0.2)
+            return {'data': {'作品标题': f"标题{note_id[-2:]}", '作品描述': f"正文{note_id}"}}
+
+        self.patches = [
+            mock.patch.object(xhs_processor, "download_note_via_api", side_effect=fake_api),
+            mock.patch.object(xhs_processor, "check_xhs_api_status", return_value=True),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        self.release.set()
+        for p in self.patches:
+            p.stop()
+        for name, value in self.saved.items():
+            setattr(xhs_processor, name, value)
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _main(self, *argv):
+        args = ["xhs_processor.py", *argv, "--fetch-workers", "1", "--no-ocr-server",
+                "--no-api-cache"]
+        with mock.patch.object(sys, "argv", args):
+            return xhs_processor.main()
+
+    def _merged(self, task_id):
+        text = (Path(self.test_dir) / "ronggao_output" / task_id / "merged.md").read_text(encoding='utf-8')
+        lines = text.splitlines()
+        # 时间戳和任务ID之外逐字节比较
+        skipped = ("生成时间", "完成时间", "任务ID")
+        return "\n".join(line for line in lines if not any(key in line for key in skipped))
+
+    def test_interrupt_then_resume(self):
+        """测试Ctrl+C后续跑，合并文档与一次完整运行相同"""
+        notes = "\n".join(NOTE_IDS)
+        self.interrupt = True
+        task_id = self._main(notes)
+
+        state = load_journal(task_id)
+        self.assertEqual(state["status"], {0: "done", 1: "done"})
+        self.assertFalse((Path(self.test_dir) / "ronggao_output" / task_id / "merged.md").exists())
+
+        self.interrupt = False
+        self.api_calls.clear()
+        self.assertEqual(self._main("--resume", task_id), task_id)
+
+        self.assertEqual(self.api_calls, state["items"][2:])
+        self.assertTrue(load_journal(task_id)["finished"])
+
+        # 所有笔记都已缓存时一次完整运行得到的合并文档
+        clean_task = self._main(notes)
+        self.assertEqual(self._merged(task_id), self._merged(clean_task))
+
+    def _status(self, task_id):
+        path = Path(self.test_dir) / "ronggao_output" / task_id / "merged.json"
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    def test_interrupted_stream_stays_incomplete(self):
+        """测试流式写入时Ctrl+C只保留已完成的笔记，merged.json保持未完成"""
+        self.interrupt = True
+        task_id = self._main("\n".join(NOTE_IDS), "--stream-merged")
+
+        status = self._status(task_id)
+        self.assertFalse(status["complete"])
+        self.assertEqual((status["written"], status["success"], status["failed"]), (2, 2, 0))
+        items = load_journal(task_id)["items"]
+        merged = self._merged(task_id)
+        for note_id in items[:2]:
+            self.assertIn(f"正文{note_id}", merged)
+        for note_id in items[2:]:
+            self.assertNotIn(f"正文{note_id}", merged)
+        self.assertNotIn("## 处理统计", merged)
+
+    def test_stream_interrupt_then_resume(self):
+        """测试流式写入时Ctrl+C后续跑，merged.md和merged.json与一次完整运行相同"""
+        notes = "\n".join(NOTE_IDS)
+        self.interrupt = True
+        task_id = self._main(notes, "--stream-merged")
+        self.assertFalse(self._status(task_id)["complete"])
+
+        self.interrupt = False
+        self.assertEqual(self._main("--resume", task_id, "--stream-merged"), task_id)
+        clean_task = self._main(notes, "--stream-merged")
+
+        self.assertEqual(self._merged(task_id), self._merged(clean_task))
+        status, clean_status = self._status(task_id), self._status(clean_task)
+        self.assertTrue(status["complete"])
+        self.assertEqual(status.pop("task_id"), task_id)
+        clean_status.pop("task_id")
+        self.assertEqual(status, clean_status)
+
+    def test_second_interrupt_does_not_wait_for_workers(self):
+        """测试第二次Ctrl+C立即退出，不等待阻塞中的工作线程"""
+        self.force_quit = True
+        handler = signal.getsignal(signal.SIGINT)
+        start = time.monotonic()
+
+        with self.assertRaises(KeyboardInterrupt):
+            self._main("\n".join(NOTE_IDS))
+
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertFalse(self.release.is_set())
+        self.assertIs(signal.getsignal(signal.SIGINT), handler)
+
+    def test_resume_unknown_task(self):
+        """测试续跑不存在的任务时退出"""
+        with self.assertRaises(SystemExit):
+            self._main("--resume", "no_such_task")
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,269 @@
+"""
+manifest.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+import threading
+from types import SimpleNamespace
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+from image_downloader import configure_downloader
+from manifest import (
+    load_manifest, stage_done, missing_images, set_expected_images,
+    mark_downloaded, mark_ocr_done, mark_content_done, manifest_dir, mark_ocr_synced,
+    changed_ocr_files, mark_fetched, content_stale
+)
+
+
+JPEG_BYTES = b"\xff\xd8" + bytes(range(256)) + b"\xff\xd9"
+
+API_DATA = {
+    'data': {
+        '作品标题': '测试标题',
+        '作品描述': '正文',
+        '下载地址': [f"http://cdn.example/{i}.jpg" for i in range(5)],
+    }
+}
+
+
+class StubPaddle:
+    """模拟PaddleOCR：记录识别过的图片"""
+
+    class Result:
+        def __init__(self, lines):
+            self.json = {'res': {'rec_texts': lines}}
+
+    def __init__(self):
+        self.seen = []
+
+    def predict(self, input):
+        paths = input if isinstance(input, list) else [input]
+        self.seen.extend(Path(p).name for p in paths)
+        return [self.Result([f"{Path(p).stem}号图"]) for p in paths]
+
+
+class TestManifest(unittest.TestCase):
+    """测试阶段清单的读写与阶段计算"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+
+    def tearDown(self):
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_stage_follows_image_sets(self):
+        """测试所有应有图片完成后阶段才算完成"""
+        note_dir = manifest_dir("n1")
+        set_expected_images("n1", ["0.jpg", "1.jpg"])
+        mark_downloaded(note_dir, "0.jpg")
+
+        manifest = load_manifest(note_dir)
+        self.assertFalse(stage_done(manifest, "download"))
+        self.assertEqual(missing_images(manifest, "download"), ["1.jpg"])
+
+        mark_downloaded(note_dir, "1.jpg")
+        mark_ocr_done(note_dir, {"0.jpg": "aa", "1.jpg": None})
+        manifest = load_manifest(note_dir)
+        self.assertTrue(stage_done(manifest, "download"))
+        self.assertTrue(stage_done(manifest, "ocr"))
+
+    def test_note_without_images(self):
+        """测试没有图片的笔记下载和OCR阶段直接完成"""
+        set_expected_images("n2", [])
+
+        manifest = load_manifest(manifest_dir("n2"))
+        self.assertTrue(stage_done(manifest, "download"))
+        self.assertTrue(stage_done(manifest, "ocr"))
+
+    def test_ocr_invalidates_content(self):
+        """测试新的OCR结果使content阶段失效"""
+        note_dir = manifest_dir("n3")
+        mark_content_done("n3", "hash")
+        self.assertTrue(stage_done(load_manifest(note_dir), "content"))
+
+        mark_ocr_done(note_dir, {"0.jpg": None})
+        self.assertFalse(stage_done(load_manifest(note_dir), "content"))
+
+    def test_changed_ocr_files_uses_written_hashes(self):
+        """测试只有内容与OCR写入时不同的结果文件才算手动修正"""
+        note_dir = manifest_dir("n6")
+        mark_ocr_done(note_dir, {"0.jpg": None, "1.jpg": None}, {"0.md": "a2", "1.md": "b"})
+        # content.md生成于重新识别之前，其输入指纹中0.md仍是旧内容
+        mark_content_done("n6", "hash", {"template": 1, "metadata": "m", "ocr": {"0.md": "a", "1.md": "b"}})
+        current = {"ocr": {"0.md": "a2", "1.md": "b2", "2.md": "c"}}
+
+        self.assertEqual(changed_ocr_files(note_dir, current), ["1.md"])
+        mark_ocr_synced(note_dir, {"1.md": "b2"})
+        self.assertEqual(changed_ocr_files(note_dir, current), [])
+
+    def test_changed_ocr_files_legacy_manifest(self):
+        """测试没有写入哈希的旧清单与生成content.md时的输入指纹比较"""
+        note_dir = manifest_dir("n7")
+        mark_content_done("n7", "hash", {"template": 1, "metadata": "m", "ocr": {"0.md": "a"}})
+        self.assertEqual(changed_ocr_files(note_dir, {"ocr": {"0.md": "a1"}}), ["0.md"])
+        self.assertEqual(changed_ocr_files(note_dir, {"ocr": {"0.md": "a"}}), [])
+
+    def test_concurrent_updates(self):
+        """测试多线程同时更新同一清单不会丢失"""
+        note_dir = manifest_dir("n4")
+        set_expected_images("n4", [f"{i}.jpg" for i in range(20)])
+
+        threads = [threading.Thread(target=mark_downloaded, args=(note_dir, f"{i}.jpg"))
+                   for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertTrue(stage_done(load_manifest(note_dir), "download"))
+        self.assertEqual([p.name for p in note_dir.iterdir()], ["manifest.json"])
+
+    def test_corrupt_manifest_ignored(self):
+        """测试损坏的清单视为不存在"""
+        note_dir = manifest_dir("n5")
+        note_dir.mkdir(parents=True)
+        (note_dir / "manifest.json").write_text("{broken", encoding='utf-8')
+
+        self.assertIsNone(load_manifest(note_dir))
+
+
+class TestManifestResume(unittest.TestCase):
+    """测试处理器按阶段清单逐张图片续做"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        self.original_ocr = xhs_processor.ocr
+        self.original_server_client = xhs_processor.ocr_server_client
+        self.original_cache_enabled = xhs_processor.OCR_CACHE_ENABLED
+        self.original_phash_enabled = xhs_processor.PHASH_ENABLED
+        self.paddle = StubPaddle()
+        xhs_processor.ocr = self.paddle
+        xhs_processor.ocr_server_client = None
+        xhs_processor.OCR_CACHE_ENABLED = False
+        xhs_processor.PHASH_ENABLED = False
+        self.fetched = []
+        self.fail_urls = set()
+
+        def fetch(url, img_path):
+            if url in self.fail_urls:
+                return "连接中断"
+            self.fetched.append(url)
+            Path(img_path).write_bytes(JPEG_BYTES)
+            return None
+
+        configure_downloader(per_host=2, rate=0, fetch=fetch)
+
+    def tearDown(self):
+        configure_downloader()
+        xhs_processor.ocr = self.original_ocr
+        xhs_processor.ocr_server_client = self.original_server_client
+        xhs_processor.OCR_CACHE_ENABLED = self.original_cache_enabled
+        xhs_processor.PHASH_ENABLED = self.original_phash_enabled
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _note_dir(self, note_id):
+        return self.test_dir / "xhs_notes" / note_id
+
+    def test_partial_ocr_resumed_image_by_image(self):
+        """测试OCR中断后只识别缺失的图片"""
+        xhs_processor.save_metadata_md("note_a", API_DATA)
+        xhs_processor.download_images("note_a", API_DATA)
+        note_dir = self._note_dir("note_a")
+
+        # 模拟上次运行在3张图片后中断：结果文件已写但未记入清单的第4张视为未完成
+        ocr_dir = note_dir / "ocr_results"
+        ocr_dir.mkdir()
+        for i in range(4):
+            (ocr_dir / f"{i}.md").write_text(f"{i}", encoding='utf-8')
+        mark_ocr_done(note_dir, {f"{i}.jpg": None for i in range(3)})
+
+        self.assertFalse(utils.has_ocr_results("note_a"))
+        xhs_processor.perform_ocr_on_note("note_a")
+
+        self.assertEqual(sorted(self.paddle.seen), ["3.jpg", "4.jpg"])
+        self.assertTrue(utils.has_ocr_results("note_a"))
+
+    def test_missing_downloads_resumed_from_record(self):
+        """测试下载中断后从note.json补齐缺失的图片"""
+        self.fail_urls = {API_DATA['data']['下载地址'][3]}
+        xhs_processor.save_metadata_md("note_b", API_DATA)
+        xhs_processor.download_images("note_b", API_DATA)
+        self.assertEqual(missing_images(load_manifest(self._note_dir("note_b")), "download"),
+                         ["3.jpg"])
+
+        self.fail_urls = set()
+        self.fetched = []
+        content = xhs_processor.process_note("note_b", "task_resume")
+
+        self.assertEqual(self.fetched, [API_DATA['data']['下载地址'][3]])
+        self.assertIn("3号图", content)
+        self.assertTrue(stage_done(load_manifest(self._note_dir("note_b")), "content"))
+
+    def test_leftover_content_not_complete(self):
+        """测试content阶段未记入清单时content.md不算完成"""
+        xhs_processor.save_metadata_md("note_c", {'data': {'作品标题': '标题'}})
+        (self._note_dir("note_c") / "content.md").write_text("半成品", encoding='utf-8')
+
+        self.assertFalse(utils.is_note_complete("note_c"))
+
+        xhs_processor.generate_content_md("note_c")
+        self.assertTrue(utils.is_note_complete("note_c"))
+
+    def test_manifest_overrides_catalog(self):
+        """测试有清单时按清单判断完成状态，状态目录中的content_done不再优先"""
+        xhs_processor.save_metadata_md("note_e", {'data': {'作品标题': '标题'}})
+        xhs_processor.generate_content_md("note_e")
+        self.assertTrue(utils.is_note_complete("note_e"))
+
+        mark_fetched("note_e", "新的API数据")
+        xhs_processor.update_catalog("note_e", content_done=1)
+
+        self.assertFalse(utils.is_note_complete("note_e"))
+
+    def test_stale_content_regenerated_on_run(self):
+        """测试已处理的笔记在OCR结果被修改后，处理时重新生成content.md"""
+        xhs_processor.save_metadata_md("note_f", API_DATA)
+        xhs_processor.download_images("note_f", API_DATA)
+        xhs_processor.perform_ocr_on_note("note_f")
+        xhs_processor.generate_content_md("note_f")
+        self.assertTrue(utils.is_note_complete("note_f"))
+
+        ocr_path = self._note_dir("note_f") / "ocr_results" / "2.md"
+        ocr_path.write_text(ocr_path.read_text(encoding='utf-8').replace("2号图", "修正后的文字"),
+                            encoding='utf-8')
+
+        job = SimpleNamespace(item="note_f", note_id=None, content=None, api_data=None)
+        self.assertTrue(xhs_processor._pipeline_fetch(job, "task_stale"))
+        self.assertIn("修正后的文字", job.content)
+        self.assertFalse(content_stale(self._note_dir("note_f")))
+        self.assertEqual(xhs_processor.process_note("note_f", "task_stale"), job.content)
+
+    def test_atomic_writes_leave_no_temp_files(self):
+        """测试各阶段写入后不留下临时文件"""
+        xhs_processor.save_metadata_md("note_d", API_DATA)
+        xhs_processor.download_images("note_d", API_DATA)
+        xhs_processor.perform_ocr_on_note("note_d")
+        xhs_processor.generate_content_md("note_d")
+
+        leftovers = [p for p in self._note_dir("note_d").rglob("*") if p.name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+"""
+merged_writer.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import threading
+import random
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+from merged_writer import MergedWriter
+from pipeline import NotePipeline
+
+
+class TestMergedWriter(unittest.TestCase):
+    """测试流式写入合并文档"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+
+    def tearDown(self):
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _status(self, writer):
+        return json.loads(writer.status_path.read_text(encoding='utf-8'))
+
+    def test_sections_written_in_input_order(self):
+        """测试乱序完成的笔记按输入顺序写入，前面的笔记完成后立即可读"""
+        writer = MergedWriter("task_a", ["n0", "n1", "n2"]).open()
+        self.assertIn("任务ID: task_a", writer.path.read_text(encoding='utf-8').replace("**", ""))
+
+        writer.add(1, "# 笔记1")
+        self.assertNotIn("# 笔记1", writer.path.read_text(encoding='utf-8'))
+        self.assertEqual(self._status(writer)["written"], 0)
+
+        writer.add(0, "# 笔记0")
+        text = writer.path.read_text(encoding='utf-8')
+        self.assertLess(text.index("# 笔记0"), text.index("# 笔记1"))
+        self.assertEqual(self._status(writer)["written"], 2)
+
+        writer.add(2, None)
+        writer.close()
+
+        text = writer.path.read_text(encoding='utf-8')
+        self.assertIn("# 笔记0\n\n---\n\n# 笔记1", text)
+        self.assertIn("**成功处理**: 2", text)
+        self.assertIn("**失败处理**: 1", text)
+        status = self._status(writer)
+        self.assertTrue(status["complete"])
+        self.assertEqual((status["success"], status["failed_notes"]), (2, ["n2"]))
+
+    def test_no_successful_notes(self):
+        """测试没有成功的笔记时写入提示"""
+        with MergedWriter("task_b", ["n0"]) as writer:
+            writer.add(0, None)
+
+        self.assertIn("没有成功处理的笔记内容", writer.path.read_text(encoding='utf-8'))
+        self.assertEqual(self._status(writer)["failed"], 1)
+
+    def test_missing_results_count_as_failed(self):
+        """测试关闭时仍未提交的笔记按失败计"""
+        writer = MergedWriter("task_c", ["n0", "n1", "n2"]).open()
+        writer.add(2, "# 笔记2")
+        writer.close()
+
+        status = self._status(writer)
+        self.assertEqual((status["success"], status["failed_notes"]), (1, ["n0", "n1"]))
+        self.assertIn("# 笔记2", writer.path.read_text(encoding='utf-8'))
+
+    def test_abort_keeps_status_incomplete(self):
+        """测试中断时只保留已写入的笔记，不写文末统计也不标记完成"""
+        writer = MergedWriter("task_e", ["n0", "n1", "n2"]).open()
+        writer.add(0, "# 笔记0")
+        writer.add(2, "# 笔记2")
+        writer.abort()
+        writer.abort()
+
+        text = writer.path.read_text(encoding='utf-8')
+        self.assertIn("# 笔记0", text)
+        self.assertNotIn("# 笔记2", text)
+        self.assertNotIn("## 处理统计", text)
+        status = self._status(writer)
+        self.assertFalse(status["complete"])
+        self.assertEqual((status["written"], status["success"], status["failed_notes"]), (1, 1, []))
+
+    def test_concurrent_pipeline_results(self):
+        """测试流水线多线程完成笔记时输出顺序稳定且不保留内容"""
+        items = [f"n{i}" for i in range(20)]
+        writer = MergedWriter("task_d", items).open()
+
+        def build(job):
+            threading.Event().wait(random.random() * 0.01)
+            return f"# {job.item}"
+
+        pipeline = NotePipeline(
+            fetch=lambda job: setattr(job, "note_id", job.item),
+            download=lambda job, emit: None,
+            ocr=lambda items: None,
+            build=build,
+            workers={"build": 4},
+            on_result=lambda job: writer.add(job.index, None if job.failed else job.content),
+            keep_results=False
+        )
+        results = pipeline.run(items)
+        writer.close()
+
+        self.assertEqual(results, [True] * 20)
+        text = writer.path.read_text(encoding='utf-8')
+        positions = [text.index(f"# {item}\n") if i < 19 else text.index(f"# {item}")
+                     for i, item in enumerate(items)]
+        self.assertEqual(positions, sorted(positions))
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,124 @@
+"""
+metrics.py 模块与处理器分阶段指标的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+from unittest import mock
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import utils
+import xhs_processor
+import http_client
+from http_client import HttpClient
+from metrics import TaskMetrics, timed, set_metrics, get_metrics, SUMMARY_FILENAME
+from benchmark import StubOcr
+from fake_xhs_server import FakeXhsServer
+from synthetic_corpus import note_id_for
+
+# main()会修改的模块级配置，测试后恢复
+PROCESSOR_GLOBALS = (
+    "ocr", "ocr_server_client", "ocr_pool", "OCR_CPU_THREADS", "OCR_CACHE_ENABLED",
+    "PHASH_ENABLED", "PHASH_DISTANCE", "API_CACHE_ENABLED", "API_CACHE_TTL_SECONDS",
+    "API_CACHE_SIZE_BYTES", "API_RETRY_POLICY", "api_breaker", "XHS_API_BASE",
+    "XHS_API_URL", "XHS_API_DOCS_URL",
+)
+
+
+class TestTaskMetrics(unittest.TestCase):
+    """测试指标记录与汇总"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+
+    def tearDown(self):
+        set_metrics(None)
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_timed_inactive(self):
+        """测试未启用时计时上下文不记录"""
+        self.assertIsNone(get_metrics())
+        with timed("api", "a") as m:
+            m["bytes"] = 1
+        self.assertEqual(m, {"bytes": 1})
+
+    def test_events_and_summary(self):
+        """测试事件写入metrics.jsonl，汇总包含调用数、计数器合计和异常"""
+        metrics = TaskMetrics("task_m")
+        set_metrics(metrics)
+        for size in (100, 300):
+            with timed("download", "n1") as m:
+                m["bytes"] = size
+        with self.assertRaises(ValueError):
+            with timed("ocr", "n1"):
+                raise ValueError("boom")
+        table = metrics.close()
+
+        events = [json.loads(line) for line in metrics.path.read_text(encoding='utf-8').splitlines()]
+        self.assertEqual([e["stage"] for e in events], ["download", "download", "ocr"])
+        summary = metrics.summary()
+        self.assertEqual(summary["download"]["calls"], 2)
+        self.assertEqual(summary["download"]["bytes"], 400)
+        self.assertEqual(summary["ocr"]["errors"], 1)
+        self.assertIn("图片下载", table)
+        self.assertTrue((metrics.path.parent / SUMMARY_FILENAME).exists())
+
+
+class TestProcessorMetrics(unittest.TestCase):
+    """测试一次完整任务写出各阶段指标"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+        self.saved = {name: getattr(xhs_processor, name) for name in PROCESSOR_GLOBALS}
+        self.server = FakeXhsServer(images=2).start()
+        self.original_client = http_client.set_client(HttpClient())
+        xhs_processor.ocr = StubOcr({})
+
+    def tearDown(self):
+        self.server.stop()
+        http_client.set_client(self.original_client)
+        for name, value in self.saved.items():
+            setattr(xhs_processor, name, value)
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_stage_metrics(self):
+        """测试API、下载、OCR、生成内容和合并文档都有指标"""
+        notes = "\n".join(note_id_for(n, prefix="8b") for n in range(2))
+        argv = ["xhs_processor.py", notes, "--api-base", self.server.url, "--no-ocr-server",
+                "--no-api-cache", "--no-ocr-cache", "--no-phash"]
+        with mock.patch.object(sys, "argv", argv):
+            task_id = xhs_processor.main()
+
+        self.assertIsNone(get_metrics())
+        output = Path(self.test_dir) / "ronggao_output" / task_id
+        events = [json.loads(line) for line in (output / "metrics.jsonl").read_text(encoding='utf-8').splitlines()]
+        by_stage = {}
+        for event in events:
+            by_stage.setdefault(event["stage"], []).append(event)
+
+        self.assertEqual(len(by_stage["api"]), 2)
+        self.assertTrue(all(e["ok"] == 1 and e["bytes"] > 0 for e in by_stage["api"]))
+        self.assertEqual(sum(e["downloaded"] for e in by_stage["download"]), 4)
+        self.assertEqual(sum(e["recognized"] for e in by_stage["ocr"]), 4)
+        self.assertEqual(len(by_stage["content"]), 2)
+        self.assertEqual(by_stage["merged"][0]["notes"], 2)
+        self.assertIn("OCR识别", (output / SUMMARY_FILENAME).read_text(encoding='utf-8'))
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
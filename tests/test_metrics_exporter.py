@@ -0,0 +1,123 @@
+"""
+metrics_exporter.py 模块（Prometheus指标导出）的单元测试
+"""
+
+import re
+import unittest
+import threading
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import http_client
+import xhs_processor
+from http_client import HttpClient
+from metrics import timed
+from metrics_exporter import MetricsExporter, CONTENT_TYPE
+from pipeline import NotePipeline, running_snapshot
+from fake_xhs_server import FakeXhsServer
+from load_harness import run_load
+
+
+class TestMetricsExporter(unittest.TestCase):
+    """测试指标注册与文本格式"""
+
+    def test_render_histogram_and_counters(self):
+        """测试直方图桶累积、计数器和缓存命中率"""
+        exporter = MetricsExporter(buckets=(0.1, 1.0))
+        exporter.observe("api", 0.05, {"cache_hits": 1, "bytes": 100})
+        exporter.observe("api", 0.5, {"bytes": 50})
+        exporter.observe("ocr", 2.0, {"recognized": 3, "cache_hits": 1, "errors": 1})
+
+        text = exporter.render()
+        self.assertIn('# TYPE xhs_stage_duration_seconds histogram', text)
+        self.assertIn('xhs_stage_duration_seconds_bucket{stage="api",le="0.1"} 1', text)
+        self.assertIn('xhs_stage_duration_seconds_bucket{stage="api",le="1"} 2', text)
+        self.assertIn('xhs_stage_duration_seconds_bucket{stage="api",le="+Inf"} 2', text)
+        self.assertIn('xhs_stage_duration_seconds_count{stage="ocr"} 1', text)
+        self.assertIn('xhs_stage_units_total{stage="api",unit="bytes"} 150', text)
+        self.assertIn('xhs_stage_errors_total{stage="ocr"} 1', text)
+        self.assertIn('xhs_cache_hit_ratio{cache="api"} 0.5', text)
+        self.assertIn('xhs_cache_hit_ratio{cache="ocr"} 0.25', text)
+
+    def test_http_endpoint_and_observer(self):
+        """测试 /metrics 服务，以及启动后阶段计时自动计入"""
+        exporter = MetricsExporter().start(0)
+        try:
+            with timed("content", "n1"):
+                pass
+            client = HttpClient()
+            response = client.get(exporter.url, timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["Content-Type"], CONTENT_TYPE)
+            self.assertIn('xhs_stage_calls_total{stage="content"} 1', response.text)
+            self.assertEqual(client.get(exporter.url.replace("/metrics", "/other"), timeout=5).status_code, 404)
+        finally:
+            exporter.stop()
+        with timed("content", "n2"):
+            pass
+        self.assertEqual(exporter.stage_calls.value(stage="content"), 1)
+
+
+class TestPipelineGauges(unittest.TestCase):
+    """测试流水线状态与处理器指标"""
+
+    def test_in_flight_snapshot(self):
+        """测试运行中的流水线报告进行中和未开始的笔记"""
+        entered = threading.Event()
+        release = threading.Event()
+
+        def fetch(job):
+            job.note_id = job.item
+            if job.item == "a":
+                entered.set()
+                release.wait(5)
+
+        pipeline = NotePipeline(fetch=fetch, download=lambda job, emit: None,
+                                ocr=lambda items: None, build=lambda job: "x",
+                                workers={"fetch": 1})
+        thread = threading.Thread(target=pipeline.run, args=(["a", "b", "c"],))
+        thread.start()
+        try:
+            self.assertTrue(entered.wait(5))
+            snapshot = running_snapshot()
+            self.assertEqual(snapshot["in_flight"], 1)
+            self.assertEqual(snapshot["pending"], 2)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(running_snapshot()["pipelines"], 0)
+
+    def test_processor_exporter(self):
+        """测试处理一批笔记后导出笔记数、阶段指标和OCR引擎状态"""
+        server = FakeXhsServer(images=1).start()
+        original_client = http_client.set_client(HttpClient())
+        exporter = xhs_processor.start_metrics_exporter(0)
+        try:
+            report = run_load(server, 3, api_retries=1)
+            text = http_client.get_client().get(exporter.url, timeout=5).text
+        finally:
+            xhs_processor.stop_metrics_exporter()
+            http_client.set_client(original_client)
+            server.stop()
+
+        self.assertEqual(report["success"], 3)
+        self.assertIn('xhs_notes_total{result="success"} 3', text)
+        self.assertIn('xhs_stage_calls_total{stage="api"} 3', text)
+        self.assertIn('xhs_pipeline_queue_depth{stage="ocr"} 0', text)
+        self.assertIn('xhs_ocr_engine_state{backend="local"', text)
+        self.assertIn('xhs_api_breaker_open{state="closed"} 0', text)
+        # API调用统计是累计值，按计数器导出
+        self.assertIn('# TYPE xhs_api_requests_total counter', text)
+        calls = re.search(r'^xhs_api_requests_total\{result="calls"\} (\d+)$', text, re.M)
+        self.assertGreaterEqual(int(calls.group(1)), 3)
+        self.assertNotIn('# TYPE xhs_api_requests gauge', text)
+        self.assertIsNone(xhs_processor.metrics_exporter)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
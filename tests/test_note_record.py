@@ -0,0 +1,145 @@
+"""
+note_record.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+import threading
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+from note_record import (
+    load_record, save_api_data, update_ocr_results, render_content_md, note_dir_for
+)
+
+
+API_DATA = {
+    'data': {
+        '作品标题': '测试标题',
+        '作者昵称': '测试作者',
+        '作者ID': 'author_1',
+        '发布时间': '2025-01-01 10:00:00',
+        '作品描述': '第一段\n\n## 第二段也保留\n#标签',
+        '点赞数量': 12,
+    }
+}
+
+
+class StubPaddle:
+    """模拟PaddleOCR：每张图片返回两行文本"""
+
+    class Result:
+        def __init__(self, lines):
+            self.json = {'res': {'rec_texts': lines}}
+
+    def predict(self, input):
+        paths = input if isinstance(input, list) else [input]
+        return [self.Result([f"{Path(p).stem}号图", "第二行"] if Path(p).stem != "3" else [])
+                for p in paths]
+
+
+class TestNoteRecord(unittest.TestCase):
+    """测试笔记结构化记录"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        self.original_ocr = xhs_processor.ocr
+        self.original_server_client = xhs_processor.ocr_server_client
+        self.original_cache_enabled = xhs_processor.OCR_CACHE_ENABLED
+        xhs_processor.ocr = StubPaddle()
+        xhs_processor.ocr_server_client = None
+        xhs_processor.OCR_CACHE_ENABLED = False
+
+    def tearDown(self):
+        xhs_processor.ocr = self.original_ocr
+        xhs_processor.ocr_server_client = self.original_server_client
+        xhs_processor.OCR_CACHE_ENABLED = self.original_cache_enabled
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _process(self, note_id, images=12):
+        xhs_processor.save_metadata_md(note_id, API_DATA)
+        images_dir = self.test_dir / "xhs_notes" / note_id / "images"
+        images_dir.mkdir(parents=True)
+        for i in range(images):
+            (images_dir / f"{i}.jpg").write_bytes(b"\xff\xd8" + f"image{i}".encode() + b"\xff\xd9")
+        xhs_processor.perform_ocr_on_note(note_id)
+        return self.test_dir / "xhs_notes" / note_id
+
+    def test_metadata_saved_as_record(self):
+        """测试保存元数据时写入note.json"""
+        note_dir = self._process("note_a", images=1)
+
+        record = load_record(note_dir)
+        self.assertEqual(record["api"]["作品标题"], "测试标题")
+        self.assertIsNotNone(record["fetched_at"])
+        self.assertEqual(record["ocr"]["0.jpg"]["lines"], ["0号图", "第二行"])
+        self.assertIn("**标题**: 测试标题", (note_dir / "metadata.md").read_text(encoding='utf-8'))
+
+    def test_rendered_content_matches_legacy(self):
+        """测试由记录渲染的content.md与旧的正则解析结果一致"""
+        note_dir = self._process("note_b")
+        (note_dir / "metadata.md").write_text(
+            (note_dir / "metadata.md").read_text(encoding='utf-8').replace("## 第二段也保留\n", ""),
+            encoding='utf-8'
+        )
+        record = load_record(note_dir)
+        record["api"]["作品描述"] = "第一段\n\n#标签"
+
+        xhs_processor._generate_content_md_legacy("note_b")
+        legacy = (note_dir / "content.md").read_text(encoding='utf-8')
+
+        self.assertEqual(render_content_md(record), legacy)
+
+    def test_content_does_not_read_markdown(self):
+        """测试有记录时生成content.md不依赖metadata.md和OCR结果文件"""
+        note_dir = self._process("note_c", images=2)
+        (note_dir / "metadata.md").unlink()
+        shutil.rmtree(note_dir / "ocr_results")
+
+        xhs_processor.generate_content_md("note_c")
+
+        content = (note_dir / "content.md").read_text(encoding='utf-8')
+        self.assertIn("# 测试标题", content)
+        self.assertIn("## 第二段也保留", content)
+        self.assertIn("### 图片1文本\n\n1号图\n第二行", content)
+
+    def test_legacy_note_without_record(self):
+        """测试没有note.json的旧笔记仍可生成content.md"""
+        note_dir = self._process("note_d", images=1)
+        (note_dir / "note.json").unlink()
+
+        xhs_processor.generate_content_md("note_d")
+
+        self.assertIn("### 封面图片文本", (note_dir / "content.md").read_text(encoding='utf-8'))
+
+    def test_concurrent_ocr_updates_merge(self):
+        """测试多个线程同时写入同一笔记的OCR结果不会丢失"""
+        save_api_data("note_e", API_DATA['data'])
+        note_dir = note_dir_for("note_e")
+
+        def worker(i):
+            update_ocr_results(note_dir, {f"{i}.jpg": {"lines": [str(i)], "source": None,
+                                                       "recognized_at": "2025-01-01 00:00:00"}})
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(load_record(note_dir)["ocr"]), 20)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
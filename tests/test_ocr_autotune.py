@@ -0,0 +1,347 @@
+"""
+测试OCR配置自动调优和调优配置的加载
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import types
+from unittest import mock
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import utils
+import xhs_processor
+from ocr_autotune import (
+    Autotuner, char_agreement, thread_choices, sample_images, load_profile, save_profile,
+    PROFILE_FILENAME, PROFILE_KEYS,
+)
+from image_preprocess import DEFAULT_MAX_SIDE
+from synthetic_corpus import generate_corpus
+
+try:
+    from PIL import Image  # noqa: F401
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+class FakeClock:
+    """由桩引擎推进的计时器（测量结果与机器速度无关）"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResult:
+    def __init__(self, lines):
+        self.json = {"res": {"rec_texts": lines}}
+
+
+class StubEngine:
+    """
+    按模型和线程数模拟耗时与准确度的OCR引擎桩
+
+    mobile检测模型更快且同样准确；mobile识别模型更快但每5个字漏掉1个；
+    缩小后的图片（数组输入）识别不到文字；每次调用有固定开销，批量越大越快
+    """
+
+    DET_COST = {"PP-OCRv5_mobile_det": 1.0, "PP-OCRv5_server_det": 3.0}
+    REC_COST = {"PP-OCRv5_mobile_rec": 1.0, "PP-OCRv5_server_rec": 2.0}
+    CALL_OVERHEAD = 1.0
+
+    def __init__(self, det_model, rec_model, cpu_threads, clock, texts):
+        self.det_model = det_model
+        self.rec_model = rec_model
+        self.cpu_threads = cpu_threads or 1
+        self.clock = clock
+        self.texts = texts
+
+    def _lines(self, item):
+        if not isinstance(item, str):
+            return []
+        lines = self.texts[item]
+        if self.rec_model == "PP-OCRv5_mobile_rec":
+            lines = ["".join(c for i, c in enumerate(line) if i % 5 != 4) for line in lines]
+        return lines
+
+    def predict(self, input):
+        items = input if isinstance(input, list) else [input]
+        per_image = (self.DET_COST[self.det_model] + self.REC_COST[self.rec_model]) / self.cpu_threads
+        self.clock.now += self.CALL_OVERHEAD + per_image * len(items)
+        return [FakeResult(self._lines(item)) for item in items]
+
+
+@unittest.skipUnless(PIL_AVAILABLE, "Pillow未安装")
+class TestAutotune(unittest.TestCase):
+    """测试调优流程"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+            generate_corpus(self.test_dir, 3, images=2, render=True)
+        self.samples = sample_images(10, notes_root=Path(self.test_dir) / "xhs_notes")
+        self.texts = {s["path"]: s["lines"] for s in self.samples}
+        self.clock = FakeClock()
+        self.created = []
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def factory(self, det_model, rec_model, cpu_threads, device="cpu"):
+        self.created.append((det_model, rec_model, cpu_threads))
+        return StubEngine(det_model, rec_model, cpu_threads, self.clock, self.texts)
+
+    def tuner(self, **kwargs):
+        return Autotuner(self.samples, engine_factory=self.factory, clock=self.clock, **kwargs)
+
+    def run_quiet(self, tuner, **kwargs):
+        with open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+            return tuner.run(threads=(1, 2), batch_sizes=(1, 4), max_sides=(320, 0), **kwargs)
+
+    def test_sample_images(self):
+        """只抽取有参考文本的图片"""
+        self.assertEqual(len(self.samples), 6)
+        for sample in self.samples:
+            self.assertTrue(Path(sample["path"]).exists())
+            self.assertTrue(sample["lines"])
+        again = sample_images(3, notes_root=Path(self.test_dir) / "xhs_notes")
+        self.assertEqual(again, sample_images(3, notes_root=Path(self.test_dir) / "xhs_notes"))
+        self.assertEqual(len(again), 3)
+
+    def test_picks_fastest_accurate_profile(self):
+        """选择满足一致率要求的最快配置"""
+        report = self.run_quiet(self.tuner())
+
+        self.assertEqual(report["profile"], {
+            "det_model": "PP-OCRv5_mobile_det",
+            "rec_model": "PP-OCRv5_server_rec",
+            "cpu_threads": 2,
+            "batch_size": 4,
+            "max_side": DEFAULT_MAX_SIDE,
+        })
+        self.assertEqual(report["agreement"], 1.0)
+        self.assertGreater(report["images_per_sec"], report["baseline"]["images_per_sec"])
+        self.assertEqual(report["images"], len(self.samples))
+
+        # mobile识别模型更快但不够准确
+        mobile_rec = [t for t in report["trials"] if t["rec_model"] == "PP-OCRv5_mobile_rec"]
+        self.assertTrue(mobile_rec)
+        self.assertTrue(all(t["agreement"] < 0.97 for t in mobile_rec))
+        # 缩小到320像素后识别不到文字
+        small = [t for t in report["trials"] if t["max_side"] == 320]
+        self.assertEqual(small[0]["agreement"], 0.0)
+
+    def test_engines_reused(self):
+        """批大小和最长边不重新创建引擎"""
+        self.run_quiet(self.tuner())
+        self.assertEqual(len(self.created), len(set(self.created)))
+        # 4种模型组合 + 线程数1
+        self.assertEqual(len(self.created), 5)
+
+    def test_lower_agreement_allows_mobile_rec(self):
+        """降低一致率下限时可以选择mobile识别模型"""
+        report = self.run_quiet(self.tuner(min_agreement=0.5))
+        self.assertEqual(report["profile"]["rec_model"], "PP-OCRv5_mobile_rec")
+
+    def test_nothing_accurate_enough(self):
+        """没有配置达到下限时选择一致率最高的"""
+        tuner = self.tuner(min_agreement=1.5)
+        best = tuner.best([
+            {"agreement": 0.9, "images_per_sec": 10.0},
+            {"agreement": 0.95, "images_per_sec": 1.0},
+        ])
+        self.assertEqual(best["agreement"], 0.95)
+
+    def test_server_reference(self):
+        """用server模型识别原图的结果作为参考文本"""
+        for sample in self.samples:
+            sample["lines"] = None
+        tuner = self.tuner()
+        with open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+            tuner.build_reference()
+        self.assertEqual([s["lines"] for s in self.samples], [self.texts[s["path"]] for s in self.samples])
+        self.assertEqual(self.created[0], ("PP-OCRv5_server_det", "PP-OCRv5_server_rec", None))
+
+    def test_profile_roundtrip(self):
+        """写入的配置可以被读取"""
+        report = self.run_quiet(self.tuner())
+        path = save_profile(report, Path(self.test_dir) / PROFILE_FILENAME)
+
+        self.assertEqual(load_profile(path), report["profile"])
+        data = json.loads(path.read_text(encoding='utf-8'))
+        self.assertEqual(len(data["trials"]), len(report["trials"]))
+
+
+class TestAutotuneHelpers(unittest.TestCase):
+    """测试调优的辅助函数"""
+
+    def test_char_agreement(self):
+        self.assertEqual(char_agreement(["你好世界"], ["你好", "世界"]), 1.0)
+        self.assertEqual(char_agreement([], []), 1.0)
+        self.assertEqual(char_agreement(["你好"], []), 0.0)
+        self.assertAlmostEqual(char_agreement(["abcd"], ["abc"]), 6 / 7)
+
+    def test_thread_choices(self):
+        self.assertEqual(thread_choices(1), (1,))
+        self.assertEqual(thread_choices(6), (1, 2, 4, 6))
+        self.assertEqual(thread_choices(8), (1, 2, 4, 8))
+
+    def test_invalid_profile(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = Path(test_dir) / PROFILE_FILENAME
+            self.assertIsNone(load_profile(path))
+            path.write_text("{", encoding='utf-8')
+            self.assertIsNone(load_profile(path))
+            path.write_text(json.dumps({"profile": {"det_model": "x"}}), encoding='utf-8')
+            self.assertIsNone(load_profile(path))
+        finally:
+            shutil.rmtree(test_dir)
+
+
+class FakePaddleOCR:
+    """记录初始化参数的PaddleOCR桩"""
+    kwargs = None
+
+    def __init__(self, **kwargs):
+        FakePaddleOCR.kwargs = kwargs
+
+
+class TestProcessorProfile(unittest.TestCase):
+    """测试处理器加载调优配置"""
+
+    PROFILE = {
+        "det_model": "PP-OCRv5_mobile_det",
+        "rec_model": "PP-OCRv5_server_rec",
+        "cpu_threads": 3,
+        "batch_size": 8,
+        "max_side": 960,
+    }
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+        self.saved = {name: getattr(xhs_processor, name)
+                      for name in ("ocr", "OCR_CPU_THREADS", "OCR_PROFILE_ENABLED", "OCR_PROFILE_PATH",
+                                   "_ocr_profile")}
+        self.saved_state = dict(xhs_processor.OCR_ENGINE_STATE)
+        xhs_processor.OCR_PROFILE_ENABLED = True
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(xhs_processor, name, value)
+        xhs_processor.OCR_ENGINE_STATE.update(self.saved_state)
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir)
+
+    def write_profile(self):
+        save_profile({"profile": dict(self.PROFILE)})
+
+    def test_no_profile(self):
+        """没有调优配置时使用默认参数"""
+        self.assertIsNone(xhs_processor.get_ocr_profile())
+        self.assertEqual(xhs_processor.ocr_engine_config(), xhs_processor.OCR_CONFIG)
+        args = xhs_processor.parse_args(["1"])
+        self.assertEqual(args.ocr_batch_size, xhs_processor.OCR_BATCH_SIZE)
+        self.assertEqual(args.ocr_max_side, xhs_processor.OCR_MAX_SIDE)
+
+    def test_engine_key_follows_profile(self):
+        """调优配置中的模型参与OCR缓存指纹"""
+        before = xhs_processor.ocr_engine_key()
+        self.write_profile()
+        # 配置文件只在启动时读取一次，写入新配置后需要重新加载
+        self.assertEqual(xhs_processor.ocr_engine_key(), before)
+        xhs_processor.load_ocr_profile()
+        config = xhs_processor.ocr_engine_config()
+        self.assertEqual(config["text_detection_model_name"], "PP-OCRv5_mobile_det")
+        self.assertEqual(config["text_recognition_model_name"], "PP-OCRv5_server_rec")
+        self.assertNotEqual(xhs_processor.ocr_engine_key(), before)
+
+        xhs_processor.OCR_PROFILE_ENABLED = False
+        self.assertEqual(xhs_processor.ocr_engine_key(), before)
+
+    def test_parse_args_defaults(self):
+        """未指定的批大小和最长边使用调优配置，命令行参数优先"""
+        self.write_profile()
+        args = xhs_processor.parse_args(["1"])
+        self.assertEqual((args.ocr_batch_size, args.ocr_max_side), (8, 960))
+
+        args = xhs_processor.parse_args(["1", "--ocr-batch-size", "2", "--ocr-max-side", "0"])
+        self.assertEqual((args.ocr_batch_size, args.ocr_max_side), (2, 0))
+
+        args = xhs_processor.parse_args(["1", "--no-ocr-profile"])
+        self.assertEqual(args.ocr_batch_size, xhs_processor.OCR_BATCH_SIZE)
+        self.assertEqual(args.ocr_max_side, xhs_processor.OCR_MAX_SIDE)
+
+    def test_profile_read_once(self):
+        """计算引擎指纹和初始化引擎时不重复读取配置文件"""
+        self.write_profile()
+        with mock.patch.object(xhs_processor, "load_profile", wraps=load_profile) as load:
+            xhs_processor.parse_args(["1"])
+            for _ in range(3):
+                xhs_processor.ocr_engine_key()
+            self.init_with_fake_paddle()
+        self.assertEqual(load.call_count, 1)
+
+    def test_custom_profile_path(self):
+        """--ocr-profile 指定的配置文件用于批大小、最长边和引擎参数"""
+        custom = os.path.join(self.test_dir, "cpu_profile.json")
+        save_profile({"profile": dict(self.PROFILE)}, custom)
+        self.assertIsNone(xhs_processor.get_ocr_profile())
+
+        args = xhs_processor.parse_args(["1", "--ocr-profile", custom])
+        self.assertEqual((args.ocr_batch_size, args.ocr_max_side), (8, 960))
+
+        xhs_processor.OCR_PROFILE_PATH = custom
+        xhs_processor.OCR_CPU_THREADS = None
+        kwargs = self.init_with_fake_paddle()
+        self.assertEqual(kwargs["text_detection_model_name"], "PP-OCRv5_mobile_det")
+        self.assertEqual(kwargs["cpu_threads"], 3)
+
+    def init_with_fake_paddle(self):
+        paddle = types.SimpleNamespace(
+            is_compiled_with_cuda=lambda: False,
+            device=types.SimpleNamespace(cuda=types.SimpleNamespace(device_count=lambda: 0)),
+        )
+        fake_modules = {"paddleocr": types.SimpleNamespace(PaddleOCR=FakePaddleOCR), "paddle": paddle}
+        xhs_processor.ocr = None
+        FakePaddleOCR.kwargs = None
+        with mock.patch.dict(sys.modules, fake_modules), \
+                open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+            self.assertTrue(xhs_processor.init_ocr())
+        return FakePaddleOCR.kwargs
+
+    def test_init_ocr_loads_profile(self):
+        """初始化OCR引擎时使用调优配置中的模型和线程数"""
+        self.write_profile()
+        xhs_processor.OCR_CPU_THREADS = None
+        kwargs = self.init_with_fake_paddle()
+        self.assertEqual(kwargs["text_detection_model_name"], "PP-OCRv5_mobile_det")
+        self.assertEqual(kwargs["text_recognition_model_name"], "PP-OCRv5_server_rec")
+        self.assertEqual(kwargs["cpu_threads"], 3)
+        self.assertEqual(kwargs["device"], "cpu")
+
+        # 显式指定的线程数优先
+        xhs_processor.OCR_CPU_THREADS = 1
+        self.assertEqual(self.init_with_fake_paddle()["cpu_threads"], 1)
+
+    def test_init_ocr_without_profile(self):
+        xhs_processor.OCR_CPU_THREADS = None
+        kwargs = self.init_with_fake_paddle()
+        self.assertNotIn("text_detection_model_name", kwargs)
+        self.assertNotIn("cpu_threads", kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+ocr_cache.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+from ocr_cache import OcrCache, image_hash, engine_fingerprint
+
+
+class TestOcrCache(unittest.TestCase):
+    """测试OCR结果缓存"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_image_hash_depends_on_content(self):
+        """测试哈希只取决于图片内容"""
+        a = self.test_dir / "a.jpg"
+        b = self.test_dir / "b.jpg"
+        c = self.test_dir / "c.jpg"
+        a.write_bytes(b"same")
+        b.write_bytes(b"same")
+        c.write_bytes(b"other")
+
+        self.assertEqual(image_hash(a), image_hash(b))
+        self.assertNotEqual(image_hash(a), image_hash(c))
+
+    def test_engine_fingerprint_changes_with_config(self):
+        """测试引擎参数或版本变化时指纹改变"""
+        config = {"ocr_version": "PP-OCRv5", "lang": "ch"}
+        base = engine_fingerprint(config, "3.2.0")
+
+        self.assertEqual(base, engine_fingerprint(dict(config), "3.2.0"))
+        self.assertNotEqual(base, engine_fingerprint({**config, "lang": "en"}, "3.2.0"))
+        self.assertNotEqual(base, engine_fingerprint(config, "3.3.0"))
+
+    def test_put_get(self):
+        """测试写入与读取"""
+        cache = OcrCache("engine1", root=self.test_dir)
+        self.assertIsNone(cache.get("ab" * 32))
+
+        cache.put("ab" * 32, ["第一行", "第二行"])
+
+        self.assertEqual(cache.get("ab" * 32), ["第一行", "第二行"])
+        self.assertIsNone(OcrCache("engine2", root=self.test_dir).get("ab" * 32))
+
+    def test_purge_other_engines(self):
+        """测试清理其它引擎配置下的缓存"""
+        OcrCache("old", root=self.test_dir).put("cd" * 32, ["旧"])
+        cache = OcrCache("new", root=self.test_dir)
+        cache.put("cd" * 32, ["新"])
+
+        self.assertEqual(cache.purge_other_engines(), 1)
+        self.assertIsNone(OcrCache("old", root=self.test_dir).get("cd" * 32))
+        self.assertEqual(cache.get("cd" * 32), ["新"])
+
+
+class CountingEngine:
+    """记录识别次数的模拟OCR引擎"""
+
+    class Result:
+        def __init__(self, lines):
+            self.json = {'res': {'rec_texts': lines}}
+
+    def __init__(self):
+        self.images = 0
+
+    def predict(self, input):
+        paths = input if isinstance(input, list) else [input]
+        self.images += len(paths)
+        # 图片内容为 SOI + 文本 + EOI，去掉JPEG首尾标记即识别结果
+        return [self.Result([f"识别:{Path(p).read_bytes()[2:-2].decode()}"]) for p in paths]
+
+
+class TestProcessorOcrCache(unittest.TestCase):
+    """测试处理器跨笔记复用OCR结果"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        self.original_ocr = xhs_processor.ocr
+        self.original_server_client = xhs_processor.ocr_server_client
+        self.original_config = dict(xhs_processor.OCR_CONFIG)
+        self.engine = CountingEngine()
+        xhs_processor.ocr = self.engine
+        xhs_processor.ocr_server_client = None
+
+    def tearDown(self):
+        xhs_processor.OCR_CONFIG.clear()
+        xhs_processor.OCR_CONFIG.update(self.original_config)
+        xhs_processor.ocr = self.original_ocr
+        xhs_processor.ocr_server_client = self.original_server_client
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _note_jobs(self, note_id, contents):
+        images_dir = self.test_dir / "xhs_notes" / note_id / "images"
+        ocr_dir = self.test_dir / "xhs_notes" / note_id / "ocr_results"
+        images_dir.mkdir(parents=True)
+        ocr_dir.mkdir(parents=True)
+        jobs = []
+        for i, data in enumerate(contents):
+            img_file = images_dir / f"{i}.jpg"
+            img_file.write_bytes(b"\xff\xd8" + data + b"\xff\xd9")
+            jobs.append((img_file, str(ocr_dir / f"{i}.md")))
+        return jobs
+
+    def test_identical_images_recognized_once(self):
+        """测试不同笔记中的相同图片只识别一次"""
+        jobs = self._note_jobs("note_a", [b"cover", b"page"]) + \
+            self._note_jobs("note_b", [b"cover", b"follow_me"])
+
+        xhs_processor.ocr_images_batch(jobs, batch_size=4)
+
+        self.assertEqual(self.engine.images, 3)
+        for _, ocr_md_path in jobs:
+            self.assertTrue(Path(ocr_md_path).exists())
+        self.assertIn("识别:cover", Path(jobs[2][1]).read_text(encoding='utf-8'))
+
+    def test_cache_hit_skips_inference(self):
+        """测试命中缓存时不执行推理"""
+        xhs_processor.ocr_images_batch(self._note_jobs("note_c", [b"end_slide"]))
+        self.assertEqual(self.engine.images, 1)
+
+        jobs = self._note_jobs("note_d", [b"end_slide"])
+        xhs_processor.ocr_images_batch(jobs)
+
+        self.assertEqual(self.engine.images, 1)
+        content = Path(jobs[0][1]).read_text(encoding='utf-8')
+        self.assertIn("识别:end_slide", content)
+        self.assertIn("OCR缓存", content)
+
+    def test_config_change_invalidates(self):
+        """测试修改OCR配置后旧缓存不再命中"""
+        xhs_processor.ocr_images_batch(self._note_jobs("note_e", [b"slide"]))
+        xhs_processor.OCR_CONFIG["ocr_version"] = "PP-OCRv4"
+
+        xhs_processor.ocr_images_batch(self._note_jobs("note_f", [b"slide"]))
+
+        self.assertEqual(self.engine.images, 2)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
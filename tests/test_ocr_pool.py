@@ -0,0 +1,144 @@
+"""
+ocr_pool.py 模块的单元测试
+工作进程使用模拟引擎，不需要PaddleOCR
+"""
+
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import xhs_processor
+from ocr_pool import OcrProcessPool, default_cpu_threads
+
+
+class StubPaddle:
+    """模拟PaddleOCR：按图片内容返回确定的识别结果"""
+
+    class Result:
+        def __init__(self, lines):
+            self.json = {'res': {'rec_texts': lines}}
+
+    def predict(self, input):
+        paths = input if isinstance(input, list) else [input]
+        results = []
+        for p in paths:
+            data = Path(p).read_bytes()[2:-2].decode()  # 去掉JPEG首尾标记
+            results.append(self.Result([f"第{i}行: {data}" for i in range(3)]))
+        return results
+
+
+# 以下引擎工厂在工作进程中调用，必须是模块级函数
+def stub_engine_factory(cpu_threads):
+    """加载模拟引擎，识别流程与PaddleOCR相同"""
+    xhs_processor.ocr = StubPaddle()
+    return xhs_processor.recognize_images
+
+
+def env_engine_factory(cpu_threads):
+    """返回工作进程中的线程数设置"""
+    def engine(paths):
+        return [[os.environ.get("OMP_NUM_THREADS"), str(cpu_threads), Path(p).name] for p in paths]
+    return engine
+
+
+def unavailable_engine_factory(cpu_threads):
+    """模拟引擎加载失败"""
+    return None
+
+
+class TestOcrProcessPool(unittest.TestCase):
+    """测试多进程OCR识别池"""
+
+    def test_limits_threads_and_keeps_order(self):
+        """测试工作进程线程数设置且结果按输入顺序返回"""
+        pool = OcrProcessPool(2, cpu_threads=3, engine_factory=env_engine_factory)
+        try:
+            results = pool.recognize([f"/tmp/{i}.jpg" for i in range(5)])
+        finally:
+            pool.close()
+
+        self.assertEqual([r[2] for r in results], [f"{i}.jpg" for i in range(5)])
+        self.assertTrue(all(r[:2] == ["3", "3"] for r in results))
+
+    def test_unavailable_engine(self):
+        """测试引擎加载失败时每张图片得到异常"""
+        pool = OcrProcessPool(1, engine_factory=unavailable_engine_factory)
+        try:
+            results = pool.recognize(["/tmp/0.jpg", "/tmp/1.jpg"])
+        finally:
+            pool.close()
+
+        self.assertTrue(all(isinstance(r, Exception) for r in results))
+
+    def test_default_cpu_threads(self):
+        """测试默认线程数不超过CPU核心数"""
+        cpus = os.cpu_count() or 1
+        self.assertEqual(default_cpu_threads(1), cpus)
+        self.assertGreaterEqual(default_cpu_threads(cpus * 2), 1)
+
+
+class TestProcessorUsesPool(unittest.TestCase):
+    """测试多进程识别的输出与单进程完全一致"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_ocr = xhs_processor.ocr
+        self.original_pool = xhs_processor.ocr_pool
+        self.original_server_client = xhs_processor.ocr_server_client
+        self.original_cache_enabled = xhs_processor.OCR_CACHE_ENABLED
+        xhs_processor.ocr_server_client = None
+        xhs_processor.OCR_CACHE_ENABLED = False
+
+    def tearDown(self):
+        xhs_processor.ocr = self.original_ocr
+        xhs_processor.ocr_pool = self.original_pool
+        xhs_processor.ocr_server_client = self.original_server_client
+        xhs_processor.OCR_CACHE_ENABLED = self.original_cache_enabled
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _jobs(self, name):
+        images_dir = self.test_dir / name / "images"
+        ocr_dir = self.test_dir / name / "ocr_results"
+        images_dir.mkdir(parents=True)
+        ocr_dir.mkdir(parents=True)
+        jobs = []
+        for i in range(5):
+            img_file = images_dir / f"{i}.jpg"
+            img_file.write_bytes(b"\xff\xd8" + f"图片{i}".encode() + b"\xff\xd9")
+            jobs.append((img_file, str(ocr_dir / f"{i}.md")))
+        return jobs
+
+    def _read_results(self, jobs):
+        # 去掉识别时间行后比较
+        return [
+            [line for line in Path(path).read_bytes().split(b"\n") if "**识别时间**".encode() not in line]
+            for _, path in jobs
+        ]
+
+    def test_output_matches_single_process(self):
+        """测试多进程识别与单进程识别写出相同的结果文件"""
+        xhs_processor.ocr = StubPaddle()
+        single_jobs = self._jobs("single")
+        xhs_processor.ocr_images_batch(single_jobs, batch_size=4)
+
+        xhs_processor.ocr = None
+        xhs_processor.ocr_pool = OcrProcessPool(2, cpu_threads=1, engine_factory=stub_engine_factory)
+        pool_jobs = self._jobs("pool")
+        try:
+            xhs_processor.ocr_images_batch(pool_jobs, batch_size=4)
+        finally:
+            xhs_processor.ocr_pool.close()
+
+        self.assertIsNone(xhs_processor.ocr)
+        self.assertEqual(self._read_results(single_jobs), self._read_results(pool_jobs))
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,247 @@
+"""
+ocr_server.py 模块的单元测试
+使用模拟识别引擎，不需要PaddleOCR和GPU
+"""
+
+import unittest
+import io
+import tempfile
+import shutil
+import threading
+import time
+from unittest import mock
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import http_client
+import utils
+import xhs_processor
+import ocr_server
+from ocr_server import DynamicBatcher, OcrServer, OcrServerClient, is_loopback_host
+
+
+class StubEngine:
+    """模拟批量识别引擎：记录每批大小，返回图片文件名"""
+
+    def __init__(self, delay=0.0):
+        self.batch_sizes = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, paths):
+        with self.lock:
+            self.batch_sizes.append(len(paths))
+        time.sleep(self.delay)
+        return [
+            RuntimeError("坏图") if 'bad' in p else [f"文字:{Path(p).name}"]
+            for p in paths
+        ]
+
+
+class TestDynamicBatcher(unittest.TestCase):
+    """测试动态凑批器"""
+
+    def test_merges_concurrent_requests(self):
+        """测试并发请求被合并成批"""
+        engine = StubEngine()
+        batcher = DynamicBatcher(engine, max_batch=8, max_wait=0.2)
+        results = {}
+
+        def submit(name):
+            results[name] = batcher.submit([f"/tmp/{name}-0.jpg", f"/tmp/{name}-1.jpg"])
+
+        threads = [threading.Thread(target=submit, args=(f"p{i}",)) for i in range(3)]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            batcher.stop()
+
+        self.assertEqual(sum(engine.batch_sizes), 6)
+        self.assertLess(len(engine.batch_sizes), 6)
+        self.assertEqual(results["p1"], [["文字:p1-0.jpg"], ["文字:p1-1.jpg"]])
+
+    def test_respects_max_batch(self):
+        """测试每批不超过上限"""
+        engine = StubEngine()
+        batcher = DynamicBatcher(engine, max_batch=3, max_wait=0.05)
+        try:
+            results = batcher.submit([f"/tmp/{i}.jpg" for i in range(7)])
+        finally:
+            batcher.stop()
+
+        self.assertEqual(len(results), 7)
+        self.assertTrue(all(size <= 3 for size in engine.batch_sizes))
+
+    def test_engine_failure_reported_per_image(self):
+        """测试引擎整体失败时每张图片都得到异常"""
+        def engine(paths):
+            raise RuntimeError("引擎崩溃")
+
+        batcher = DynamicBatcher(engine, max_batch=4, max_wait=0.01)
+        try:
+            results = batcher.submit(["/tmp/0.jpg", "/tmp/1.jpg"])
+        finally:
+            batcher.stop()
+
+        self.assertTrue(all(isinstance(r, Exception) for r in results))
+
+
+class TestOcrServer(unittest.TestCase):
+    """测试OCR服务与客户端"""
+
+    def setUp(self):
+        self.original_client = http_client.set_client(None)
+        self.engine = StubEngine()
+        self.server = OcrServer(self.engine, port=0, max_batch=4, max_wait=0.01).start()
+        self.client = OcrServerClient(self.server.url)
+
+    def tearDown(self):
+        self.server.stop()
+        client = http_client.set_client(self.original_client)
+        if isinstance(client, http_client.HttpClient):
+            client.close()
+
+    def test_health_and_recognize(self):
+        """测试健康检查与识别请求"""
+        self.assertTrue(self.client.is_available())
+
+        results = self.client.recognize(["/data/0.jpg", "/data/bad.jpg"])
+
+        self.assertEqual(results[0], ["文字:0.jpg"])
+        self.assertIsInstance(results[1], Exception)
+
+    def test_engine_key_reported(self):
+        """测试健康检查和识别结果都返回服务端引擎指纹"""
+        self.assertIsNone(self.client.recognize_with_key(["/data/0.jpg"])[1])
+
+        server = OcrServer(self.engine, port=0, engine_key="0123456789abcdef").start()
+        try:
+            client = OcrServerClient(server.url)
+            self.assertTrue(client.is_available())
+            self.assertEqual(client.engine_key, "0123456789abcdef")
+            results, engine_key = client.recognize_with_key(["/data/0.jpg"])
+        finally:
+            server.stop()
+
+        self.assertEqual(results, [["文字:0.jpg"]])
+        self.assertEqual(engine_key, "0123456789abcdef")
+
+    def test_unreachable_server(self):
+        """测试服务不可达时返回不可用"""
+        client = OcrServerClient("http://127.0.0.1:9")
+        self.assertFalse(client.is_available())
+
+
+    def test_rejects_non_loopback_host(self):
+        """测试服务只允许监听本机回环地址，启动前即退出"""
+        for host in ("127.0.0.1", "localhost", "::1", "127.0.0.2"):
+            self.assertTrue(is_loopback_host(host), host)
+        for host in ("0.0.0.0", "::", "192.168.1.10", "example.com"):
+            self.assertFalse(is_loopback_host(host), host)
+
+        with mock.patch.object(sys, "argv", ["ocr_server.py", "--host", "0.0.0.0"]), \
+                mock.patch.object(ocr_server, "create_paddle_engine") as create, \
+                mock.patch("sys.stderr", new_callable=io.StringIO):
+            with self.assertRaises(SystemExit):
+                ocr_server.main()
+        create.assert_not_called()
+
+
+class TestProcessorUsesServer(unittest.TestCase):
+    """测试处理器优先使用OCR服务，不可用时回退到进程内识别"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_http = http_client.set_client(None)
+        self.original_server_client = xhs_processor.ocr_server_client
+        self.original_ocr = xhs_processor.ocr
+        self.original_cache_enabled = xhs_processor.OCR_CACHE_ENABLED
+        xhs_processor.OCR_CACHE_ENABLED = False
+
+        images_dir = self.test_dir / "images"
+        self.ocr_dir = self.test_dir / "ocr_results"
+        images_dir.mkdir()
+        self.ocr_dir.mkdir()
+        self.jobs = []
+        for i in range(2):
+            img_file = images_dir / f"{i}.jpg"
+            img_file.write_bytes(b"\xff\xd8fake_image\xff\xd9")
+            self.jobs.append((img_file, str(self.ocr_dir / f"{i}.md")))
+
+    def tearDown(self):
+        xhs_processor.ocr_server_client = self.original_server_client
+        xhs_processor.ocr = self.original_ocr
+        xhs_processor.OCR_CACHE_ENABLED = self.original_cache_enabled
+        client = http_client.set_client(self.original_http)
+        if isinstance(client, http_client.HttpClient):
+            client.close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_uses_server_when_available(self):
+        """测试服务可用时不加载本地引擎"""
+        engine = StubEngine()
+        server = OcrServer(engine, port=0, max_batch=4, max_wait=0.01).start()
+        try:
+            xhs_processor.ocr_server_client = OcrServerClient(server.url)
+            xhs_processor.ocr = None
+            xhs_processor.ocr_images_batch(self.jobs, batch_size=2)
+        finally:
+            server.stop()
+
+        self.assertEqual(engine.batch_sizes, [2])
+        self.assertIsNone(xhs_processor.ocr)
+        content = Path(self.jobs[1][1]).read_text(encoding='utf-8')
+        self.assertIn("文字:1.jpg", content)
+
+    def test_results_cached_under_server_engine(self):
+        """测试服务识别的结果按服务端引擎指纹缓存，而不是本进程的配置"""
+        original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        xhs_processor.OCR_CACHE_ENABLED = True
+        server_key = "fedcba9876543210"
+        server = OcrServer(StubEngine(), port=0, max_batch=4, max_wait=0.01,
+                           engine_key=server_key).start()
+        try:
+            xhs_processor.ocr_server_client = OcrServerClient(server.url)
+            xhs_processor.ocr = None
+            # 两张图片内容不同，各自写入缓存
+            self.jobs[1][0].write_bytes(b"\xff\xd8other_image\xff\xd9")
+            xhs_processor.ocr_images_batch(self.jobs, batch_size=2)
+        finally:
+            server.stop()
+            utils.PROJECT_ROOT = original_root
+
+        cache_root = self.test_dir / "cache" / "ocr"
+        self.assertEqual([p.name for p in cache_root.iterdir()], [server_key])
+        self.assertEqual(len(list((cache_root / server_key).rglob("*.json"))), 2)
+        self.assertNotEqual(xhs_processor.ocr_engine_key(), server_key)
+
+    def test_falls_back_to_local_engine(self):
+        """测试服务不可达时回退到进程内识别"""
+        class LocalResult:
+            json = {'res': {'rec_texts': ["本地识别"]}}
+
+        class LocalEngine:
+            def predict(self, input):
+                paths = input if isinstance(input, list) else [input]
+                return [LocalResult() for _ in paths]
+
+        xhs_processor.ocr_server_client = OcrServerClient("http://127.0.0.1:9")
+        xhs_processor.ocr = LocalEngine()
+
+        xhs_processor.ocr_images_batch(self.jobs, batch_size=2)
+
+        content = Path(self.jobs[0][1]).read_text(encoding='utf-8')
+        self.assertIn("本地识别", content)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,184 @@
+"""
+phash.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+import random
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import numpy as np
+from PIL import Image
+
+import utils
+import xhs_processor
+from phash import PhashIndex, phash, dhash, hamming
+
+
+def make_slide(path, seed, size=(600, 800), quality=90):
+    """生成一张带色块的“幻灯片”图片，同一seed在不同尺寸/质量下是同一张图"""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((800, 600, 3), 240, dtype=np.uint8)
+    for _ in range(12):
+        x, y = rng.integers(0, 500), rng.integers(0, 740)
+        w, h = rng.integers(40, 100), rng.integers(10, 60)
+        pixels[y:y + h, x:x + w] = rng.integers(0, 200, 3)
+    Image.fromarray(pixels).resize(size).save(path, quality=quality)
+    return path
+
+
+class TestPerceptualHash(unittest.TestCase):
+    """测试感知哈希计算"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_reencoded_image_is_close(self):
+        """测试重新压缩并缩放的图片哈希接近"""
+        original = make_slide(self.test_dir / "a.jpg", seed=1)
+        with Image.open(original) as img:
+            img.resize((300, 400)).save(self.test_dir / "b.jpg", quality=40)
+
+        self.assertLessEqual(hamming(phash(original), phash(self.test_dir / "b.jpg")), 4)
+        self.assertLessEqual(hamming(dhash(original), dhash(self.test_dir / "b.jpg")), 6)
+
+    def test_different_images_are_far(self):
+        """测试不同图片哈希差异大"""
+        a = make_slide(self.test_dir / "a.jpg", seed=1)
+        b = make_slide(self.test_dir / "b.jpg", seed=2)
+
+        self.assertGreater(hamming(phash(a), phash(b)), 10)
+
+
+class TestPhashIndex(unittest.TestCase):
+    """测试多索引哈希近邻查询"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_query_matches_brute_force(self):
+        """测试查询结果与暴力比较一致"""
+        rng = random.Random(7)
+        index = PhashIndex(path=False, max_distance=4)
+        values = {}
+        for i in range(2000):
+            value = rng.getrandbits(64)
+            values[f"h{i}"] = value
+            index.add(value, f"h{i}")
+        # 加入若干与查询值相差1~5位的近邻
+        query = rng.getrandbits(64)
+        for bits in range(1, 6):
+            value = query
+            for pos in rng.sample(range(64), bits):
+                value ^= 1 << pos
+            values[f"near{bits}"] = value
+            index.add(value, f"near{bits}")
+
+        expected = sorted(
+            (hamming(query, v), k) for k, v in values.items() if hamming(query, v) <= 4
+        )
+        self.assertEqual(index.query(query), expected)
+        self.assertEqual([k for _, k in index.query(query, max_distance=2)], ["near1", "near2"])
+
+    def test_persist_and_reload(self):
+        """测试索引写入文件后可重新加载"""
+        path = self.test_dir / "index.tsv"
+        index = PhashIndex(path=path)
+        index.add(0xF0F0, "aa", image="0.jpg")
+        index.add(0xF0F0, "aa")
+
+        reloaded = PhashIndex(path=path)
+
+        self.assertEqual(len(reloaded), 1)
+        self.assertEqual(reloaded.get("aa"), 0xF0F0)
+        self.assertEqual(reloaded.query(0xF0F1), [(1, "aa")])
+
+
+class CountingEngine:
+    """记录识别次数的模拟OCR引擎"""
+
+    class Result:
+        def __init__(self, lines):
+            self.json = {'res': {'rec_texts': lines}}
+
+    def __init__(self):
+        self.images = 0
+
+    def predict(self, input):
+        paths = input if isinstance(input, list) else [input]
+        self.images += len(paths)
+        return [self.Result([f"识别:{Path(p).parent.parent.name}"]) for p in paths]
+
+
+class TestProcessorNearDuplicates(unittest.TestCase):
+    """测试处理器复用近似图片的OCR结果"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        self.original_ocr = xhs_processor.ocr
+        self.original_server_client = xhs_processor.ocr_server_client
+        self.original_phash = xhs_processor.PHASH_ENABLED
+        self.engine = CountingEngine()
+        xhs_processor.ocr = self.engine
+        xhs_processor.ocr_server_client = None
+
+    def tearDown(self):
+        xhs_processor.ocr = self.original_ocr
+        xhs_processor.ocr_server_client = self.original_server_client
+        xhs_processor.PHASH_ENABLED = self.original_phash
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _note_job(self, note_id, seed, size=(600, 800), quality=90):
+        images_dir = self.test_dir / "xhs_notes" / note_id / "images"
+        ocr_dir = self.test_dir / "xhs_notes" / note_id / "ocr_results"
+        images_dir.mkdir(parents=True)
+        ocr_dir.mkdir(parents=True)
+        img_file = make_slide(images_dir / "0.jpg", seed, size=size, quality=quality)
+        return img_file, str(ocr_dir / "0.md")
+
+    def test_reencoded_image_reuses_text(self):
+        """测试重新压缩的同一张图复用已识别的文本"""
+        xhs_processor.ocr_images_batch([self._note_job("note_a", seed=3)])
+        job = self._note_job("note_b", seed=3, size=(450, 600), quality=50)
+
+        xhs_processor.ocr_images_batch([job])
+
+        self.assertEqual(self.engine.images, 1)
+        content = Path(job[1]).read_text(encoding='utf-8')
+        self.assertIn("识别:note_a", content)
+        self.assertIn("近似图片复用", content)
+
+    def test_different_image_is_recognized(self):
+        """测试不相似的图片仍然执行识别"""
+        xhs_processor.ocr_images_batch([self._note_job("note_c", seed=4)])
+        xhs_processor.ocr_images_batch([self._note_job("note_d", seed=5)])
+
+        self.assertEqual(self.engine.images, 2)
+
+    def test_disabled(self):
+        """测试关闭近似图片复用"""
+        xhs_processor.PHASH_ENABLED = False
+        xhs_processor.ocr_images_batch([self._note_job("note_e", seed=6)])
+        xhs_processor.ocr_images_batch([self._note_job("note_f", seed=6, quality=50)])
+
+        self.assertEqual(self.engine.images, 2)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,192 @@
+"""
+pipeline.py 模块的单元测试
+"""
+
+import unittest
+import threading
+import time
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from pipeline import NotePipeline
+
+
+class TestNotePipeline(unittest.TestCase):
+    """测试分阶段流水线"""
+
+    def _make_pipeline(self, images_per_note=2, **kwargs):
+        """构造使用模拟阶段的流水线"""
+        self.events = []
+        self.events_lock = threading.Lock()
+
+        def record(event):
+            with self.events_lock:
+                self.events.append(event)
+
+        def fetch(job):
+            job.note_id = job.item
+            record(("fetch", job.item))
+
+        def download(job, emit):
+            for i in range(images_per_note):
+                record(("download", job.item, i))
+                emit(f"{job.item}/{i}.jpg")
+                time.sleep(0.01)
+
+        def ocr(items):
+            for job, img_path in items:
+                record(("ocr", img_path))
+
+        def build(job):
+            record(("build", job.item))
+            return f"content-{job.item}"
+
+        stages = dict(fetch=fetch, download=download, ocr=ocr, build=build)
+        stages.update(kwargs.pop("stages", {}))
+        return NotePipeline(**stages, **kwargs)
+
+    def test_results_keep_input_order(self):
+        """测试结果按输入顺序返回"""
+        pipeline = self._make_pipeline(workers={"fetch": 3, "download": 3, "build": 2})
+        items = [f"note{i}" for i in range(10)]
+
+        results = pipeline.run(items)
+
+        self.assertEqual(results, [f"content-{item}" for item in items])
+
+    def test_empty_input(self):
+        """测试空输入"""
+        pipeline = self._make_pipeline()
+        self.assertEqual(pipeline.run([]), [])
+
+    def test_images_reach_ocr_before_download_finishes(self):
+        """测试图片下载完成后立即进入OCR，而不是等整篇笔记下载完"""
+        pipeline = self._make_pipeline(images_per_note=5, workers={"download": 1},
+                                       ocr_batch_size=1)
+        pipeline.run(["note0"])
+
+        first_ocr = self.events.index(("ocr", "note0/0.jpg"))
+        last_download = self.events.index(("download", "note0", 4))
+        self.assertLess(first_ocr, last_download)
+
+        # 所有图片OCR完成后才生成内容
+        build = self.events.index(("build", "note0"))
+        ocr_positions = [i for i, e in enumerate(self.events) if e[0] == "ocr"]
+        self.assertEqual(len(ocr_positions), 5)
+        self.assertGreater(build, max(ocr_positions))
+
+    def test_fetch_failure(self):
+        """测试获取阶段失败的笔记返回None，其它笔记不受影响"""
+        def fetch(job):
+            job.note_id = job.item
+            return job.item != "bad"
+
+        pipeline = self._make_pipeline(stages={"fetch": fetch})
+        results = pipeline.run(["good", "bad"])
+
+        self.assertEqual(results, ["content-good", None])
+
+    def test_cached_note_skips_later_stages(self):
+        """测试已完成的笔记直接返回内容"""
+        def fetch(job):
+            job.note_id = job.item
+            job.content = "cached"
+
+        pipeline = self._make_pipeline(stages={"fetch": fetch})
+        results = pipeline.run(["note0"])
+
+        self.assertEqual(results, ["cached"])
+        self.assertFalse(any(e[0] in ("download", "ocr", "build") for e in self.events))
+
+    def test_stage_exception_reported(self):
+        """测试阶段异常通过on_error回调报告"""
+        errors = []
+
+        def download(job, emit):
+            raise RuntimeError("网络错误")
+
+        pipeline = self._make_pipeline(
+            stages={"download": download},
+            on_error=lambda job, stage, exc: errors.append((job.item, stage))
+        )
+        results = pipeline.run(["note0", "note1"])
+
+        self.assertEqual(results, [None, None])
+        self.assertEqual(sorted(errors), [("note0", "download"), ("note1", "download")])
+
+    def test_ocr_failure_does_not_fail_note(self):
+        """测试OCR失败不影响笔记生成"""
+        def ocr(items):
+            raise RuntimeError("识别失败")
+
+        pipeline = self._make_pipeline(stages={"ocr": ocr})
+        results = pipeline.run(["note0"])
+
+        self.assertEqual(results, ["content-note0"])
+
+    def test_stages_overlap(self):
+        """测试不同阶段并发执行：总耗时接近最慢阶段而非各阶段之和"""
+        def fetch(job):
+            job.note_id = job.item
+            time.sleep(0.05)
+
+        def download(job, emit):
+            time.sleep(0.05)
+            emit("0.jpg")
+
+        def ocr(items):
+            time.sleep(0.05)
+
+        pipeline = self._make_pipeline(
+            stages={"fetch": fetch, "download": download, "ocr": ocr},
+            workers={"fetch": 1, "download": 1, "ocr": 1, "build": 1},
+            ocr_batch_size=1
+        )
+        start = time.time()
+        results = pipeline.run([f"note{i}" for i in range(6)])
+        elapsed = time.time() - start
+
+        self.assertEqual(len(results), 6)
+        # 串行需要 6 * 0.15 = 0.9 秒，流水线约 (6 + 2) * 0.05 = 0.4 秒
+        self.assertLess(elapsed, 0.75)
+
+    def test_ocr_batches_across_notes(self):
+        """测试OCR阶段跨笔记凑批"""
+        batches = []
+
+        def download(job, emit):
+            emit(f"{job.item}/0.jpg")
+            emit(f"{job.item}/1.jpg")
+
+        def ocr(items):
+            batches.append(sorted(img_path for _, img_path in items))
+
+        pipeline = self._make_pipeline(
+            stages={"download": download, "ocr": ocr},
+            workers={"download": 4, "ocr": 1},
+            ocr_batch_size=4,
+            ocr_linger=0.2
+        )
+        results = pipeline.run(["a", "b"])
+
+        self.assertEqual(results, ["content-a", "content-b"])
+        self.assertEqual(sum(len(b) for b in batches), 4)
+        self.assertTrue(all(len(b) <= 4 for b in batches))
+        # 两篇笔记的图片进入了同一批
+        self.assertTrue(any({p.split('/')[0] for p in b} == {"a", "b"} for b in batches))
+
+    def test_on_result_called_once_per_note(self):
+        """测试每个笔记完成时回调一次"""
+        finished = []
+        pipeline = self._make_pipeline(on_result=lambda job: finished.append(job.index))
+        pipeline.run(["a", "b", "c"])
+
+        self.assertEqual(sorted(finished), [0, 1, 2])
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,178 @@
+"""
+rebuild.py 模块的单元测试
+"""
+
+import unittest
+import tempfile
+import shutil
+from unittest import mock
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import utils
+import xhs_processor
+import note_record
+import manifest
+from manifest import content_inputs, content_stale
+from note_record import load_record, update_ocr_results, parse_ocr_md
+from rebuild import rebuild_notes, list_notes
+
+
+API_DATA = {'data': {'作品标题': '测试标题', '作品描述': '正文'}}
+
+
+class TestRebuild(unittest.TestCase):
+    """测试按输入指纹增量重建content.md"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+
+    def tearDown(self):
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _note(self, note_id, images=2):
+        """生成一个已完成OCR的笔记"""
+        xhs_processor.save_metadata_md(note_id, API_DATA)
+        note_dir = self.test_dir / "xhs_notes" / note_id
+        (note_dir / "ocr_results").mkdir(parents=True)
+        entries = {}
+        for i in range(images):
+            img = Path(f"{i}.jpg")
+            recognized_at = xhs_processor.save_ocr_md(img, note_dir / "ocr_results" / f"{i}.md",
+                                                      [f"第{i}张"])
+            entries[img.name] = {"lines": [f"第{i}张"], "source": None, "recognized_at": recognized_at}
+        update_ocr_results(note_dir, entries)
+        return note_dir
+
+    def test_unchanged_notes_skipped(self):
+        """测试输入未变化的笔记被跳过"""
+        for i in range(3):
+            self._note(f"note{i}")
+
+        first = rebuild_notes(workers=2)
+        second = rebuild_notes(workers=2)
+
+        self.assertEqual((first["rebuilt"], first["skipped"], first["failed"]), (3, 0, []))
+        self.assertEqual((second["rebuilt"], second["skipped"]), (0, 3))
+
+    def test_edited_ocr_file_rebuilds_only_that_note(self):
+        """测试修正一个OCR结果文件后只重建该笔记，并同步到记录"""
+        note_dir = self._note("note_a")
+        self._note("note_b")
+        rebuild_notes(workers=2)
+
+        ocr_path = note_dir / "ocr_results" / "1.md"
+        ocr_path.write_text(ocr_path.read_text(encoding='utf-8').replace("第1张", "修正后的文字"),
+                            encoding='utf-8')
+        self.assertTrue(content_stale(note_dir))
+
+        result = rebuild_notes(workers=2)
+
+        self.assertEqual((result["rebuilt"], result["skipped"]), (1, 1))
+        self.assertIn("修正后的文字", (note_dir / "content.md").read_text(encoding='utf-8'))
+        self.assertEqual(load_record(note_dir)["ocr"]["1.jpg"]["lines"], ["修正后的文字"])
+        self.assertFalse(content_stale(note_dir))
+
+    def test_ocr_rerun_not_treated_as_edit(self):
+        """测试重新识别写入的OCR结果文件不算手动修正，之后的修改才算"""
+        from PIL import Image
+
+        class Engine:
+            class Result:
+                json = {'res': {'rec_texts': ["重新识别的文字"]}}
+
+            def predict(self, input):
+                items = input if isinstance(input, list) else [input]
+                return [self.Result() for _ in items]
+
+        note_dir = self._note("note_g")
+        rebuild_notes(workers=1)
+        (note_dir / "images").mkdir()
+        img = note_dir / "images" / "1.jpg"
+        Image.new("RGB", (64, 64), (200, 200, 200)).save(img)
+
+        saved = {name: getattr(xhs_processor, name)
+                 for name in ("ocr", "ocr_server_client", "OCR_CACHE_ENABLED", "OCR_TEXT_GATE")}
+        xhs_processor.ocr = Engine()
+        xhs_processor.ocr_server_client = None
+        xhs_processor.OCR_CACHE_ENABLED = False
+        xhs_processor.OCR_TEXT_GATE = "off"
+        try:
+            with open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+                xhs_processor.ocr_images_batch([(img, str(note_dir / "ocr_results" / "1.md"))])
+                rebuild_notes(workers=1)
+        finally:
+            for name, value in saved.items():
+                setattr(xhs_processor, name, value)
+
+        entry = load_record(note_dir)["ocr"]["1.jpg"]
+        self.assertEqual(entry["lines"], ["重新识别的文字"])
+        self.assertIsNone(entry["source"])
+
+        ocr_path = note_dir / "ocr_results" / "1.md"
+        ocr_path.write_text(ocr_path.read_text(encoding='utf-8').replace("重新识别的文字", "手改"),
+                            encoding='utf-8')
+        with open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+            rebuild_notes(workers=1)
+        entry = load_record(note_dir)["ocr"]["1.jpg"]
+        self.assertEqual((entry["lines"], entry["source"]), (["手改"], "手动修正"))
+
+        # 已同步的修正不会在下次生成时再次同步
+        with open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+            xhs_processor.generate_content_md("note_g")
+        self.assertEqual(load_record(note_dir)["ocr"]["1.jpg"]["recognized_at"], entry["recognized_at"])
+
+    def test_template_version_change_rebuilds(self):
+        """测试模板版本变化后全部重建"""
+        self._note("note_c")
+        rebuild_notes(workers=1)
+
+        with mock.patch.object(manifest, "CONTENT_TEMPLATE_VERSION",
+                               note_record.CONTENT_TEMPLATE_VERSION + 1):
+            result = rebuild_notes(workers=1)
+
+        self.assertEqual(result["rebuilt"], 1)
+
+    def test_deleted_content_and_force(self):
+        """测试content.md被删除时重建，--force时忽略指纹"""
+        note_dir = self._note("note_d")
+        rebuild_notes(workers=1)
+        (note_dir / "content.md").unlink()
+
+        self.assertEqual(rebuild_notes(workers=1)["rebuilt"], 1)
+        self.assertEqual(rebuild_notes(workers=1, force=True)["rebuilt"], 1)
+
+    def test_legacy_note_fingerprint(self):
+        """测试没有note.json的旧笔记按metadata.md计算指纹"""
+        note_dir = self._note("note_e", images=1)
+        (note_dir / "note.json").unlink()
+
+        self.assertEqual(rebuild_notes(workers=1)["rebuilt"], 1)
+        self.assertEqual(rebuild_notes(workers=1)["skipped"], 1)
+        self.assertIsNotNone(content_inputs(note_dir)["metadata"])
+
+    def test_list_and_missing_notes(self):
+        """测试只列出有元数据的笔记，不存在的笔记报告失败"""
+        self._note("note_f", images=0)
+        (self.test_dir / "xhs_notes" / "empty").mkdir()
+
+        self.assertEqual(list_notes(), ["note_f"])
+        self.assertEqual(rebuild_notes(["missing"], workers=1)["failed"], ["missing"])
+
+    def test_parse_ocr_md(self):
+        """测试从OCR结果文件解析文本行"""
+        self.assertEqual(parse_ocr_md("# 标题\n\n## 识别文本\n\n第一行\n第二行\n"), ["第一行", "第二行"])
+        self.assertEqual(parse_ocr_md("## 识别文本\n\n（未识别到文字）\n"), [])
+        self.assertIsNone(parse_ocr_md("随意的文本"))
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,228 @@
+"""
+resilience.py 模块的单元测试
+"""
+
+import unittest
+import json
+import threading
+import random
+import socket
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import xhs_processor
+import http_client
+from resilience import (
+    RetryPolicy, CircuitBreaker, RetryableError, CircuitOpenError, call_with_retry,
+    CLOSED, OPEN, HALF_OPEN
+)
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """测试指数退避"""
+
+    def test_jittered_exponential_delays(self):
+        """测试退避上限按指数增长且不超过最大值"""
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0, rng=random.Random(1))
+        for retry, cap in enumerate([1.0, 2.0, 4.0, 5.0, 5.0]):
+            delays = [policy.delay(retry) for _ in range(50)]
+            self.assertTrue(all(0 <= d <= cap for d in delays))
+            self.assertGreater(max(delays), cap / 2)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """测试熔断器状态转换"""
+
+    def test_open_probe_recover(self):
+        """测试连续失败后熔断，冷却后只放行一个探测请求"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(threshold=3, cooldown=10, clock=clock)
+        for _ in range(3):
+            self.assertEqual(breaker.acquire(), 0)
+            breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.acquire(), 10)
+
+        clock.sleep(10)
+        self.assertEqual(breaker.acquire(), 0)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertGreater(breaker.acquire(), 0)  # 探测进行中，其它调用等待
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.acquire(), 0)
+
+    def test_failed_probe_reopens(self):
+        """测试探测失败后重新熔断"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(threshold=1, cooldown=5, clock=clock)
+        breaker.record_failure()
+        clock.sleep(5)
+        breaker.acquire()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.stats()["opens"], 2)
+
+
+class TestCallWithRetry(unittest.TestCase):
+    """测试重试调用"""
+
+    def test_retry_until_success(self):
+        """测试可重试的失败被重试"""
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) < 3:
+                raise RetryableError("503")
+            return "ok"
+
+        retries = []
+        result = call_with_retry(func, RetryPolicy(attempts=3), sleep=lambda s: None,
+                                 on_retry=lambda n, e, d: retries.append(n))
+        self.assertEqual(result, "ok")
+        self.assertEqual(retries, [1, 2])
+
+    def test_non_retryable_not_retried(self):
+        """测试其它异常不重试"""
+        calls = []
+
+        def func():
+            calls.append(1)
+            raise ValueError("400")
+
+        with self.assertRaises(ValueError):
+            call_with_retry(func, RetryPolicy(attempts=5), sleep=lambda s: None)
+        self.assertEqual(len(calls), 1)
+
+    def test_open_breaker_waits_then_gives_up(self):
+        """测试熔断期间等待冷却，超过最长等待后拒绝"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(threshold=1, cooldown=10, clock=clock)
+        breaker.record_failure()
+
+        self.assertEqual(call_with_retry(lambda: "ok", breaker=breaker, sleep=clock.sleep), "ok")
+        self.assertEqual(clock.now, 10)
+
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            call_with_retry(lambda: "ok", breaker=breaker, max_wait=5, sleep=clock.sleep)
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    """模拟XHS-Downloader：按脚本依次返回状态码"""
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests += 1
+            status = server.script.pop(0) if server.script else 200
+        body = json.dumps({'data': {'作品标题': '标题'}} if status == 200 else {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestApiAgainstFakeServer(unittest.TestCase):
+    """测试download_note_via_api对本地模拟API的重试与熔断"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeApiHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.script = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.original = (xhs_processor.XHS_API_URL, xhs_processor.API_RETRY_POLICY,
+                         xhs_processor.api_breaker, xhs_processor.API_CACHE_ENABLED,
+                         xhs_processor.API_BREAKER_MAX_WAIT, dict(xhs_processor.API_STATS))
+        xhs_processor.XHS_API_URL = f"http://127.0.0.1:{self.server.server_port}/xhs/detail"
+        xhs_processor.API_RETRY_POLICY = RetryPolicy(attempts=3, base_delay=0.01)
+        xhs_processor.API_CACHE_ENABLED = False
+        self.clock = FakeClock()
+        xhs_processor.api_breaker = CircuitBreaker(threshold=3, cooldown=60, clock=self.clock)
+        self.original_client = http_client.set_client(http_client.HttpClient())
+
+    def tearDown(self):
+        http_client.set_client(self.original_client)
+        (xhs_processor.XHS_API_URL, xhs_processor.API_RETRY_POLICY, xhs_processor.api_breaker,
+         xhs_processor.API_CACHE_ENABLED, xhs_processor.API_BREAKER_MAX_WAIT, stats) = self.original
+        xhs_processor.API_STATS.update(stats)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_5xx_retried(self):
+        """测试503后重试成功"""
+        self.server.script = [503, 502]
+
+        result = xhs_processor.download_note_via_api("note_a")
+
+        self.assertEqual(result['data']['作品标题'], '标题')
+        self.assertEqual(self.server.requests, 3)
+
+    def test_4xx_not_retried(self):
+        """测试4xx不重试"""
+        self.server.script = [404]
+
+        self.assertIsNone(xhs_processor.download_note_via_api("note_b"))
+        self.assertEqual(self.server.requests, 1)
+
+    def test_breaker_stops_hammering(self):
+        """测试连续失败后熔断，不再请求服务，冷却后探测恢复"""
+        self.server.script = [500] * 3
+
+        self.assertIsNone(xhs_processor.download_note_via_api("note_c"))
+        self.assertEqual(xhs_processor.api_breaker.state, OPEN)
+
+        # 熔断期间等待超过最长时间的笔记直接放弃，不请求服务
+        xhs_processor.API_BREAKER_MAX_WAIT = 0
+        self.assertIsNone(xhs_processor.download_note_via_api("note_d"))
+        self.assertEqual(self.server.requests, 3)
+
+        # 冷却结束后探测请求成功，恢复正常
+        self.clock.sleep(60)
+        self.assertIsNotNone(xhs_processor.download_note_via_api("note_e"))
+        self.assertEqual(xhs_processor.api_breaker.state, CLOSED)
+        stats = xhs_processor.report_api_resilience()
+        self.assertGreaterEqual(stats["breaker_opens"], 1)
+
+    def test_connection_error_retried(self):
+        """测试服务不可达时按连接错误重试后失败"""
+        # 绑定后立即释放的端口上没有服务监听
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        xhs_processor.XHS_API_URL = f"http://127.0.0.1:{port}/xhs/detail"
+
+        before = xhs_processor.API_STATS["retries"]
+        self.assertIsNone(xhs_processor.download_note_via_api("note_f"))
+        self.assertEqual(xhs_processor.API_STATS["retries"] - before, 2)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -0,0 +1,279 @@
+"""
+text_gate.py 模块（识别前的文字存在性判断）的单元测试
+使用模拟检测模型，不需要PaddleOCR
+"""
+
+import unittest
+import tempfile
+import shutil
+import pickle
+import random
+from pathlib import Path
+import sys
+import os
+
+# 添加scripts目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import numpy as np
+from PIL import Image
+
+import http_client
+import utils
+import xhs_processor
+from note_record import load_record
+from ocr_server import OcrServer, OcrServerClient
+from synthetic_corpus import render_image, find_font
+from text_gate import (
+    TextGate,
+    NoText,
+    heuristic_no_text,
+    text_features,
+    REASON_HEURISTIC,
+    REASON_DETECTION,
+    DEFAULT_GATE_MODE
+)
+
+
+def make_blank(path, size=(600, 800)):
+    """生成一张只有柔和渐变的图片（没有文字）"""
+    ramp = np.linspace(150, 200, size[0], dtype=np.float32)
+    pixels = np.repeat(np.tile(ramp, (size[1], 1))[..., None], 3, axis=2).astype(np.uint8)
+    Image.fromarray(pixels).save(path, quality=90)
+    return path
+
+
+def make_text(path, seed=0):
+    """生成一张带文字的图片"""
+    render_image(path, ["小红书笔记", "今日份分享", "好物推荐清单"], find_font(), seed)
+    return path
+
+
+def make_photo(path, seed=0, size=(600, 800)):
+    """生成一张纹理丰富的“照片”（启发式判断无法排除）"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    Image.fromarray(pixels).resize(size, Image.NEAREST).save(path, quality=90)
+    return path
+
+
+class FakeDetector:
+    """模拟TextDetection：文件名含photo的图片检测不到文本框"""
+
+    class Result:
+        def __init__(self, boxes):
+            self.json = {'res': {'dt_polys': boxes}}
+
+    def __init__(self, names):
+        self.names = names
+        self.calls = []
+
+    def predict(self, input, batch_size=1):
+        self.calls.append(len(input))
+        return [self.Result([] if "photo" in name else [[[0, 0], [10, 0], [10, 5], [0, 5]]])
+                for name in self.names(input)]
+
+
+class TestHeuristic(unittest.TestCase):
+    """测试边缘密度判断"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_blank_image_has_no_text(self):
+        """测试没有边缘的图片判断为没有文字"""
+        self.assertTrue(heuristic_no_text(make_blank(self.test_dir / "blank.jpg")))
+
+    def test_text_image_kept(self):
+        """测试带文字的图片不会被排除"""
+        path = make_text(self.test_dir / "text.jpg")
+        self.assertFalse(heuristic_no_text(path))
+        self.assertGreater(text_features(path)["edge_density"], 0.004)
+
+    def test_array_input(self):
+        """测试预处理后的BGR数组与路径判断一致"""
+        path = make_text(self.test_dir / "text.jpg")
+        with Image.open(path) as img:
+            pixels = np.asarray(img.convert('RGB'))[:, :, ::-1]
+        self.assertFalse(heuristic_no_text(pixels))
+        self.assertTrue(heuristic_no_text(np.full((800, 600, 3), 128, dtype=np.uint8)))
+
+    def test_unreadable_image_kept(self):
+        """测试无法读取的图片交给OCR引擎处理"""
+        path = self.test_dir / "broken.jpg"
+        path.write_bytes(b"not an image")
+        self.assertFalse(heuristic_no_text(path))
+
+
+class TestTextGate(unittest.TestCase):
+    """测试判断流程"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.items = [
+            str(make_blank(self.test_dir / "blank.jpg")),
+            str(make_text(self.test_dir / "text.jpg")),
+            str(make_photo(self.test_dir / "photo.jpg")),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_detect_mode(self):
+        """测试启发式排除后只把剩余图片交给检测模型"""
+        detector = FakeDetector(lambda items: [Path(p).name for p in items])
+        gate = TextGate("detect", detector_factory=lambda device: detector)
+
+        reasons = gate.check(self.items)
+
+        self.assertEqual(reasons, [REASON_HEURISTIC, None, REASON_DETECTION])
+        self.assertEqual(detector.calls, [2])
+
+    def test_heuristic_and_off_modes(self):
+        """测试只用启发式判断和关闭判断"""
+        def factory(device):
+            raise AssertionError("不应加载检测模型")
+
+        self.assertEqual(TextGate("heuristic", detector_factory=factory).check(self.items),
+                         [REASON_HEURISTIC, None, None])
+        self.assertEqual(TextGate("off", detector_factory=factory).check(self.items), [None] * 3)
+
+    def test_detector_unavailable_or_failing(self):
+        """测试检测模型不可用或出错时不跳过候选图片"""
+        self.assertEqual(TextGate("detect", detector_factory=lambda device: None).check(self.items),
+                         [REASON_HEURISTIC, None, None])
+
+        class Broken:
+            def predict(self, input, batch_size=1):
+                raise RuntimeError("检测失败")
+
+        self.assertEqual(TextGate("detect", detector_factory=lambda device: Broken()).check(self.items),
+                         [REASON_HEURISTIC, None, None])
+
+    def test_no_text_serializable(self):
+        """测试跳过结果可在进程之间传递"""
+        restored = pickle.loads(pickle.dumps(NoText(REASON_DETECTION)))
+        self.assertIsInstance(restored, NoText)
+        self.assertEqual(restored, [])
+        self.assertEqual(restored.reason, REASON_DETECTION)
+
+
+class RecordingEngine:
+    """记录识别图片数的模拟OCR引擎"""
+
+    class Result:
+        def __init__(self, lines):
+            self.json = {'res': {'rec_texts': lines}}
+
+    def __init__(self):
+        self.images = 0
+        self.calls = 0
+
+    def predict(self, input):
+        items = input if isinstance(input, list) else [input]
+        self.calls += 1
+        self.images += len(items)
+        return [self.Result(["图中文字"]) for _ in items]
+
+
+class TestProcessorTextGate(unittest.TestCase):
+    """测试处理器跳过没有文字的图片"""
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        self.saved = {name: getattr(xhs_processor, name)
+                      for name in ("ocr", "ocr_server_client", "OCR_CACHE_ENABLED",
+                                   "OCR_TEXT_GATE", "text_gate")}
+        self.engine = RecordingEngine()
+        xhs_processor.ocr = self.engine
+        xhs_processor.ocr_server_client = None
+        xhs_processor.OCR_CACHE_ENABLED = False
+        xhs_processor.OCR_TEXT_GATE = "detect"
+
+        self.note_dir = self.test_dir / "xhs_notes" / "note_a"
+        images_dir = self.note_dir / "images"
+        self.ocr_dir = self.note_dir / "ocr_results"
+        images_dir.mkdir(parents=True)
+        self.ocr_dir.mkdir()
+        self.images = [
+            make_blank(images_dir / "0.jpg"),
+            make_text(images_dir / "1.jpg"),
+            make_photo(images_dir / "2.jpg"),
+        ]
+        self.jobs = [(img, str(self.ocr_dir / f"{img.stem}.md")) for img in self.images]
+        photo = np.asarray(Image.open(self.images[2]).convert('RGB'))[:, :, ::-1]
+        # 按内容识别“照片”（预处理后可能是数组）
+        names = lambda items: ["photo" if np.array_equal(self._load(p), photo) else "text" for p in items]
+        self.detector = FakeDetector(names)
+        xhs_processor.text_gate = TextGate("detect", detector_factory=lambda device: self.detector)
+
+    def _load(self, item):
+        if isinstance(item, np.ndarray):
+            return item
+        return np.asarray(Image.open(item).convert('RGB'))[:, :, ::-1]
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(xhs_processor, name, value)
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_skips_images_without_text(self):
+        """测试只有检测到文字的图片执行识别，其余记录为无文字"""
+        before = xhs_processor.OCR_STATS["no_text"]
+
+        xhs_processor.ocr_images_batch(self.jobs, batch_size=4)
+
+        self.assertEqual(self.engine.images, 1)
+        self.assertEqual(xhs_processor.OCR_STATS["no_text"] - before, 2)
+        blank = (self.ocr_dir / "0.md").read_text(encoding='utf-8')
+        self.assertIn("无文字，跳过识别", blank)
+        self.assertIn(REASON_HEURISTIC, blank)
+        self.assertIn("（未识别到文字）", blank)
+        self.assertIn(REASON_DETECTION, (self.ocr_dir / "2.md").read_text(encoding='utf-8'))
+        self.assertIn("图中文字", (self.ocr_dir / "1.md").read_text(encoding='utf-8'))
+
+        record = load_record(self.note_dir)
+        self.assertIn(REASON_HEURISTIC, record["ocr"]["0.jpg"]["source"])
+        self.assertEqual(record["ocr"]["1.jpg"]["lines"], ["图中文字"])
+
+    def test_default_mode_detects_once(self):
+        """测试默认判断方式下有文字的图片只经过一次检测（即完整识别中的检测）"""
+        xhs_processor.OCR_TEXT_GATE = DEFAULT_GATE_MODE
+        detector = FakeDetector(lambda items: ["text"] * len(items))
+        xhs_processor.text_gate = TextGate(DEFAULT_GATE_MODE, detector_factory=lambda device: detector)
+
+        xhs_processor.ocr_images_batch([self.jobs[1]], batch_size=4)
+
+        self.assertEqual(DEFAULT_GATE_MODE, "heuristic")
+        self.assertEqual(detector.calls, [])
+        self.assertEqual((self.engine.calls, self.engine.images), (1, 1))
+        self.assertIn("图中文字", (self.ocr_dir / "1.md").read_text(encoding='utf-8'))
+
+    def test_no_text_through_server(self):
+        """测试OCR服务返回的跳过结果保留原因"""
+        original_http = http_client.set_client(None)
+        server = OcrServer(xhs_processor.recognize_images, port=0, max_batch=4, max_wait=0.01).start()
+        try:
+            results = OcrServerClient(server.url).recognize(self.images)
+        finally:
+            server.stop()
+            client = http_client.set_client(original_http)
+            if isinstance(client, http_client.HttpClient):
+                client.close()
+
+        self.assertIsInstance(results[0], NoText)
+        self.assertEqual(results[0].reason, REASON_HEURISTIC)
+        self.assertEqual(results[1], ["图中文字"])
+        self.assertEqual(results[2].reason, REASON_DETECTION)
+
+
+if __name__ == '__main__':
+    # 运行测试
+    unittest.main(verbosity=2)
@@ -15,6 +15,9 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
 
 import xhs_processor
+import http_client
+from resilience import RetryPolicy, CircuitBreaker
+import utils
 from xhs_processor import (
     check_xhs_api_status,
     download_note_via_api,
@@ -40,33 +43,47 @@ class TestXHSProcessor(unittest.TestCase):
         # 创建必要的目录结构
         os.makedirs("xhs_notes", exist_ok=True)
         os.makedirs("ronggao_output", exist_ok=True)
+        
+        # 注入模拟的HTTP客户端
+        self.mock_client = Mock()
+        self.original_client = http_client.set_client(self.mock_client)
+        
+        # 每个用例都直接调用模拟的API，不读写API响应缓存
+        self.original_api_cache = xhs_processor.API_CACHE_ENABLED
+        xhs_processor.API_CACHE_ENABLED = False
+        # 失败时不重试等待，熔断器状态不跨用例保留
+        self.original_retry_policy = xhs_processor.API_RETRY_POLICY
+        self.original_breaker = xhs_processor.api_breaker
+        xhs_processor.API_RETRY_POLICY = RetryPolicy(attempts=1)
+        xhs_processor.api_breaker = CircuitBreaker()
     
     def tearDown(self):
         """清理测试环境"""
+        xhs_processor.API_CACHE_ENABLED = self.original_api_cache
+        xhs_processor.API_RETRY_POLICY = self.original_retry_policy
+        xhs_processor.api_breaker = self.original_breaker
+        http_client.set_client(self.original_client)
         os.chdir(self.original_cwd)
         shutil.rmtree(self.test_dir, ignore_errors=True)
     
-    @patch('requests.get')
-    def test_check_xhs_api_status_success(self, mock_get):
+    def test_check_xhs_api_status_success(self):
         """测试API状态检查 - 成功"""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_get.return_value = mock_response
+        self.mock_client.get.return_value = mock_response
         
         result = check_xhs_api_status()
         self.assertTrue(result)
-        mock_get.assert_called_once_with("http://127.0.0.1:5556/docs", timeout=5)
+        self.mock_client.get.assert_called_once_with("http://127.0.0.1:5556/docs", timeout=5)
     
-    @patch('requests.get')
-    def test_check_xhs_api_status_failure(self, mock_get):
+    def test_check_xhs_api_status_failure(self):
         """测试API状态检查 - 失败"""
-        mock_get.side_effect = Exception("Connection error")
+        self.mock_client.get.side_effect = Exception("Connection error")
         
         result = check_xhs_api_status()
         self.assertFalse(result)
     
-    @patch('requests.post')
-    def test_download_note_via_api_success(self, mock_post):
+    def test_download_note_via_api_success(self):
         """测试通过API下载笔记 - 成功"""
         mock_response = Mock()
         mock_response.status_code = 200
@@ -78,7 +95,7 @@ class TestXHSProcessor(unittest.TestCase):
                 '作品描述': '测试内容'
             }
         }
-        mock_post.return_value = mock_response
+        self.mock_client.post.return_value = mock_response
         
         result = download_note_via_api('test_note_id')
         
@@ -86,17 +103,16 @@ class TestXHSProcessor(unittest.TestCase):
         self.assertEqual(result['data']['作品标题'], '测试标题')
         
         # 验证请求参数
-        mock_post.assert_called_once()
-        call_args = mock_post.call_args
+        self.mock_client.post.assert_called_once()
+        call_args = self.mock_client.post.call_args
         self.assertEqual(call_args[0][0], xhs_processor.XHS_API_URL)
         self.assertIn('url', call_args[1]['json'])
     
-    @patch('requests.post')
-    def test_download_note_via_api_failure(self, mock_post):
+    def test_download_note_via_api_failure(self):
         """测试通过API下载笔记 - 失败"""
         mock_response = Mock()
         mock_response.status_code = 500
-        mock_post.return_value = mock_response
+        self.mock_client.post.return_value = mock_response
         
         result = download_note_via_api('test_note_id')
         self.assertIsNone(result)
@@ -134,36 +150,42 @@ class TestXHSProcessor(unittest.TestCase):
         self.assertIn('这是测试描述内容', content)
         self.assertIn('测试, 标签1, 标签2', content)
     
-    @patch('requests.get')
-    def test_download_images(self, mock_get):
+    def test_download_images(self):
         """测试下载图片"""
         note_id = "test_note_002"
         api_data = {
             'data': {
-                '图片链接': [
+                '下载地址': [
                     'http://example.com/image1.jpg',
                     'http://example.com/image2.jpg'
                 ]
             }
         }
         
-        # 模拟图片下载
+        # 模拟图片下载：fetch_image 通过 iter_content 流式写入 .part 再重命名
+        image_data = b"\xff\xd8" + b"fake_image_data" + b"\xff\xd9"
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.content = b'fake_image_data'
-        mock_get.return_value = mock_response
-        
-        download_images(note_id, api_data)
-        
-        # 验证图片文件是否创建
-        image1_path = Path(f"xhs_notes/{note_id}/images/0.jpg")
-        image2_path = Path(f"xhs_notes/{note_id}/images/1.jpg")
-        
-        self.assertTrue(image1_path.exists())
-        self.assertTrue(image2_path.exists())
+        mock_response.headers = {"Content-Length": str(len(image_data))}
+        mock_response.iter_content.side_effect = lambda chunk_size=None: iter(
+            [image_data[:8], image_data[8:]])
+        self.mock_client.get.return_value = mock_response
+        
+        original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = self.test_dir
+        try:
+            download_images(note_id, api_data)
+        finally:
+            utils.PROJECT_ROOT = original_root
+        
+        # 验证图片文件已完整写入并重命名，不留临时文件
+        images_dir = Path(self.test_dir) / "xhs_notes" / note_id / "images"
+        for name in ("0.jpg", "1.jpg"):
+            self.assertEqual((images_dir / name).read_bytes(), image_data)
+            self.assertFalse((images_dir / f"{name}.part").exists())
         
         # 验证请求次数
-        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(self.mock_client.get.call_count, 2)
     
     @patch('xhs_processor.init_ocr')
     @patch('xhs_processor.ocr')
@@ -176,8 +198,8 @@ class TestXHSProcessor(unittest.TestCase):
         images_dir.mkdir(parents=True, exist_ok=True)
         
         # 创建假图片文件
-        (images_dir / "0.jpg").write_bytes(b"fake_image")
-        (images_dir / "1.jpg").write_bytes(b"fake_image")
+        (images_dir / "0.jpg").write_bytes(b"\xff\xd8fake_image\xff\xd9")
+        (images_dir / "1.jpg").write_bytes(b"\xff\xd8fake_image\xff\xd9")
         
         # 模拟OCR结果
         mock_init_ocr.return_value = True
@@ -349,6 +371,103 @@ class TestXHSProcessor(unittest.TestCase):
         self.assertEqual(cm.exception.code, 1)
 
 
+class FakeOCRResult:
+    """模拟PaddleOCR单张图片的识别结果"""
+    
+    def __init__(self, lines):
+        self.json = {'res': {'rec_texts': lines}}
+
+
+class FakeOCREngine:
+    """模拟支持批量predict的OCR引擎"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def predict(self, input):
+        paths = input if isinstance(input, list) else [input]
+        self.calls.append(len(paths))
+        return [FakeOCRResult([f"{Path(p).stem}号图片文字"]) for p in paths]
+
+
+class TestBatchedOCR(unittest.TestCase):
+    """测试批量OCR"""
+    
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.original_root = utils.PROJECT_ROOT
+        utils.PROJECT_ROOT = str(self.test_dir)
+        self.original_ocr = xhs_processor.ocr
+        self.original_server_client = xhs_processor.ocr_server_client
+        self.engine = FakeOCREngine()
+        xhs_processor.ocr = self.engine
+        xhs_processor.ocr_server_client = None
+    
+    def tearDown(self):
+        xhs_processor.ocr = self.original_ocr
+        xhs_processor.ocr_server_client = self.original_server_client
+        utils.PROJECT_ROOT = self.original_root
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def _make_jobs(self, note, count):
+        images_dir = self.test_dir / note / "images"
+        ocr_dir = self.test_dir / note / "ocr_results"
+        images_dir.mkdir(parents=True)
+        ocr_dir.mkdir(parents=True)
+        jobs = []
+        for i in range(count):
+            img_file = images_dir / f"{i}.jpg"
+            img_file.write_bytes(b"\xff\xd8" + f"fake_image_{note}_{i}".encode() + b"\xff\xd9")
+            jobs.append((img_file, str(ocr_dir / f"{i}.md")))
+        return jobs
+    
+    def test_batches_across_notes(self):
+        """测试多个笔记的图片按批大小分批识别，结果写入各自文件"""
+        jobs = self._make_jobs("note_a", 3) + self._make_jobs("note_b", 2)
+        
+        xhs_processor.ocr_images_batch(jobs, batch_size=2)
+        
+        self.assertEqual(self.engine.calls, [2, 2, 1])
+        for img_file, ocr_md_path in jobs:
+            content = Path(ocr_md_path).read_text(encoding='utf-8')
+            self.assertIn(f"{img_file.stem}号图片文字", content)
+            self.assertIn(f"images/{img_file.name}", content)
+    
+    def test_skips_existing_results(self):
+        """测试已有OCR结果的图片不参与识别"""
+        jobs = self._make_jobs("note_c", 3)
+        Path(jobs[0][1]).write_text("已有结果", encoding='utf-8')
+        
+        xhs_processor.ocr_images_batch(jobs, batch_size=4)
+        
+        self.assertEqual(self.engine.calls, [2])
+        self.assertEqual(Path(jobs[0][1]).read_text(encoding='utf-8'), "已有结果")
+    
+    def test_batch_failure_falls_back_to_single(self):
+        """测试批量识别失败时逐张识别"""
+        engine = self.engine
+        
+        def predict(input):
+            if isinstance(input, list):
+                raise RuntimeError("batch not supported")
+            return FakeOCREngine.predict(engine, input)
+        
+        engine.predict = predict
+        jobs = self._make_jobs("note_d", 2)
+        
+        xhs_processor.ocr_images_batch(jobs, batch_size=2)
+        
+        self.assertEqual(engine.calls, [1, 1])
+        self.assertTrue(all(Path(p).exists() for _, p in jobs))
+    
+    def test_throughput_recorded(self):
+        """测试累计吞吐统计"""
+        before = xhs_processor.OCR_STATS["images"]
+        xhs_processor.ocr_images_batch(self._make_jobs("note_e", 3), batch_size=2)
+        self.assertEqual(xhs_processor.OCR_STATS["images"] - before, 3)
+        self.assertIsNotNone(xhs_processor.report_ocr_throughput(2))
+
+
 class TestXHSProcessorIntegration(unittest.TestCase):
     """集成测试"""
     
@@ -387,8 +506,8 @@ class TestXHSProcessorIntegration(unittest.TestCase):
         # 创建图片目录
         images_dir = note_dir / "images"
         images_dir.mkdir(exist_ok=True)
-        (images_dir / "0.jpg").write_bytes(b"fake_image_0")
-        (images_dir / "1.jpg").write_bytes(b"fake_image_1")
+        (images_dir / "0.jpg").write_bytes(b"\xff\xd8fake_image_0\xff\xd9")
+        (images_dir / "1.jpg").write_bytes(b"\xff\xd8fake_image_1\xff\xd9")
         
         # 创建OCR结果
         ocr_dir = note_dir / "ocr_results"